@@ -0,0 +1,107 @@
+"""对比单线程 zipfile/tarfile 与 archive_utils 并行压缩后端的打包吞吐
+
+生成一个混合目录（大文本、半可压缩二进制、大量小文件），分别用旧实现与新实现打包，
+输出 MB/s 与压缩率。并行收益取决于 CPU 核数，可用 --workers 指定线程数。
+
+用法: python benchmarks/bench_archive_create.py [--size-mb 256] [--small-files 2000] [--workers N]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'clawos'))
+
+from lib import archive_utils  # noqa: E402
+
+
+def _generate_tree(base, size_mb, small_files):
+    rng = random.Random(7)
+    words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9))) for _ in range(2000)]
+    os.makedirs(os.path.join(base, 'big'))
+    os.makedirs(os.path.join(base, 'small'))
+    half = size_mb // 2
+    with open(os.path.join(base, 'big', 'log.txt'), 'w') as f:
+        written = 0
+        while written < half * 1024 * 1024:
+            line = ' '.join(rng.choice(words) for _ in range(12)) + '\n'
+            f.write(line)
+            written += len(line)
+    with open(os.path.join(base, 'big', 'data.bin'), 'wb') as f:
+        for _ in range(size_mb - half):
+            # 一半随机、一半重复，模拟可部分压缩的二进制
+            f.write(os.urandom(512 * 1024) + bytes(512 * 1024))
+    for i in range(small_files):
+        with open(os.path.join(base, 'small', f'f{i:05d}.py'), 'w') as f:
+            f.write('\n'.join(rng.choice(words) * 3 for _ in range(rng.randint(20, 200))))
+
+
+def _plan(base):
+    entries = []
+    for root, dirs, files in os.walk(base):
+        dirs.sort()
+        for d in dirs:
+            entries.append(('dir', os.path.join(root, d), os.path.relpath(os.path.join(root, d), base) + '/'))
+        for name in sorted(files):
+            fp = os.path.join(root, name)
+            entries.append(('file', fp, os.path.relpath(fp, base)))
+    return entries
+
+
+def _legacy(out, entries, fmt):
+    if fmt == 'zip':
+        with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for kind, fp, arc in entries:
+                if kind == 'file':
+                    zf.write(fp, arcname=arc)
+    else:
+        with tarfile.open(out, 'w:gz') as tf:
+            for _kind, fp, arc in entries:
+                tf.add(fp, arcname=arc.rstrip('/'), recursive=False)
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--small-files', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=archive_utils.ARCHIVE_WORKERS)
+    args = parser.parse_args()
+
+    base = tempfile.mkdtemp(prefix='clawos-bench-archive-')
+    try:
+        src = os.path.join(base, 'src')
+        _generate_tree(src, args.size_mb, args.small_files)
+        entries = _plan(src)
+        total = sum(os.path.getsize(fp) for kind, fp, _arc in entries if kind == 'file')
+        mb = total / (1024 * 1024)
+        print(f'input {mb:.1f} MB, {len(entries)} entries, cpu={os.cpu_count()}, workers={args.workers}')
+        print(f'{"format":>8}  {"backend":>9}  {"seconds":>8}  {"MB/s":>7}  {"ratio":>6}')
+        cases = [('zip', 'legacy'), ('zip', 'parallel'), ('tar.gz', 'legacy'), ('tar.gz', 'parallel')]
+        if archive_utils.zstd_available():
+            cases.append(('tar.zst', 'parallel'))
+        for fmt, backend in cases:
+            out = os.path.join(base, f'out-{backend}.{fmt}')
+            if backend == 'legacy':
+                dt = _timed(lambda: _legacy(out, entries, fmt))
+            else:
+                dt = _timed(lambda: archive_utils.write_archive(out, entries, fmt, workers=args.workers))
+            ratio = os.path.getsize(out) / total
+            print(f'{fmt:>8}  {backend:>9}  {dt:>8.2f}  {mb / dt:>7.1f}  {ratio:>6.3f}')
+            os.remove(out)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""对比 os.listdir 旧实现与 scandir 列表引擎的目录列出耗时
+
+用法: python benchmarks/bench_list_directory.py [--sizes 1000,10000,100000] [--repeat 3]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'clawos'))
+
+from lib import file_utils, path_utils  # noqa: E402
+
+
+def _legacy_get_file_info(path):
+    try:
+        stat = os.stat(path)
+        is_link = os.path.islink(path)
+        target_exists = os.path.exists(path) if is_link else True
+    except OSError:
+        try:
+            stat = os.lstat(path)
+            is_link = True
+            target_exists = False
+        except OSError:
+            return {'size': 0, 'modified': '-', 'is_dir': False, 'is_broken_link': True}
+    return {
+        'size': stat.st_size,
+        'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+        'is_dir': os.path.isdir(path) if target_exists else False,
+        'is_link': is_link,
+        'target_exists': target_exists,
+    }
+
+
+def legacy_list_directory(directory):
+    """基线：改造前基于 os.listdir + 多次 os.path 调用的实现"""
+    items = []
+    for item in os.listdir(directory):
+        item_path = os.path.join(directory, item)
+        is_symlink = os.path.islink(item_path)
+        try:
+            is_dir = os.path.isdir(item_path)
+        except OSError:
+            is_dir = False
+        info = _legacy_get_file_info(item_path)
+        broken = is_symlink and not info.get('target_exists', True)
+        if is_dir:
+            items.append({
+                'name': item, 'path': item_path, 'icon': '📁', 'size': '-',
+                'modified': info['modified'], 'is_dir': True, 'is_image': False,
+                'extension': '', 'is_symlink': is_symlink, 'is_broken_link': broken,
+            })
+        else:
+            _, ext = os.path.splitext(item)
+            items.append({
+                'name': item, 'path': item_path, 'icon': path_utils.get_file_icon(ext),
+                'size': path_utils.format_size(info['size']), 'modified': info['modified'],
+                'is_dir': False, 'is_image': ext.lower() in file_utils.IMAGE_EXTENSIONS,
+                'extension': ext.lower(), 'is_symlink': is_symlink, 'is_broken_link': broken,
+            })
+    items.sort(key=lambda x: (not x['is_dir'], x['name']))
+    return items
+
+
+def _generate_tree(base, count):
+    exts = ['.txt', '.py', '.jpg', '.json', '.md', '']
+    dir_every = 20
+    link_every = 50
+    for i in range(count):
+        if i % dir_every == 0:
+            os.mkdir(os.path.join(base, f'dir_{i:06d}'))
+        elif i % link_every == 1:
+            os.symlink(os.path.join(base, f'missing_{i}'), os.path.join(base, f'link_{i:06d}'))
+        else:
+            with open(os.path.join(base, f'file_{i:06d}{exts[i % len(exts)]}'), 'wb') as f:
+                f.write(b'x' * (i % 4096))
+
+
+def _best_of(fn, directory, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(directory)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    print(f'{"entries":>8}  {"legacy(s)":>10}  {"scandir(s)":>10}  {"speedup":>7}')
+    for size in sizes:
+        base = tempfile.mkdtemp(prefix='clawos-bench-ls-')
+        try:
+            _generate_tree(base, size)
+            legacy_t, legacy_items = _best_of(legacy_list_directory, base, args.repeat)
+            new_t, new_items = _best_of(file_utils.list_directory, base, args.repeat)
+            if len(legacy_items) != len(new_items):
+                raise SystemExit(f'结果条数不一致: {len(legacy_items)} != {len(new_items)}')
+            print(f'{size:>8}  {legacy_t:>10.4f}  {new_t:>10.4f}  {legacy_t / new_t:>6.2f}x')
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
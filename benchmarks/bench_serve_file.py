@@ -0,0 +1,118 @@
+"""对比 send_from_directory 旧实现与 http_utils.send_file_ranged 的大文件下载吞吐
+
+在本机起一个 werkzeug 多线程 HTTP 服务，分别测完整下载与随机 Range 读取（模拟视频拖动）。
+
+用法: python benchmarks/bench_serve_file.py [--size-mb 512] [--repeat 3] [--seeks 200]
+"""
+import argparse
+import http.client
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'clawos'))
+
+from flask import Flask, send_from_directory  # noqa: E402
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+from lib import http_utils  # noqa: E402
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _make_app(path):
+    app = Flask(__name__)
+
+    @app.route('/legacy')
+    def legacy():
+        return send_from_directory(os.path.dirname(path), os.path.basename(path), as_attachment=True)
+
+    @app.route('/ranged')
+    def ranged():
+        return http_utils.send_file_ranged(path, as_attachment=True)
+
+    return app
+
+
+def _fetch(port, route, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        conn.request('GET', route, headers=headers or {})
+        resp = conn.getresponse()
+        total = 0
+        while True:
+            chunk = resp.read(1024 * 1024)
+            if not chunk:
+                break
+            total += len(chunk)
+        return resp.status, total
+    finally:
+        conn.close()
+
+
+def _bench_full(port, route, size, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        status, total = _fetch(port, route)
+        dt = time.perf_counter() - t0
+        if status != 200 or total != size:
+            raise SystemExit(f'{route} 返回异常: status={status} bytes={total}')
+        best = dt if best is None else min(best, dt)
+    return size / best / (1024 * 1024)
+
+
+def _bench_seeks(port, route, size, seeks):
+    rng = random.Random(42)
+    span = 256 * 1024
+    t0 = time.perf_counter()
+    for _ in range(seeks):
+        start = rng.randrange(0, size - span)
+        status, total = _fetch(port, route, {'Range': f'bytes={start}-{start + span - 1}'})
+        if status != 206 or total != span:
+            raise SystemExit(f'{route} Range 返回异常: status={status} bytes={total}')
+    return seeks / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seeks', type=int, default=200)
+    args = parser.parse_args()
+
+    base = tempfile.mkdtemp(prefix='clawos-bench-serve-')
+    server = None
+    try:
+        path = os.path.join(base, 'big.bin')
+        block = os.urandom(1024 * 1024)
+        with open(path, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(block)
+        size = os.path.getsize(path)
+
+        server = make_server('127.0.0.1', 0, _make_app(path), threaded=True, request_handler=_QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+
+        print(f'{"route":>8}  {"full(MB/s)":>10}  {"seeks/s":>8}')
+        for route in ('/legacy', '/ranged'):
+            _fetch(port, route)
+            mbps = _bench_full(port, route, size, args.repeat)
+            seeks = _bench_seeks(port, route, size, args.seeks)
+            print(f'{route[1:]:>8}  {mbps:>10.1f}  {seeks:>8.1f}')
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""对比整文件读写 JSON 与 state_utils 状态库在大量记录下的单次请求耗时
+
+模拟两类请求：追加一条会话记录（/api/save）与读取计数（/api/stats），以及在大键值表中修改一行
+（保存数据库连接）。旧实现每次请求都整体读入并重写 JSON 文件，耗时随记录数线性增长。
+
+用法: python benchmarks/bench_state_store.py [--sizes 10000,50000] [--ops 50] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'clawos'))
+
+from lib import conversation_utils, json_utils, state_utils  # noqa: E402
+
+
+def _message(i):
+    return {'type': 'user' if i % 2 else 'bot', 'text': f'message {i} ' + 'x' * 80, 'time': '12:00:00'}
+
+
+def _connection(i):
+    return {'id': f'c{i}', 'host': f'db{i}.local', 'port': 5432, 'user': 'app', 'password': 'enc:' + 'y' * 40}
+
+
+def legacy_append(path, i):
+    data = json_utils.load_json(path, {'history': [], 'sent_count': 0})
+    item = _message(i)
+    data['history'].append(item)
+    if item['type'] == 'user':
+        data['sent_count'] = data.get('sent_count', 0) + 1
+    json_utils.save_json(path, data)
+
+
+def legacy_stats(path, _i):
+    data = json_utils.load_json(path, {'history': [], 'sent_count': 0})
+    return data.get('sent_count', 0), len(data.get('history', []))
+
+
+def legacy_update(path, i):
+    conns = json_utils.load_json(path, {})
+    conns[f'c{i}']['port'] = 6000 + i
+    json_utils.save_json(path, conns)
+
+
+def store_append(log, i):
+    log.append(_message(i))
+
+
+def store_stats(log, _i):
+    stats = log.stats()
+    return stats['sent_count'], stats['conv_count']
+
+
+def store_update(store, i):
+    conn = store.get(state_utils.NS_DB_CONN, f'c{i}')
+    conn['port'] = 6000 + i
+    store.set(state_utils.NS_DB_CONN, f'c{i}', conn)
+
+
+def _best_of(fn, target, ops, repeat):
+    """返回 repeat 轮中最快一轮的单次请求平均耗时（毫秒）"""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(ops):
+            fn(target, i)
+        dt = (time.perf_counter() - t0) / ops * 1000
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def _seed(base, size):
+    conv_path = os.path.join(base, 'conversations.json')
+    conn_path = os.path.join(base, 'db_connections.json')
+    history = [_message(i) for i in range(size)]
+    conns = {f'c{i}': _connection(i) for i in range(size)}
+    with open(conv_path, 'w', encoding='utf-8') as f:
+        json.dump({'history': history, 'sent_count': size // 2}, f)
+    with open(conn_path, 'w', encoding='utf-8') as f:
+        json.dump(conns, f)
+    store = state_utils.StateStore(os.path.join(base, 'state.sqlite3'))
+    with store.transaction():
+        for item in history:
+            store.append(state_utils.NS_CONVERSATION, item)
+        store.set(state_utils.NS_CONVERSATION, 'sent_count', size // 2)
+        store.set_many(state_utils.NS_DB_CONN, conns)
+    # 热数据上限设得足够大，计时期间后台线程不归档
+    log = conversation_utils.ConversationLog(store, os.path.join(base, 'archive'), hot_limit=10 ** 9)
+    return conv_path, conn_path, store, log
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,50000')
+    parser.add_argument('--ops', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    print(f'{"records":>8}  {"request":<8}  {"json(ms)":>9}  {"store(ms)":>9}  {"speedup":>7}')
+    for size in sizes:
+        base = tempfile.mkdtemp(prefix='clawos-bench-state-')
+        try:
+            conv_path, conn_path, store, log = _seed(base, size)
+            cases = [
+                ('append', legacy_append, conv_path, store_append, log),
+                ('stats', legacy_stats, conv_path, store_stats, log),
+                ('update', legacy_update, conn_path, store_update, store),
+            ]
+            for name, legacy_fn, path, store_fn, target in cases:
+                legacy_t = _best_of(legacy_fn, path, args.ops, args.repeat)
+                new_t = _best_of(store_fn, target, args.ops, args.repeat)
+                print(f'{size:>8}  {name:<8}  {legacy_t:>9.3f}  {new_t:>9.3f}  {legacy_t / new_t:>6.1f}x')
+            if legacy_stats(conv_path, 0) != store_stats(log, 0):
+                raise SystemExit(f'计数不一致: {legacy_stats(conv_path, 0)} != {store_stats(log, 0)}')
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -31,7 +31,7 @@ from ctrl.nanobot_ctrl import nanobot_bp
 from ctrl.nullclaw_ctrl import nullclaw_bp
 from ctrl.zeroclaw_ctrl import zeroclaw_bp
 from ctrl.system_ctrl import system_bp
-from ctrl.task_ctrl import task_bp
+from ctrl.task_ctrl import register_task_socketio, task_bp
 from ctrl.term_ctrl import register_term_socketio
 
 app = Flask(__name__, static_folder='static', static_url_path='/static', template_folder='templates')
@@ -78,7 +78,6 @@ def server_is_windows():
 
 app.extensions['api_ctx'] = _ApiContext(
     root_dir=config.ROOT_DIR,
-    conversation_file=config.CONVERSATION_FILE,
     trash_dir=config.TRASH_DIR,
     terminal_supported=True,
 )
@@ -104,6 +103,7 @@ app.register_blueprint(edit_bp)
 app.register_blueprint(file_bp)
 app.register_blueprint(model_config_bp)
 register_term_socketio(socketio, terminal_root_dir=config.ROOT_DIR)
+register_task_socketio(socketio)
 
 
 @app.errorhandler(Exception)
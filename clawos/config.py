@@ -9,9 +9,19 @@ os.makedirs(DATA_DIR, exist_ok=True)
 TRASH_DIR = os.path.join(DATA_DIR, 'trash')
 os.makedirs(TRASH_DIR, exist_ok=True)
 
+# 旧版 JSON 状态文件（含下方 FILE_OPEN_CONFIG_FILE）已并入 STATE_DB，仅用于首次启动时迁移
 CONVERSATION_FILE = os.path.join(DATA_DIR, 'conversations.json')
 AUTH_FILE = os.path.join(DATA_DIR, 'auth.json')
 PIN_FILE = os.path.join(DATA_DIR, 'pin.json')
+FILE_INDEX_DB = os.path.join(DATA_DIR, 'file_index.sqlite3')
+THUMBNAIL_DIR = os.path.join(DATA_DIR, 'thumbnails')
+UPLOAD_STATE_DIR = os.path.join(DATA_DIR, 'uploads')
+ARCHIVE_CATALOG_DIR = os.path.join(DATA_DIR, 'archive_catalog')
+TRASH_DB = os.path.join(DATA_DIR, 'trash.sqlite3')
+DU_CACHE_DB = os.path.join(DATA_DIR, 'du_cache.sqlite3')
+CSV_INDEX_DIR = os.path.join(DATA_DIR, 'csv_index')
+STATE_DB = os.path.join(DATA_DIR, 'state.sqlite3')
+CONVERSATION_ARCHIVE_DIR = os.path.join(DATA_DIR, 'conversation_archive')
 
 _AUTH_FILE = os.path.join(DATA_DIR, 'clawos_password.json')
 if os.path.exists(_AUTH_FILE):
@@ -1,15 +1,17 @@
 """Flask API routes for ClawOS."""
 
+import json
 import os
-import shutil
+import re
 from datetime import datetime
 
-from flask import Blueprint, current_app, request
+from flask import Blueprint, Response, current_app, request, stream_with_context
 
 import config
 from ctrl import api_error, api_ok
+from ctrl.task_ctrl import create_task, update_task
 
-from lib import file_utils, json_utils
+from lib import conversation_utils, file_utils, grep_utils, index_utils, json_utils, trash_utils
 
 
 class _ApiContext:
@@ -18,12 +20,10 @@ class _ApiContext:
     def __init__(
         self,
         root_dir,
-        conversation_file,
         trash_dir,
         terminal_supported,
     ):
         self.root_dir = root_dir
-        self.conversation_file = conversation_file
         self.trash_dir = trash_dir
         self.terminal_supported = terminal_supported
 
@@ -37,7 +37,6 @@ def _get_ctx():
         return stored
     return _ApiContext(
         root_dir=config.ROOT_DIR,
-        conversation_file=config.CONVERSATION_FILE,
         trash_dir=config.TRASH_DIR,
         terminal_supported=True,
     )
@@ -52,152 +51,218 @@ def _api_test_socket(_ctx):
     })
 
 
-def _api_stats(ctx):
+def _api_stats(_ctx):
     """Return conversation counters and server time."""
 
-    conversations = json_utils.load_json(
-        ctx.conversation_file,
-        {'history': [], 'sent_count': 0},
-    )
+    stats = conversation_utils.get_conversation_log().stats()
     return api_ok({
-        'sent_count': conversations.get('sent_count', 0),
-        'conv_count': len(conversations.get('history', [])),
+        'sent_count': stats['sent_count'],
+        'conv_count': stats['conv_count'],
         'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
     })
 
 
-def _api_history(ctx):
-    """Return conversation history."""
+def _api_history(_ctx):
+    """Return one page of conversation history, newest last.
 
-    conversations = json_utils.load_json(
-        ctx.conversation_file,
-        {'history': []},
-    )
-    return api_ok({'history': conversations.get('history', [])})
+    ``before`` is the ``next_before`` cursor of the previous page.
+    """
+
+    try:
+        before = request.args.get('before', type=int)
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return api_error('Invalid limit', status=400)
+    page = conversation_utils.get_conversation_log().page(before=before, limit=limit)
+    return api_ok(page)
 
 
-def _api_save(ctx):
+def _api_save(_ctx):
     """Append a message to conversation history."""
 
     data = request.json
     if not isinstance(data, dict):
         return api_error('Invalid JSON', status=400)
 
-    conversations = json_utils.load_json(
-        ctx.conversation_file,
-        {'history': [], 'sent_count': 0},
-    )
-    conversations.setdefault('history', [])
-    conversations['history'].append({
+    item = {
         'type': data.get('type', 'bot'),
         'text': data.get('text', ''),
         'time': datetime.now().strftime('%H:%M:%S'),
-    })
-    if data.get('type') == 'user':
-        conversations['sent_count'] = conversations.get('sent_count', 0) + 1
-    json_utils.save_json(ctx.conversation_file, conversations)
-    return api_ok()
+    }
+    item['id'] = conversation_utils.get_conversation_log().append(item)
+    return api_ok({'message': item})
 
 
-def _api_clear(ctx):
+def _api_clear(_ctx):
     """Clear conversation history."""
 
-    json_utils.save_json(
-        ctx.conversation_file,
-        {'history': [], 'sent_count': 0},
-    )
+    conversation_utils.get_conversation_log().clear()
     return api_ok()
 
 
+def _get_file_index(ctx):
+    return index_utils.get_file_index(ctx.root_dir, config.FILE_INDEX_DB)
+
+
 def _api_search(ctx):
-    """Search files under root directory."""
+    """Search file names under root directory via the persistent index."""
 
     query = request.args.get('q', '').strip()
-    result = file_utils.search_files(ctx.root_dir, query)
-    if isinstance(result, dict) and result.get('error'):
-        return api_error(result.get('error'), status=500)
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return api_error('Invalid offset or limit', status=400)
+    try:
+        index = _get_file_index(ctx)
+        result = index.search(query, offset=offset, limit=limit)
+        result['index'] = index.status(with_counts=False)
+    except Exception as e:
+        return api_error(str(e), status=500)
     return api_ok(result)
 
 
-def _api_trash_list(ctx):
-    """List items in trash directory."""
-
-    os.makedirs(ctx.trash_dir, exist_ok=True)
-    items = []
-    for name in os.listdir(ctx.trash_dir):
-        if name.startswith('.'):
-            continue
-        full_path = os.path.join(ctx.trash_dir, name)
-        parts = name.split('_', 2)
-        deleted_at = parts[0] if len(parts) >= 2 else '未知'
-        try:
-            dt = datetime.strptime(deleted_at, '%Y%m%d%H%M%S')
-            deleted_at = dt.strftime('%Y-%m-%d %H:%M:%S')
-        except Exception:
-            pass
+def _api_search_index_status(ctx):
+    """Return file name index state."""
 
-        display_name = name
-        if len(name) > 15 and name[14] == '_':
-            display_name = name[15:]
+    return api_ok(_get_file_index(ctx).status())
 
-        items.append({
-            'name': name,
-            'display_name': display_name,
-            'deleted_at': deleted_at,
-            'is_dir': os.path.isdir(full_path),
-        })
 
-    items.sort(key=lambda x: x['name'], reverse=True)
-    return api_ok({'items': items, 'count': len(items)})
+def _api_search_index_rebuild(ctx):
+    """Force a full rescan of the file name index."""
 
+    _get_file_index(ctx).request_rescan(full=True)
+    return api_ok()
 
-def _api_trash_clear(ctx):
-    """Remove all trash items."""
 
-    os.makedirs(ctx.trash_dir, exist_ok=True)
+def _api_grep(ctx):
+    """Stream content search matches as NDJSON."""
+
+    query = request.args.get('q', '')
+    if not query.strip():
+        return api_error('q is required', status=400)
+    use_regex = request.args.get('regex') == '1'
+    case_sensitive = request.args.get('case') == '1'
     try:
-        for name in os.listdir(ctx.trash_dir):
-            if name.startswith('.'):
-                continue
-            full_path = os.path.join(ctx.trash_dir, name)
-            if os.path.isdir(full_path):
-                shutil.rmtree(full_path)
-            else:
-                os.remove(full_path)
-        return api_ok()
-    except Exception as e:
-        return api_error(str(e), status=500)
+        pattern = grep_utils.compile_query(query, use_regex=use_regex, case_sensitive=case_sensitive)
+    except re.error as e:
+        return api_error(f'Invalid regex: {e}', status=400)
+    try:
+        max_size = int(request.args.get('max_size', grep_utils.GREP_MAX_FILE_SIZE))
+        max_results = int(request.args.get('max_results', grep_utils.GREP_MAX_RESULTS))
+    except ValueError:
+        return api_error('Invalid max_size or max_results', status=400)
+    max_size = max(1, min(max_size, 100 * 1024 * 1024))
+    max_results = max(1, min(max_results, 10000))
+
+    root_dir = os.path.normpath(ctx.root_dir)
+    rel = request.args.get('path', '').strip().lstrip('/\\').replace('\\', '/')
+    start_dir = os.path.normpath(os.path.join(root_dir, rel))
+    try:
+        if os.path.commonpath([root_dir, start_dir]) != root_dir:
+            return api_error('Invalid path', status=403)
+    except ValueError:
+        return api_error('Invalid path', status=403)
+    if not os.path.isdir(start_dir):
+        return api_error('Directory not found', status=404)
 
+    search = grep_utils.ContentSearch(
+        root_dir,
+        start_dir,
+        pattern,
+        max_file_size=max_size,
+        max_results=max_results,
+        name_glob=request.args.get('glob', '').strip(),
+        use_gitignore=request.args.get('gitignore', '1') != '0',
+    )
+    grep_utils.register_search(search)
 
-def _api_trash_restore(ctx, name):
-    """Restore a trash item into a target path under root."""
+    def generate():
+        try:
+            for event in search.events():
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+        finally:
+            search.cancel()
+            grep_utils.unregister_search(search.id)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'},
+    )
 
-    os.makedirs(ctx.trash_dir, exist_ok=True)
-    if not name or '/' in name or '\\' in name:
-        return api_error('Invalid trash item name', status=400)
 
-    trash_item = os.path.normpath(os.path.join(ctx.trash_dir, name))
-    if not trash_item.startswith(os.path.normpath(ctx.trash_dir)):
-        return api_error('Invalid trash item path', status=400)
+def _api_grep_cancel(_ctx):
+    """Cancel a running content search."""
 
-    if not os.path.exists(trash_item):
+    payload = request.get_json(silent=True) or {}
+    search_id = str(payload.get('id') or request.args.get('id', '')).strip()
+    if not search_id:
+        return api_error('id is required', status=400)
+    if not grep_utils.cancel_search(search_id):
         return api_error('Not Found', status=404)
+    return api_ok()
 
-    payload = request.json if isinstance(request.json, dict) else {}
-    target_path = (payload.get('target_path') or '').strip()
-    if not target_path:
-        return api_error('target_path is required', status=400)
 
-    target_full = os.path.normpath(os.path.join(ctx.root_dir, target_path))
-    if not target_full.startswith(os.path.normpath(ctx.root_dir)):
-        return api_error('Invalid target path', status=403)
-    if os.path.exists(target_full):
-        return api_error('Target already exists', status=409)
+def _trash_store(ctx):
+    return trash_utils.get_trash_store(ctx.trash_dir, config.TRASH_DB)
+
+
+def _api_trash_list(ctx):
+    """List trash items from the manifest, newest first, paginated."""
+
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return api_error('Invalid offset/limit', status=400)
+    items, total, total_size = _trash_store(ctx).list(offset=offset, limit=limit)
+    return api_ok({
+        'items': items,
+        'count': len(items),
+        'total': total,
+        'total_size': total_size,
+        'offset': max(0, offset),
+        'has_more': max(0, offset) + len(items) < total,
+    })
+
+
+def _api_trash_clear(ctx):
+    """Empty the trash in a background task."""
+
+    task_id = create_task(trash_utils.purge_job(_trash_store(ctx), update_task), name='trash:clear')
+    return api_ok({'taskId': task_id})
 
+
+def _api_trash_purge(ctx):
+    """Apply a retention policy (age in days and/or total size) in a background task."""
+
+    store = _trash_store(ctx)
+    payload = request.get_json(silent=True) or {}
     try:
-        os.makedirs(os.path.dirname(target_full), exist_ok=True)
-        shutil.move(trash_item, target_full)
-        return api_ok()
+        max_days = float(payload.get('max_days', store.max_days) or 0)
+        max_mb = float(payload.get('max_mb', store.max_bytes / (1024 * 1024)) or 0)
+    except (TypeError, ValueError):
+        return api_error('Invalid max_days/max_mb', status=400)
+    if max_days <= 0 and max_mb <= 0:
+        return api_error('max_days or max_mb is required', status=400)
+    victims = store.select_expired(max_days=max_days, max_bytes=int(max_mb * 1024 * 1024))
+    if not victims:
+        return api_ok({'taskId': None, 'count': 0})
+    task_id = create_task(trash_utils.purge_job(store, update_task, victims), name='trash:purge')
+    return api_ok({'taskId': task_id, 'count': len(victims)})
+
+
+def _api_trash_restore(ctx, name):
+    """Restore a trash item to its original path, or to target_path if given."""
+
+    payload = request.json if isinstance(request.json, dict) else {}
+    target_path = (payload.get('target_path') or '').strip()
+    try:
+        restored = _trash_store(ctx).restore(name, ctx.root_dir, target_path or None)
+        return api_ok({'path': restored})
+    except trash_utils.TrashError as e:
+        return api_error(str(e), status=e.status)
     except Exception as e:
         return api_error(str(e), status=500)
 
@@ -262,6 +327,26 @@ def api_search():
     return _api_search(_get_ctx())
 
 
+@api_bp.route('/api/search/index/status')
+def api_search_index_status():
+    return _api_search_index_status(_get_ctx())
+
+
+@api_bp.route('/api/search/index/rebuild', methods=['POST'])
+def api_search_index_rebuild():
+    return _api_search_index_rebuild(_get_ctx())
+
+
+@api_bp.route('/api/grep')
+def api_grep():
+    return _api_grep(_get_ctx())
+
+
+@api_bp.route('/api/grep/cancel', methods=['POST'])
+def api_grep_cancel():
+    return _api_grep_cancel(_get_ctx())
+
+
 @api_bp.route('/api/trash/list')
 def api_trash_list():
     return _api_trash_list(_get_ctx())
@@ -272,6 +357,11 @@ def api_trash_clear():
     return _api_trash_clear(_get_ctx())
 
 
+@api_bp.route('/api/trash/purge', methods=['POST'])
+def api_trash_purge():
+    return _api_trash_purge(_get_ctx())
+
+
 @api_bp.route('/api/trash/restore/<name>', methods=['POST'])
 def api_trash_restore(name):
     return _api_trash_restore(_get_ctx(), name)
@@ -304,6 +394,8 @@ def api_file_read():
 
     if os.path.isdir(full_path):
         return api_error('Cannot read directory', status=400)
+    if os.path.getsize(full_path) > file_utils.TEXT_READ_MAX_BYTES:
+        return api_error('File too large, use /api/file/lines to read it in windows', status=413)
 
     try:
         with open(full_path, 'r', encoding='utf-8') as f:
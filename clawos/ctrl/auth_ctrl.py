@@ -1,63 +1,25 @@
-import os
 import secrets
-import threading
 import time
 
 from flask import Blueprint, jsonify, redirect, request, url_for
 from flask import render_template
 
 import config
-from lib import json_utils
+from lib import session_utils
 
 
 auth_bp = Blueprint('auth', __name__)
 
 AUTH_COOKIE_NAME = 'clawos_auth'
-AUTH_FILE_PATH = config.AUTH_FILE
 AUTH_SESSION_TTL_SECONDS = 30 * 24 * 60 * 60
 
-_auth_lock = threading.Lock()
-
 
 def _now_ts():
     return int(time.time())
 
 
-def _load_auth_store():
-    data = json_utils.load_json(AUTH_FILE_PATH, default=None)
-    if not isinstance(data, dict):
-        data = {}
-    if not isinstance(data.get('sessions'), dict):
-        data['sessions'] = {}
-    if not isinstance(data.get('version'), int):
-        data['version'] = 1
-    return data
-
-
-def _save_auth_store(data):
-    json_utils.save_json(AUTH_FILE_PATH, data if isinstance(data, dict) else {})
-
-
-def _purge_expired_sessions(data, now_ts):
-    sessions = data.get('sessions')
-    if not isinstance(sessions, dict):
-        data['sessions'] = {}
-        return
-    expired = []
-    for token, meta in sessions.items():
-        if not isinstance(meta, dict):
-            expired.append(token)
-            continue
-        last_seen = meta.get('last_seen')
-        try:
-            last_seen = int(last_seen)
-        except Exception:
-            expired.append(token)
-            continue
-        if now_ts - last_seen > AUTH_SESSION_TTL_SECONDS:
-            expired.append(token)
-    for token in expired:
-        sessions.pop(token, None)
+def _sessions():
+    return session_utils.get_session_table(AUTH_SESSION_TTL_SECONDS)
 
 
 def _get_authed_token():
@@ -68,29 +30,13 @@ def _get_authed_token():
 
 
 def _is_request_authed():
-    token = _get_authed_token()
-    if not token:
-        return False
-    now_ts = _now_ts()
-    with _auth_lock:
-        data = _load_auth_store()
-        _purge_expired_sessions(data, now_ts)
-        sessions = data.get('sessions', {})
-        if token not in sessions:
-            _save_auth_store(data)
-            return False
-        meta = sessions.get(token) or {}
-        if not isinstance(meta, dict):
-            sessions.pop(token, None)
-            _save_auth_store(data)
-            return False
-        meta['last_seen'] = now_ts
-        meta['ip'] = request.remote_addr or meta.get('ip') or ''
-        meta['ua'] = request.headers.get('User-Agent', '')[:300]
-        sessions[token] = meta
-        data['sessions'] = sessions
-        _save_auth_store(data)
-    return True
+    """内存会话表中查找令牌；访问信息由会话表批量写盘，这里不加全局锁也不读写文件"""
+    return _sessions().check(
+        _get_authed_token(),
+        ip=request.remote_addr or '',
+        ua=request.headers.get('User-Agent', '')[:300],
+        now=_now_ts(),
+    )
 
 
 def _render_login_page(error_message=None, success_redirect=None):
@@ -109,20 +55,13 @@ def login():
     password = (request.form.get('password') or '').strip()
     success_redirect = request.form.get('success_redirect', '').strip()
     if password and password == config.AUTH_PASSWORD:
-        now_ts = _now_ts()
         token = 'sess_' + secrets.token_urlsafe(32)
-        with _auth_lock:
-            data = _load_auth_store()
-            _purge_expired_sessions(data, now_ts)
-            sessions = data.get('sessions', {})
-            sessions[token] = {
-                'created_at': now_ts,
-                'last_seen': now_ts,
-                'ip': request.remote_addr or '',
-                'ua': request.headers.get('User-Agent', '')[:300],
-            }
-            data['sessions'] = sessions
-            _save_auth_store(data)
+        _sessions().create(
+            token,
+            ip=request.remote_addr or '',
+            ua=request.headers.get('User-Agent', '')[:300],
+            now=_now_ts(),
+        )
 
         success_redirect = success_redirect or ''
         if success_redirect and success_redirect.startswith('/'):
@@ -173,13 +112,7 @@ def require_auth():
 def logout():
     token = _get_authed_token()
     if token:
-        with _auth_lock:
-            data = _load_auth_store()
-            sessions = data.get('sessions', {})
-            if isinstance(sessions, dict):
-                sessions.pop(token, None)
-                data['sessions'] = sessions
-            _save_auth_store(data)
+        _sessions().remove(token)
     resp = redirect('/login')
     resp.set_cookie(AUTH_COOKIE_NAME, '', expires=0)
     return resp
@@ -1,20 +1,25 @@
 import os
-import shutil
-from datetime import datetime
+import threading
 
 from flask import Blueprint, request
 
 import config
 from ctrl import api_error, api_ok
+from ctrl.task_ctrl import create_task, is_task_cancelled, update_task
+from lib import archive_utils, path_utils, transfer_utils, trash_utils
 
 
 batch_bp = Blueprint('batch', __name__)
 
+# 运行中的复制 / 移动任务的暂停开关，按 taskId 索引
+_TRANSFERS = {}
+_TRANSFERS_LOCK = threading.Lock()
+
 
 @batch_bp.route('/api/batch/delete', methods=['POST'])
 def batch_delete():
     root_dir = config.ROOT_DIR
-    trash_dir = config.TRASH_DIR
+    store = trash_utils.get_trash_store(config.TRASH_DIR, config.TRASH_DB)
 
     data = request.json
     if not isinstance(data, dict):
@@ -32,13 +37,11 @@ def batch_delete():
         if not os.path.exists(full_path):
             errors.append({'path': path, 'error': '文件不存在'})
             continue
+        if full_path == os.path.normpath(config.TRASH_DIR):
+            errors.append({'path': path, 'error': '不能删除回收站文件夹'})
+            continue
         try:
-            os.makedirs(trash_dir, exist_ok=True)
-            item_name = os.path.basename(full_path)
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            trash_name = f"{timestamp}_{item_name}"
-            trash_path = os.path.join(trash_dir, trash_name)
-            shutil.move(full_path, trash_path)
+            store.move_to_trash(full_path, root_dir)
             deleted.append(path)
         except Exception as e:
             errors.append({'path': path, 'error': str(e)})
@@ -50,8 +53,31 @@ def batch_delete():
     })
 
 
-@batch_bp.route('/api/batch/copy', methods=['POST'])
-def batch_copy():
+def _transfer_pairs(root_dir, target_full, paths):
+    """校验源路径并为每一项确定不冲突的目标路径（同名时追加 _1、_2 …）"""
+    pairs, errors, taken = [], [], set()
+    for path in paths:
+        full_path = os.path.normpath(os.path.join(root_dir, path))
+        if not full_path.startswith(root_dir) or not os.path.lexists(full_path):
+            errors.append({'path': path, 'error': '无效路径'})
+            continue
+        if full_path == target_full or target_full.startswith(full_path + os.sep):
+            errors.append({'path': path, 'error': '不能复制或移动到自身内部'})
+            continue
+        item_name = os.path.basename(full_path)
+        new_path = os.path.join(target_full, item_name)
+        counter = 1
+        while os.path.lexists(new_path) or new_path in taken:
+            name, ext = os.path.splitext(item_name)
+            new_name = f"{name}_{counter}{ext}"
+            new_path = os.path.join(target_full, new_name)
+            counter += 1
+        taken.add(new_path)
+        pairs.append((path, full_path, new_path))
+    return pairs, errors
+
+
+def _start_transfer(op):
     root_dir = config.ROOT_DIR
 
     data = request.json
@@ -74,85 +100,82 @@ def batch_copy():
     if not target_full.startswith(root_dir) or not os.path.isdir(target_full):
         return api_error('目标位置无效', status=400)
 
-    copied, errors = [], []
-    for path in paths:
-        full_path = os.path.normpath(os.path.join(root_dir, path))
-        if not full_path.startswith(root_dir) or not os.path.exists(full_path):
-            errors.append({'path': path, 'error': '无效路径'})
-            continue
-        try:
-            item_name = os.path.basename(full_path)
-            new_path = os.path.join(target_full, item_name)
-            counter = 1
-            while os.path.exists(new_path):
-                name, ext = os.path.splitext(item_name)
-                new_name = f"{name}_{counter}{ext}"
-                new_path = os.path.join(target_full, new_name)
-                counter += 1
-            if os.path.isdir(full_path):
-                shutil.copytree(full_path, new_path)
-            else:
-                shutil.copy2(full_path, new_path)
-            copied.append(path)
-        except Exception as e:
-            errors.append({'path': path, 'error': str(e)})
+    pairs, errors = _transfer_pairs(root_dir, target_full, paths)
+    if not pairs:
+        return api_error(errors[0]['error'] if errors else '参数不完整', status=400)
+    rel_by_full = {full_path: path for path, full_path, _new in pairs}
+    verb = '移动' if op == 'move' else '复制'
 
+    def _run(task_id):
+        control = transfer_utils.TransferControl(cancelled=lambda: is_task_cancelled(task_id))
+        with _TRANSFERS_LOCK:
+            _TRANSFERS[task_id] = control
+        try:
+            update_task(task_id, status='running', progress=0.0, message='统计中…')
+
+            def _report(done, total, pct):
+                update_task(
+                    task_id, progress=pct,
+                    message=f'{verb}中… {path_utils.format_size(done)}/{path_utils.format_size(total)}',
+                )
+
+            job = transfer_utils.TransferJob(op, [(full, new) for _p, full, new in pairs], control=control)
+            throttle = archive_utils.ProgressThrottle(job.measure(), _report)
+            job.on_bytes = throttle.add
+            done, failed = job.run()
+        finally:
+            with _TRANSFERS_LOCK:
+                _TRANSFERS.pop(task_id, None)
+        all_errors = errors + [{'path': rel_by_full.get(src, src), 'error': msg} for src, msg in failed]
+        if not done:
+            raise OSError('; '.join(f"{e['path']}: {e['error']}" for e in all_errors) or f'{verb}失败')
+        message = f'已{verb} {len(done)} 个项目'
+        if all_errors:
+            message += f'，{len(all_errors)} 个失败: ' + '; '.join(f"{e['path']}: {e['error']}" for e in all_errors[:5])
+        update_task(task_id, progress=100.0, message=message)
+
+    task_id = create_task(_run, name=f'batch:{op}')
     return api_ok({
-        'copied': copied,
+        'taskId': task_id,
         'errors': errors,
-        'message': f'已复制 {len(copied)} 个项目',
+        'message': f'正在{verb} {len(pairs)} 个项目',
     })
 
 
+@batch_bp.route('/api/batch/copy', methods=['POST'])
+def batch_copy():
+    return _start_transfer('copy')
+
+
 @batch_bp.route('/api/batch/move', methods=['POST'])
 def batch_move():
-    root_dir = config.ROOT_DIR
+    return _start_transfer('move')
 
-    data = request.json
-    if not isinstance(data, dict):
-        return api_error('Invalid JSON', status=400)
-    paths = data.get('paths', [])
-    target_path = data.get('target')
-    if target_path is None:
-        target_path = ''
-    if not isinstance(target_path, str):
-        return api_error('参数不完整', status=400)
-    target_path = target_path.strip()
-    if not paths:
-        return api_error('参数不完整', status=400)
 
-    if target_path == '':
-        target_full = root_dir
-    else:
-        target_full = os.path.normpath(os.path.join(root_dir, target_path))
-    if not target_full.startswith(root_dir) or not os.path.isdir(target_full):
-        return api_error('目标位置无效', status=400)
+@batch_bp.route('/api/batch/transfer/pause', methods=['POST'])
+def batch_transfer_pause():
+    return _control_transfer(pause=True)
 
-    moved, errors = [], []
-    for path in paths:
-        full_path = os.path.normpath(os.path.join(root_dir, path))
-        if not full_path.startswith(root_dir) or not os.path.exists(full_path):
-            errors.append({'path': path, 'error': '无效路径'})
-            continue
-        try:
-            item_name = os.path.basename(full_path)
-            new_path = os.path.join(target_full, item_name)
-            counter = 1
-            while os.path.exists(new_path):
-                name, ext = os.path.splitext(item_name)
-                new_name = f"{name}_{counter}{ext}"
-                new_path = os.path.join(target_full, new_name)
-                counter += 1
-            shutil.move(full_path, new_path)
-            moved.append(path)
-        except Exception as e:
-            errors.append({'path': path, 'error': str(e)})
 
-    return api_ok({
-        'moved': moved,
-        'errors': errors,
-        'message': f'已移动 {len(moved)} 个项目',
-    })
+@batch_bp.route('/api/batch/transfer/resume', methods=['POST'])
+def batch_transfer_resume():
+    return _control_transfer(pause=False)
+
+
+def _control_transfer(pause):
+    data = request.get_json(silent=True) or {}
+    task_id = (data.get('taskId') or '').strip()
+    with _TRANSFERS_LOCK:
+        control = _TRANSFERS.get(task_id)
+    if control is None:
+        return api_error('任务不存在或已结束', status=404)
+    if pause:
+        control.pause()
+        update_task(task_id, status='paused', message='已暂停')
+    else:
+        control.resume()
+        update_task(task_id, status='running', message='继续中…')
+    return api_ok({'taskId': task_id, 'paused': control.paused})
 
 
 @batch_bp.route('/api/batch/symlink', methods=['POST'])
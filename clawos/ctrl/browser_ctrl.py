@@ -1,20 +1,21 @@
+import base64
+import hashlib
+import json as json_lib
+import mimetypes
 import os
+import posixpath
 import shutil
-import subprocess
-import tarfile
-import zipfile
 from datetime import datetime
 
-from flask import Blueprint, jsonify, redirect, render_template, request, send_from_directory, url_for
+from flask import Blueprint, Response, jsonify, redirect, render_template, request, send_from_directory, stream_with_context, url_for
 
 import config
-from ctrl.task_ctrl import create_task, update_task
-from lib import file_utils, git_utils, json_utils, path_utils
+from ctrl.task_ctrl import create_task, is_task_cancelled, update_task
+from lib import archive_utils, cache_utils, catalog_utils, git_utils, http_utils, path_utils, state_utils, trash_utils, upload_utils
 
 
 browser_bp = Blueprint('browser', __name__)
 
-PIN_FILE = config.PIN_FILE
 
 
 def _resolve_safe_file(path):
@@ -57,8 +58,7 @@ def _normalize_pin_dir(dir_path):
 
 
 def _load_pin_store():
-    data = json_utils.load_json(PIN_FILE, default={'pins': []})
-    pins = data.get('pins') if isinstance(data, dict) else None
+    pins = state_utils.get_state_store().get(state_utils.NS_PIN, 'pins')
     if not isinstance(pins, list):
         pins = []
     normalized = []
@@ -82,7 +82,7 @@ def _save_pin_store(store):
     pins = store.get('pins') if isinstance(store, dict) else None
     if not isinstance(pins, list):
         pins = []
-    json_utils.save_json(PIN_FILE, {'pins': pins})
+    state_utils.get_state_store().set(state_utils.NS_PIN, 'pins', pins)
 
 
 def _pin_dir_from_full_path(root_dir, full_path):
@@ -155,6 +155,186 @@ def browse(path=''):
     return send_from_directory(templates_dir, 'index.html')
 
 
+_EXT_TO_GROUP = {
+    '.jpg': 'image', '.jpeg': 'image', '.png': 'image', '.gif': 'image',
+    '.bmp': 'image', '.webp': 'image', '.avif': 'image',
+    '.xlsx': 'excel', '.xls': 'excel', '.xlsm': 'excel', '.xlsb': 'excel',
+    '.docx': 'word', '.doc': 'word',
+    '.pptx': 'ppt', '.ppt': 'ppt',
+    '.pdf': 'pdf',
+    '.zip': 'archive', '.rar': 'archive', '.7z': 'archive',
+    '.tar': 'archive', '.gz': 'archive', '.bz2': 'archive',
+    '.tar.gz': 'archive', '.tar.bz2': 'archive', '.tar.xz': 'archive',
+    '.py': 'code', '.js': 'code', '.ts': 'code', '.jsx': 'code', '.tsx': 'code',
+    '.vue': 'code', '.go': 'code', '.rs': 'code', '.java': 'code',
+    '.c': 'code', '.cpp': 'code', '.h': 'code', '.css': 'code',
+    '.scss': 'code', '.less': 'code', '.xml': 'code',
+    '.json': 'json', '.jsonc': 'json',
+    '.yaml': 'yaml', '.yml': 'yaml', '.toml': 'yaml', '.ini': 'yaml',
+    '.conf': 'yaml', '.env': 'yaml',
+    '.md': 'markdown', '.markdown': 'markdown',
+    '.mp4': 'video', '.webm': 'video', '.mov': 'video', '.avi': 'video',
+    '.mkv': 'video', '.wmv': 'video', '.flv': 'video',
+    '.mp3': 'audio', '.wav': 'audio', '.flac': 'audio', '.aac': 'audio',
+    '.ogg': 'audio', '.m4a': 'audio', '.wma': 'audio',
+    '.txt': 'text', '.log': 'text', '.sh': 'text', '.bat': 'text', '.ps1': 'text',
+    '.html': 'web', '.htm': 'web', '.css': 'web', '.svg': 'web', '.url': 'url',
+}
+
+_LIST_SORTS = {'name', 'size', 'mtime', 'type'}
+_LIST_MAX_LIMIT = 5000
+_COUNT_MAX_NAMES = 1000
+
+
+def _open_method_for(name, open_config):
+    ext = os.path.splitext(name)[1].lower() if name else ''
+    group = _EXT_TO_GROUP.get(ext, 'text')
+    if group not in open_config:
+        group = 'other'
+    return open_config.get(group, 'browser')
+
+
+def _record_to_item(record, root_dir, open_config, item_count):
+    item = record.to_dict()
+    item['path'] = path_utils.get_relative_path(record.path, root_dir)
+    if not record.is_dir:
+        item['open_method'] = _open_method_for(record.name, open_config)
+    item['item_count'] = item_count if record.is_dir else 0
+    return item
+
+
+def _record_sort_key(record, sort):
+    if sort == 'size':
+        primary = int(record.size or 0)
+    elif sort == 'mtime':
+        primary = float(record.mtime or 0.0)
+    elif sort == 'type':
+        primary = record.ext
+    else:
+        primary = record.name
+    return [0 if record.is_dir else 1, primary, record.name]
+
+
+def _key_after(key, cursor_key, descending):
+    if key[0] != cursor_key[0]:
+        return key[0] > cursor_key[0]
+    if descending:
+        return key[1:] < cursor_key[1:]
+    return key[1:] > cursor_key[1:]
+
+
+def _encode_cursor(payload):
+    raw = json_lib.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json_lib.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get('k'), list) or len(payload['k']) != 3:
+        return None
+    if payload.get('s') not in _LIST_SORTS or payload.get('o') not in {'asc', 'desc'}:
+        return None
+    if not _cursor_key_valid(payload['k'], payload['s']):
+        return None
+    return payload
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _cursor_key_valid(key, sort):
+    """游标中的排序键须与 _record_sort_key 的类型一致，否则比较时会抛 TypeError"""
+    is_dir, primary, name = key
+    if is_dir not in (0, 1) or isinstance(is_dir, bool) or not isinstance(name, str):
+        return False
+    if sort == 'size':
+        return isinstance(primary, int) and not isinstance(primary, bool)
+    if sort == 'mtime':
+        return _is_number(primary)
+    return isinstance(primary, str)
+
+
+def _parse_list_query(args):
+    """解析分页参数，返回 (query, err)；未指定 limit/cursor 时 query 为 None，保持整目录返回"""
+    cursor = (args.get('cursor') or '').strip()
+    limit_raw = (args.get('limit') or '').strip()
+    if not cursor and not limit_raw:
+        return None, None
+    try:
+        limit = int(limit_raw or 500)
+    except ValueError:
+        return None, 'limit 无效'
+    limit = max(1, min(limit, _LIST_MAX_LIMIT))
+    if cursor:
+        payload = _decode_cursor(cursor)
+        if payload is None:
+            return None, 'cursor 无效'
+        return {'sort': payload['s'], 'order': payload['o'], 'q': str(payload.get('q') or ''), 'after': payload['k'], 'limit': limit}, None
+    sort = (args.get('sort') or 'name').strip().lower()
+    if sort not in _LIST_SORTS:
+        return None, '不支持的排序字段'
+    order = (args.get('order') or 'asc').strip().lower()
+    if order not in {'asc', 'desc'}:
+        return None, '不支持的排序方向'
+    return {'sort': sort, 'order': order, 'q': (args.get('q') or '').strip(), 'after': None, 'limit': limit}, None
+
+
+def _page_records(records, query):
+    """按排序与名称过滤取出一页记录，返回 (page, total, next_cursor)"""
+    sort = query['sort']
+    descending = query['order'] == 'desc'
+    q = query['q'].lower()
+    if q:
+        records = [r for r in records if q in r.name.lower()]
+    keyed = [(_record_sort_key(r, sort), r) for r in records]
+    keyed.sort(key=lambda x: x[0][1:], reverse=descending)
+    keyed.sort(key=lambda x: x[0][0])
+
+    start = 0
+    after = query['after']
+    if after is not None:
+        start = len(keyed)
+        for i, (key, _r) in enumerate(keyed):
+            if _key_after(key, after, descending):
+                start = i
+                break
+    page = keyed[start:start + query['limit']]
+    next_cursor = None
+    if page and start + len(page) < len(keyed):
+        next_cursor = _encode_cursor({'k': page[-1][0], 's': sort, 'o': query['order'], 'q': query['q']})
+    return [r for _key, r in page], len(keyed), next_cursor
+
+
+def _build_listing(full_dir, root_dir, args):
+    """生成目录列表响应数据；分页模式下 item_count 为 None，由 /api/browse/counts 按需补齐"""
+    query, err = _parse_list_query(args)
+    if err:
+        return None, None, err
+    records = cache_utils.scan_directory(full_dir)
+    open_config = _load_file_open_config()
+    if query is None:
+        items = [
+            _record_to_item(r, root_dir, open_config, cache_utils.count_entries(r.path) if r.is_dir else 0)
+            for r in records
+        ]
+        return records, {'items': items, 'total': len(items), 'next_cursor': None}, None
+    page, total, next_cursor = _page_records(records, query)
+    items = [_record_to_item(r, root_dir, open_config, None) for r in page]
+    return records, {
+        'items': items,
+        'total': total,
+        'next_cursor': next_cursor,
+        'sort': query['sort'],
+        'order': query['order'],
+        'q': query['q'],
+    }, None
+
+
 @browser_bp.route('/api/browse/state')
 def api_browse_state():
     dir_rel = (request.args.get('path') or '').strip()
@@ -163,68 +343,10 @@ def api_browse_state():
         status = 404 if err == '目录不存在' else 400
         return jsonify({'success': False, 'error': {'message': err}}), status
 
-    items = file_utils.list_directory(full_dir)
-    
-    # 加载文件打开方式配置
-    open_config = _load_file_open_config()
-    ext_to_group = {
-        '.jpg': 'image', '.jpeg': 'image', '.png': 'image', '.gif': 'image',
-        '.bmp': 'image', '.webp': 'image', '.avif': 'image',
-        '.xlsx': 'excel', '.xls': 'excel', '.xlsm': 'excel', '.xlsb': 'excel',
-        '.docx': 'word', '.doc': 'word',
-        '.pptx': 'ppt', '.ppt': 'ppt',
-        '.pdf': 'pdf',
-        '.zip': 'archive', '.rar': 'archive', '.7z': 'archive',
-        '.tar': 'archive', '.gz': 'archive', '.bz2': 'archive',
-        '.tar.gz': 'archive', '.tar.bz2': 'archive', '.tar.xz': 'archive',
-        '.py': 'code', '.js': 'code', '.ts': 'code', '.jsx': 'code', '.tsx': 'code',
-        '.vue': 'code', '.go': 'code', '.rs': 'code', '.java': 'code',
-        '.c': 'code', '.cpp': 'code', '.h': 'code', '.css': 'code',
-        '.scss': 'code', '.less': 'code', '.xml': 'code',
-        '.json': 'json', '.jsonc': 'json',
-        '.yaml': 'yaml', '.yml': 'yaml', '.toml': 'yaml', '.ini': 'yaml',
-        '.conf': 'yaml', '.env': 'yaml',
-        '.md': 'markdown', '.markdown': 'markdown',
-        '.mp4': 'video', '.webm': 'video', '.mov': 'video', '.avi': 'video',
-        '.mkv': 'video', '.wmv': 'video', '.flv': 'video',
-        '.mp3': 'audio', '.wav': 'audio', '.flac': 'audio', '.aac': 'audio',
-        '.ogg': 'audio', '.m4a': 'audio', '.wma': 'audio',
-        '.txt': 'text', '.log': 'text', '.sh': 'text', '.bat': 'text', '.ps1': 'text',
-        '.html': 'web', '.htm': 'web', '.css': 'web', '.svg': 'web', '.url': 'url',
-    }
-    
-    items_rel = []
-    item_names = set()
-    for it in items:
-        if not isinstance(it, dict):
-            continue
-        name = str(it.get('name') or '')
-        item_names.add(name)
-        p = it.get('path')
-        rel_path = path_utils.get_relative_path(p, root_dir)
-        normalized = dict(it)
-        normalized['path'] = rel_path
-        
-        # 添加打开方式
-        if not it.get('is_dir'):
-            ext = os.path.splitext(name)[1].lower() if name else ''
-            group = ext_to_group.get(ext, 'text')
-            if group not in open_config:
-                group = 'other'
-            normalized['open_method'] = open_config.get(group, 'browser')
-        
-        # 目录统计子项目数量
-        if it.get('is_dir'):
-            try:
-                item_full_path = os.path.join(full_dir, name)
-                sub_items = os.listdir(item_full_path)
-                normalized['item_count'] = len(sub_items)
-            except:
-                normalized['item_count'] = 0
-        else:
-            normalized['item_count'] = 0
-        
-        items_rel.append(normalized)
+    records, listing, err = _build_listing(full_dir, root_dir, request.args)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
+    item_names = {r.name for r in records}
 
     current_dir_rel = path_utils.get_relative_path(full_dir, root_dir)
     pin_dir = _normalize_pin_dir(current_dir_rel)
@@ -262,116 +384,78 @@ def api_browse_state():
     except Exception:
         initial_git_status = None
 
-    return jsonify({
-        'success': True,
-        'data': {
-            'items': items_rel,
-            'breadcrumbs': breadcrumbs,
-            'current_dir': current_dir_rel,
-            'current_dir_name': os.path.basename(full_dir),
-            'root_dir': root_dir,
-            'pin_dir': pin_dir,
-            'pins': initial_pins,
-            'git_status': initial_git_status,
-            'server_is_windows': os.name == 'nt',
-        }
+    data = dict(listing)
+    data.update({
+        'breadcrumbs': breadcrumbs,
+        'current_dir': current_dir_rel,
+        'current_dir_name': os.path.basename(full_dir),
+        'root_dir': root_dir,
+        'pin_dir': pin_dir,
+        'pins': initial_pins,
+        'git_status': initial_git_status,
+        'server_is_windows': os.name == 'nt',
     })
+    return jsonify({'success': True, 'data': data})
 
 
 @browser_bp.route('/api/browse/files')
 def api_browse_files():
-    """获取目录文件列表（用于 AJAX 刷新）"""
+    """获取目录文件列表（用于 AJAX 刷新），传入 limit/cursor 时按页返回"""
     dir_rel = (request.args.get('path') or '').strip()
     root_dir, full_dir, err = _resolve_safe_dir(dir_rel, ensure_exists=False)
     if err:
         return jsonify({'success': False, 'error': {'message': err}}), 400
 
-    items = file_utils.list_directory(full_dir)
-    
-    # 加载文件打开方式配置
-    open_config = _load_file_open_config()
-    
-    # 扩展名到分组的映射
-    ext_to_group = {
-        '.jpg': 'image', '.jpeg': 'image', '.png': 'image', '.gif': 'image',
-        '.bmp': 'image', '.webp': 'image', '.avif': 'image',
-        '.xlsx': 'excel', '.xls': 'excel', '.xlsm': 'excel', '.xlsb': 'excel',
-        '.docx': 'word', '.doc': 'word',
-        '.pptx': 'ppt', '.ppt': 'ppt',
-        '.pdf': 'pdf',
-        '.zip': 'archive', '.rar': 'archive', '.7z': 'archive',
-        '.tar': 'archive', '.gz': 'archive', '.bz2': 'archive',
-        '.tar.gz': 'archive', '.tar.bz2': 'archive', '.tar.xz': 'archive',
-        '.py': 'code', '.js': 'code', '.ts': 'code', '.jsx': 'code', '.tsx': 'code',
-        '.vue': 'code', '.go': 'code', '.rs': 'code', '.java': 'code',
-        '.c': 'code', '.cpp': 'code', '.h': 'code', '.css': 'code',
-        '.scss': 'code', '.less': 'code', '.xml': 'code',
-        '.json': 'json', '.jsonc': 'json',
-        '.yaml': 'yaml', '.yml': 'yaml', '.toml': 'yaml', '.ini': 'yaml',
-        '.conf': 'yaml', '.env': 'yaml',
-        '.md': 'markdown', '.markdown': 'markdown',
-        '.mp4': 'video', '.webm': 'video', '.mov': 'video', '.avi': 'video',
-        '.mkv': 'video', '.wmv': 'video', '.flv': 'video',
-        '.mp3': 'audio', '.wav': 'audio', '.flac': 'audio', '.aac': 'audio',
-        '.ogg': 'audio', '.m4a': 'audio', '.wma': 'audio',
-        '.txt': 'text', '.log': 'text', '.sh': 'text', '.bat': 'text', '.ps1': 'text',
-        '.html': 'web', '.htm': 'web', '.css': 'web', '.svg': 'web', '.url': 'url',
-    }
-    
-    items_rel = []
-    for it in items:
-        if not isinstance(it, dict):
+    _records, listing, err = _build_listing(full_dir, root_dir, request.args)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
+    data = dict(listing)
+    data['current_dir'] = dir_rel
+    return jsonify({'success': True, 'data': data})
+
+
+@browser_bp.route('/api/browse/counts', methods=['POST'])
+def api_browse_counts():
+    """批量统计子目录的项目数量"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'error': {'message': 'Invalid JSON'}}), 400
+    dir_rel = str(payload.get('path') or '').strip()
+    names = payload.get('names') or []
+    if not isinstance(names, list):
+        return jsonify({'success': False, 'error': {'message': 'names required'}}), 400
+    if len(names) > _COUNT_MAX_NAMES:
+        return jsonify({'success': False, 'error': {'message': f'一次最多统计 {_COUNT_MAX_NAMES} 个目录'}}), 400
+    _root_dir, full_dir, err = _resolve_safe_dir(dir_rel, ensure_exists=False)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
+
+    counts = {}
+    for name in names:
+        if not isinstance(name, str) or not name or name in {'.', '..'}:
             continue
-        name = str(it.get('name') or '')
-        p = it.get('path')
-        rel_path = path_utils.get_relative_path(p, root_dir)
-        normalized = dict(it)
-        normalized['path'] = rel_path
-        
-        # 目录统计子项目数量
-        if it.get('is_dir'):
-            try:
-                item_full_path = os.path.join(full_dir, name)
-                sub_items = os.listdir(item_full_path)
-                normalized['item_count'] = len(sub_items)
-            except:
-                normalized['item_count'] = 0
-        else:
-            normalized['item_count'] = 0
-        
-        # 添加打开方式
-        if not it.get('is_dir'):
-            ext = os.path.splitext(name)[1].lower() if name else ''
-            group = ext_to_group.get(ext, 'text')
-            if group not in open_config:
-                group = 'other'
-            normalized['open_method'] = open_config.get(group, 'browser')
-        
-        # 目录统计子项目数量
-        if it.get('is_dir'):
-            try:
-                item_full_path = os.path.join(full_dir, name)
-                sub_items = os.listdir(item_full_path)
-                normalized['item_count'] = len(sub_items)
-            except:
-                normalized['item_count'] = 0
-        else:
-            normalized['item_count'] = 0
-        
-        items_rel.append(normalized)
+        if any(sep in name for sep in ['/', '\\']):
+            continue
+        counts[name] = cache_utils.count_entries(os.path.join(full_dir, name))
+    return jsonify({'success': True, 'data': {'path': dir_rel, 'counts': counts}})
 
-    return jsonify({
-        'success': True,
-        'data': {
-            'items': items_rel,
-            'current_dir': dir_rel
-        }
-    })
+
+@browser_bp.route('/api/browse/cache/stats')
+def api_browse_cache_stats():
+    """目录列表缓存的命中统计"""
+    return jsonify({'success': True, 'data': cache_utils.get_listing_cache().stats()})
+
+
+FILE_OPEN_CONFIG_KEY = 'file_open_config'
+
+
+def _saved_file_open_config():
+    """已保存的文件打开方式配置，未保存过返回 None"""
+    return state_utils.get_state_store().get(state_utils.NS_UI, FILE_OPEN_CONFIG_KEY)
 
 
 def _load_file_open_config():
     """加载文件打开方式配置"""
-    config_file = config.FILE_OPEN_CONFIG_FILE
     default_config = {
         'image': 'preview-image',
         'excel': 'preview-excel',
@@ -388,14 +472,8 @@ def _load_file_open_config():
         'text': 'browser',
         'web': 'browser', 'url': 'browser',
     }
-    try:
-        if os.path.exists(config_file):
-            with open(config_file, 'r', encoding='utf-8') as f:
-                import json as json_lib
-                return json_lib.load(f)
-    except:
-        pass
-    return default_config
+    saved = _saved_file_open_config()
+    return saved if saved is not None else default_config
 
 
 @browser_bp.route('/api/pin/list')
@@ -508,50 +586,8 @@ def api_pin_toggle():
     )
 
 
-def _is_archive_name(name):
-    n = (name or '').lower()
-    if n.endswith('.tar.gz') or n.endswith('.tar.bz2') or n.endswith('.tar.xz'):
-        return True
-    ext = os.path.splitext(n)[1].lower()
-    return ext in {'.zip', '.rar', '.tar', '.tgz', '.7z'}
-
-
-def _archive_kind(name):
-    n = (name or '').lower()
-    if n.endswith('.tar.gz'):
-        return 'tar'
-    if n.endswith('.tar.bz2'):
-        return 'tar'
-    if n.endswith('.tar.xz'):
-        return 'tar'
-    ext = os.path.splitext(n)[1].lower()
-    if ext == '.tgz':
-        return 'tar'
-    if ext == '.tar':
-        return 'tar'
-    if ext == '.zip':
-        return 'zip'
-    if ext in {'.7z', '.rar'}:
-        return '7z'
-    return None
-
-
-def _safe_join(base_dir, member_path):
-    rel = (member_path or '').replace('\\', '/')
-    if not rel or rel.startswith('/') or rel.startswith('\\'):
-        return None
-    if ':' in rel.split('/')[0]:
-        return None
-    norm_base = os.path.normpath(base_dir)
-    norm = os.path.normpath(os.path.join(norm_base, rel))
-    try:
-        if os.path.commonpath([norm_base, norm]) != norm_base:
-            return None
-    except Exception:
-        return None
-    if not norm.startswith(norm_base):
-        return None
-    return norm
+def _archive_catalog():
+    return catalog_utils.get_archive_catalog(config.ARCHIVE_CATALOG_DIR)
 
 
 @browser_bp.route('/api/archive/list/<path:path>')
@@ -560,121 +596,47 @@ def api_archive_list(path):
     if err:
         return jsonify({'success': False, 'error': {'message': err}}), 400
     name = os.path.basename(full_path)
-    if not _is_archive_name(name):
+    if not catalog_utils.is_archive_name(name):
         return jsonify({'success': False, 'error': {'message': '不是压缩包'}}), 400
 
-    kind = _archive_kind(name)
-    items = []
     try:
-        if kind == 'zip':
-            dirs = set()
-            with zipfile.ZipFile(full_path, 'r') as zf:
-                for info in zf.infolist():
-                    inner = (info.filename or '').replace('\\', '/')
-                    if not inner or inner.startswith('/') or ':' in inner.split('/')[0]:
-                        continue
-                    if inner.endswith('/'):
-                        dirs.add(inner.rstrip('/'))
-                        continue
-                    parts = inner.split('/')
-                    if len(parts) > 1:
-                        acc = ''
-                        for seg in parts[:-1]:
-                            acc = (acc + '/' + seg) if acc else seg
-                            dirs.add(acc)
-                    items.append(
-                        {
-                            'path': inner,
-                            'is_dir': False,
-                            'size': int(info.file_size or 0),
-                            'size_human': path_utils.format_size(int(info.file_size or 0)),
-                        }
-                    )
-            for d in dirs:
-                items.append({'path': d + '/', 'is_dir': True, 'size': 0, 'size_human': ''})
-        elif kind == 'tar':
-            dirs = set()
-            with tarfile.open(full_path, 'r:*') as tf:
-                for m in tf.getmembers():
-                    inner = (m.name or '').replace('\\', '/')
-                    if not inner or inner.startswith('/') or ':' in inner.split('/')[0]:
-                        continue
-                    if '..' in inner.split('/'):
-                        continue
-                    if m.isdir():
-                        dirs.add(inner.rstrip('/'))
-                        continue
-                    parts = inner.split('/')
-                    if len(parts) > 1:
-                        acc = ''
-                        for seg in parts[:-1]:
-                            acc = (acc + '/' + seg) if acc else seg
-                            dirs.add(acc)
-                    size = int(m.size or 0)
-                    items.append(
-                        {
-                            'path': inner,
-                            'is_dir': False,
-                            'size': size,
-                            'size_human': path_utils.format_size(size),
-                        }
-                    )
-            for d in dirs:
-                items.append({'path': d + '/', 'is_dir': True, 'size': 0, 'size_human': ''})
-        else:
-            seven = shutil.which('7z') or shutil.which('7za') or shutil.which('7zr')
-            if not seven:
-                return (
-                    jsonify({'success': False, 'error': {'message': '缺少 7z 命令，无法预览该压缩包'}}),
-                    400,
-                )
-            proc = subprocess.run([seven, 'l', '-slt', full_path], capture_output=True, text=True, timeout=30)
-            if proc.returncode != 0:
-                return (
-                    jsonify(
-                        {'success': False, 'error': {'message': (proc.stderr or proc.stdout or '列出失败').strip()}}
-                    ),
-                    400,
-                )
-            blocks = (proc.stdout or '').split('\n\n')
-            for b in blocks:
-                if 'Path = ' not in b:
-                    continue
-                inner = None
-                is_dir = False
-                size = 0
-                for line in b.splitlines():
-                    if line.startswith('Path = '):
-                        inner = line[len('Path = '):].strip().replace('\\', '/')
-                    elif line.startswith('Attributes = '):
-                        attrs = line[len('Attributes = '):]
-                        if 'D' in attrs:
-                            is_dir = True
-                    elif line.startswith('Size = '):
-                        try:
-                            size = int(line[len('Size = '):].strip() or 0)
-                        except Exception:
-                            size = 0
-                if not inner or inner == name:
-                    continue
-                if inner.startswith('/') or ':' in inner.split('/')[0] or '..' in inner.split('/'):
-                    continue
-                if is_dir and not inner.endswith('/'):
-                    inner = inner + '/'
-                items.append(
-                    {
-                        'path': inner,
-                        'is_dir': bool(is_dir),
-                        'size': int(size or 0),
-                        'size_human': '' if is_dir else path_utils.format_size(int(size or 0)),
-                    }
-                )
-
-        items.sort(key=lambda x: (not x.get('is_dir', False), x.get('path', '').lower()))
-        return jsonify({'success': True, 'data': {'items': items}})
+        catalog, cached = _archive_catalog().load(full_path, catalog_utils.archive_kind(name))
+        return jsonify({'success': True, 'data': {'items': catalog['items'], 'cached': cached}})
+    except catalog_utils.CatalogError as e:
+        return jsonify({'success': False, 'error': {'message': str(e)}}), e.status
+    except Exception as e:
+        return jsonify({'success': False, 'error': {'message': str(e)}}), 500
+
+
+@browser_bp.route('/api/archive/member/<path:path>', methods=['GET', 'HEAD'])
+def api_archive_member(path):
+    _root_dir, full_path, err = _resolve_safe_file(path)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
+    name = os.path.basename(full_path)
+    if not catalog_utils.is_archive_name(name):
+        return jsonify({'success': False, 'error': {'message': '不是压缩包'}}), 400
+    member_name = (request.args.get('member') or '').strip()
+    if not member_name:
+        return jsonify({'success': False, 'error': {'message': '缺少 member 参数'}}), 400
+    try:
+        member = _archive_catalog().open_member(full_path, catalog_utils.archive_kind(name), member_name)
+    except catalog_utils.CatalogError as e:
+        return jsonify({'success': False, 'error': {'message': str(e)}}), e.status
     except Exception as e:
         return jsonify({'success': False, 'error': {'message': str(e)}}), 500
 
+    st = os.stat(full_path)
+    member_key = hashlib.sha1(member.name.encode('utf-8', 'surrogateescape')).hexdigest()[:12]
+    download = (request.args.get('download') or '').strip().lower() in ('1', 'true', 'yes')
+    return http_utils.send_stream_ranged(
+        member.read, member.size, st, f'{http_utils.file_etag(st)}-{member_key}',
+        mimetype=mimetypes.guess_type(member.name)[0],
+        ranged=member.seekable,
+        as_attachment=download,
+        download_name=posixpath.basename(member.name),
+    )
+
 
 @browser_bp.route('/api/archive/extract/<path:path>', methods=['POST'])
 def api_archive_extract(path):
@@ -682,7 +644,7 @@ def api_archive_extract(path):
     if err:
         return jsonify({'success': False, 'error': {'message': err}}), 400
     name = os.path.basename(full_path)
-    if not _is_archive_name(name):
+    if not catalog_utils.is_archive_name(name):
         return jsonify({'success': False, 'error': {'message': '不是压缩包'}}), 400
 
     payload = request.get_json(silent=True) or {}
@@ -697,58 +659,95 @@ def api_archive_extract(path):
         return jsonify({'success': False, 'error': {'message': '非法目标目录'}}), 400
     os.makedirs(dest_full, exist_ok=True)
 
-    kind = _archive_kind(name)
-    extracted = 0
-    try:
-        if kind == 'zip':
-            with zipfile.ZipFile(full_path, 'r') as zf:
-                for info in zf.infolist():
-                    inner = (info.filename or '').replace('\\', '/')
-                    if not inner or inner.endswith('/') or inner.startswith('/') or ':' in inner.split('/')[0] or '..' in inner.split('/'):
-                        if inner and inner.endswith('/'):
-                            d = _safe_join(dest_full, inner.rstrip('/'))
-                            if d:
-                                os.makedirs(d, exist_ok=True)
-                        continue
-                    out_path = _safe_join(dest_full, inner)
-                    if not out_path:
-                        continue
-                    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-                    with zf.open(info, 'r') as src, open(out_path, 'wb') as dst:
-                        shutil.copyfileobj(src, dst)
-                    extracted += 1
-        elif kind == 'tar':
-            with tarfile.open(full_path, 'r:*') as tf:
-                for m in tf.getmembers():
-                    inner = (m.name or '').replace('\\', '/')
-                    if not inner or inner.startswith('/') or ':' in inner.split('/')[0] or '..' in inner.split('/'):
-                        continue
-                    out_path = _safe_join(dest_full, inner)
-                    if not out_path:
-                        continue
-                    if m.isdir():
-                        os.makedirs(out_path, exist_ok=True)
-                        continue
-                    if not m.isreg():
-                        continue
-                    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-                    src = tf.extractfile(m)
-                    if not src:
+    kind = catalog_utils.archive_kind(name)
+    check_space = payload.get('check_space', True) is not False
+
+    def _run(task_id):
+        update_task(task_id, status='running', progress=0.0, message='统计中…')
+        catalog, _cached = _archive_catalog().load(full_path, kind)
+        total_bytes = sum(int(it.get('size') or 0) for it in catalog['items'] if not it.get('is_dir'))
+        if check_space:
+            archive_utils.ensure_disk_space(dest_full, total_bytes)
+
+        def _report(done, total, pct):
+            update_task(
+                task_id, progress=pct,
+                message=f'解压中… {path_utils.format_size(done)}/{path_utils.format_size(total)}',
+            )
+
+        throttle = archive_utils.ProgressThrottle(total_bytes, _report)
+        extracted = archive_utils.extract_archive(
+            full_path, kind, dest_full,
+            on_bytes=throttle.add,
+            cancelled=lambda: is_task_cancelled(task_id),
+            size_hint=total_bytes,
+        )
+        update_task(task_id, progress=100.0, message=f'解压完成，共 {extracted} 个文件')
+
+    task_id = create_task(_run, name=f'archive:extract:{kind}')
+    return jsonify({'success': True, 'data': {'taskId': task_id, 'target_dir': target_dir}})
+
+
+def _resolve_archive_paths(root_dir, paths):
+    """把待打包的相对路径解析为 [(rel, full)]，忽略越界与不存在的项"""
+    resolved = []
+    for p in paths:
+        if not isinstance(p, str) or not p.strip():
+            continue
+        rel = p.strip().lstrip('/\\').replace('\\', '/')
+        full = os.path.normpath(os.path.join(root_dir, rel))
+        try:
+            if os.path.commonpath([root_dir, full]) != root_dir:
+                continue
+        except Exception:
+            continue
+        if not os.path.exists(full):
+            continue
+        resolved.append((rel, full))
+    return resolved
+
+
+def _iter_archive_plan(resolved):
+    """遍历待打包项，逐个产出 (kind, 源路径, 包内路径)；跳过符号链接，空目录保留目录项"""
+    seen = set()
+    for _rel, full in resolved:
+        top = os.path.basename(full.rstrip('/\\'))
+        if not top:
+            continue
+        if os.path.isdir(full):
+            file_count = 0
+            for root, dirs, files in os.walk(full):
+                dirs[:] = [d for d in dirs if not os.path.islink(os.path.join(root, d))]
+                for d in dirs:
+                    arc = os.path.join(top, os.path.relpath(os.path.join(root, d), full)).replace('\\', '/').rstrip('/') + '/'
+                    if arc not in seen:
+                        seen.add(arc)
+                        yield 'dir', os.path.join(root, d), arc
+                for f in files:
+                    fp = os.path.join(root, f)
+                    if os.path.islink(fp):
                         continue
-                    with src, open(out_path, 'wb') as dst:
-                        shutil.copyfileobj(src, dst)
-                    extracted += 1
+                    arc = os.path.join(top, os.path.relpath(fp, full)).replace('\\', '/')
+                    if arc not in seen:
+                        seen.add(arc)
+                        yield 'file', fp, arc
+                        file_count += 1
+            if file_count == 0:
+                arc = top.rstrip('/') + '/'
+                if arc not in seen:
+                    seen.add(arc)
+                    yield 'dir', full, arc
         else:
-            seven = shutil.which('7z') or shutil.which('7za') or shutil.which('7zr')
-            if not seven:
-                return jsonify({'success': False, 'error': {'message': '缺少 7z 命令，无法解压该压缩包'}}), 400
-            proc = subprocess.run([seven, 'x', '-y', '-o' + dest_full, full_path], capture_output=True, text=True, timeout=300)
-            if proc.returncode != 0:
-                return jsonify({'success': False, 'error': {'message': (proc.stderr or proc.stdout or '解压失败').strip()}}), 400
-            extracted = 1
-        return jsonify({'success': True, 'data': {'extracted': extracted, 'target_dir': target_dir}})
-    except Exception as e:
-        return jsonify({'success': False, 'error': {'message': str(e)}}), 500
+            arc = top
+            if arc not in seen:
+                seen.add(arc)
+                yield 'file', full, arc
+
+
+def _build_archive_plan(resolved):
+    entries = list(_iter_archive_plan(resolved))
+    file_count = sum(1 for kind, _fp, _arc in entries if kind == 'file')
+    return entries, max(file_count, 1)
 
 
 @browser_bp.route('/api/archive/create', methods=['POST'])
@@ -762,8 +761,10 @@ def api_archive_create():
         return jsonify({'success': False, 'error': {'message': 'paths required'}}), 400
 
     fmt = (payload.get('format') or 'zip').strip().lower()
-    if fmt not in {'zip', 'tar.gz'}:
+    if fmt not in archive_utils.ARCHIVE_CREATE_FORMATS:
         return jsonify({'success': False, 'error': {'message': '不支持的格式'}}), 400
+    if fmt == 'tar.zst' and not archive_utils.zstd_available():
+        return jsonify({'success': False, 'error': {'message': '缺少 zstandard 模块或 zstd 命令'}}), 400
 
     output_dir = (payload.get('output_dir') or '').strip()
     root_dir, out_dir_full, err = _resolve_safe_dir(output_dir, ensure_exists=False)
@@ -772,15 +773,8 @@ def api_archive_create():
 
     archive_name = (payload.get('name') or '').strip()
     if not archive_name:
-        archive_name = '新建压缩包.zip' if fmt == 'zip' else '新建压缩包.tar.gz'
-    archive_name = os.path.basename(archive_name)
-    if fmt == 'zip' and not archive_name.lower().endswith('.zip'):
-        archive_name = archive_name + '.zip'
-    if fmt == 'tar.gz' and not archive_name.lower().endswith('.tar.gz'):
-        if archive_name.lower().endswith('.tar'):
-            archive_name = archive_name + '.gz'
-        else:
-            archive_name = archive_name + '.tar.gz'
+        archive_name = '新建压缩包.' + fmt
+    archive_name = archive_utils.archive_download_name(archive_name, fmt)
 
     root_dir = os.path.normpath(root_dir)
     output_full = os.path.normpath(os.path.join(out_dir_full, archive_name))
@@ -793,9 +787,9 @@ def api_archive_create():
     if os.path.exists(output_full):
         base = archive_name
         ext = ''
-        if fmt == 'tar.gz':
-            base = archive_name[:-7]
-            ext = '.tar.gz'
+        if fmt.startswith('tar.'):
+            base = archive_name[:-len(fmt) - 1]
+            ext = '.' + fmt
         else:
             base, ext = os.path.splitext(archive_name)
         counter = 1
@@ -806,132 +800,86 @@ def api_archive_create():
                 break
             counter += 1
 
-    resolved = []
-    for p in paths:
-        if not isinstance(p, str) or not p.strip():
-            continue
-        rel = p.strip().lstrip('/\\').replace('\\', '/')
-        full = os.path.normpath(os.path.join(root_dir, rel))
-        try:
-            if os.path.commonpath([root_dir, full]) != root_dir:
-                continue
-        except Exception:
-            continue
-        if not os.path.exists(full):
-            continue
-        resolved.append((rel, full))
+    resolved = _resolve_archive_paths(root_dir, paths)
     if not resolved:
         return jsonify({'success': False, 'error': {'message': '未找到可压缩项'}}), 400
 
-    def _build_plan():
-        entries = []
-        seen = set()
-        file_count = 0
-        for _rel, full in resolved:
-            top = os.path.basename(full.rstrip('/\\'))
-            if not top:
-                continue
-            if os.path.isdir(full):
-                for root, dirs, files in os.walk(full):
-                    dirs[:] = [d for d in dirs if not os.path.islink(os.path.join(root, d))]
-                    for d in dirs:
-                        arc = os.path.join(top, os.path.relpath(os.path.join(root, d), full)).replace('\\', '/').rstrip('/') + '/'
-                        if arc not in seen:
-                            seen.add(arc)
-                            entries.append(('dir', os.path.join(root, d), arc))
-                    for f in files:
-                        fp = os.path.join(root, f)
-                        if os.path.islink(fp):
-                            continue
-                        arc = os.path.join(top, os.path.relpath(fp, full)).replace('\\', '/')
-                        if arc not in seen:
-                            seen.add(arc)
-                            entries.append(('file', fp, arc))
-                            file_count += 1
-                if file_count == 0:
-                    arc = top.rstrip('/') + '/'
-                    if arc not in seen:
-                        seen.add(arc)
-                        entries.append(('dir', full, arc))
-            else:
-                arc = top
-                if arc not in seen:
-                    seen.add(arc)
-                    entries.append(('file', full, arc))
-                    file_count += 1
-        return entries, max(file_count, 1)
-
     def _run(task_id):
-        entries, total = _build_plan()
+        entries, _count = _build_archive_plan(resolved)
+        total_bytes = 0
+        for kind, fp, _arc in entries:
+            if kind == 'file':
+                try:
+                    total_bytes += os.path.getsize(fp)
+                except OSError:
+                    pass
         update_task(task_id, status='pending', progress=0.0, message='准备中…')
 
-        done = 0
-        if fmt == 'zip':
-            zf = None
-            try:
-                zf = zipfile.ZipFile(output_full, 'w', compression=zipfile.ZIP_DEFLATED)
-                for kind, fp, arc in entries:
-                    if kind == 'dir':
-                        arc_dir = (arc or '').replace('\\', '/').rstrip('/') + '/'
-                        if arc_dir:
-                            try:
-                                zf.writestr(arc_dir, b'')
-                            except Exception:
-                                pass
-                        continue
-                    zf.write(fp, arcname=arc)
-                    done += 1
-                    update_task(task_id, progress=(done * 100.0 / total), message=f'压缩中… {done}/{total}')
-            finally:
-                if zf:
-                    zf.close()
-        else:
-            tf = None
-            try:
-                tf = tarfile.open(output_full, 'w:gz')
-                for kind, fp, arc in entries:
-                    if kind == 'dir':
-                        tf.add(fp, arcname=(arc or '').replace('\\', '/').rstrip('/') + '/', recursive=False)
-                        continue
-                    if os.path.isdir(fp):
-                        tf.add(fp, arcname=arc.rstrip('/'), recursive=False)
-                        continue
-                    tf.add(fp, arcname=arc, recursive=False)
-                    done += 1
-                    update_task(task_id, progress=(done * 100.0 / total), message=f'压缩中… {done}/{total}')
-            finally:
-                if tf:
-                    tf.close()
+        def _report(done, total, pct):
+            update_task(
+                task_id, progress=pct,
+                message=f'压缩中… {path_utils.format_size(done)}/{path_utils.format_size(total)}',
+            )
+
+        throttle = archive_utils.ProgressThrottle(total_bytes, _report)
+        archive_utils.write_archive(output_full, entries, fmt, on_bytes=throttle.add)
+        update_task(task_id, progress=100.0, message='压缩完成')
 
     task_id = create_task(_run, name=f'archive:create:{fmt}')
     rel_out = os.path.relpath(output_full, root_dir).replace('\\', '/')
     return jsonify({'success': True, 'data': {'taskId': task_id, 'output': rel_out}})
 
 
-@browser_bp.route('/api/upload', methods=['POST'])
-def api_upload_file():
-    root_dir = config.ROOT_DIR
+@browser_bp.route('/api/archive/download', methods=['GET', 'POST'])
+def api_archive_download():
+    """把选中的文件/目录实时打包并以流的形式下载，不生成临时文件
+
+    参数（查询串、表单或 JSON）：paths（可重复）、format=zip|tar|tar.gz、compression=deflate|stored（仅 zip）、name。
+    """
+    payload = request.get_json(silent=True) if request.is_json else None
+    if isinstance(payload, dict):
+        paths = payload.get('paths') or []
+        fmt = str(payload.get('format') or 'zip')
+        compression = str(payload.get('compression') or 'deflate')
+        name = str(payload.get('name') or '')
+    else:
+        paths = request.values.getlist('paths')
+        fmt = request.values.get('format') or 'zip'
+        compression = request.values.get('compression') or 'deflate'
+        name = request.values.get('name') or ''
+    fmt = fmt.strip().lower()
+    compression = compression.strip().lower()
+    if fmt not in archive_utils.ARCHIVE_STREAM_FORMATS:
+        return jsonify({'success': False, 'error': {'message': '不支持的格式'}}), 400
+    if compression not in archive_utils.ZIP_COMPRESSIONS:
+        return jsonify({'success': False, 'error': {'message': '不支持的压缩方式'}}), 400
+    if not isinstance(paths, list) or not paths:
+        return jsonify({'success': False, 'error': {'message': 'paths required'}}), 400
 
-    f = request.files.get('file')
-    if not f:
-        return jsonify({'success': False, 'error': {'message': 'file required'}}), 400
+    root_dir = os.path.normpath(config.ROOT_DIR)
+    resolved = _resolve_archive_paths(root_dir, paths)
+    if not resolved:
+        return jsonify({'success': False, 'error': {'message': '未找到可压缩项'}}), 400
+    if not name:
+        name = os.path.basename(resolved[0][1].rstrip('/\\')) if len(resolved) == 1 else 'download'
+    download_name = archive_utils.archive_download_name(name, fmt)
 
-    target_dir = (request.form.get('target_dir') or '').strip().lstrip('/\\').replace('\\', '/')
-    _root, target_full, err = _resolve_safe_dir(target_dir, ensure_exists=True)
-    if err:
-        return jsonify({'success': False, 'error': {'message': err}}), 400
+    body = archive_utils.stream_archive(_iter_archive_plan(resolved), fmt=fmt, compression=compression)
+    resp = Response(stream_with_context(body), mimetype=archive_utils.ARCHIVE_STREAM_FORMATS[fmt])
+    resp.headers['Content-Disposition'] = http_utils.content_disposition(download_name)
+    resp.headers['Cache-Control'] = 'no-store'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
 
-    desired = (request.form.get('filename') or f.filename or '').strip()
-    desired = os.path.basename(desired)
-    if not desired:
-        return jsonify({'success': False, 'error': {'message': 'filename required'}}), 400
 
+def _unique_upload_path(root_dir, target_full, desired):
+    """返回 (out_full, filename, err)；目标已存在时按 name(1).ext 递增改名"""
     out_full = os.path.normpath(os.path.join(target_full, desired))
     try:
         if os.path.commonpath([root_dir, out_full]) != root_dir:
-            return jsonify({'success': False, 'error': {'message': '非法目标文件'}}), 400
+            return None, None, '非法目标文件'
     except Exception:
-        return jsonify({'success': False, 'error': {'message': '非法目标文件'}}), 400
+        return None, None, '非法目标文件'
 
     if os.path.exists(out_full):
         base, ext = os.path.splitext(desired)
@@ -943,6 +891,30 @@ def api_upload_file():
                 desired = os.path.basename(out_full)
                 break
             counter += 1
+    return out_full, desired, None
+
+
+@browser_bp.route('/api/upload', methods=['POST'])
+def api_upload_file():
+    root_dir = config.ROOT_DIR
+
+    f = request.files.get('file')
+    if not f:
+        return jsonify({'success': False, 'error': {'message': 'file required'}}), 400
+
+    target_dir = (request.form.get('target_dir') or '').strip().lstrip('/\\').replace('\\', '/')
+    _root, target_full, err = _resolve_safe_dir(target_dir, ensure_exists=True)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
+
+    desired = (request.form.get('filename') or f.filename or '').strip()
+    desired = os.path.basename(desired)
+    if not desired:
+        return jsonify({'success': False, 'error': {'message': 'filename required'}}), 400
+
+    out_full, desired, err = _unique_upload_path(root_dir, target_full, desired)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
 
     try:
         f.save(out_full)
@@ -953,6 +925,124 @@ def api_upload_file():
     return jsonify({'success': True, 'data': {'path': rel_out, 'filename': desired}})
 
 
+def _upload_store():
+    return upload_utils.get_upload_store(config.UPLOAD_STATE_DIR)
+
+
+def _upload_status(session):
+    return {
+        'id': session.id,
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'received': session.received,
+        'chunk_size': upload_utils.UPLOAD_CHUNK_SIZE,
+        'max_chunk_size': upload_utils.UPLOAD_MAX_CHUNK,
+    }
+
+
+@browser_bp.route('/api/upload/create', methods=['POST'])
+def api_upload_create():
+    """创建可续传上传：{target_dir, filename, size}"""
+    data = request.get_json(silent=True) or {}
+    target_dir = str(data.get('target_dir') or '').strip().lstrip('/\\').replace('\\', '/')
+    root_dir, target_full, err = _resolve_safe_dir(target_dir, ensure_exists=True)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
+
+    desired = os.path.basename(str(data.get('filename') or '').strip())
+    if not desired:
+        return jsonify({'success': False, 'error': {'message': 'filename required'}}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        size = -1
+    if size < 0:
+        return jsonify({'success': False, 'error': {'message': 'size required'}}), 400
+    _out, _name, err = _unique_upload_path(root_dir, target_full, desired)
+    if err:
+        return jsonify({'success': False, 'error': {'message': err}}), 400
+
+    try:
+        session = _upload_store().create(target_full, desired, size)
+    except upload_utils.UploadError as e:
+        return jsonify({'success': False, 'error': {'message': str(e)}}), e.status
+    except OSError as e:
+        return jsonify({'success': False, 'error': {'message': str(e)}}), 500
+    resp = jsonify({'success': True, 'data': _upload_status(session)})
+    resp.status_code = 201
+    resp.headers['Location'] = url_for('browser.api_upload_session', upload_id=session.id)
+    resp.headers['Upload-Offset'] = str(session.offset)
+    return resp
+
+
+@browser_bp.route('/api/upload/<upload_id>', methods=['GET', 'HEAD', 'PATCH', 'PUT', 'DELETE'])
+def api_upload_session(upload_id):
+    """查询进度（GET/HEAD）、写入分片（PUT/PATCH，Upload-Offset 指定位置）、放弃上传（DELETE）"""
+    store = _upload_store()
+    session = store.get(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'error': {'message': '上传不存在或已过期'}}), 404
+
+    if request.method == 'DELETE':
+        store.abort(session)
+        return jsonify({'success': True})
+
+    if request.method in ('PUT', 'PATCH'):
+        raw_offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        try:
+            offset = int(raw_offset)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': {'message': '缺少 Upload-Offset'}}), 400
+        try:
+            # 直接读取原始请求体，不经过表单解析与临时文件
+            store.write_chunk(
+                session, request.stream, offset, request.content_length,
+                sha256=request.headers.get('X-Chunk-Sha256') or None,
+            )
+        except upload_utils.UploadError as e:
+            return jsonify({'success': False, 'error': {'message': str(e)}, 'data': _upload_status(session)}), e.status
+        except OSError as e:
+            return jsonify({'success': False, 'error': {'message': str(e)}}), 500
+
+    resp = jsonify({'success': True, 'data': _upload_status(session)})
+    resp.headers['Upload-Offset'] = str(session.offset)
+    resp.headers['Upload-Length'] = str(session.size)
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+@browser_bp.route('/api/upload/<upload_id>/finalize', methods=['POST'])
+def api_upload_finalize(upload_id):
+    """完成上传：可选 {checksum: "sha256:<hex>"} 校验整个文件，按需重命名后落盘"""
+    store = _upload_store()
+    session = store.get(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'error': {'message': '上传不存在或已过期'}}), 404
+    data = request.get_json(silent=True) or {}
+    checksum = str(data.get('checksum') or '').strip() or None
+    root_dir = config.ROOT_DIR
+
+    for _attempt in range(5):
+        out_full, desired, err = _unique_upload_path(root_dir, session.target_dir, session.filename)
+        if err:
+            return jsonify({'success': False, 'error': {'message': err}}), 400
+        try:
+            store.finalize(session, out_full, checksum=checksum)
+            break
+        except FileExistsError:
+            continue
+        except upload_utils.UploadError as e:
+            return jsonify({'success': False, 'error': {'message': str(e)}, 'data': _upload_status(session)}), e.status
+        except OSError as e:
+            return jsonify({'success': False, 'error': {'message': str(e)}}), 500
+    else:
+        return jsonify({'success': False, 'error': {'message': '目标文件名冲突'}}), 409
+
+    rel_out = os.path.relpath(out_full, root_dir).replace('\\', '/')
+    return jsonify({'success': True, 'data': {'path': rel_out, 'filename': desired}})
+
+
 @browser_bp.route('/upload/', methods=['POST'])
 @browser_bp.route('/upload/<path:path>', methods=['POST'])
 def upload_file(path=''):
@@ -1012,18 +1102,8 @@ def delete_item(path):
     if full_path == trash_dir:
         return jsonify({'success': False, 'message': '不能删除回收站文件夹'})
     try:
-        os.makedirs(trash_dir, exist_ok=True)
         is_dir = os.path.isdir(full_path)
-        item_name = os.path.basename(full_path)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        trash_name = f"{timestamp}_{item_name}"
-        trash_path = os.path.join(trash_dir, trash_name)
-        counter = 1
-        while os.path.exists(trash_path):
-            trash_name = f"{timestamp}_{item_name}_{counter}"
-            trash_path = os.path.join(trash_dir, trash_name)
-            counter += 1
-        shutil.move(full_path, trash_path)
+        _trash_store().move_to_trash(full_path, root_dir)
         _prune_pins_for_deleted_item(root_dir, full_path, is_dir)
         return jsonify({'success': True, 'message': '已移到回收站'})
     except Exception as e:
@@ -1166,95 +1246,44 @@ def touch(parent=''):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def _trash_store():
+    return trash_utils.get_trash_store(config.TRASH_DIR, config.TRASH_DB)
+
+
 @browser_bp.route('/trash')
 def trash():
-    trash_dir = config.TRASH_DIR
-    os.makedirs(trash_dir, exist_ok=True)
-    items = []
-    for name in os.listdir(trash_dir):
-        if name.startswith('.'):
-            continue
-        path = os.path.join(trash_dir, name)
-        parts = name.split('_', 2)
-        deleted_at = parts[0] if len(parts) >= 2 else '未知'
-        try:
-            dt = datetime.strptime(deleted_at, '%Y%m%d%H%M%S')
-            deleted_at = dt.strftime('%Y-%m-%d %H:%M:%S')
-        except Exception:
-            pass
-        items.append({'name': name, 'path': path, 'deleted_at': deleted_at, 'is_dir': os.path.isdir(path)})
-    items.sort(key=lambda x: x['name'], reverse=True)
-    return render_template("trash.html", items=items)
+    items, total, _total_size = _trash_store().list(limit=trash_utils.TRASH_LIST_MAX_LIMIT)
+    return render_template("trash.html", items=items, total=total)
 
 
 @browser_bp.route('/trash/clear', methods=['POST'])
 def trash_clear():
-    trash_dir = config.TRASH_DIR
-    os.makedirs(trash_dir, exist_ok=True)
-    try:
-        for name in os.listdir(trash_dir):
-            if name.startswith('.'):
-                continue
-            path = os.path.join(trash_dir, name)
-            try:
-                if os.path.islink(path):
-                    os.unlink(path)
-                elif os.path.isdir(path):
-                    shutil.rmtree(path, ignore_errors=True)
-                else:
-                    os.remove(path)
-            except Exception as e:
-                print(f"删除失败: {path}, {e}")
-        return jsonify({'success': True, 'message': '回收站已清空'})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)})
+    task_id = create_task(trash_utils.purge_job(_trash_store(), update_task), name='trash:clear')
+    return jsonify({'success': True, 'taskId': task_id, 'message': '正在后台清空回收站'})
 
 
 @browser_bp.route('/trash/restore/<name>', methods=['POST'])
 def trash_restore(name):
-    root_dir = config.ROOT_DIR
-    trash_dir = config.TRASH_DIR
-    os.makedirs(trash_dir, exist_ok=True)
-    if not name or '/' in name or '\\' in name:
-        return jsonify({'success': False, 'message': '非法名称'}), 400
-    trash_item = os.path.normpath(os.path.join(trash_dir, name))
-    if not trash_item.startswith(os.path.normpath(trash_dir)):
-        return jsonify({'success': False, 'message': '非法路径'}), 400
-    if not os.path.exists(trash_item):
-        return jsonify({'success': False, 'message': '文件不存在'}), 404
-
     payload = request.get_json(silent=True) or {}
     target_path = (payload.get('target_path') or '').strip()
-    if not target_path:
-        return jsonify({'success': False, 'message': '请输入还原路径'}), 400
-
-    target_full = os.path.normpath(os.path.join(root_dir, target_path))
-    if not target_full.startswith(os.path.normpath(root_dir)):
-        return jsonify({'success': False, 'message': '非法路径'}), 403
-    if os.path.exists(target_full):
-        return jsonify({'success': False, 'message': '目标已存在'}), 409
-
     try:
-        os.makedirs(os.path.dirname(target_full), exist_ok=True)
-        shutil.move(trash_item, target_full)
-        return jsonify({'success': True, 'message': '还原成功'})
+        restored = _trash_store().restore(name, config.ROOT_DIR, target_path or None)
+        return jsonify({'success': True, 'message': '还原成功', 'path': restored})
+    except trash_utils.TrashError as e:
+        return jsonify({'success': False, 'message': str(e)}), e.status
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
 # ========== 文件打开方式配置 API ==========
-import json as json_lib
-
-FILE_OPEN_CONFIG_FILE = config.FILE_OPEN_CONFIG_FILE
 
 
 @browser_bp.route('/api/file-open-config')
 def get_file_open_config():
     """获取文件打开方式配置"""
     try:
-        if os.path.exists(FILE_OPEN_CONFIG_FILE):
-            with open(FILE_OPEN_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config_data = json_lib.load(f)
+        config_data = _saved_file_open_config()
+        if config_data is not None:
             return jsonify({'success': True, 'data': config_data})
         else:
             # 返回默认配置
@@ -1284,8 +1313,7 @@ def save_file_open_config():
     """保存文件打开方式配置"""
     try:
         config_data = request.get_json(silent=True) or {}
-        with open(FILE_OPEN_CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json_lib.dump(config_data, f, ensure_ascii=False, indent=2)
+        state_utils.get_state_store().set(state_utils.NS_UI, FILE_OPEN_CONFIG_KEY, config_data)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1295,17 +1323,15 @@ def save_file_open_config():
 def get_file_open_method(group_id):
     """获取指定文件类型的打开方式"""
     try:
-        config_data = {}
-        if os.path.exists(FILE_OPEN_CONFIG_FILE):
-            with open(FILE_OPEN_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config_data = json_lib.load(f)
+        saved = _saved_file_open_config()
+        config_data = saved or {}
         
         # 根据扩展名获取分组
         ext = group_id if group_id.startswith('.') else '.' + group_id
         
         # 扩展名到分组的映射
         ext_to_group = {}
-        if os.path.exists(FILE_OPEN_CONFIG_FILE):
+        if saved is not None:
             # 使用保存的配置
             pass
         else:
@@ -975,7 +975,7 @@ def api_clash_install():
         _download_mihomo_binary(task_id)
         _ensure_mihomo_service(task_id)
 
-    task_id = create_task(_do, name='clash install')
+    task_id = create_task(_do, name='clash install', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -986,7 +986,7 @@ def api_clash_reinstall():
         _download_mihomo_binary(task_id)
         _ensure_mihomo_service(task_id)
 
-    task_id = create_task(_do, name='clash reinstall')
+    task_id = create_task(_do, name='clash reinstall', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -995,5 +995,5 @@ def api_clash_uninstall():
     def _do(task_id):
         _clash_uninstall(task_id)
 
-    task_id = create_task(_do, name='clash uninstall')
+    task_id = create_task(_do, name='clash uninstall', queue='system')
     return api_ok({'taskId': task_id})
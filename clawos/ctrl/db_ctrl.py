@@ -10,7 +10,7 @@ from threading import Lock
 from flask import Blueprint, request, jsonify, current_app, send_from_directory
 
 from ctrl import api_error, api_ok
-import config
+from lib import state_utils
 
 db_bp = Blueprint('db', __name__)
 
@@ -19,10 +19,7 @@ db_bp = Blueprint('db', __name__)
 def db_manager():
     return send_from_directory(current_app.template_folder, 'db_manager.html')
 
-# 数据库连接配置存储路径
-DB_CONFIG_DIR = config.DATA_DIR
-os.makedirs(DB_CONFIG_DIR, exist_ok=True)
-DB_CONFIG_FILE = os.path.join(DB_CONFIG_DIR, 'db_connections.json')
+# 数据库连接保存在状态库 db_conn 命名空间，每个连接一行；界面状态也占一行
 UI_STATE_KEY = '__ui_state__'
 
 # 加密密钥
@@ -37,19 +34,12 @@ _engines_lock = Lock()
 
 def _load_connections():
     """加载保存的数据库连接."""
-    try:
-        if os.path.exists(DB_CONFIG_FILE):
-            with open(DB_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
-    return {}
+    return state_utils.get_state_store().items(state_utils.NS_DB_CONN)
 
 
 def _save_connections(conns):
-    """保存数据库连接."""
-    with open(DB_CONFIG_FILE, 'w') as f:
-        json.dump(conns, f, indent=2)
+    """保存数据库连接（只写入有变化的连接）."""
+    state_utils.get_state_store().replace(state_utils.NS_DB_CONN, conns)
 
 def _is_meta_key(k):
     return isinstance(k, str) and k.startswith('__')
@@ -783,32 +773,23 @@ def api_db_databases(conn_id):
         return api_error(str(e))
 
 
-AI_HISTORY_FILE = os.path.join(config.DATA_DIR, 'ai_sql_history.json')
+AI_HISTORY_KEEP = 50
 
 
 def _load_ai_history(limit=10):
     """加载 AI SQL 生成历史."""
-    try:
-        if os.path.exists(AI_HISTORY_FILE):
-            with open(AI_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-                return history[-limit:]
-    except Exception:
-        pass
-    return []
+    rows = state_utils.get_state_store().log_page(state_utils.NS_AI_SQL_HISTORY, limit=limit)
+    return [item for _, item in rows]
 
 
 def _save_ai_history(prompt, sql):
     """保存到历史."""
+    store = state_utils.get_state_store()
+    item = {'prompt': prompt, 'sql': sql, 'time': datetime.utcnow().isoformat()}
     try:
-        history = []
-        if os.path.exists(AI_HISTORY_FILE):
-            with open(AI_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        history.append({'prompt': prompt, 'sql': sql, 'time': datetime.utcnow().isoformat()})
-        history = history[-50:]  # 只保留最近 50 条
-        with open(AI_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        with store.transaction():
+            store.append(state_utils.NS_AI_SQL_HISTORY, item)
+            store.log_trim(state_utils.NS_AI_SQL_HISTORY, AI_HISTORY_KEEP)  # 只保留最近 50 条
     except Exception:
         pass
 
@@ -5,14 +5,24 @@ import os
 from urllib.parse import quote
 
 import markdown
-from flask import Blueprint, redirect, render_template, request, send_from_directory, url_for, jsonify
+from flask import Blueprint, current_app, redirect, render_template, request, send_file, url_for, jsonify
 
 import config
-from lib import file_utils
+from ctrl.task_ctrl import create_task, is_task_cancelled, update_task
+from lib import (
+    catalog_utils, csv_utils, file_utils, http_utils, jsonindex_utils, lineindex_utils, scheduler_utils, state_utils,
+    thumb_utils, xlsx_utils,
+)
 
 
 file_bp = Blueprint('file', __name__)
 
+# 压缩包内 Markdown 预览最多读取的字节数
+ARCHIVE_PREVIEW_MAX_BYTES = 4 * 1024 * 1024
+# 超过该大小的文本文件按行窗口分页查看，不再整体读入
+TEXT_VIEW_WINDOW_THRESHOLD = 1024 * 1024
+TEXT_VIEW_WINDOW_LINES = 1000
+
 
 def _get_root_dir():
     return os.path.normpath(config.ROOT_DIR)
@@ -28,6 +38,9 @@ def view_file(path):
         return "文件不存在", 404
     if os.path.isdir(full_path):
         return redirect(url_for('browser.browse', path=path))
+    member = (request.args.get('member') or '').strip()
+    if member:
+        return _view_archive_member(path, full_path, member)
 
     mime_type, _ = mimetypes.guess_type(full_path)
     _, ext = os.path.splitext(full_path)
@@ -80,12 +93,22 @@ def view_file(path):
             file_path=path,
             current_dir=os.path.dirname(path),
         )
-    if ext_lower in ['.xlsx', '.xls']:
+    if csv_utils.is_delimited_name(full_path) and os.path.getsize(full_path) > TEXT_VIEW_WINDOW_THRESHOLD:
+        return render_template(
+            'csv_viewer.html',
+            filename=os.path.basename(full_path),
+            file_path=path,
+            current_dir=os.path.dirname(path),
+            total_size=os.path.getsize(full_path),
+        )
+    if ext_lower in ['.xlsx', '.xlsm', '.xls']:
         return render_template(
             'excel_viewer.html',
             filename=os.path.basename(full_path),
             file_path=path,
             current_dir=os.path.dirname(path),
+            # 旧版二进制 .xls 仍由浏览器端 SheetJS 解析
+            server_mode=ext_lower != '.xls',
         )
     if ext_lower in ['.docx', '.doc']:
         return render_template(
@@ -97,30 +120,85 @@ def view_file(path):
     if ext_lower in ['.ppt', '.pptx']:
         src = (request.url_root or '').rstrip('/') + url_for('file.serve_file', path=path)
         return redirect('https://view.officeapps.live.com/op/view.aspx?src=' + quote(src, safe=''))
-    if mime_type and mime_type.startswith('text'):
-        max_bytes = 1024 * 1024
+    if (mime_type and mime_type.startswith('text')) or ext_lower == '.log':
         size = os.path.getsize(full_path)
-        truncated = size > max_bytes
+        common = {
+            'filename': os.path.basename(full_path),
+            'file_path': path,
+            'current_dir': os.path.dirname(path),
+            'extension': ext_lower,
+            'total_size': size,
+        }
+        if size > TEXT_VIEW_WINDOW_THRESHOLD:
+            window = lineindex_utils.get_line_reader().window(full_path, 0, TEXT_VIEW_WINDOW_LINES)
+            return render_template(
+                "code_mirror.html",
+                content='\n'.join(window['lines']),
+                windowed=True,
+                window=window,
+                window_lines=TEXT_VIEW_WINDOW_LINES,
+                **common,
+            )
         with open(full_path, 'rb') as f:
-            raw = f.read(max_bytes if truncated else None)
-        try:
-            content = raw.decode('utf-8')
-        except UnicodeDecodeError:
-            content = raw.decode('gbk', errors='replace')
-        return render_template(
-            "code_mirror.html",
-            content=content,
-            filename=os.path.basename(full_path),
-            file_path=path,
-            current_dir=os.path.dirname(path),
-            extension=ext_lower,
-            truncated=truncated,
-            total_size=size,
-        )
+            content = _decode_text(f.read())
+        return render_template("code_mirror.html", content=content, **common)
 
     return redirect(url_for('file.download_file', path=path))
 
 
+def _decode_text(raw):
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('gbk', errors='replace')
+
+
+def _view_archive_member(path, full_path, member_name):
+    """预览压缩包内的单个文件：文本、Markdown 与图片直接从压缩包流式读取，不解压到磁盘"""
+    name = os.path.basename(full_path)
+    if not catalog_utils.is_archive_name(name):
+        return "不是压缩包", 400
+    catalog = catalog_utils.get_archive_catalog(config.ARCHIVE_CATALOG_DIR)
+    try:
+        member = catalog.open_member(full_path, catalog_utils.archive_kind(name), member_name)
+    except catalog_utils.CatalogError as e:
+        return str(e), e.status
+
+    src_url = url_for('browser.api_archive_member', path=path, member=member.name)
+    download_url = url_for('browser.api_archive_member', path=path, member=member.name, download=1)
+    filename = member.name.rsplit('/', 1)[-1]
+    ext_lower = os.path.splitext(filename)[1].lower()
+    mime_type, _ = mimetypes.guess_type(filename)
+    common = {
+        'filename': filename,
+        'file_path': f'{path}:{member.name}',
+        'current_dir': os.path.dirname(path),
+        'src_url': src_url,
+        'download_url': download_url,
+        'read_only': True,
+    }
+
+    if ext_lower in file_utils.MARKDOWN_EXTENSIONS:
+        raw_markdown = _decode_text(member.read_head(ARCHIVE_PREVIEW_MAX_BYTES))
+        rendered_html = markdown.markdown(raw_markdown or '', extensions=['fenced_code', 'tables'], output_format='html5')
+        return render_template('markdown.html', raw_markdown=raw_markdown, rendered_html=rendered_html, **common)
+    if mime_type and (mime_type.startswith('image') or ext_lower in file_utils.IMAGE_EXTENSIONS):
+        return render_template('image_viewer.html', **common)
+    # .env、.gitignore 这类点文件没有扩展名，按整个文件名匹配
+    code_ext = ext_lower or filename.lower()
+    if (mime_type and mime_type.startswith('text')) or code_ext in file_utils.CODE_EXTENSIONS:
+        max_bytes = 1024 * 1024
+        truncated = member.size > max_bytes
+        content = _decode_text(member.read_head(max_bytes))
+        return render_template(
+            'code_mirror.html', content=content, extension=ext_lower,
+            truncated=truncated, total_size=member.size, **common,
+        )
+    if mime_type and (mime_type.startswith('video') or mime_type.startswith('audio') or mime_type == 'application/pdf'):
+        return redirect(src_url)
+    return redirect(download_url)
+
+
 @file_bp.route('/download/<path:path>')
 def download_file(path):
     root_dir = _get_root_dir()
@@ -130,11 +208,7 @@ def download_file(path):
         return "非法路径", 403
     if not os.path.exists(full_path) or os.path.isdir(full_path):
         return "文件不存在", 404
-    return send_from_directory(
-        os.path.dirname(full_path),
-        os.path.basename(full_path),
-        as_attachment=True,
-    )
+    return http_utils.send_file_ranged(full_path, mimetype=mimetypes.guess_type(full_path)[0], as_attachment=True)
 
 
 @file_bp.route('/serve/<path:path>')
@@ -183,23 +257,80 @@ def serve_file(path):
     if not mime:
         guessed, _ = mimetypes.guess_type(full_path)
         mime = guessed
-    return send_from_directory(
-        os.path.dirname(full_path),
-        os.path.basename(full_path),
-        mimetype=mime,
-    )
+    return http_utils.send_file_ranged(full_path, mimetype=mime)
+
+
+# 超过该大小的 JSON 文件在编辑器中按节点惰性展开，只编辑选中的子树
+JSON_LAZY_THRESHOLD = 5 * 1024 * 1024
 
 
 @file_bp.route('/json/editor')
 def json_editor():
     """JSON编辑器页面"""
     path = request.args.get('path', '')
-    return render_template('json_editor.html', path=path)
+    full_path = os.path.normpath(os.path.join(_get_root_dir(), path))
+    lazy = (
+        full_path.startswith(_get_root_dir())
+        and os.path.isfile(full_path)
+        and os.path.getsize(full_path) > JSON_LAZY_THRESHOLD
+    )
+    return render_template('json_editor.html', path=path, lazy=lazy)
 
 
 @file_bp.route('/thumbnail/<path:path>')
 def thumbnail(path):
-    return serve_file(path)
+    """返回图片缩略图：按需在进程池中生成并缓存到磁盘，非图片或生成失败时回退为原文件"""
+    root_dir = _get_root_dir()
+    rel = (path or '').lstrip('/\\').replace('\\', '/')
+    full_path = os.path.normpath(os.path.join(root_dir, rel))
+    if not full_path.startswith(root_dir):
+        return "非法路径", 403
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        return "文件不存在", 404
+    if os.path.isdir(full_path):
+        return "文件不存在", 404
+    if os.path.splitext(full_path)[1].lower() not in thumb_utils.THUMB_EXTENSIONS:
+        return serve_file(path)
+
+    size = request.args.get('size', type=int) or thumb_utils.THUMB_DEFAULT_SIZE
+    # 归一到最近的预设尺寸，避免任意尺寸撑爆缓存
+    size = min(thumb_utils.THUMB_SIZES, key=lambda s: (s < size, abs(s - size)))
+    fmt = (request.args.get('fmt') or '').lower()
+    if fmt not in thumb_utils.THUMB_FORMATS:
+        fmt = 'webp' if 'image/webp' in (request.headers.get('Accept') or '') else 'jpeg'
+
+    cache = thumb_utils.get_thumbnail_cache(config.THUMBNAIL_DIR)
+    key = cache.key_for(full_path, st, size, fmt)
+    # URL 带 v（源文件 mtime）时内容不可变，可长期缓存；否则每次用 ETag 协商
+    if request.args.get('v'):
+        cache_control = 'private, max-age=604800, immutable'
+    else:
+        cache_control = 'private, no-cache'
+    if request.if_none_match.contains(key):
+        resp = current_app.response_class(status=304)
+        resp.set_etag(key)
+        resp.headers['Cache-Control'] = cache_control
+        resp.headers['Vary'] = 'Accept'
+        return resp
+
+    try:
+        thumb_path, key = cache.get(full_path, st, size, fmt)
+    except Exception as e:
+        print(f"生成缩略图失败 {full_path}: {e}")
+        return serve_file(path)
+
+    resp = send_file(
+        thumb_path,
+        mimetype=thumb_utils.THUMB_FORMATS[fmt][1],
+        etag=key,
+        conditional=True,
+        max_age=None,
+    )
+    resp.headers['Cache-Control'] = cache_control
+    resp.headers['Vary'] = 'Accept'
+    return resp
 
 
 @file_bp.route('/api/file/read')
@@ -220,6 +351,9 @@ def api_file_read():
     if os.path.isdir(full_path):
         return {'success': False, 'error': {'message': '不能读取目录'}}
     
+    if os.path.getsize(full_path) > file_utils.TEXT_READ_MAX_BYTES:
+        return {'success': False, 'error': {'message': '文件过大，请使用 /api/file/lines 分页读取'}}, 413
+
     try:
         with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read()
@@ -228,6 +362,301 @@ def api_file_read():
         return {'success': False, 'error': {'message': str(e)}}
 
 
+@file_bp.route('/api/file/lines')
+def api_file_lines():
+    """按行窗口读取大文本文件：start/count 读取任意一页（start 为负数时从末尾倒数），
+    after=<字节偏移> 读取之后新追加的完整行（跟随模式）"""
+    path = request.args.get('path', '')
+    if not path:
+        return jsonify({'success': False, 'error': {'message': '缺少 path 参数'}}), 400
+    root_dir = _get_root_dir()
+    full_path = os.path.normpath(os.path.join(root_dir, path))
+    if not full_path.startswith(root_dir):
+        return jsonify({'success': False, 'error': {'message': '非法路径'}}), 403
+    if not os.path.isfile(full_path):
+        return jsonify({'success': False, 'error': {'message': '文件不存在'}}), 404
+
+    reader = lineindex_utils.get_line_reader()
+    try:
+        count = int(request.args.get('count', TEXT_VIEW_WINDOW_LINES))
+        after = request.args.get('after')
+        if after is not None and after != '':
+            data = reader.follow(full_path, int(after), count)
+        else:
+            data = reader.window(full_path, int(request.args.get('start', 0)), count)
+    except ValueError:
+        return jsonify({'success': False, 'error': {'message': '参数无效'}}), 400
+    except OSError as e:
+        return jsonify({'success': False, 'error': {'message': str(e)}}), 500
+    return jsonify({'success': True, 'data': data})
+
+
+def _json_error(message, status):
+    return jsonify({'success': False, 'error': {'message': message}}), status
+
+
+def _resolve_csv(path):
+    """返回 (CsvIndex, None) 或 (None, 错误响应)"""
+    if not path:
+        return None, _json_error('缺少 path 参数', 400)
+    root_dir = _get_root_dir()
+    full_path = os.path.normpath(os.path.join(root_dir, path))
+    if not full_path.startswith(root_dir):
+        return None, _json_error('非法路径', 403)
+    if not os.path.isfile(full_path):
+        return None, _json_error('文件不存在', 404)
+    try:
+        return csv_utils.get_csv_service(config.CSV_INDEX_DIR).get(full_path), None
+    except (OSError, csv_utils.CsvError) as e:
+        return None, _json_error(str(e), getattr(e, 'status', 500))
+
+
+def _ensure_csv_index(index):
+    """索引未建完时在后台任务中继续建立，返回任务 id"""
+    service = csv_utils.get_csv_service(config.CSV_INDEX_DIR)
+    with index.lock:
+        if index.complete or index.building:
+            return index.task_id
+        index.building = True
+
+    def _run(task_id):
+        update_task(task_id, status='running', progress=0.0, message='建立行索引…')
+
+        def _report(done, total, rows):
+            update_task(task_id, progress=done * 100.0 / total if total else None, message=f'已索引 {rows} 行')
+
+        try:
+            if index.build(on_progress=_report, cancelled=lambda: is_task_cancelled(task_id)):
+                service.save(index)
+                update_task(task_id, progress=100.0, message=f'共 {index.rows} 行')
+            else:
+                raise csv_utils.CsvError('已取消')
+        finally:
+            index.building = False
+
+    index.task_id = create_task(_run, name='csv:index', priority=scheduler_utils.PRIORITY_HIGH)
+    return index.task_id
+
+
+@file_bp.route('/api/csv/meta')
+def api_csv_meta():
+    """CSV/TSV 的列、方言与索引进度；首次访问时在后台建立行索引"""
+    index, err = _resolve_csv(request.args.get('path', ''))
+    if err:
+        return err
+    data = index.describe()
+    data['taskId'] = _ensure_csv_index(index)
+    return jsonify({'success': True, 'data': data})
+
+
+@file_bp.route('/api/csv/rows')
+def api_csv_rows():
+    """按行分页读取；columns 为逗号分隔的列名或序号，filter 为 JSON 数组
+    [{"column": ..., "op": "contains", "value": ...}]，带过滤时 next_offset 是继续扫描的游标"""
+    index, err = _resolve_csv(request.args.get('path', ''))
+    if err:
+        return err
+    _ensure_csv_index(index)
+    columns = [c for c in (request.args.get('columns') or '').split(',') if c != ''] or None
+    try:
+        filters = json.loads(request.args.get('filter') or '[]')
+        if not isinstance(filters, list):
+            raise ValueError()
+        data = index.page(
+            offset=int(request.args.get('offset', 0)),
+            limit=int(request.args.get('limit', 100)),
+            columns=columns,
+            filters=filters,
+        )
+    except ValueError:
+        return _json_error('参数无效', 400)
+    except csv_utils.CsvError as e:
+        return _json_error(str(e), e.status)
+    data['columns'] = [index.columns[csv_utils.column_index(c, index.columns)] for c in columns] if columns else index.columns
+    return jsonify({'success': True, 'data': data})
+
+
+@file_bp.route('/api/csv/stats')
+def api_csv_stats():
+    """列统计（min/max/mean/唯一值数量），已算过的直接返回，否则在后台任务中计算"""
+    index, err = _resolve_csv(request.args.get('path', ''))
+    if err:
+        return err
+    column = request.args.get('column', '')
+    try:
+        name = index.columns[csv_utils.column_index(column, index.columns)]
+    except csv_utils.CsvError as e:
+        return _json_error(str(e), e.status)
+    if name in index.stats:
+        return jsonify({'success': True, 'data': {'stats': index.stats[name]}})
+    return jsonify({'success': True, 'data': {'taskId': _start_csv_stats(index, name)}}), 202
+
+
+def _start_csv_stats(index, name):
+    """在后台任务中统计一列，同一列同时只统计一次，返回任务 id"""
+    with index.lock:
+        task_id = index.stats_tasks.get(name)
+        if task_id is not None:
+            return task_id
+
+        def _run(task_id):
+            update_task(task_id, status='running', progress=0.0, message=f'统计列 {name}…')
+            try:
+                index.compute_stats(
+                    name,
+                    on_progress=lambda done, total: update_task(task_id, progress=done * 100.0 / total if total else None),
+                    cancelled=lambda: is_task_cancelled(task_id),
+                )
+                if index.complete:
+                    csv_utils.get_csv_service(config.CSV_INDEX_DIR).save(index)
+                update_task(task_id, progress=100.0, message='统计完成')
+            finally:
+                with index.lock:
+                    index.stats_tasks.pop(name, None)
+
+        task_id = create_task(_run, name='csv:stats', queue='cpu', priority=scheduler_utils.PRIORITY_HIGH)
+        index.stats_tasks[name] = task_id
+    return task_id
+
+
+def _resolve_workbook(path):
+    """返回 (Workbook, None) 或 (None, 错误响应)"""
+    if not path:
+        return None, _json_error('缺少 path 参数', 400)
+    root_dir = _get_root_dir()
+    full_path = os.path.normpath(os.path.join(root_dir, path))
+    if not full_path.startswith(root_dir):
+        return None, _json_error('非法路径', 403)
+    if not os.path.isfile(full_path):
+        return None, _json_error('文件不存在', 404)
+    try:
+        return xlsx_utils.get_workbook_service().get(full_path), None
+    except (OSError, xlsx_utils.XlsxError) as e:
+        return None, _json_error(str(e), getattr(e, 'status', 500))
+
+
+def _start_sheet_parse(workbook, index):
+    """在后台任务中解析工作表，同一工作表同时只解析一次，返回任务 id"""
+    with workbook.lock:
+        task_id = workbook.tasks.get(index)
+        if task_id is not None:
+            return task_id
+        name = workbook.sheets[index]['name']
+
+        def _run(task_id):
+            update_task(task_id, status='running', progress=0.0, message=f'解析工作表 {name}…')
+            try:
+                sheet = workbook.parse_sheet(
+                    index,
+                    on_progress=lambda done, total: update_task(
+                        task_id, progress=done * 100.0 / total if total else None,
+                    ),
+                    cancelled=lambda: is_task_cancelled(task_id),
+                )
+                update_task(task_id, progress=100.0, message=f'{sheet.n_rows} 行 × {sheet.n_cols} 列')
+            finally:
+                with workbook.lock:
+                    workbook.tasks.pop(index, None)
+
+        task_id = create_task(_run, name='xlsx:parse', queue='cpu', priority=scheduler_utils.PRIORITY_HIGH)
+        workbook.tasks[index] = task_id
+    return task_id
+
+
+@file_bp.route('/api/xlsx/sheets')
+def api_xlsx_sheets():
+    """工作表列表与声明的尺寸；不解析单元格"""
+    workbook, err = _resolve_workbook(request.args.get('path', ''))
+    if err:
+        return err
+    return jsonify({'success': True, 'data': {'sheets': workbook.describe()}})
+
+
+@file_bp.route('/api/xlsx/cells')
+def api_xlsx_cells():
+    """读取工作表的一块区域 [row, row+rows) × [col, col+cols)；
+    工作表尚未解析时启动后台解析并返回 202 与 taskId"""
+    workbook, err = _resolve_workbook(request.args.get('path', ''))
+    if err:
+        return err
+    try:
+        index = workbook.sheet_index(request.args.get('sheet', '0'))
+        sheet = workbook.parsed.get(index)
+        if sheet is None:
+            return jsonify({'success': True, 'data': {'taskId': _start_sheet_parse(workbook, index)}}), 202
+        data = sheet.window(
+            workbook,
+            row=int(request.args.get('row', 0)),
+            rows=int(request.args.get('rows', 100)),
+            col=int(request.args.get('col', 0)),
+            cols=int(request.args.get('cols', 50)),
+        )
+    except ValueError:
+        return _json_error('参数无效', 400)
+    except xlsx_utils.XlsxError as e:
+        return _json_error(str(e), e.status)
+    data['sheet'] = index
+    return jsonify({'success': True, 'data': data})
+
+
+def _resolve_json_path(path):
+    """返回 (完整路径, None) 或 (None, 错误响应)"""
+    if not path:
+        return None, _json_error('缺少 path 参数', 400)
+    root_dir = _get_root_dir()
+    full_path = os.path.normpath(os.path.join(root_dir, path))
+    if not full_path.startswith(root_dir):
+        return None, _json_error('非法路径', 403)
+    if not os.path.isfile(full_path):
+        return None, _json_error('文件不存在', 404)
+    return full_path, None
+
+
+@file_bp.route('/api/json/node')
+def api_json_node():
+    """按 JSON Pointer 读取节点：容器返回一页直接子节点（类型、字节大小、元素数量），
+    value=1 时返回节点的完整值"""
+    full_path, err = _resolve_json_path(request.args.get('path', ''))
+    if err:
+        return err
+    pointer = request.args.get('pointer', '')
+    try:
+        doc = jsonindex_utils.get_json_service().get(full_path)
+        data = doc.node(
+            pointer,
+            offset=int(request.args.get('offset', 0)),
+            limit=int(request.args.get('limit', 200)),
+        )
+        if request.args.get('value') in ('1', 'true'):
+            data['value'] = doc.value(pointer)
+    except ValueError:
+        return _json_error('参数无效', 400)
+    except jsonindex_utils.JsonIndexError as e:
+        return _json_error(str(e), e.status)
+    return jsonify({'success': True, 'data': data})
+
+
+@file_bp.route('/api/json/patch', methods=['POST'])
+def api_json_patch():
+    """替换 pointer 处的子树并保存，文件其余部分按字节原样保留"""
+    payload = request.get_json(silent=True) or {}
+    full_path, err = _resolve_json_path(payload.get('path', ''))
+    if err:
+        return err
+    if 'value' not in payload:
+        return _json_error('缺少 value 参数', 400)
+    pointer = payload.get('pointer') or ''
+    try:
+        mtime_ns = jsonindex_utils.get_json_service().patch(
+            full_path, pointer, payload['value'], expected_mtime_ns=payload.get('mtime_ns'),
+        )
+    except ValueError:
+        return _json_error('参数无效', 400)
+    except jsonindex_utils.JsonIndexError as e:
+        return _json_error(str(e), e.status)
+    return jsonify({'success': True, 'data': {'pointer': pointer, 'mtime_ns': str(mtime_ns)}})
+
+
 @file_bp.route('/api/file/write', methods=['POST'])
 def api_file_write():
     """写入文件内容（用于创建 URL 文件等）"""
@@ -294,28 +723,15 @@ def send_file_email():
         return jsonify({'success': False, 'error': str(e)})
 
 
-# 邮箱历史记录
-EMAIL_HISTORY_DIR = config.DATA_DIR
-EMAIL_HISTORY_FILE = os.path.join(EMAIL_HISTORY_DIR, 'email_history.json')
+# 邮箱历史记录（状态库 email/history，最近使用的在前）
+EMAIL_HISTORY_LIMIT = 10
 
 def load_email_history():
-    try:
-        os.makedirs(EMAIL_HISTORY_DIR, exist_ok=True)
-        if os.path.exists(EMAIL_HISTORY_FILE):
-            with open(EMAIL_HISTORY_FILE, 'r') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"Email history error: {e}")
-        pass
-    return []
+    emails = state_utils.get_state_store().get(state_utils.NS_EMAIL, 'history')
+    return emails if isinstance(emails, list) else []
 
 def save_email_history(emails):
-    try:
-        with open(EMAIL_HISTORY_FILE, 'w') as f:
-            json.dump(emails, f, ensure_ascii=False)
-    except Exception as e:
-        print(f"Email history error: {e}")
-        pass
+    state_utils.get_state_store().set(state_utils.NS_EMAIL, 'history', list(emails))
 
 @file_bp.route('/api/email/history', methods=['GET'])
 def get_email_history():
@@ -329,44 +745,34 @@ def add_email_history():
     if not email or not re.match(r"^[^\s@]+@[^\s@]+\.[^\s@]+$", email):
         return jsonify({'success': False, 'error': '邮箱不能为空'})
     
-    emails = load_email_history()
-    if email in emails:
-        emails.remove(email)
-    emails.insert(0, email)
-    emails = emails[:10]  # 保留最近10个
-    save_email_history(emails)
+    def _push(emails):
+        emails = [e for e in (emails if isinstance(emails, list) else []) if e != email]
+        return [email] + emails[:EMAIL_HISTORY_LIMIT - 1]  # 保留最近10个
+
+    state_utils.get_state_store().update(state_utils.NS_EMAIL, 'history', _push, default=[])
     return jsonify({'success': True})
 
 @file_bp.route('/api/email/history', methods=['DELETE'])
 def delete_email_history():
     data = request.json or {}
     email = data.get('email', '').strip()
-    emails = load_email_history()
-    if email in emails:
-        emails.remove(email)
-        save_email_history(emails)
+    state_utils.get_state_store().update(
+        state_utils.NS_EMAIL, 'history',
+        lambda emails: [e for e in (emails if isinstance(emails, list) else []) if e != email],
+        default=[],
+    )
     return jsonify({'success': True})
 
 
 # Email config
-EMAIL_CONFIG_FILE = os.path.join(config.DATA_DIR, 'email_config.json')
-
 def load_email_config():
-    try:
-        if os.path.exists(EMAIL_CONFIG_FILE):
-            with open(EMAIL_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
+    cfg = state_utils.get_state_store().get(state_utils.NS_EMAIL, 'config')
+    if isinstance(cfg, dict):
+        return cfg
     return {'smtp_host': '', 'smtp_port': 465, 'smtp_ssl': 'ssl', 'smtp_user': '', 'smtp_pass': '', 'smtp_from': ''}
 
 def save_email_config(config_data):
-    try:
-        os.makedirs(os.path.dirname(EMAIL_CONFIG_FILE), exist_ok=True)
-        with open(EMAIL_CONFIG_FILE, 'w') as f:
-            json.dump(config_data, f)
-    except:
-        pass
+    state_utils.get_state_store().set(state_utils.NS_EMAIL, 'config', config_data)
 
 @file_bp.route('/email-config')
 def email_config_page():
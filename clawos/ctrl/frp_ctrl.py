@@ -324,7 +324,7 @@ def api_frp_install():
         _ensure_frpc_config()
         _ensure_frpc_service(task_id)
 
-    task_id = create_task(lambda tid: _install(tid, True), name='frp install')
+    task_id = create_task(lambda tid: _install(tid, True), name='frp install', queue='system')
     return api_ok({'taskId': task_id})
 
 @frp_bp.route('/api/frp/reinstall', methods=['POST'])
@@ -382,7 +382,7 @@ def api_frp_reinstall():
         _ensure_frpc_config()
         _ensure_frpc_service(task_id)
 
-    task_id = create_task(_do, name='frp reinstall')
+    task_id = create_task(_do, name='frp reinstall', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -423,5 +423,5 @@ def api_frp_uninstall():
     def _do(task_id):
         _do_uninstall(task_id)
 
-    task_id = create_task(_do, name='frp uninstall')
+    task_id = create_task(_do, name='frp uninstall', queue='system')
     return api_ok({'taskId': task_id})
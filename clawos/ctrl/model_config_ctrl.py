@@ -4,9 +4,7 @@
 AI 模型评测控制器 - 后台任务版
 """
 
-import os
 import sys
-import json
 import time
 import requests
 import threading
@@ -14,7 +12,7 @@ import traceback
 from urllib.parse import urlparse
 from flask import Blueprint, jsonify, request, current_app, send_from_directory, redirect
 
-import config
+from lib import state_utils
 
 model_config_bp = Blueprint('model_config', __name__)
 
@@ -28,8 +26,7 @@ def model_config():
 def ai_model_config():
     return send_from_directory(current_app.template_folder, 'model_config.html')
 
-# 评测状态文件
-EVAL_STATE_FILE = os.path.join(config.DATA_DIR, 'model_config_state.json')
+# 评测状态保存在状态库 model_eval/state
 
 # 评测题目
 REASONING_QUESTIONS = [
@@ -138,19 +135,14 @@ def save_models(models):
 
 def load_eval_state():
     """加载评测状态"""
-    if os.path.exists(EVAL_STATE_FILE):
-        try:
-            with open(EVAL_STATE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
+    state = state_utils.get_state_store().get(state_utils.NS_MODEL_EVAL, 'state')
+    if isinstance(state, dict):
+        return state
     return {"running": False, "results": [], "current": {}, "start_time": None}
 
 def save_eval_state(state):
     """保存评测状态"""
-    os.makedirs(os.path.dirname(EVAL_STATE_FILE), exist_ok=True)
-    with open(EVAL_STATE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    state_utils.get_state_store().set(state_utils.NS_MODEL_EVAL, 'state', state)
 
 # ========== API 接口 ==========
 
@@ -484,14 +476,7 @@ def start_eval():
         return jsonify({"success": False, "error": "无效的模型选择"})
     
     # 获取已有结果（不清除）
-    existing_results = []
-    if os.path.exists(EVAL_STATE_FILE):
-        try:
-            with open(EVAL_STATE_FILE, 'r', encoding='utf-8') as f:
-                old_state = json.load(f)
-                existing_results = old_state.get("results", [])
-        except:
-            pass
+    existing_results = load_eval_state().get("results", [])
     
     # 根据 eval_type 决定评测类别
     categories = []
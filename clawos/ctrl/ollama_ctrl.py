@@ -190,7 +190,7 @@ WantedBy=default.target
         
         update_task(task_id, status='completed', message='安装完成！Ollama 服务已启动', progress=100)
 
-    task_id = create_task(_do_install, name='ollama install')
+    task_id = create_task(_do_install, name='ollama install', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -203,7 +203,7 @@ def api_ollama_reinstall():
         _do_uninstall(task_id)
         _do_install(task_id)
 
-    task_id = create_task(_do, name='ollama reinstall')
+    task_id = create_task(_do, name='ollama reinstall', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -215,7 +215,7 @@ def api_ollama_uninstall():
     def _do(task_id):
         _do_uninstall(task_id)
 
-    task_id = create_task(_do, name='ollama uninstall')
+    task_id = create_task(_do, name='ollama uninstall', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -198,7 +198,7 @@ def api_openclaw_install():
         if not r.get('success'):
             raise RuntimeError(r.get('message') or 'install failed')
 
-    task_id = create_task(_do, name='openclaw install')
+    task_id = create_task(_do, name='openclaw install', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -210,7 +210,7 @@ def api_openclaw_reinstall():
         if not r.get('success'):
             raise RuntimeError(r.get('message') or 'install failed')
 
-    task_id = create_task(_do, name='openclaw reinstall')
+    task_id = create_task(_do, name='openclaw reinstall', queue='system')
     return api_ok({'taskId': task_id})
 
 
@@ -221,7 +221,7 @@ def api_openclaw_uninstall():
         if not r.get('success'):
             raise RuntimeError(r.get('message') or 'uninstall failed')
 
-    task_id = create_task(_do, name='openclaw uninstall')
+    task_id = create_task(_do, name='openclaw uninstall', queue='system')
     return api_ok({'taskId': task_id})
 
 
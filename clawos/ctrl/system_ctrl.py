@@ -2,6 +2,8 @@ import json
 import os
 import re
 import subprocess
+import threading
+from collections import OrderedDict
 from flask import Blueprint, request, jsonify
 
 import config
@@ -13,12 +15,14 @@ except ImportError:
 
 from ctrl import api_error, api_ok
 
-from ctrl.task_ctrl import create_task
+from ctrl.task_ctrl import create_task, get_task, is_task_cancelled, update_task
 from lib import (
     disk_utils,
     docker_utils,
+    du_utils,
     network_utils,
     packages_utils,
+    path_utils,
     process_utils,
     systemd_utils,
 )
@@ -340,6 +344,103 @@ def api_disk_list():
     return _wrap(result)
 
 
+_du_analyzer = None
+_DU_RESULTS = OrderedDict()
+_DU_RESULTS_MAX = 8
+_DU_LOCK = threading.Lock()
+
+
+def _get_du_analyzer():
+    global _du_analyzer
+    with _DU_LOCK:
+        if _du_analyzer is None:
+            _du_analyzer = du_utils.DiskUsageAnalyzer(config.DU_CACHE_DB)
+        return _du_analyzer
+
+
+@system_bp.route('/api/disk/usage', methods=['POST'])
+def api_disk_usage():
+    """在后台任务中统计目录占用，结果通过 /api/disk/usage/result 获取"""
+    payload = request.get_json(silent=True) or {}
+    rel = str(payload.get('path') or '').strip().lstrip('/\\')
+    root_dir = os.path.normpath(config.ROOT_DIR)
+    full_path = os.path.normpath(os.path.join(root_dir, rel))
+    if os.path.commonpath([root_dir, full_path]) != root_dir:
+        return api_error('非法路径', status=403)
+    if not os.path.isdir(full_path):
+        return api_error('目录不存在', status=404)
+    try:
+        top = int(payload.get('top', 50))
+        depth = int(payload.get('depth', 3))
+        max_children = int(payload.get('max_children', 50))
+        max_age = payload.get('max_age')
+        max_age = du_utils.DU_CACHE_MAX_AGE if max_age is None else max(0, int(max_age))
+    except (TypeError, ValueError):
+        return api_error('参数无效', status=400)
+    one_fs = payload.get('one_fs', True) is not False
+    refresh = payload.get('refresh') is True
+    base = os.path.relpath(full_path, root_dir).replace(os.sep, '/')
+    base = '' if base == '.' else base
+
+    def _run(task_id):
+        update_task(task_id, status='running', progress=0.0, message='扫描中…')
+
+        def _report(dirs, files, size, expected_dirs):
+            # 以上次分析的目录数估算进度，首次分析只显示计数
+            pct = min(99.0, dirs * 100.0 / expected_dirs) if expected_dirs else None
+            update_task(task_id, progress=pct, message=f'已扫描 {dirs} 个目录，{files} 个文件，{path_utils.format_size(size)}')
+
+        result = _get_du_analyzer().analyze(
+            full_path, top=top, one_fs=one_fs,
+            cancelled=lambda: is_task_cancelled(task_id),
+            on_progress=_report,
+            max_age=max_age, refresh=refresh,
+        )
+
+        def _prefix(p):
+            if p is None or not base:
+                return p
+            return base + '/' + p if p else base
+
+        def _walk(node):
+            node['path'] = _prefix(node.get('path'))
+            for child in node.get('children') or []:
+                _walk(child)
+            return node
+
+        tree = _walk(result.tree(depth=depth, max_children=max_children))
+        tree['name'] = os.path.basename(full_path) or full_path
+        top_files = [{'path': _prefix(it['path']), 'size': it['size']} for it in result.top_files()]
+        with _DU_LOCK:
+            _DU_RESULTS[task_id] = {'path': base, 'tree': tree, 'top': top_files, 'stats': result.stats}
+            while len(_DU_RESULTS) > _DU_RESULTS_MAX:
+                _DU_RESULTS.popitem(last=False)
+        stats = result.stats
+        stats['cache_max_age'] = 0 if refresh else max_age
+        update_task(task_id, progress=100.0, message=(
+            f'共 {stats["dirs"]} 个目录，{stats["files"]} 个文件，{path_utils.format_size(stats["size"])}'
+            f'（{stats["cached_dirs"]} 个目录来自缓存）'
+        ))
+
+    task_id = create_task(_run, name='disk:usage')
+    return api_ok({'taskId': task_id, 'path': base})
+
+
+@system_bp.route('/api/disk/usage/result')
+def api_disk_usage_result():
+    task_id = request.args.get('taskId', '').strip()
+    if not task_id:
+        return api_error('taskId required', status=400)
+    with _DU_LOCK:
+        result = _DU_RESULTS.get(task_id)
+    if result is not None:
+        return api_ok(result)
+    task = get_task(task_id)
+    if not task:
+        return api_error('task not found', status=404)
+    return api_error(task.get('message') or '分析尚未完成', status=409)
+
+
 @system_bp.route('/api/network/list')
 def api_network_list():
     result = network_utils.list_network()
@@ -1,71 +1,100 @@
-import threading
-import time
-import uuid
-import inspect
-
 from flask import Blueprint, jsonify, request
+from flask_socketio import emit, join_room, leave_room
+
+from lib import scheduler_utils, state_utils, taskevent_utils
+
+
+# 结束的任务写入状态库，保留最近这么多条
+TASK_HISTORY_KEEP = 500
+TASK_LIST_LIMIT = 500
+# 批量查询 / 订阅一次最多接受的任务数
+TASK_BATCH_LIMIT = 200
+
+
+def _save_history(record):
+    store = state_utils.get_state_store()
+    with store.transaction():
+        store.append(state_utils.NS_TASK_HISTORY, record)
+        store.log_trim(state_utils.NS_TASK_HISTORY, TASK_HISTORY_KEEP)
+
+
+# Socket.IO 注册后才有事件合并器；未注册时任务变化只更新内存
+_EVENTS = None
+
 
+def _publish(record):
+    if _EVENTS is not None:
+        _EVENTS.publish(record)
 
-_TASKS = {}
-_LOCK = threading.Lock()
+
+_SCHEDULER = scheduler_utils.TaskScheduler(on_finish=_save_history, on_change=_publish)
 
 
 def update_task(task_id, status=None, message=None, progress=None):
-    with _LOCK:
-        if task_id not in _TASKS:
-            return False
-        if isinstance(status, str) and status:
-            _TASKS[task_id]['status'] = status
-        if isinstance(message, str):
-            _TASKS[task_id]['message'] = message
-        if progress is not None:
-            try:
-                p = float(progress)
-            except Exception:
-                p = None
-            if p is not None:
-                if p < 0:
-                    p = 0.0
-                if p > 100:
-                    p = 100.0
-                _TASKS[task_id]['progress'] = p
-        return True
-
-
-def create_task(run_fn, name=None):
-    task_id = uuid.uuid4().hex
-    with _LOCK:
-        _TASKS[task_id] = {
-            'taskId': task_id,
-            'name': name or '',
-            'status': 'pending',
-            'message': '',
-            'progress': 0.0,
-            'createdAt': int(time.time() * 1000),
-        }
+    return _SCHEDULER.update(task_id, status=status, message=message, progress=progress)
+
+
+def cancel_task(task_id):
+    """请求取消任务：排队中的任务立即取消；运行中的任务通过 is_task_cancelled / 取消令牌自行退出"""
+    return _SCHEDULER.cancel(task_id)
+
+
+def is_task_cancelled(task_id):
+    return _SCHEDULER.is_cancelled(task_id)
+
+
+def create_task(run_fn, name=None, queue=scheduler_utils.DEFAULT_QUEUE, priority=scheduler_utils.PRIORITY_NORMAL):
+    """提交后台任务，返回任务 id
 
-    def _runner():
-        try:
-            try:
-                sig = inspect.signature(run_fn)
-                if len(sig.parameters) >= 1:
-                    run_fn(task_id)
-                else:
-                    run_fn()
-            except (TypeError, ValueError):
-                run_fn()
-            update_task(task_id, status='success', progress=100.0)
-        except Exception as e:
-            update_task(task_id, status='failed', message=str(e))
-
-    t = threading.Thread(target=_runner, daemon=True)
-    t.start()
-    return task_id
+    run_fn 可以不带参数、接收 task_id，或接收 (task_id, cancel_token)。
+    queue 选择并发受限的执行队列（io / cpu / system），priority 越大越先执行。
+    """
+    return _SCHEDULER.submit(run_fn, name=name, queue=queue, priority=priority)
 
 
 def get_task(task_id):
-    with _LOCK:
-        return dict(_TASKS.get(task_id) or {})
+    return _SCHEDULER.get(task_id)
+
+
+def list_tasks(status='all', queue=None, limit=100):
+    """内存中的任务加上持久化的历史记录，按创建时间倒序"""
+    tasks = {t['taskId']: t for t in _SCHEDULER.list()}
+    if status != 'active':
+        store = state_utils.get_state_store()
+        for _, record in store.log_page(state_utils.NS_TASK_HISTORY, limit=TASK_HISTORY_KEEP):
+            if isinstance(record, dict) and record.get('taskId') not in tasks:
+                tasks[record.get('taskId')] = record
+    out = []
+    for task in tasks.values():
+        active = task.get('status') in scheduler_utils.ACTIVE_STATUSES
+        if (status == 'active' and not active) or (status == 'finished' and active):
+            continue
+        if queue and task.get('queue') != queue:
+            continue
+        out.append(task)
+    out.sort(key=lambda t: t.get('createdAt') or 0, reverse=True)
+    return out[:limit]
+
+
+def _clean_task_ids(task_ids):
+    out = []
+    for task_id in task_ids:
+        task_id = str(task_id or '').strip()
+        if task_id and task_id not in out:
+            out.append(task_id)
+    return out
+
+
+def _status_payload(task_id):
+    task = get_task(task_id)
+    if not task:
+        return {
+            'success': False,
+            'error': {'message': 'task not found'},
+            'taskId': task_id,
+            'status': 'failed',
+        }
+    return taskevent_utils.task_payload(task)
 
 
 task_bp = Blueprint('task', __name__)
@@ -79,18 +108,121 @@ def api_task_status():
             'success': False,
             'error': {'message': 'taskId required'},
         }), 400
-    task = get_task(task_id)
-    if not task:
+    payload = _status_payload(task_id)
+    return jsonify(payload), 200 if payload['success'] else 404
+
+
+@task_bp.route('/api/task/status/batch', methods=['GET', 'POST'])
+def api_task_status_batch():
+    """一次查询多个任务：GET ?taskIds=a,b 或 POST {"taskIds": [...]}"""
+    payload = request.get_json(silent=True) or {}
+    task_ids = payload.get('taskIds')
+    if not isinstance(task_ids, list):
+        task_ids = (request.args.get('taskIds') or '').split(',')
+    task_ids = _clean_task_ids(task_ids)
+    if not task_ids:
         return jsonify({
             'success': False,
-            'error': {'message': 'task not found'},
-            'taskId': task_id,
-            'status': 'failed',
-        }), 404
+            'error': {'message': 'taskIds required'},
+        }), 400
+    if len(task_ids) > TASK_BATCH_LIMIT:
+        return jsonify({
+            'success': False,
+            'error': {'message': f'at most {TASK_BATCH_LIMIT} taskIds'},
+        }), 400
+    return jsonify({'success': True, 'tasks': {task_id: _status_payload(task_id) for task_id in task_ids}})
+
+
+@task_bp.route('/api/task/list')
+def api_task_list():
+    """任务列表：status=active|finished|all，可按 queue 过滤"""
+    status = request.args.get('status', 'all')
+    if status not in ('active', 'finished', 'all'):
+        return jsonify({
+            'success': False,
+            'error': {'message': 'status must be active, finished or all'},
+        }), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 100)), TASK_LIST_LIMIT))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': {'message': 'invalid limit'},
+        }), 400
+    tasks = list_tasks(status=status, queue=request.args.get('queue') or None, limit=limit)
     return jsonify({
         'success': True,
-        'taskId': task_id,
-        'status': task.get('status'),
-        'message': task.get('message', ''),
-        'progress': task.get('progress', 0.0),
+        'data': {'tasks': tasks, 'queues': _SCHEDULER.queue_stats()},
     })
+
+
+@task_bp.route('/api/task/cancel', methods=['POST'])
+def api_task_cancel():
+    payload = request.get_json(silent=True) or {}
+    task_ids = payload.get('taskIds')
+    if isinstance(task_ids, list):
+        # 批量取消：逐个返回结果，不因单个失败而整体报错
+        results = {}
+        for task_id in _clean_task_ids(task_ids)[:TASK_BATCH_LIMIT]:
+            if not get_task(task_id):
+                results[task_id] = 'not_found'
+            elif cancel_task(task_id):
+                results[task_id] = get_task(task_id).get('status')
+            else:
+                results[task_id] = 'finished'
+        return jsonify({'success': True, 'results': results})
+    task_id = (payload.get('taskId') or request.args.get('taskId') or '').strip()
+    if not task_id:
+        return jsonify({
+            'success': False,
+            'error': {'message': 'taskId required'},
+        }), 400
+    if not get_task(task_id):
+        return jsonify({
+            'success': False,
+            'error': {'message': 'task not found'},
+        }), 404
+    if not cancel_task(task_id):
+        return jsonify({
+            'success': False,
+            'error': {'message': 'task already finished'},
+        }), 409
+    return jsonify({'success': True, 'taskId': task_id, 'status': get_task(task_id).get('status')})
+
+
+def register_task_socketio(socketio):
+    """/tasks 命名空间：客户端按任务订阅房间，进度按 TASK_EVENTS_PER_SECOND 合并推送
+
+    subscribe {"taskIds": [...]} 加入各任务的房间并立即收到一次当前状态；
+    subscribe {"all": true} 接收所有任务的事件（任务列表页使用）。事件名为 task，
+    内容与 /api/task/status 的响应相同。
+    """
+    global _EVENTS
+
+    def _emit(record):
+        payload = taskevent_utils.task_payload(record)
+        socketio.emit('task', payload, room='task:' + record['taskId'], namespace='/tasks')
+        socketio.emit('task', payload, room='tasks:all', namespace='/tasks')
+
+    _EVENTS = taskevent_utils.TaskEventCoalescer(_emit)
+    socketio.start_background_task(_EVENTS.run, socketio.sleep)
+
+    def tasks_subscribe(data):
+        data = data if isinstance(data, dict) else {}
+        if data.get('all'):
+            join_room('tasks:all')
+        task_ids = data.get('taskIds')
+        for task_id in _clean_task_ids(task_ids if isinstance(task_ids, list) else [])[:TASK_BATCH_LIMIT]:
+            join_room('task:' + task_id)
+            emit('task', _status_payload(task_id))
+
+    def tasks_unsubscribe(data):
+        data = data if isinstance(data, dict) else {}
+        if data.get('all'):
+            leave_room('tasks:all')
+        task_ids = data.get('taskIds')
+        for task_id in _clean_task_ids(task_ids if isinstance(task_ids, list) else []):
+            leave_room('task:' + task_id)
+
+    socketio.on('subscribe', namespace='/tasks')(tasks_subscribe)
+    socketio.on('unsubscribe', namespace='/tasks')(tasks_unsubscribe)
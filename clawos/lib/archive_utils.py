@@ -0,0 +1,788 @@
+import os
+import queue
+import re
+import shutil
+import struct
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from lib import path_utils
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ARCHIVE_STREAM_FORMATS = {
+    'zip': 'application/zip',
+    'tar': 'application/x-tar',
+    'tar.gz': 'application/gzip',
+}
+ZIP_COMPRESSIONS = {'stored': zipfile.ZIP_STORED, 'deflate': zipfile.ZIP_DEFLATED}
+
+_COPY_BLOCK = 1024 * 1024
+_FLUSH_BYTES = 256 * 1024
+# 生产者最多领先消费者的块数，决定了内存上限（约 _QUEUE_DEPTH * _FLUSH_BYTES）
+_QUEUE_DEPTH = 16
+
+
+class _StreamClosed(Exception):
+    pass
+
+
+class _QueueSink:
+    """只写、不可 seek 的文件对象：攒够一定字节后放入有界队列，由响应生成器取走"""
+
+    def __init__(self, q, cancelled):
+        self._q = q
+        self._cancelled = cancelled
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        if len(self._buf) >= _FLUSH_BYTES:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self._buf:
+            return
+        chunk = bytes(self._buf)
+        self._buf.clear()
+        self._put(chunk)
+
+    def _put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise _StreamClosed()
+            try:
+                self._q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+
+def _write_zip(sink, entries, compression):
+    # 输出不可 seek 时 zipfile 自动使用数据描述符，边读边写
+    with zipfile.ZipFile(sink, 'w', compression=compression, allowZip64=True) as zf:
+        for kind, fp, arc in entries:
+            if kind == 'dir':
+                arc_dir = arc.rstrip('/') + '/'
+                try:
+                    info = zipfile.ZipInfo.from_file(fp, arc_dir)
+                except OSError:
+                    info = zipfile.ZipInfo(arc_dir)
+                zf.writestr(info, b'')
+                continue
+            try:
+                info = zipfile.ZipInfo.from_file(fp, arc)
+                src = open(fp, 'rb')
+            except OSError:
+                continue
+            info.compress_type = compression
+            with src, zf.open(info, 'w') as dst:
+                while True:
+                    chunk = src.read(_COPY_BLOCK)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+
+
+def _write_tar(sink, entries, mode):
+    with tarfile.open(fileobj=sink, mode=mode) as tf:
+        for kind, fp, arc in entries:
+            try:
+                if kind == 'dir':
+                    tf.add(fp, arcname=arc.rstrip('/'), recursive=False)
+                else:
+                    tf.add(fp, arcname=arc, recursive=False)
+            except OSError:
+                continue
+            # 流式模式下 members 只会增长，写完即可丢弃
+            tf.members.clear()
+
+
+def stream_archive(entries, fmt='zip', compression='deflate'):
+    """把 (kind, 源路径, 包内路径) 序列实时打包为 zip / tar / tar.gz，逐块产出字节
+
+    打包在后台线程中进行，经有界队列交给调用方；不落临时文件，内存占用与文件数、大小无关。
+    调用方停止迭代（如客户端断开）时打包线程随之退出。
+    """
+    q = queue.Queue(maxsize=_QUEUE_DEPTH)
+    cancelled = threading.Event()
+    sink = _QueueSink(q, cancelled)
+    errors = []
+
+    def _produce():
+        try:
+            if fmt == 'zip':
+                _write_zip(sink, entries, ZIP_COMPRESSIONS.get(compression, zipfile.ZIP_DEFLATED))
+            else:
+                _write_tar(sink, entries, 'w|gz' if fmt == 'tar.gz' else 'w|')
+            sink.flush()
+        except _StreamClosed:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                sink._put(None)
+            except _StreamClosed:
+                pass
+
+    worker = threading.Thread(target=_produce, name='archive-stream', daemon=True)
+    worker.start()
+    try:
+        while True:
+            chunk = q.get()
+            if chunk is None:
+                break
+            yield chunk
+        if errors:
+            print(f"打包下载失败: {errors[0]}")
+    finally:
+        cancelled.set()
+
+
+def archive_download_name(name, fmt):
+    name = os.path.basename((name or '').strip()) or 'download'
+    suffix = '.' + fmt
+    if not name.lower().endswith(suffix):
+        if fmt.startswith('tar.') and name.lower().endswith('.tar'):
+            name += fmt[3:]
+        else:
+            name += suffix
+    return name
+
+
+ARCHIVE_CREATE_FORMATS = ('zip', 'tar.gz', 'tar.zst')
+ARCHIVE_WORKERS = max(1, int(os.getenv('CLAWOS_ARCHIVE_WORKERS', '0')) or (os.cpu_count() or 1))
+DEFLATE_LEVEL = 6
+DEFLATE_BLOCK_SIZE = 1024 * 1024
+ZSTD_LEVEL = 3
+# deflate 对这些已压缩格式几乎无收益，zip 中直接存储
+STORED_EXTENSIONS = {
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar', '.jar', '.apk', '.whl',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp3', '.m4a', '.aac', '.ogg', '.flac', '.opus',
+    '.mp4', '.m4v', '.mkv', '.mov', '.webm', '.avi',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.odt',
+}
+
+_DICT_SIZE = 32 * 1024
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_MEMBER_LIMIT = int(_ZIP64_LIMIT * 0.95)
+
+
+def _deflate_block(data, dictionary, level, last):
+    """压缩一个块为 raw deflate；非最后一块以 Z_SYNC_FLUSH 字节对齐结束，可直接拼接"""
+    if dictionary:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, 9)
+    out = c.compress(data)
+    return out + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelDeflater:
+    """pigz 式的分块并行 deflate
+
+    每块在线程池中独立压缩（以前一块末尾 32 KB 作为字典，压缩率接近单线程），
+    结果连同插入的原始字节与回调按提交顺序写出；在途块数有上限，内存占用固定。
+    """
+
+    def __init__(self, write, workers=ARCHIVE_WORKERS, level=DEFLATE_LEVEL):
+        self._write = write
+        self.level = level
+        self.workers = max(1, int(workers))
+        # 单核时线程池只有调度开销，直接在调用线程压缩
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='deflate') if self.workers > 1 else None
+        self._pending = deque()
+        self._max_pending = self.workers * 2 + 2
+        self._tail = b''
+
+    def begin(self):
+        """开始一个新的 deflate 流"""
+        self._tail = b''
+
+    def feed(self, block, last):
+        if self._pool is None:
+            future = _deflate_block(block, self._tail, self.level, last)
+        else:
+            future = self._pool.submit(_deflate_block, block, self._tail, self.level, last)
+        self._tail = block[-_DICT_SIZE:] if len(block) >= _DICT_SIZE else (self._tail + block)[-_DICT_SIZE:]
+        self._enqueue(future)
+
+    def raw(self, data):
+        """按顺序原样写出（存储成员、文件头等）"""
+        self._enqueue(data)
+
+    def call(self, fn):
+        """轮到时执行回调（用于写数据描述符等依赖前序输出的内容）"""
+        self._enqueue(fn)
+
+    def flush(self):
+        self._drain(0)
+
+    def close(self):
+        try:
+            self._drain(0)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _enqueue(self, item):
+        self._pending.append(item)
+        if len(self._pending) > self._max_pending:
+            self._drain(self._max_pending)
+
+    def _drain(self, keep):
+        while len(self._pending) > keep:
+            item = self._pending.popleft()
+            if isinstance(item, Future):
+                self._write(item.result())
+            elif callable(item):
+                item()
+            else:
+                self._write(item)
+
+
+class ParallelGzipWriter:
+    """多线程 gzip 写入器（只写文件对象），输出为标准单成员 gzip，可供 tarfile 'w|' 使用"""
+
+    def __init__(self, fileobj, workers=ARCHIVE_WORKERS, level=DEFLATE_LEVEL, block_size=DEFLATE_BLOCK_SIZE):
+        self._fileobj = fileobj
+        self._block_size = block_size
+        self._buf = bytearray()
+        self._crc = 0
+        self._size = 0
+        self._closed = False
+        self._deflater = ParallelDeflater(fileobj.write, workers=workers, level=level)
+        xfl = 2 if level >= 9 else (4 if level <= 1 else 0)
+        self._deflater.raw(b'\x1f\x8b\x08\x00' + struct.pack('<I', int(time.time())) + bytes([xfl, 3]))
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buf += data
+        while len(self._buf) >= self._block_size:
+            block = bytes(self._buf[:self._block_size])
+            del self._buf[:self._block_size]
+            self._deflater.feed(block, last=False)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._deflater.feed(bytes(self._buf), last=True)
+        self._buf.clear()
+        self._deflater.raw(struct.pack('<II', self._crc & 0xFFFFFFFF, self._size & 0xFFFFFFFF))
+        self._deflater.close()
+
+
+class _ZipMember:
+    __slots__ = ('name', 'flags', 'method', 'dostime', 'dosdate', 'crc', 'csize', 'usize',
+                 'offset', 'data_start', 'external_attr', 'zip64')
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ParallelZipWriter:
+    """并行压缩的 zip 写入器
+
+    成员数据经 ParallelDeflater 按块并行压缩，使用数据描述符（flag bit 3）边压边写，
+    不需要回写文件头，也可写入不可 seek 的流；超过 4 GB 的成员和偏移自动使用 ZIP64。
+    """
+
+    def __init__(self, fileobj, workers=ARCHIVE_WORKERS, level=DEFLATE_LEVEL, block_size=DEFLATE_BLOCK_SIZE):
+        self._fileobj = fileobj
+        self._block_size = block_size
+        self._offset = 0
+        self._members = []
+        self._deflater = ParallelDeflater(self._write, workers=workers, level=level)
+
+    def _write(self, data):
+        self._fileobj.write(data)
+        self._offset += len(data)
+
+    def add_dir(self, path, arcname):
+        try:
+            st = os.stat(path)
+            mtime, mode = st.st_mtime, st.st_mode
+        except OSError:
+            mtime, mode = time.time(), 0o40755
+        m = self._new_member(arcname.rstrip('/') + '/', mtime, mode, zipfile.ZIP_STORED, 0)
+        m.external_attr |= 0x10
+        m.flags &= ~0x08
+        m.csize = m.usize = 0
+        self._deflater.call(lambda: self._write_local_header(m))
+
+    def add_file(self, path, arcname, on_bytes=None):
+        """压缩并写入一个文件；on_bytes(n) 在每读入 n 字节原始数据后调用"""
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return False
+        with f:
+            st = os.fstat(f.fileno())
+            ext = os.path.splitext(arcname)[1].lower()
+            method = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            m = self._new_member(arcname, st.st_mtime, st.st_mode, method, st.st_size)
+            self._deflater.call(lambda: self._write_local_header(m))
+            self._deflater.begin()
+            crc = 0
+            usize = 0
+            block = f.read(self._block_size)
+            while True:
+                nxt = f.read(self._block_size) if block else b''
+                crc = zlib.crc32(block, crc)
+                usize += len(block)
+                last = not nxt
+                if method == zipfile.ZIP_DEFLATED:
+                    self._deflater.feed(block, last)
+                elif block:
+                    self._deflater.raw(block)
+                if on_bytes is not None and block:
+                    on_bytes(len(block))
+                if last:
+                    break
+                block = nxt
+            m.crc = crc & 0xFFFFFFFF
+            m.usize = usize
+            self._deflater.call(lambda: self._write_data_descriptor(m))
+        return True
+
+    def close(self):
+        try:
+            self._deflater.flush()
+            self._write_central_directory()
+        finally:
+            self._deflater.close()
+
+    def _new_member(self, arcname, mtime, mode, method, expected_size):
+        m = _ZipMember()
+        m.name = arcname.encode('utf-8')
+        m.flags = 0x08 | (0x800 if not arcname.isascii() else 0)
+        m.method = method
+        m.dostime, m.dosdate = _dos_datetime(mtime)
+        m.crc = 0
+        m.csize = 0
+        m.usize = 0
+        m.offset = 0
+        m.data_start = 0
+        m.external_attr = (mode & 0xFFFF) << 16
+        m.zip64 = expected_size >= _ZIP64_MEMBER_LIMIT
+        self._members.append(m)
+        return m
+
+    def _write_local_header(self, m):
+        m.offset = self._offset
+        extra = b''
+        size_field = 0
+        if m.zip64:
+            extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0)
+            size_field = _ZIP64_LIMIT
+        version = 45 if m.zip64 else 20
+        crc = m.crc if not m.flags & 0x08 else 0
+        csize = m.csize if not m.flags & 0x08 else size_field
+        usize = m.usize if not m.flags & 0x08 else size_field
+        self._write(struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, version, m.flags, m.method, m.dostime, m.dosdate,
+            crc, csize, usize, len(m.name), len(extra),
+        ) + m.name + extra)
+        m.data_start = self._offset
+
+    def _write_data_descriptor(self, m):
+        m.csize = self._offset - m.data_start
+        if m.zip64:
+            self._write(struct.pack('<IIQQ', 0x08074b50, m.crc, m.csize, m.usize))
+        else:
+            self._write(struct.pack('<IIII', 0x08074b50, m.crc, m.csize, m.usize))
+
+    def _write_central_directory(self):
+        cd_start = self._offset
+        for m in self._members:
+            extra_fields = []
+            usize, csize, offset = m.usize, m.csize, m.offset
+            if usize >= _ZIP64_LIMIT or m.zip64:
+                extra_fields.append(usize)
+                usize = _ZIP64_LIMIT
+            if csize >= _ZIP64_LIMIT or m.zip64:
+                extra_fields.append(csize)
+                csize = _ZIP64_LIMIT
+            if offset >= _ZIP64_LIMIT:
+                extra_fields.append(offset)
+                offset = _ZIP64_LIMIT
+            extra = b''
+            if extra_fields:
+                extra = struct.pack('<HH', 0x0001, 8 * len(extra_fields)) + struct.pack('<%dQ' % len(extra_fields), *extra_fields)
+            version = 45 if extra_fields else 20
+            self._write(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | version, version, m.flags, m.method,
+                m.dostime, m.dosdate, m.crc, csize, usize, len(m.name), len(extra), 0, 0, 0,
+                m.external_attr, offset,
+            ) + m.name + extra)
+        cd_end = self._offset
+        count = len(self._members)
+        cd_size = cd_end - cd_start
+        if count >= 0xFFFF or cd_start >= _ZIP64_LIMIT or cd_size >= _ZIP64_LIMIT:
+            self._write(struct.pack(
+                '<IQHHIIQQQQ', 0x06064b50, 44, (3 << 8) | 45, 45, 0, 0, count, count, cd_size, cd_start,
+            ))
+            self._write(struct.pack('<IIQI', 0x07064b50, 0, cd_end, 1))
+            self._write(struct.pack(
+                '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                min(cd_size, _ZIP64_LIMIT), min(cd_start, _ZIP64_LIMIT), 0,
+            ))
+        else:
+            self._write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, cd_size, cd_start, 0))
+
+
+class _ZstdCliWriter:
+    """调用 zstd 命令行（-T0 多线程）压缩的只写文件对象，zstandard 模块不可用时使用"""
+
+    def __init__(self, fileobj, level=ZSTD_LEVEL, workers=ARCHIVE_WORKERS):
+        exe = shutil.which('zstd')
+        self._proc = subprocess.Popen(
+            [exe, '-q', f'-{level}', f'-T{workers}', '-c'], stdin=subprocess.PIPE, stdout=fileobj,
+        )
+
+    def write(self, data):
+        self._proc.stdin.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._proc.stdin.close()
+        if self._proc.wait() != 0:
+            raise OSError(f'zstd 退出码 {self._proc.returncode}')
+
+
+def zstd_available():
+    return zstandard is not None or shutil.which('zstd') is not None
+
+
+def _open_zstd_writer(fileobj, workers):
+    if zstandard is not None:
+        cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=workers)
+        return cctx.stream_writer(fileobj, closefd=False)
+    if shutil.which('zstd'):
+        return _ZstdCliWriter(fileobj, workers=workers)
+    raise OSError('缺少 zstandard 模块或 zstd 命令，无法生成 tar.zst')
+
+
+class ProgressThrottle:
+    """把高频进度回调合并为最多每 interval 秒一次（或进度跨过 1%）"""
+
+    def __init__(self, total, report, interval=0.5):
+        self.total = max(int(total), 1)
+        self.done = 0
+        self._report = report
+        self._interval = interval
+        self._last_time = 0.0
+        self._last_pct = -1.0
+        # 并行解压时多个线程同时回调
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self.done += n
+            now = time.monotonic()
+            pct = min(self.done * 100.0 / self.total, 100.0)
+            if not (now - self._last_time >= self._interval or pct - self._last_pct >= 1.0):
+                return
+            self._last_time = now
+            self._last_pct = pct
+            done = self.done
+        self._report(done, self.total, pct)
+
+
+def write_archive(output_path, entries, fmt, workers=ARCHIVE_WORKERS, on_bytes=None):
+    """把 (kind, 源路径, 包内路径) 列表写为 zip / tar.gz / tar.zst，压缩在多个线程中并行进行
+
+    写入 output_path 的同目录临时文件，完成后原子改名；on_bytes(n) 随读入的原始字节数调用。
+    """
+    tmp = f'{output_path}.part'
+    try:
+        with open(tmp, 'wb') as out:
+            if fmt == 'zip':
+                zw = ParallelZipWriter(out, workers=workers)
+                try:
+                    for kind, fp, arc in entries:
+                        if kind == 'dir':
+                            zw.add_dir(fp, arc)
+                        else:
+                            zw.add_file(fp, arc, on_bytes=on_bytes)
+                finally:
+                    zw.close()
+            else:
+                if fmt == 'tar.gz':
+                    stream = ParallelGzipWriter(out, workers=workers)
+                elif fmt == 'tar.zst':
+                    stream = _open_zstd_writer(out, workers)
+                else:
+                    raise ValueError(f'不支持的格式: {fmt}')
+                try:
+                    with tarfile.open(fileobj=stream, mode='w|', bufsize=DEFLATE_BLOCK_SIZE) as tf:
+                        for kind, fp, arc in entries:
+                            try:
+                                tf.add(fp, arcname=arc.rstrip('/'), recursive=False)
+                            except OSError:
+                                continue
+                            tf.members.clear()
+                            if kind == 'file' and on_bytes is not None:
+                                try:
+                                    on_bytes(os.path.getsize(fp))
+                                except OSError:
+                                    pass
+                finally:
+                    stream.close()
+        os.replace(tmp, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class ExtractCancelled(Exception):
+    """解压被取消"""
+
+
+def _safe_join(base_dir, member_path):
+    rel = (member_path or '').replace('\\', '/')
+    if not rel or rel.startswith('/') or rel.startswith('\\'):
+        return None
+    if ':' in rel.split('/')[0]:
+        return None
+    norm_base = os.path.normpath(base_dir)
+    norm = os.path.normpath(os.path.join(norm_base, rel))
+    try:
+        if os.path.commonpath([norm_base, norm]) != norm_base:
+            return None
+    except Exception:
+        return None
+    if not norm.startswith(norm_base):
+        return None
+    return norm
+
+
+def unsafe_member(inner):
+    """压缩包成员名为空、绝对路径、带盘符或含 .. 时返回 True，这类成员不解压也不预览"""
+    parts = inner.split('/')
+    return not inner or inner.startswith('/') or ':' in parts[0] or '..' in parts
+
+
+def ensure_disk_space(dest_dir, needed):
+    """目标所在文件系统的剩余空间不足 needed 字节时抛出 OSError"""
+    free = shutil.disk_usage(dest_dir).free
+    if needed > free:
+        raise OSError(f'磁盘空间不足：需要 {path_utils.format_size(needed)}，剩余 {path_utils.format_size(free)}')
+
+
+def _copy_member(src, out_path, on_bytes, cancelled):
+    try:
+        with open(out_path, 'wb') as dst:
+            while True:
+                if cancelled is not None and cancelled():
+                    raise ExtractCancelled()
+                chunk = src.read(_COPY_BLOCK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                if on_bytes is not None:
+                    on_bytes(len(chunk))
+    except BaseException:
+        # 不留下写了一半的文件
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+        raise
+
+
+def _extract_zip(full_path, dest_full, workers, on_bytes, cancelled):
+    jobs = []
+    with zipfile.ZipFile(full_path, 'r') as zf:
+        for info in zf.infolist():
+            inner = (info.filename or '').replace('\\', '/')
+            if unsafe_member(inner):
+                continue
+            if inner.endswith('/'):
+                d = _safe_join(dest_full, inner.rstrip('/'))
+                if d:
+                    os.makedirs(d, exist_ok=True)
+                continue
+            out_path = _safe_join(dest_full, inner)
+            if out_path:
+                jobs.append((info, out_path))
+
+    # ZipFile 对象不是线程安全的，每个工作线程各自打开一份
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+    failed = threading.Event()
+
+    def _stop():
+        return failed.is_set() or (cancelled is not None and cancelled())
+
+    def _run(info, out_path):
+        zf = getattr(local, 'zf', None)
+        if zf is None:
+            zf = local.zf = zipfile.ZipFile(full_path, 'r')
+            with opened_lock:
+                opened.append(zf)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with zf.open(info, 'r') as src:
+            _copy_member(src, out_path, on_bytes, _stop)
+
+    try:
+        if workers <= 1:
+            for info, out_path in jobs:
+                _run(info, out_path)
+            return len(jobs)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='unzip') as pool:
+            pending = set()
+            try:
+                for info, out_path in jobs:
+                    # 在途任务有上限，百万成员的压缩包也不会一次性排入队列
+                    if len(pending) >= workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for f in done:
+                            f.result()
+                    if _stop():
+                        break
+                    pending.add(pool.submit(_run, info, out_path))
+                for f in pending:
+                    f.result()
+            except BaseException:
+                failed.set()
+                for f in pending:
+                    f.cancel()
+                raise
+        if cancelled is not None and cancelled():
+            raise ExtractCancelled()
+        return len(jobs)
+    finally:
+        for zf in opened:
+            zf.close()
+
+
+def _extract_tar(full_path, dest_full, on_bytes, cancelled):
+    extracted = 0
+    # 流式读取：成员按顺序解出，不需要先 getmembers() 完整解压一遍
+    with tarfile.open(full_path, 'r|*') as tf:
+        for m in tf:
+            tf.members.clear()
+            inner = (m.name or '').replace('\\', '/')
+            if unsafe_member(inner):
+                continue
+            out_path = _safe_join(dest_full, inner)
+            if not out_path:
+                continue
+            if m.isdir():
+                os.makedirs(out_path, exist_ok=True)
+                continue
+            if not m.isreg():
+                continue
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            src = tf.extractfile(m)
+            if not src:
+                continue
+            with src:
+                _copy_member(src, out_path, on_bytes, cancelled)
+            extracted += 1
+    return extracted
+
+
+_SEVEN_PERCENT = re.compile(rb'(\d+)%')
+
+
+def _extract_7z(full_path, dest_full, size_hint, on_bytes, cancelled):
+    seven = shutil.which('7z') or shutil.which('7za') or shutil.which('7zr')
+    if not seven:
+        raise OSError('缺少 7z 命令，无法解压该压缩包')
+    # stderr 写到临时文件：逐个文件报错时输出可能超过管道缓冲区，7z 会因写不出而卡住
+    err_file = tempfile.TemporaryFile()
+    try:
+        proc = subprocess.Popen(
+            [seven, 'x', '-y', '-bsp1', '-bso0', '-o' + dest_full, full_path],
+            stdout=subprocess.PIPE, stderr=err_file,
+        )
+    except BaseException:
+        err_file.close()
+        raise
+    state = {'pct': 0}
+
+    def _read_progress():
+        for chunk in iter(lambda: proc.stdout.read1(4096), b''):
+            found = _SEVEN_PERCENT.findall(chunk)
+            if found:
+                state['pct'] = int(found[-1])
+
+    reader = threading.Thread(target=_read_progress, daemon=True)
+    reader.start()
+    reported = 0
+    try:
+        while proc.poll() is None:
+            if cancelled is not None and cancelled():
+                proc.kill()
+                proc.wait()
+                raise ExtractCancelled()
+            # 7z 只报告百分比，按预计大小折算为字节进度
+            current = size_hint * min(state['pct'], 100) // 100
+            if on_bytes is not None and current > reported:
+                on_bytes(current - reported)
+                reported = current
+            time.sleep(0.2)
+        reader.join(timeout=1)
+        # 只保留最后一段错误输出作为任务消息
+        err_file.seek(max(0, err_file.seek(0, os.SEEK_END) - 4096))
+        stderr = err_file.read()
+        if proc.returncode != 0:
+            raise OSError(stderr.decode('utf-8', 'replace').strip() or '解压失败')
+        if on_bytes is not None and size_hint > reported:
+            on_bytes(size_hint - reported)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        err_file.close()
+    return 1
+
+
+def extract_archive(full_path, kind, dest_full, workers=ARCHIVE_WORKERS, on_bytes=None, cancelled=None, size_hint=0):
+    """把压缩包解压到 dest_full，返回解出的文件数
+
+    zip 成员由有上限的线程池并行解出；tar 按顺序流式解出；7z / rar 交给 7z 命令。
+    on_bytes(n) 随写出的字节数调用；cancelled() 返回 True 时尽快停止并抛出 ExtractCancelled。
+    """
+    os.makedirs(dest_full, exist_ok=True)
+    if kind == 'zip':
+        return _extract_zip(full_path, dest_full, workers, on_bytes, cancelled)
+    if kind == 'tar':
+        return _extract_tar(full_path, dest_full, on_bytes, cancelled)
+    if kind == '7z':
+        return _extract_7z(full_path, dest_full, size_hint, on_bytes, cancelled)
+    raise ValueError(f'不支持的格式: {kind}')
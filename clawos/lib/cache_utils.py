@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from lib import file_utils, inotify_utils
+
+
+LISTING_CACHE_MAX_DIRS = int(os.getenv('CLAWOS_LISTING_CACHE_DIRS', '1024'))
+# 无 inotify 时，仅凭目录 mtime 无法感知子文件大小/修改时间的变化，因此额外限制缓存寿命
+LISTING_CACHE_FALLBACK_TTL = float(os.getenv('CLAWOS_LISTING_CACHE_TTL', '5'))
+
+
+class _Entry:
+    __slots__ = ('gen', 'watched', 'records', 'count')
+
+    def __init__(self, watched):
+        self.gen = 0
+        self.watched = watched
+        # (value, mtime_ns, stamp)
+        self.records = None
+        self.count = None
+
+
+class DirListingCache:
+    """目录列表与子项计数的进程内缓存
+
+    以目录路径为键，优先用 inotify 监听失效；监听不可用（非 Linux、超出 watch 上限）时
+    退回到目录 mtime 校验加短 TTL。被缓存的目录数按 LRU 限制，淘汰时同时移除监听。
+    """
+
+    def __init__(self, max_dirs=LISTING_CACHE_MAX_DIRS, fallback_ttl=LISTING_CACHE_FALLBACK_TTL, use_inotify=True):
+        self.max_dirs = max(1, int(max_dirs))
+        self.fallback_ttl = float(fallback_ttl)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._watcher = inotify_utils.create_watcher(self._on_event) if use_inotify else None
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+    def scan(self, directory):
+        """带缓存的 file_utils.scan_directory，返回的记录列表只读共享"""
+        return self._get(directory, 'records', file_utils.scan_directory)
+
+    def count(self, directory):
+        """带缓存的 file_utils.count_entries"""
+        return self._get(directory, 'count', file_utils.count_entries)
+
+    def invalidate(self, directory):
+        directory = os.path.normpath(directory)
+        with self._lock:
+            self._invalidate_locked(directory)
+            self._invalidate_locked(os.path.dirname(directory))
+
+    def clear(self):
+        with self._lock:
+            paths = list(self._entries.keys())
+            self._entries.clear()
+        if self._watcher is not None:
+            for p in paths:
+                self._watcher.remove(p)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['entries'] = len(self._entries)
+            data['watched'] = sum(1 for e in self._entries.values() if e.watched)
+        total = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / total, 4) if total else 0.0
+        data['max_dirs'] = self.max_dirs
+        data['backend'] = 'inotify' if self._watcher is not None else 'mtime'
+        data['fallback_ttl'] = self.fallback_ttl
+        return data
+
+    def _get(self, directory, field, loader):
+        directory = os.path.normpath(directory)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(directory)
+            slot = getattr(entry, field) if entry is not None else None
+            watched = entry.watched if entry is not None else False
+        if slot is not None:
+            value, mtime_ns, stamp = slot
+            if watched or (now - stamp < self.fallback_ttl and _dir_mtime_ns(directory) == mtime_ns):
+                with self._lock:
+                    self._stats['hits'] += 1
+                    if directory in self._entries:
+                        self._entries.move_to_end(directory)
+                return value
+
+        gen = self._prepare(directory)
+        mtime_ns = _dir_mtime_ns(directory)
+        value = loader(directory)
+        with self._lock:
+            self._stats['misses'] += 1
+            entry = self._entries.get(directory)
+            if entry is not None and entry.gen == gen and mtime_ns is not None:
+                setattr(entry, field, (value, mtime_ns, now))
+        return value
+
+    def _prepare(self, directory):
+        """确保目录有缓存槽位和监听（先监听后读取，避免漏掉读取期间的变化），返回当前代数"""
+        with self._lock:
+            entry = self._entries.get(directory)
+            if entry is not None:
+                self._entries.move_to_end(directory)
+                return entry.gen
+        watched = self._watcher.add(directory) if self._watcher is not None else False
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(directory)
+            if entry is None:
+                entry = _Entry(watched)
+                self._entries[directory] = entry
+            while len(self._entries) > self.max_dirs:
+                old_path, _old = self._entries.popitem(last=False)
+                evicted.append(old_path)
+                self._stats['evictions'] += 1
+            gen = entry.gen
+        if self._watcher is not None:
+            for p in evicted:
+                self._watcher.remove(p)
+        return gen
+
+    def _invalidate_locked(self, directory):
+        entry = self._entries.get(directory)
+        if entry is None:
+            return
+        entry.gen += 1
+        if entry.records is not None or entry.count is not None:
+            self._stats['invalidations'] += 1
+        entry.records = None
+        entry.count = None
+
+    def _on_event(self, path, _name, mask):
+        if path is None:
+            with self._lock:
+                for p in list(self._entries.keys()):
+                    self._invalidate_locked(p)
+            return
+        with self._lock:
+            self._invalidate_locked(path)
+            # 子目录内容变化会改变其 mtime，父目录列表中的该项随之过期
+            self._invalidate_locked(os.path.dirname(path))
+            if mask & inotify_utils.SELF_GONE_MASK:
+                self._entries.pop(path, None)
+        if mask & inotify_utils.SELF_GONE_MASK and not mask & inotify_utils.IN_IGNORED:
+            self._watcher.remove(path)
+
+
+def _dir_mtime_ns(directory):
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+_listing_cache = None
+_listing_cache_lock = threading.Lock()
+
+
+def get_listing_cache():
+    global _listing_cache
+    if _listing_cache is None:
+        with _listing_cache_lock:
+            if _listing_cache is None:
+                _listing_cache = DirListingCache()
+    return _listing_cache
+
+
+def scan_directory(directory):
+    """带缓存的目录列表"""
+    return get_listing_cache().scan(directory)
+
+
+def count_entries(directory):
+    """带缓存的目录项目计数"""
+    return get_listing_cache().count(directory)
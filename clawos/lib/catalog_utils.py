@@ -0,0 +1,479 @@
+import bz2
+import contextlib
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import struct
+import subprocess
+import tarfile
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+
+from lib import archive_utils, path_utils, zran_utils
+
+
+CATALOG_VERSION = 1
+CATALOG_MAX_BYTES = int(os.getenv('CLAWOS_ARCHIVE_CATALOG_MB', '512')) * 1024 * 1024
+GZ_INDEX_SPAN = int(os.getenv('CLAWOS_GZ_INDEX_SPAN_MB', '16')) * 1024 * 1024
+_MEMORY_ENTRIES = 8
+_READ_BLOCK = 1024 * 1024
+
+
+class CatalogError(Exception):
+    """无法列出压缩包（缺少工具、格式不支持等），status 为对应的 HTTP 状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_archive_name(name):
+    n = (name or '').lower()
+    if n.endswith('.tar.gz') or n.endswith('.tar.bz2') or n.endswith('.tar.xz'):
+        return True
+    ext = os.path.splitext(n)[1].lower()
+    return ext in {'.zip', '.rar', '.tar', '.tgz', '.7z'}
+
+
+def archive_kind(name):
+    n = (name or '').lower()
+    if n.endswith('.tar.gz'):
+        return 'tar'
+    if n.endswith('.tar.bz2'):
+        return 'tar'
+    if n.endswith('.tar.xz'):
+        return 'tar'
+    ext = os.path.splitext(n)[1].lower()
+    if ext == '.tgz':
+        return 'tar'
+    if ext == '.tar':
+        return 'tar'
+    if ext == '.zip':
+        return 'zip'
+    if ext in {'.7z', '.rar'}:
+        return '7z'
+    return None
+
+
+def _add_parent_dirs(dirs, inner):
+    parts = inner.split('/')
+    acc = ''
+    for seg in parts[:-1]:
+        acc = (acc + '/' + seg) if acc else seg
+        dirs.add(acc)
+
+
+def _file_item(inner, size):
+    return {'path': inner, 'is_dir': False, 'size': size, 'size_human': path_utils.format_size(size)}
+
+
+def _dir_items(dirs):
+    return [{'path': d + '/', 'is_dir': True, 'size': 0, 'size_human': ''} for d in dirs]
+
+
+def _list_zip(full_path):
+    items = []
+    dirs = set()
+    with zipfile.ZipFile(full_path, 'r') as zf:
+        for info in zf.infolist():
+            inner = (info.filename or '').replace('\\', '/')
+            if not inner or inner.startswith('/') or ':' in inner.split('/')[0]:
+                continue
+            if inner.endswith('/'):
+                dirs.add(inner.rstrip('/'))
+                continue
+            _add_parent_dirs(dirs, inner)
+            items.append(_file_item(inner, int(info.file_size or 0)))
+    return items + _dir_items(dirs), {}
+
+
+def _compression(full_path):
+    with open(full_path, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(b'\x1f\x8b'):
+        return 'gz'
+    if magic.startswith(b'BZh'):
+        return 'bz2'
+    if magic == b'\xfd7zXZ\x00':
+        return 'xz'
+    return None
+
+
+def _is_gzip(full_path):
+    return _compression(full_path) == 'gz'
+
+
+def _list_tar(full_path, index_path):
+    """列出 tar 成员并记录每个普通文件在（解压后）tar 流中的数据偏移
+
+    gzip 压缩的 tar 在同一遍解压中顺带建立 zran 访问点索引，写入 index_path。
+    """
+    items = []
+    members = {}
+    dirs = set()
+    reader = None
+    if zran_utils.available() and _is_gzip(full_path):
+        reader = zran_utils.IndexingGzipReader(full_path, span=GZ_INDEX_SPAN)
+        tf = tarfile.open(fileobj=reader, mode='r|')
+    else:
+        tf = tarfile.open(full_path, 'r:*')
+    try:
+        # 流式遍历，不保留 TarInfo 列表，超大备份包也只占少量内存
+        while True:
+            m = tf.next()
+            if m is None:
+                break
+            tf.members.clear()
+            inner = (m.name or '').replace('\\', '/')
+            if archive_utils.unsafe_member(inner):
+                continue
+            if m.isdir():
+                dirs.add(inner.rstrip('/'))
+                continue
+            _add_parent_dirs(dirs, inner)
+            size = int(m.size or 0)
+            items.append(_file_item(inner, size))
+            if m.isreg() and not m.issparse():
+                members[inner] = [m.offset_data, size]
+        if reader is not None:
+            total = reader.drain()
+            zran_utils.GzipSeekIndex(reader.points, total, GZ_INDEX_SPAN).save(index_path)
+    finally:
+        tf.close()
+        if reader is not None:
+            reader.close()
+    return items + _dir_items(dirs), members
+
+
+def _list_7z(full_path):
+    seven = _seven_zip()
+    if not seven:
+        raise CatalogError('缺少 7z 命令，无法预览该压缩包')
+    proc = subprocess.run([seven, 'l', '-slt', full_path], capture_output=True, text=True, timeout=30)
+    if proc.returncode != 0:
+        raise CatalogError((proc.stderr or proc.stdout or '列出失败').strip())
+    name = os.path.basename(full_path)
+    items = []
+    for b in (proc.stdout or '').split('\n\n'):
+        if 'Path = ' not in b:
+            continue
+        inner = None
+        is_dir = False
+        size = 0
+        for line in b.splitlines():
+            if line.startswith('Path = '):
+                inner = line[len('Path = '):].strip().replace('\\', '/')
+            elif line.startswith('Attributes = '):
+                if 'D' in line[len('Attributes = '):]:
+                    is_dir = True
+            elif line.startswith('Size = '):
+                try:
+                    size = int(line[len('Size = '):].strip() or 0)
+                except Exception:
+                    size = 0
+        if not inner or inner == name:
+            continue
+        if inner.startswith('/') or ':' in inner.split('/')[0] or '..' in inner.split('/'):
+            continue
+        if is_dir:
+            if not inner.endswith('/'):
+                inner = inner + '/'
+            items.append({'path': inner, 'is_dir': True, 'size': int(size or 0), 'size_human': ''})
+        else:
+            items.append(_file_item(inner, int(size or 0)))
+    return items, {}
+
+
+def _seven_zip():
+    return shutil.which('7z') or shutil.which('7za') or shutil.which('7zr')
+
+
+class ArchiveMember:
+    """压缩包内的单个文件；read(start, end) 按块产出 [start, end) 区间的数据
+
+    seekable 为 True 时任意区间都无需从头解压（zip 存储成员、未压缩 tar、有索引的 tar.gz），
+    可以直接用于 HTTP Range。
+    """
+
+    def __init__(self, name, size, reader, seekable):
+        self.name = name
+        self.size = size
+        self.seekable = seekable
+        self._reader = reader
+
+    def read(self, start=0, end=None):
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return iter(())
+        return self._reader(start, end)
+
+    def read_head(self, limit):
+        return b''.join(self.read(0, min(limit, self.size)))
+
+
+def _pread_reader(full_path, data_offset):
+    def reader(start, end):
+        with open(full_path, 'rb') as f:
+            fd = f.fileno()
+            pos = data_offset + start
+            stop = data_offset + end
+            while pos < stop:
+                chunk = os.pread(fd, min(_READ_BLOCK, stop - pos), pos)
+                if not chunk:
+                    return
+                pos += len(chunk)
+                yield chunk
+    return reader
+
+
+def _skip_reader(open_stream):
+    """不可随机访问的成员：从头解压并丢弃 start 之前的数据"""
+    def reader(start, end):
+        with open_stream() as src:
+            pos = 0
+            while pos < end:
+                chunk = src.read(min(_READ_BLOCK, end - pos))
+                if not chunk:
+                    return
+                lo = max(0, start - pos)
+                pos += len(chunk)
+                if lo < len(chunk):
+                    yield chunk[lo:]
+    return reader
+
+
+def _zip_member(full_path, member):
+    with zipfile.ZipFile(full_path, 'r') as zf:
+        try:
+            info = zf.getinfo(member)
+        except KeyError:
+            raise CatalogError('压缩包内不存在该文件', 404)
+    if info.is_dir():
+        raise CatalogError('压缩包内不存在该文件', 404)
+    size = int(info.file_size or 0)
+    if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+        # 存储成员的数据在本地文件头之后，可直接按偏移读取
+        with open(full_path, 'rb') as f:
+            f.seek(info.header_offset)
+            header = f.read(30)
+        if len(header) == 30 and header[:4] == b'PK\x03\x04':
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            data_offset = info.header_offset + 30 + name_len + extra_len
+            return ArchiveMember(member, size, _pread_reader(full_path, data_offset), True)
+
+    @contextlib.contextmanager
+    def stream():
+        with zipfile.ZipFile(full_path, 'r') as zf, zf.open(info, 'r') as src:
+            yield src
+
+    return ArchiveMember(member, size, _skip_reader(stream), False)
+
+
+def _7z_member(full_path, member, size):
+    seven = _seven_zip()
+    if not seven:
+        raise CatalogError('缺少 7z 命令，无法读取该压缩包')
+
+    @contextlib.contextmanager
+    def stream():
+        # -spd 关闭通配符匹配，成员名按字面处理
+        proc = subprocess.Popen(
+            [seven, 'x', '-so', '-spd', full_path, member],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        try:
+            yield proc.stdout
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+    return ArchiveMember(member, size, _skip_reader(stream), False)
+
+
+class ArchiveCatalog:
+    """压缩包成员目录的磁盘缓存，按 (路径, 大小, mtime) 失效
+
+    每个压缩包对应 <路径哈希>-<版本哈希>.json.gz；gzip 压缩的 tar 另有同名 .gzidx
+    随机访问索引，之后读取单个成员时可从最近的访问点开始解压。
+    """
+
+    def __init__(self, cache_dir, max_bytes=CATALOG_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._building = {}
+        self._memory = OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, full_path, st):
+        path_key = hashlib.sha1(full_path.encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+        version = hashlib.sha1(f'{st.st_size}:{st.st_mtime_ns}:{CATALOG_VERSION}'.encode()).hexdigest()[:16]
+        return f'{path_key}-{version}'
+
+    def load(self, full_path, kind):
+        """返回 (catalog, cached)；catalog 含 items（已排序）与 tar 成员的数据偏移 members"""
+        st = os.stat(full_path)
+        key = self._key(full_path, st)
+        with self._lock:
+            catalog = self._memory.get(key)
+            if catalog is not None:
+                self._memory.move_to_end(key)
+                return catalog, True
+            build_lock = self._building.setdefault(key, threading.Lock())
+        # 同一压缩包的并发请求只构建一次
+        with build_lock:
+            try:
+                catalog = self._read(key)
+                cached = catalog is not None
+                if catalog is None:
+                    catalog = self._build(full_path, kind, key)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+            with self._lock:
+                self._memory[key] = catalog
+                self._memory.move_to_end(key)
+                while len(self._memory) > _MEMORY_ENTRIES:
+                    self._memory.popitem(last=False)
+        return catalog, cached
+
+    def open_member(self, full_path, kind, member):
+        """返回压缩包内单个文件的 ArchiveMember，不存在时抛出 CatalogError(404)"""
+        member = (member or '').replace('\\', '/')
+        if archive_utils.unsafe_member(member) or member.endswith('/'):
+            raise CatalogError('压缩包内不存在该文件', 404)
+        if kind == 'zip':
+            return _zip_member(full_path, member)
+        catalog, _cached = self.load(full_path, kind)
+        if kind == '7z':
+            for item in catalog['items']:
+                if item['path'] == member and not item['is_dir']:
+                    return _7z_member(full_path, member, item['size'])
+            raise CatalogError('压缩包内不存在该文件', 404)
+        entry = catalog['members'].get(member)
+        if entry is None:
+            raise CatalogError('压缩包内不存在该文件', 404)
+        offset, size = entry
+        compression = _compression(full_path)
+        if compression is None:
+            return ArchiveMember(member, size, _pread_reader(full_path, offset), True)
+        if compression == 'gz':
+            index = self.gz_index(full_path)
+            if index is not None:
+                def reader(start, end):
+                    return index.iter_range(full_path, offset + start, end - start)
+                return ArchiveMember(member, size, reader, True)
+        opener = {'gz': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}[compression]
+
+        @contextlib.contextmanager
+        def stream():
+            with opener(full_path, 'rb') as f:
+                # 压缩流的 seek 仍需向前解压，但省去了逐个解析 tar 头
+                f.seek(offset)
+                yield f
+
+        return ArchiveMember(member, size, _skip_reader(stream), False)
+
+    def gz_index(self, full_path):
+        """返回 gzip tar 的随机访问索引；尚未建立或不可用时返回 None"""
+        try:
+            key = self._key(full_path, os.stat(full_path))
+            return zran_utils.GzipSeekIndex.load(self._path(key, '.gzidx'))
+        except (OSError, ValueError):
+            return None
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _read(self, key):
+        path = self._path(key, '.json.gz')
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for p in (path, self._path(key, '.gzidx')):
+            try:
+                os.utime(p)
+            except OSError:
+                pass
+        return catalog
+
+    def _build(self, full_path, kind, key):
+        path_key = key.split('-', 1)[0]
+        for name in os.listdir(self.cache_dir):
+            # 同一路径的旧版本缓存已失效
+            if name.startswith(path_key + '-') and not name.startswith(key):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        tmp_suffix = f'.{uuid.uuid4().hex}.tmp'
+        index_tmp = self._path(key, '.gzidx' + tmp_suffix)
+        try:
+            if kind == 'zip':
+                items, members = _list_zip(full_path)
+            elif kind == 'tar':
+                items, members = _list_tar(full_path, index_tmp)
+            elif kind == '7z':
+                items, members = _list_7z(full_path)
+            else:
+                raise CatalogError('不支持的压缩格式')
+            items.sort(key=lambda x: (not x.get('is_dir', False), x.get('path', '').lower()))
+            catalog = {'version': CATALOG_VERSION, 'kind': kind, 'items': items, 'members': members}
+            catalog_tmp = self._path(key, '.json.gz' + tmp_suffix)
+            with gzip.open(catalog_tmp, 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump(catalog, f, ensure_ascii=False)
+            if os.path.exists(index_tmp):
+                os.replace(index_tmp, self._path(key, '.gzidx'))
+            os.replace(catalog_tmp, self._path(key, '.json.gz'))
+        finally:
+            try:
+                os.remove(index_tmp)
+            except OSError:
+                pass
+        self._evict()
+        return catalog
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes * 0.8:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_archive_catalog(cache_dir):
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ArchiveCatalog(cache_dir)
+    return _catalog
@@ -0,0 +1,227 @@
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import config
+from lib import state_utils
+
+
+# 热数据（状态库 log 表）超过这么多条时，最旧的部分归档为压缩段文件
+CONVERSATION_HOT_LIMIT = 5000
+CONVERSATION_SEGMENT_SIZE = 2000
+CONVERSATION_COMPACT_SECONDS = 600
+CONVERSATION_PAGE_LIMIT = 500
+# 读过的归档段在内存中保留的个数
+_SEGMENT_CACHE_SIZE = 4
+
+
+class ConversationLog:
+    """会话历史：只追加的日志，按 id 游标分页
+
+    新消息写入状态库 log 表（一次插入 + 计数器更新，同一事务）；后台线程把超出热数据上限的
+    最旧消息按 id 顺序切成段，写成 seg_<首id>_<末id>.jsonl.gz 后从 log 表删除。
+    段文件名就是偏移索引：翻页到热数据之前时按 id 范围定位到段，只解压这一段。
+    计数器（总条数、发送条数）单独存在键值表中，统计接口不需要读历史。
+    """
+
+    def __init__(self, store, archive_dir, hot_limit=CONVERSATION_HOT_LIMIT,
+                 segment_size=CONVERSATION_SEGMENT_SIZE, compact_seconds=CONVERSATION_COMPACT_SECONDS):
+        self.store = store
+        self.archive_dir = archive_dir
+        self.hot_limit = hot_limit
+        self.segment_size = segment_size
+        self.compact_seconds = compact_seconds
+        self._segments = None
+        self._segment_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._worker = None
+
+    # ---------- 段索引 ----------
+
+    def _load_segments(self):
+        """[(first_id, last_id, path), ...]，按 id 升序"""
+        if self._segments is not None:
+            return self._segments
+        segments = []
+        try:
+            names = os.listdir(self.archive_dir)
+        except OSError:
+            names = []
+        for name in names:
+            if not (name.startswith('seg_') and name.endswith('.jsonl.gz')):
+                continue
+            try:
+                first, last = name[4:-9].split('_')
+                segments.append((int(first), int(last), os.path.join(self.archive_dir, name)))
+            except ValueError:
+                continue
+        segments.sort()
+        with self._lock:
+            if self._segments is None:
+                self._segments = segments
+            return self._segments
+
+    def _archived_last_id(self):
+        segments = self._load_segments()
+        return segments[-1][1] if segments else 0
+
+    def _read_segment(self, path):
+        with self._lock:
+            rows = self._segment_cache.get(path)
+            if rows is not None:
+                self._segment_cache.move_to_end(path)
+                return rows
+        rows = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    row_id, item = json.loads(line)
+                    rows.append((row_id, item))
+        with self._lock:
+            self._segment_cache[path] = rows
+            while len(self._segment_cache) > _SEGMENT_CACHE_SIZE:
+                self._segment_cache.popitem(last=False)
+        return rows
+
+    # ---------- 读写 ----------
+
+    def _ensure_counters(self):
+        """旧数据（迁移导入或升级前写入）没有 conv_count 计数器时补算一次"""
+        if self.store.get(state_utils.NS_CONVERSATION, 'conv_count') is not None:
+            return
+        with self.store.transaction():
+            if self.store.get(state_utils.NS_CONVERSATION, 'conv_count') is None:
+                archived = sum(len(self._read_segment(path)) for _, _, path in self._load_segments())
+                total = self.store.log_count(state_utils.NS_CONVERSATION) + archived
+                self.store.set(state_utils.NS_CONVERSATION, 'conv_count', total)
+
+    def append(self, item):
+        """追加一条消息，返回其 id"""
+        self._ensure_counters()
+        with self.store.transaction():
+            row_id = self.store.append(state_utils.NS_CONVERSATION, item)
+            self.store.update(state_utils.NS_CONVERSATION, 'conv_count', lambda n: n + 1, default=0)
+            if item.get('type') == 'user':
+                self.store.update(state_utils.NS_CONVERSATION, 'sent_count', lambda n: n + 1, default=0)
+        self._ensure_worker()
+        return row_id
+
+    def stats(self):
+        self._ensure_counters()
+        return {
+            'sent_count': self.store.get(state_utils.NS_CONVERSATION, 'sent_count', 0),
+            'conv_count': self.store.get(state_utils.NS_CONVERSATION, 'conv_count', 0),
+        }
+
+    def page(self, before=None, limit=50):
+        """返回 id < before 的最近 limit 条（时间正序）与下一页游标；next_before 为 None 表示没有更早的消息"""
+        limit = max(1, min(int(limit), CONVERSATION_PAGE_LIMIT))
+        archived_last = self._archived_last_id()
+        # 压缩中途退出时段文件与热数据可能重叠，以段文件为准
+        rows = [
+            (row_id, item)
+            for row_id, item in self.store.log_page(state_utils.NS_CONVERSATION, before=before, limit=limit)
+            if row_id > archived_last
+        ]
+        if len(rows) < limit:
+            cursor = rows[0][0] if rows else before
+            for first, last, path in reversed(self._load_segments()):
+                if len(rows) >= limit:
+                    break
+                if cursor is not None and first >= cursor:
+                    continue
+                older = [r for r in self._read_segment(path) if cursor is None or r[0] < cursor]
+                rows = older[-(limit - len(rows)):] + rows
+                cursor = rows[0][0] if rows else cursor
+        next_before = None
+        if rows:
+            oldest = rows[0][0]
+            prev = self.store.log_page(state_utils.NS_CONVERSATION, before=oldest, limit=1)
+            if (prev and prev[0][0] > archived_last) or any(first < oldest for first, _, _ in self._load_segments()):
+                next_before = oldest
+        return {
+            'history': [dict(item, id=row_id) for row_id, item in rows],
+            'next_before': next_before,
+        }
+
+    def clear(self):
+        with self._compact_lock:
+            with self.store.transaction():
+                self.store.log_clear(state_utils.NS_CONVERSATION)
+                self.store.set(state_utils.NS_CONVERSATION, 'sent_count', 0)
+                self.store.set(state_utils.NS_CONVERSATION, 'conv_count', 0)
+            for _, _, path in self._load_segments():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            with self._lock:
+                self._segments = None
+                self._segment_cache.clear()
+
+    # ---------- 压缩 ----------
+
+    def compact(self):
+        """把超出热数据上限的最旧消息归档为段文件，返回归档条数"""
+        with self._compact_lock:
+            self._ensure_counters()
+            archived_last = self._archived_last_id()
+            # 上次压缩在删除热数据前中断：段文件已写好，这里补删
+            if archived_last:
+                self.store.log_delete_upto(state_utils.NS_CONVERSATION, archived_last)
+            moved = 0
+            while self.store.log_count(state_utils.NS_CONVERSATION) - self.segment_size >= self.hot_limit:
+                rows = self.store.log_head(state_utils.NS_CONVERSATION, self.segment_size)
+                if not rows:
+                    break
+                self._write_segment(rows)
+                self.store.log_delete_upto(state_utils.NS_CONVERSATION, rows[-1][0])
+                moved += len(rows)
+            return moved
+
+    def _write_segment(self, rows):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        first, last = rows[0][0], rows[-1][0]
+        path = os.path.join(self.archive_dir, f'seg_{first:012d}_{last:012d}.jsonl.gz')
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(tmp, path)
+        segments = self._load_segments()
+        with self._lock:
+            self._segments = segments + [(first, last, path)]
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True, name='conversation-compact')
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.compact()
+            except Exception as e:
+                print(f'会话历史压缩失败: {e}')
+            time.sleep(self.compact_seconds)
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_conversation_log():
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = ConversationLog(state_utils.get_state_store(), config.CONVERSATION_ARCHIVE_DIR)
+    return _log
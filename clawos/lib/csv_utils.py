@@ -0,0 +1,475 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+CSV_ROW_STRIDE = int(os.getenv('CLAWOS_CSV_ROW_STRIDE', '1000') or 1000)
+CSV_MAX_PAGE = 1000
+# 带过滤条件的请求每次最多扫描的行数，超过后返回游标由前端继续请求
+CSV_FILTER_SCAN_ROWS = 200000
+# 统计唯一值时最多记录的不同取值数量（数值与文本合计）
+CSV_UNIQUE_CAP = 1000000
+# 数值先攒成一块再汇总，内存只占一块的大小
+_STATS_CHUNK = 65536
+CSV_INDEX_VERSION = 1
+_SNIFF_BYTES = 64 * 1024
+_MEMORY_ENTRIES = 8
+_DELIMITERS = ',\t;|'
+_FILTER_OPS = {'eq', 'ne', 'contains', 'not_contains', 'gt', 'ge', 'lt', 'le', 'empty', 'not_empty'}
+
+csv.field_size_limit(64 * 1024 * 1024)
+
+
+class CsvError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_delimited_name(name):
+    return os.path.splitext(name or '')[1].lower() in ('.csv', '.tsv')
+
+
+def _detect_encoding(sample):
+    if sample.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    # 样本末尾可能截断了一个多字节字符，只检查到最后一个换行
+    cut = sample.rfind(b'\n')
+    head = sample[:cut] if cut > 0 else sample
+    try:
+        head.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def sniff(path):
+    """识别编码、分隔符、引号与表头，返回元数据字典"""
+    with open(path, 'rb') as f:
+        sample = f.read(_SNIFF_BYTES)
+    encoding = _detect_encoding(sample)
+    text = sample.decode(encoding, errors='replace')
+    cut = text.rfind('\n')
+    if cut > 0 and len(sample) == _SNIFF_BYTES:
+        text = text[:cut + 1]
+    first_line = text.split('\n', 1)[0].rstrip('\r')
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=_DELIMITERS)
+        delimiter, quotechar = dialect.delimiter, dialect.quotechar or '"'
+    except csv.Error:
+        delimiter, quotechar = '', '"'
+    # 引号内含换行时 Sniffer 可能给出空白或错误的结果，退回统计首行中各候选分隔符的出现次数
+    if len(delimiter) != 1 or delimiter not in _DELIMITERS or delimiter not in first_line:
+        counts = {d: first_line.count(d) for d in _DELIMITERS}
+        best = max(counts, key=counts.get)
+        if counts[best]:
+            delimiter = best
+        else:
+            delimiter = '\t' if path.lower().endswith('.tsv') else ','
+        quotechar = '"'
+    first = next(csv.reader([first_line], delimiter=delimiter, quotechar=quotechar), [])
+    # csv.Sniffer.has_header 同样会被多行字段干扰；这里只要首行没有数值单元格就视为表头
+    has_header = bool(first) and not any(_is_number(c) for c in first)
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'header': has_header,
+    }
+
+
+class _OffsetLines:
+    """逐行解码的迭代器，同时记录已消费的字节数；csv.reader 每次只取构成一行记录所需的行"""
+
+    def __init__(self, f, encoding, offset):
+        self._f = f
+        self._encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding
+        self.offset = offset
+        f.seek(offset)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self._f.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode(self._encoding, errors='replace')
+
+
+def _parse_filters(filters, columns):
+    parsed = []
+    for flt in filters or []:
+        if not isinstance(flt, dict):
+            raise CsvError('过滤条件格式错误')
+        op = str(flt.get('op') or 'contains')
+        if op not in _FILTER_OPS:
+            raise CsvError(f'不支持的过滤操作: {op}')
+        col = column_index(flt.get('column'), columns)
+        value = '' if flt.get('value') is None else str(flt.get('value'))
+        number = None
+        if op in ('gt', 'ge', 'lt', 'le'):
+            try:
+                number = float(value)
+            except ValueError:
+                raise CsvError(f'{op} 需要数值: {value}')
+        parsed.append((col, op, value, value.lower(), number))
+    return parsed
+
+
+def column_index(col, columns):
+    if isinstance(col, int) or (isinstance(col, str) and col.isdigit()):
+        i = int(col)
+        if 0 <= i < len(columns):
+            return i
+    elif col in columns:
+        return columns.index(col)
+    raise CsvError(f'列不存在: {col}', 404)
+
+
+def _match(row, filters):
+    for col, op, value, lowered, number in filters:
+        cell = row[col] if col < len(row) else ''
+        if op == 'eq':
+            ok = cell == value
+        elif op == 'ne':
+            ok = cell != value
+        elif op == 'contains':
+            ok = lowered in cell.lower()
+        elif op == 'not_contains':
+            ok = lowered not in cell.lower()
+        elif op == 'empty':
+            ok = not cell.strip()
+        elif op == 'not_empty':
+            ok = bool(cell.strip())
+        else:
+            try:
+                x = float(cell)
+            except ValueError:
+                return False
+            ok = (x > number if op == 'gt' else x >= number if op == 'ge'
+                  else x < number if op == 'lt' else x <= number)
+        if not ok:
+            return False
+    return True
+
+
+class CsvIndex:
+    """单个 CSV/TSV 文件的行偏移索引：每 CSV_ROW_STRIDE 行记录一次数据行的起始字节偏移
+
+    支持引号内换行。索引可边建边用：已建好的部分立即可以分页读取。
+    """
+
+    def __init__(self, path, key, meta, columns, data_offset, stride=CSV_ROW_STRIDE):
+        self.path = path
+        self.key = key
+        self.meta = meta
+        self.columns = columns
+        self.data_offset = data_offset
+        self.stride = stride
+        self.offsets = array('Q', [data_offset])
+        self.rows = 0
+        self.complete = False
+        self.building = False
+        self.task_id = None
+        self.stats = {}
+        # 列名 -> 进行中的统计任务 id
+        self.stats_tasks = {}
+        self.lock = threading.Lock()
+
+    def _reader(self, f, offset):
+        lines = _OffsetLines(f, self.meta['encoding'], offset)
+        reader = csv.reader(lines, delimiter=self.meta['delimiter'], quotechar=self.meta['quotechar'])
+        return lines, reader
+
+    def build(self, on_progress=None, cancelled=None):
+        """从最后一个检查点继续建索引，直到文件末尾"""
+        size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            start_row = (len(self.offsets) - 1) * self.stride
+            lines, reader = self._reader(f, self.offsets[-1])
+            row = start_row
+            for _ in reader:
+                row += 1
+                if row % self.stride == 0:
+                    self.offsets.append(lines.offset)
+                    self.rows = row
+                    if cancelled is not None and cancelled():
+                        return False
+                    if on_progress is not None and row % (self.stride * 100) == 0:
+                        on_progress(lines.offset, size, row)
+            self.rows = row
+        self.complete = True
+        return True
+
+    def _seek(self, f, row):
+        """返回定位到第 row 个数据行的 (lines, reader)，从最近的检查点向后最多跳过 stride 行"""
+        cp = min(row // self.stride, len(self.offsets) - 1)
+        lines, reader = self._reader(f, self.offsets[cp])
+        skip = row - cp * self.stride
+        for _ in range(skip):
+            if next(reader, None) is None:
+                break
+        return lines, reader
+
+    def page(self, offset=0, limit=100, columns=None, filters=None):
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), CSV_MAX_PAGE))
+        if not self.complete and offset > self.rows + self.stride * 10:
+            raise CsvError('索引建立中，请稍后再试', 409)
+        proj = [column_index(c, self.columns) for c in columns] if columns else None
+        flt = _parse_filters(filters, self.columns) if filters else None
+        out = []
+        row_numbers = []
+        row = offset
+        scanned = 0
+        exhausted = False
+        with open(self.path, 'rb') as f:
+            _lines, reader = self._seek(f, offset)
+            while len(out) < limit:
+                rec = next(reader, None)
+                if rec is None:
+                    exhausted = True
+                    break
+                row += 1
+                if flt is not None:
+                    scanned += 1
+                    if not _match(rec, flt):
+                        if scanned >= CSV_FILTER_SCAN_ROWS:
+                            break
+                        continue
+                if proj is not None:
+                    rec = [rec[i] if i < len(rec) else '' for i in proj]
+                out.append(rec)
+                row_numbers.append(row - 1)
+            if not exhausted and next(reader, None) is None:
+                exhausted = True
+        return {
+            'rows': out,
+            'row_numbers': row_numbers,
+            'offset': offset,
+            'next_offset': None if exhausted else row,
+            'scanned': scanned if flt is not None else len(out),
+            'total_rows': self.rows if self.complete else None,
+            'indexed_rows': self.rows,
+            'complete': self.complete,
+        }
+
+    def compute_stats(self, column, on_progress=None, cancelled=None):
+        """扫描一列计算 min/max/mean/唯一值数量
+
+        数值按块汇总为累计的最小、最大值与总和，有 NumPy 时每块用向量化计算；
+        唯一值集合与文本一样受 CSV_UNIQUE_CAP 限制，内存占用与文件大小无关。
+        """
+        col = column_index(column, self.columns)
+        size = os.path.getsize(self.path)
+        chunk = array('d')
+        uniques = set()
+        count = nulls = 0
+        text_min = text_max = None
+        num = {'count': 0, 'min': None, 'max': None, 'sum': 0.0}
+
+        def _flush_numbers():
+            if not chunk:
+                return
+            if np is not None:
+                arr = np.frombuffer(chunk, dtype=np.float64)
+                c_min, c_max, c_sum = float(arr.min()), float(arr.max()), float(arr.sum())
+                values = np.unique(arr).tolist() if len(uniques) < CSV_UNIQUE_CAP else ()
+                # 释放对 chunk 缓冲区的引用，之后才能清空重用
+                del arr
+            else:
+                c_min, c_max, c_sum = min(chunk), max(chunk), sum(chunk)
+                values = chunk if len(uniques) < CSV_UNIQUE_CAP else ()
+            num['count'] += len(chunk)
+            num['sum'] += c_sum
+            num['min'] = c_min if num['min'] is None else min(num['min'], c_min)
+            num['max'] = c_max if num['max'] is None else max(num['max'], c_max)
+            for v in values:
+                uniques.add(v)
+                if len(uniques) >= CSV_UNIQUE_CAP:
+                    break
+            del chunk[:]
+        with open(self.path, 'rb') as f:
+            lines, reader = self._reader(f, self.data_offset)
+            for rec in reader:
+                count += 1
+                cell = rec[col].strip() if col < len(rec) else ''
+                if not cell:
+                    nulls += 1
+                    continue
+                try:
+                    chunk.append(float(cell))
+                    if len(chunk) >= _STATS_CHUNK:
+                        _flush_numbers()
+                except ValueError:
+                    if text_min is None or cell < text_min:
+                        text_min = cell
+                    if text_max is None or cell > text_max:
+                        text_max = cell
+                    if len(uniques) < CSV_UNIQUE_CAP:
+                        uniques.add(cell)
+                if count % 100000 == 0:
+                    if cancelled is not None and cancelled():
+                        raise CsvError('已取消', 409)
+                    if on_progress is not None:
+                        on_progress(lines.offset, size)
+
+        _flush_numbers()
+
+        result = {
+            'column': self.columns[col],
+            'count': count,
+            'nulls': nulls,
+            'numeric': num['count'],
+            'min': text_min,
+            'max': text_max,
+            'mean': None,
+            # 数值存为 float、文本存为 str，两者不会相等，合计即总的不同取值数
+            'unique': len(uniques),
+            'unique_capped': len(uniques) >= CSV_UNIQUE_CAP,
+        }
+        if num['count']:
+            result.update({'min': num['min'], 'max': num['max'], 'mean': num['sum'] / num['count']})
+        self.stats[self.columns[col]] = result
+        return result
+
+    def to_dict(self):
+        return {
+            'version': CSV_INDEX_VERSION,
+            'key': self.key,
+            'meta': self.meta,
+            'columns': self.columns,
+            'data_offset': self.data_offset,
+            'stride': self.stride,
+            'rows': self.rows,
+            'offsets': list(self.offsets),
+            'stats': self.stats,
+        }
+
+    @classmethod
+    def from_dict(cls, path, data):
+        index = cls(path, data['key'], data['meta'], data['columns'], data['data_offset'], data['stride'])
+        index.offsets = array('Q', data['offsets'])
+        index.rows = data['rows']
+        index.stats = data.get('stats') or {}
+        index.complete = True
+        return index
+
+    def describe(self):
+        return {
+            'columns': self.columns,
+            'header': self.meta['header'],
+            'delimiter': self.meta['delimiter'],
+            'quotechar': self.meta['quotechar'],
+            'encoding': self.meta['encoding'],
+            'indexed_rows': self.rows,
+            'total_rows': self.rows if self.complete else None,
+            'complete': self.complete,
+            'stats': self.stats,
+            'numpy': np is not None,
+        }
+
+
+class CsvService:
+    """按 (path, size, mtime) 管理 CsvIndex：内存 LRU + 建完后持久化到 cache_dir"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, path):
+        st = os.stat(path)
+        return f'{st.st_size}:{st.st_mtime_ns}:{CSV_INDEX_VERSION}:{CSV_ROW_STRIDE}'
+
+    def _cache_path(self, path):
+        return os.path.join(self.cache_dir, hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest()[:16] + '.json')
+
+    def get(self, path):
+        key = self._key(path)
+        with self._lock:
+            index = self._memory.get(path)
+            if index is not None and index.key == key:
+                self._memory.move_to_end(path)
+                return index
+        index = self._load(path, key) or self._create(path, key)
+        with self._lock:
+            self._memory[path] = index
+            self._memory.move_to_end(path)
+            while len(self._memory) > _MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+        return index
+
+    def _load(self, path, key):
+        try:
+            with open(self._cache_path(path), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != CSV_INDEX_VERSION or data.get('key') != key:
+            return None
+        return CsvIndex.from_dict(path, data)
+
+    def _create(self, path, key):
+        meta = sniff(path)
+        offset = 3 if meta['encoding'] == 'utf-8-sig' else 0
+        with open(path, 'rb') as f:
+            lines = _OffsetLines(f, meta['encoding'], offset)
+            first = next(csv.reader(lines, delimiter=meta['delimiter'], quotechar=meta['quotechar']), None) or []
+            header_end = lines.offset
+        if meta['header']:
+            columns = [c.strip() or f'列{i + 1}' for i, c in enumerate(first)]
+            data_offset = header_end
+        else:
+            columns = [f'列{i + 1}' for i in range(len(first))]
+            data_offset = offset
+        # 表头重名时追加序号，保证列名可以唯一定位
+        seen = {}
+        for i, c in enumerate(columns):
+            if c in seen:
+                seen[c] += 1
+                columns[i] = f'{c}_{seen[c]}'
+            else:
+                seen[c] = 0
+        return CsvIndex(path, key, meta, columns, data_offset)
+
+    def save(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        target = self._cache_path(index.path)
+        tmp = f'{target}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, target)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_csv_service(cache_dir):
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = CsvService(cache_dir)
+    return _service
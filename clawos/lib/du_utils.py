@@ -0,0 +1,310 @@
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+DU_WORKERS = int(os.getenv('CLAWOS_DU_WORKERS', '0') or 0) or min(16, (os.cpu_count() or 1) * 4)
+# 每个目录缓存的最大文件数量（按大小），也是 top 参数的上限
+DU_TOP_CAP = 100
+# 缓存行超过该秒数即使目录 mtime 未变也重新 scandir，用于发现原地增长的文件（0 表示不按时间失效）
+DU_CACHE_MAX_AGE = int(os.getenv('CLAWOS_DU_CACHE_MAX_AGE', '0') or 0) or 86400
+_FLUSH_ROWS = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    disk INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    subdirs TEXT NOT NULL,
+    top TEXT NOT NULL,
+    scanned_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    dirs INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    analyzed_at REAL NOT NULL
+);
+"""
+
+
+class DiskUsageCancelled(Exception):
+    """分析被取消"""
+
+
+def _subtree_bounds(path):
+    # '/' 之后紧跟的字符是 '0'，[path/, path0) 恰好覆盖 path 下的所有路径
+    return path + '/', path + '0'
+
+
+class _DirScan:
+    """单个目录自身（不含子目录）的统计结果"""
+
+    __slots__ = ('path', 'mtime_ns', 'size', 'disk', 'files', 'subdirs', 'top', 'cached', 'old_subdirs')
+
+    def __init__(self, path, mtime_ns, size, disk, files, subdirs, top, cached, old_subdirs=None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.disk = disk
+        self.files = files
+        self.subdirs = subdirs
+        self.top = top
+        self.cached = cached
+        self.old_subdirs = old_subdirs
+
+
+class _Node:
+    __slots__ = ('name', 'parent', 'size', 'disk', 'files', 'dirs', 'children')
+
+    def __init__(self, name, parent, scan):
+        self.name = name
+        self.parent = parent
+        self.size = scan.size
+        self.disk = scan.disk
+        self.files = scan.files
+        self.dirs = 0
+        self.children = []
+
+
+class DiskUsageAnalyzer:
+    """并行 scandir 统计目录树占用，按目录 mtime 缓存每个目录自身的统计
+
+    目录的 mtime 只在其直接子项增删或改名时变化，所以 mtime 未变的目录直接复用缓存，
+    只需一次 stat 而不必 scandir；子目录仍逐个检查。原地改写文件不会改变目录 mtime，
+    因此缓存行超过 max_age 秒后也会重新统计，refresh=True 则完全不用缓存。
+    """
+
+    def __init__(self, db_path, workers=DU_WORKERS):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {r[1] for r in conn.execute('PRAGMA table_info(dirs)')}
+        if 'scanned_at' not in columns:
+            # 旧缓存没有扫描时间，按 0 处理，下次分析时全部重新统计
+            conn.execute('ALTER TABLE dirs ADD COLUMN scanned_at REAL NOT NULL DEFAULT 0')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _cached(self, path):
+        return self._conn().execute(
+            'SELECT mtime_ns, size, disk, files, subdirs, top, scanned_at FROM dirs WHERE path = ?', (path,)
+        ).fetchone()
+
+    def _scan(self, path, root_dev, one_fs, fresh_after):
+        st = os.lstat(path)
+        row = self._cached(path)
+        if row is not None and row[0] == st.st_mtime_ns and row[6] >= fresh_after:
+            return _DirScan(path, row[0], row[1], row[2], row[3], json.loads(row[4]), json.loads(row[5]), True)
+
+        size = disk = files = 0
+        subdirs = []
+        heap = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        est = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        # 与 du -x 一样不跨越挂载点
+                        if not one_fs or est.st_dev == root_dev:
+                            subdirs.append(entry.name)
+                        continue
+                    size += est.st_size
+                    disk += getattr(est, 'st_blocks', 0) * 512 or est.st_size
+                    files += 1
+                    if len(heap) < DU_TOP_CAP:
+                        heapq.heappush(heap, (est.st_size, entry.name))
+                    elif est.st_size > heap[0][0]:
+                        heapq.heappushpop(heap, (est.st_size, entry.name))
+        except PermissionError:
+            pass
+        top = sorted(heap, reverse=True)
+        old_subdirs = json.loads(row[4]) if row is not None else None
+        return _DirScan(path, st.st_mtime_ns, size, disk, files, subdirs, top, False, old_subdirs)
+
+    def analyze(self, root, top=50, one_fs=True, cancelled=None, on_progress=None,
+                max_age=DU_CACHE_MAX_AGE, refresh=False):
+        """统计 root 下的目录树，返回 DiskUsageResult
+
+        on_progress(dirs, files, size, expected_dirs) 在扫描过程中定期调用，
+        expected_dirs 为上次分析时的目录数（首次分析为 0）。
+        只复用 max_age 秒内扫描过的缓存行；max_age 为 0 或 None 时不按时间失效。
+        """
+        root = os.path.normpath(root)
+        root_dev = os.stat(root).st_dev
+        top = max(1, min(int(top), DU_TOP_CAP))
+        started = time.time()
+        if refresh:
+            fresh_after = float('inf')
+        elif max_age:
+            fresh_after = started - max_age
+        else:
+            fresh_after = 0.0
+        prev = self._conn().execute('SELECT dirs FROM roots WHERE path = ?', (root,)).fetchone()
+        expected_dirs = prev[0] if prev else 0
+
+        nodes = {}
+        order = []
+        top_heap = []
+        queue = deque([(root, None)])
+        dirty = []
+        stale = []
+        stats = {'dirs': 0, 'files': 0, 'size': 0, 'cached_dirs': 0}
+        last_report = 0.0
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='du') as pool:
+            pending = {}
+            try:
+                while queue or pending:
+                    if cancelled is not None and cancelled():
+                        raise DiskUsageCancelled()
+                    while queue and len(pending) < self.workers * 4:
+                        path, parent = queue.popleft()
+                        pending[pool.submit(self._scan, path, root_dev, one_fs, fresh_after)] = (path, parent)
+                    done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        path, parent = pending.pop(f)
+                        try:
+                            scan = f.result()
+                        except OSError:
+                            continue
+                        node = _Node(os.path.basename(path) if parent is not None else '', parent, scan)
+                        nodes[path] = node
+                        order.append(path)
+                        stats['dirs'] += 1
+                        stats['files'] += scan.files
+                        stats['size'] += scan.size
+                        if scan.cached:
+                            stats['cached_dirs'] += 1
+                        else:
+                            dirty.append(scan)
+                            if scan.old_subdirs:
+                                removed = set(scan.old_subdirs) - set(scan.subdirs)
+                                stale.extend(os.path.join(path, n) for n in removed)
+                        rel_dir = os.path.relpath(path, root)
+                        for fsize, fname in scan.top[:top]:
+                            item = (fsize, fname if rel_dir == '.' else rel_dir + '/' + fname)
+                            if len(top_heap) < top:
+                                heapq.heappush(top_heap, item)
+                            elif fsize > top_heap[0][0]:
+                                heapq.heappushpop(top_heap, item)
+                        for name in scan.subdirs:
+                            queue.append((os.path.join(path, name), path))
+                    if len(dirty) >= _FLUSH_ROWS:
+                        self._flush(dirty, stale)
+                    now = time.time()
+                    if on_progress is not None and now - last_report >= 0.5:
+                        last_report = now
+                        on_progress(stats['dirs'], stats['files'], stats['size'], expected_dirs)
+            except BaseException:
+                for f in pending:
+                    f.cancel()
+                # 已扫描的目录照样写入缓存，下次分析可以直接复用
+                self._flush(dirty, stale)
+                raise
+        self._flush(dirty, stale)
+
+        # 按发现顺序倒序累加，保证子目录先于父目录汇总
+        for path in reversed(order):
+            node = nodes[path]
+            if node.parent is None:
+                continue
+            parent = nodes.get(node.parent)
+            if parent is None:
+                continue
+            parent.size += node.size
+            parent.disk += node.disk
+            parent.files += node.files
+            parent.dirs += node.dirs + 1
+            parent.children.append(node)
+
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO roots(path, dirs, files, size, analyzed_at) VALUES (?, ?, ?, ?, ?)',
+                (root, stats['dirs'], stats['files'], stats['size'], time.time()),
+            )
+        stats['elapsed'] = round(time.time() - started, 3)
+        return DiskUsageResult(nodes[root], sorted(top_heap, reverse=True), stats)
+
+    def _flush(self, dirty, stale):
+        if not dirty and not stale:
+            return
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            for path in stale:
+                lo, hi = _subtree_bounds(path)
+                conn.execute('DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)', (path, lo, hi))
+            conn.executemany(
+                'INSERT OR REPLACE INTO dirs(path, mtime_ns, size, disk, files, subdirs, top, scanned_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (s.path, s.mtime_ns, s.size, s.disk, s.files,
+                     json.dumps(s.subdirs, ensure_ascii=False), json.dumps(s.top, ensure_ascii=False), now)
+                    for s in dirty
+                ],
+            )
+        dirty.clear()
+        stale.clear()
+
+
+class DiskUsageResult:
+    def __init__(self, root, top, stats):
+        self.root = root
+        self.top = top
+        self.stats = stats
+
+    def tree(self, depth=3, max_children=50):
+        """适合旭日图 / 矩形树图的嵌套结构；每层只保留最大的 max_children 项，其余合并为一个 '…' 节点"""
+        return _node_dict(self.root, '', max(0, int(depth)), max(1, int(max_children)))
+
+    def top_files(self):
+        return [{'path': path, 'size': size} for size, path in self.top]
+
+
+def _node_dict(node, rel, depth, max_children):
+    out = {
+        'name': node.name,
+        'path': rel,
+        'size': node.size,
+        'disk': node.disk,
+        'files': node.files,
+        'dirs': node.dirs,
+    }
+    if depth <= 0 or not node.children:
+        return out
+    children = heapq.nlargest(max_children, node.children, key=lambda n: n.size)
+    out['children'] = [
+        _node_dict(c, c.name if not rel else rel + '/' + c.name, depth - 1, max_children)
+        for c in children
+    ]
+    own = node.size - sum(c.size for c in node.children)
+    if len(node.children) > max_children:
+        kept = {id(c) for c in children}
+        rest_size = sum(c.size for c in node.children if id(c) not in kept)
+        out['children'].append({'name': '…', 'path': None, 'size': rest_size, 'other': True})
+    if own > 0:
+        out['children'].append({'name': '.', 'path': rel, 'size': own, 'own_files': True})
+    return out
@@ -1,4 +1,3 @@
-import json
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -7,7 +6,8 @@ from email.header import Header
 from email import encoders
 import mimetypes
 import os
-import config
+
+from lib import state_utils
 
 # 硬编码配置
 SMTP_SERVER = "smtp.qq.com"
@@ -226,17 +226,10 @@ if __name__ == "__main__":
     send_html_email("test@example.com", "HTML Test", "<h1>Hello</h1><p>This is a test.</p>")
 
 
-# Load config from file
-EMAIL_CONFIG_FILE = os.path.join(config.DATA_DIR, 'email_config.json')
-
+# Load config from the state store
 def get_email_config():
-    try:
-        if os.path.exists(EMAIL_CONFIG_FILE):
-            with open(EMAIL_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
-    return {}
+    cfg = state_utils.get_state_store().get(state_utils.NS_EMAIL, 'config')
+    return cfg if isinstance(cfg, dict) else {}
 
 def get_smtp_config():
     cfg = get_email_config()
@@ -1,5 +1,6 @@
 import os
 from datetime import datetime
+from stat import S_ISDIR
 
 from lib import path_utils
 
@@ -13,6 +14,8 @@ CODE_EXTENSIONS = {
     '.sql', '.ini', '.conf', '.cfg', '.log', '.bat', '.ps1', '.dockerfile', '.gitignore',
     '.env', '.properties', '.toml'
 }
+# 整文件读取接口（/api/file/read）的上限；更大的文本请用 /api/file/lines 按行窗口读取
+TEXT_READ_MAX_BYTES = 16 * 1024 * 1024
 
 
 def get_file_info(path):
@@ -46,54 +49,115 @@ def get_file_info(path):
     }
 
 
-def list_directory(directory):
-    """列出目录内容，排除隐藏的文件夹"""
-    items = []
+class DirEntryRecord:
+    """目录项的紧凑记录，仅在输出 JSON 时才格式化"""
+
+    __slots__ = ('name', 'path', 'is_dir', 'is_symlink', 'is_broken_link', 'size', 'mtime', 'ext')
+
+    def __init__(self, name, path, is_dir, is_symlink, is_broken_link, size, mtime, ext):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.is_symlink = is_symlink
+        self.is_broken_link = is_broken_link
+        self.size = size
+        self.mtime = mtime
+        self.ext = ext
+
+    def to_dict(self):
+        """格式化为 list_directory 的返回结构"""
+        if self.mtime is None:
+            modified = '-'
+        else:
+            modified = datetime.fromtimestamp(self.mtime).strftime('%Y-%m-%d %H:%M:%S')
+        if self.is_dir:
+            return {
+                'name': self.name,
+                'path': self.path,
+                'icon': '📁',
+                'size': '-',
+                'modified': modified,
+                'is_dir': True,
+                'is_image': False,
+                'extension': '',
+                'is_symlink': self.is_symlink,
+                'is_broken_link': self.is_broken_link,
+            }
+        return {
+            'name': self.name,
+            'path': self.path,
+            'icon': path_utils.get_file_icon(self.ext),
+            'size': path_utils.format_size(self.size),
+            'modified': modified,
+            'is_dir': False,
+            'is_image': self.ext in IMAGE_EXTENSIONS,
+            'extension': self.ext,
+            'is_symlink': self.is_symlink,
+            'is_broken_link': self.is_broken_link,
+        }
+
+
+def _record_from_entry(entry):
+    """从 os.DirEntry 构造记录，复用 scandir 缓存的类型和 stat 信息"""
     try:
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
-            is_symlink = os.path.islink(item_path)
-            
-            # 处理符号链接失效的情况
-            try:
-                is_dir = os.path.isdir(item_path)  # os.path.isdir() 会跟随软链接
-            except (OSError, FileNotFoundError):
-                is_dir = False
-            
-            if is_dir:
-                info = get_file_info(item_path)
-                items.append({
-                    'name': item,
-                    'path': item_path,
-                    'icon': '📁',
-                    'size': '-',
-                    'modified': info['modified'],
-                    'is_dir': True,
-                    'is_image': False,
-                    'extension': '',
-                    'is_symlink': is_symlink,
-                    'is_broken_link': is_symlink and not info.get('target_exists', True)
-                })
-            else:
-                _, ext = os.path.splitext(item)
-                info = get_file_info(item_path)
-                is_image = ext.lower() in IMAGE_EXTENSIONS
-                items.append({
-                    'name': item,
-                    'path': item_path,
-                    'icon': path_utils.get_file_icon(ext),
-                    'size': path_utils.format_size(info['size']),
-                    'modified': info['modified'],
-                    'is_dir': False,
-                    'is_image': is_image,
-                    'extension': ext.lower(),
-                    'is_symlink': is_symlink,
-                    'is_broken_link': is_symlink and not info.get('target_exists', True)
-                })
-    except PermissionError:
+        is_symlink = entry.is_symlink()
+    except OSError:
+        is_symlink = False
+    is_broken_link = False
+    try:
+        st = entry.stat()
+        is_dir = S_ISDIR(st.st_mode)
+    except OSError:
+        # 符号链接失效，退回到链接本身的信息
+        is_dir = False
+        try:
+            st = entry.stat(follow_symlinks=False)
+            is_broken_link = is_symlink
+        except OSError:
+            st = None
+            is_broken_link = True
+    name = entry.name
+    ext = '' if is_dir else os.path.splitext(name)[1].lower()
+    return DirEntryRecord(
+        name,
+        entry.path,
+        is_dir,
+        is_symlink,
+        is_broken_link,
+        st.st_size if st is not None else 0,
+        st.st_mtime if st is not None else None,
+        ext,
+    )
+
+
+def scan_directory(directory):
+    """基于 os.scandir 列出目录，返回按 (非目录, 名称) 排序的 DirEntryRecord 列表"""
+    records = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                records.append(_record_from_entry(entry))
+    except (PermissionError, FileNotFoundError, NotADirectoryError):
         pass
-    items.sort(key=lambda x: (not x['is_dir'], x['name']))
-    return items
+    records.sort(key=lambda r: (not r.is_dir, r.name))
+    return records
+
+
+def count_entries(directory):
+    """统计目录下的项目数量，无法访问时返回 0"""
+    count = 0
+    try:
+        with os.scandir(directory) as it:
+            for _entry in it:
+                count += 1
+    except OSError:
+        return 0
+    return count
+
+
+def list_directory(directory):
+    """列出目录内容，排除隐藏的文件夹"""
+    return [r.to_dict() for r in scan_directory(directory)]
 
 
 def get_file_details(path, root_dir):
@@ -170,6 +234,16 @@ def get_file_details(path, root_dir):
         return {'success': False, 'message': str(e)}
 
 
+def is_hidden_dir(name, hidden_folders=None):
+    """搜索时跳过的目录：隐藏目录和 hidden_folders 中的目录"""
+    return name.startswith('.') or bool(hidden_folders and name in hidden_folders)
+
+
+def is_hidden_file(name):
+    """搜索时跳过的文件：隐藏文件"""
+    return name.startswith('.')
+
+
 def search_files(root_dir, keyword, hidden_folders=None):
     """搜索文件"""
     if not hidden_folders:
@@ -180,10 +254,10 @@ def search_files(root_dir, keyword, hidden_folders=None):
     results = []
     try:
         for root, dirs, files in os.walk(root_dir):
-            dirs[:] = [d for d in dirs if d not in hidden_folders and not d.startswith('.')]
+            dirs[:] = [d for d in dirs if not is_hidden_dir(d, hidden_folders)]
 
             for name in files:
-                if name.startswith('.'):
+                if is_hidden_file(name):
                     continue
                 if keyword.lower() in name.lower():
                     full_path = os.path.join(root, name)
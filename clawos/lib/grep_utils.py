@@ -0,0 +1,377 @@
+import fnmatch
+import mmap
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from lib import file_utils
+
+
+GREP_MAX_FILE_SIZE = 10 * 1024 * 1024
+GREP_MAX_RESULTS = 1000
+GREP_MAX_MATCHES_PER_FILE = 100
+GREP_MAX_LINE_CHARS = 400
+GREP_BINARY_SNIFF_BYTES = 8192
+
+
+def _gitignore_to_regex(pattern):
+    """把一条 .gitignore 规则转换为匹配相对路径的正则"""
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = pattern.find(']', i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    body = ''.join(out)
+    if not anchored:
+        body = '(?:.*/)?' + body
+    return re.compile(body + '$', re.S)
+
+
+class GitIgnoreRules:
+    """单个目录中 .gitignore 的规则集合"""
+
+    __slots__ = ('base', 'rules')
+
+    def __init__(self, base, rules):
+        self.base = base
+        self.rules = rules
+
+    @classmethod
+    def load(cls, base, abs_dir):
+        try:
+            with open(os.path.join(abs_dir, '.gitignore'), 'r', encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        rules = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            try:
+                rules.append((_gitignore_to_regex(line), negate, dir_only))
+            except re.error:
+                continue
+        if not rules:
+            return None
+        return cls(base, rules)
+
+
+def is_ignored(rule_stack, rel_path, is_dir):
+    """按 git 语义判断 rel_path 是否被忽略：越深的 .gitignore 越优先，同一文件中后出现的规则优先
+
+    遍历时被忽略的目录不会进入，因此这里只需判断条目自身。
+    """
+    ignored = False
+    for rules in rule_stack:
+        if rules.base:
+            if not rel_path.startswith(rules.base + '/'):
+                continue
+            sub = rel_path[len(rules.base) + 1:]
+        else:
+            sub = rel_path
+        for regex, negate, dir_only in rules.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(sub):
+                ignored = not negate
+    return ignored
+
+
+def compile_query(query, use_regex=False, case_sensitive=False):
+    flags = 0 if case_sensitive else re.IGNORECASE
+    raw = query.encode('utf-8')
+    if not use_regex:
+        raw = re.escape(raw)
+    return re.compile(raw, flags | re.MULTILINE)
+
+
+class ContentSearch:
+    """并行的文件内容搜索
+
+    一个线程按 scandir 遍历目录（遵循隐藏目录规则与 .gitignore），把文件交给线程池；
+    工作线程用 mmap 读取文件并把匹配结果放入队列，由 events() 以生成器的形式流式输出。
+    """
+
+    def __init__(
+        self,
+        root_dir,
+        start_dir,
+        pattern,
+        max_file_size=GREP_MAX_FILE_SIZE,
+        max_results=GREP_MAX_RESULTS,
+        name_glob='',
+        use_gitignore=True,
+        workers=None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.root_dir = os.path.normpath(root_dir)
+        self.start_dir = os.path.normpath(start_dir)
+        self.pattern = pattern
+        self.max_file_size = max_file_size
+        self.max_results = max_results
+        self.name_glob = name_glob
+        self.use_gitignore = use_gitignore
+        self.workers = workers or min(8, (os.cpu_count() or 2) * 2)
+        self.cancelled = threading.Event()
+        self._queue = queue.Queue(maxsize=1024)
+        self._lock = threading.Lock()
+        self._stats = {
+            'files_scanned': 0,
+            'files_matched': 0,
+            'files_skipped': 0,
+            'matches': 0,
+        }
+        self._truncated = False
+        self._finished = False
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def events(self):
+        """生成 start / match / done 事件字典；消费方停止迭代时自动取消搜索"""
+        started = time.time()
+        walker = threading.Thread(target=self._walk_and_dispatch, name='grep-walker', daemon=True)
+        walker.start()
+        yield {'type': 'start', 'id': self.id}
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                yield item
+        finally:
+            self.cancel()
+        with self._lock:
+            done = dict(self._stats)
+        done.update({
+            'type': 'done',
+            'id': self.id,
+            'truncated': self._truncated,
+            'cancelled': self.cancelled.is_set() and not self._truncated and not self._finished,
+            'elapsed_ms': int((time.time() - started) * 1000),
+        })
+        yield done
+
+    def _put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _walk_and_dispatch(self):
+        slots = threading.BoundedSemaphore(self.workers * 4)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='grep') as pool:
+                for abs_path, rel_path in self._iter_files():
+                    if self.cancelled.is_set():
+                        break
+                    while not slots.acquire(timeout=0.5):
+                        if self.cancelled.is_set():
+                            break
+                    if self.cancelled.is_set():
+                        break
+                    future = pool.submit(self._scan_file, abs_path, rel_path)
+                    future.add_done_callback(lambda _f: slots.release())
+            self._finished = not self.cancelled.is_set()
+        finally:
+            # 结束标记必须送达，即使已取消
+            while True:
+                try:
+                    self._queue.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    if not self.cancelled.is_set():
+                        continue
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _iter_files(self):
+        base_rel = os.path.relpath(self.start_dir, self.root_dir).replace('\\', '/')
+        if base_rel == '.':
+            base_rel = ''
+        rule_stack = []
+        if self.use_gitignore:
+            # 起始目录之上的 .gitignore 同样生效
+            parts = base_rel.split('/') if base_rel else []
+            for k in range(len(parts)):
+                rel = '/'.join(parts[:k])
+                rules = GitIgnoreRules.load(rel, os.path.join(self.root_dir, rel) if rel else self.root_dir)
+                if rules is not None:
+                    rule_stack.append(rules)
+        stack = [(self.start_dir, base_rel, rule_stack)]
+        while stack:
+            if self.cancelled.is_set():
+                return
+            abs_dir, rel_dir, rules_here = stack.pop()
+            if self.use_gitignore:
+                own = GitIgnoreRules.load(rel_dir, abs_dir)
+                if own is not None:
+                    rules_here = rules_here + [own]
+            try:
+                with os.scandir(abs_dir) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                name = entry.name
+                rel = rel_dir + '/' + name if rel_dir else name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if file_utils.is_hidden_dir(name):
+                            continue
+                        if rules_here and is_ignored(rules_here, rel, True):
+                            continue
+                        subdirs.append((entry.path, rel))
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                except OSError:
+                    continue
+                if file_utils.is_hidden_file(name):
+                    continue
+                if self.name_glob and not fnmatch.fnmatch(name, self.name_glob):
+                    continue
+                if rules_here and is_ignored(rules_here, rel, False):
+                    continue
+                yield entry.path, rel
+            for abs_sub, rel_sub in sorted(subdirs, key=lambda x: x[1], reverse=True):
+                stack.append((abs_sub, rel_sub, rules_here))
+
+    def _scan_file(self, abs_path, rel_path):
+        if self.cancelled.is_set():
+            return
+        try:
+            with open(abs_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0 or size > self.max_file_size:
+                    self._bump('files_skipped')
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if mm.find(b'\0', 0, min(size, GREP_BINARY_SNIFF_BYTES)) != -1:
+                        self._bump('files_skipped')
+                        return
+                    self._bump('files_scanned')
+                    self._search_mmap(mm, rel_path)
+        except (OSError, ValueError):
+            self._bump('files_skipped')
+
+    def _search_mmap(self, mm, rel_path):
+        line_no = 1
+        counted_to = 0
+        last_line_start = -1
+        found = 0
+        for m in self.pattern.finditer(mm):
+            if self.cancelled.is_set():
+                return
+            start = m.start()
+            line_start = mm.rfind(b'\n', 0, start) + 1
+            if line_start == last_line_start:
+                continue
+            line_no += mm[counted_to:line_start].count(b'\n')
+            counted_to = line_start
+            last_line_start = line_start
+            line_end = mm.find(b'\n', start)
+            if line_end == -1:
+                line_end = len(mm)
+            text = mm[line_start:min(line_end, line_start + GREP_MAX_LINE_CHARS * 4)].decode('utf-8', errors='replace')
+            if not self._reserve_result(found == 0):
+                return
+            found += 1
+            self._put({
+                'type': 'match',
+                'path': rel_path,
+                'line': line_no,
+                'col': len(mm[line_start:start].decode('utf-8', errors='replace')) + 1,
+                'text': text[:GREP_MAX_LINE_CHARS].rstrip('\r'),
+            })
+            if found >= GREP_MAX_MATCHES_PER_FILE:
+                return
+
+    def _reserve_result(self, first_in_file):
+        with self._lock:
+            if self._stats['matches'] >= self.max_results:
+                self._truncated = True
+                self.cancelled.set()
+                return False
+            self._stats['matches'] += 1
+            if first_in_file:
+                self._stats['files_matched'] += 1
+            return True
+
+    def _bump(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+_searches = {}
+_searches_lock = threading.Lock()
+
+
+def register_search(search):
+    with _searches_lock:
+        _searches[search.id] = search
+
+
+def unregister_search(search_id):
+    with _searches_lock:
+        _searches.pop(search_id, None)
+
+
+def cancel_search(search_id):
+    with _searches_lock:
+        search = _searches.get(search_id)
+    if search is None:
+        return False
+    search.cancel()
+    return True
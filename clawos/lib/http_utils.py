@@ -0,0 +1,252 @@
+import os
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from flask import current_app, request
+from werkzeug.http import http_date, parse_date
+
+
+SEND_BLOCK_SIZE = 1024 * 1024
+# 超过这么多段的多段 Range 视为滥用，直接返回完整文件
+MAX_RANGES = 32
+
+
+def file_etag(st):
+    """由 inode、mtime 与大小构造强 ETag（不含引号）"""
+    return f'{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}'
+
+
+def parse_ranges(header, size):
+    """解析 Range 请求头，返回按起点排序并合并后的 [(start, end)]（end 不含）
+
+    无法解析或段数过多时返回 None（忽略 Range，返回完整内容）；全部段都不可满足时返回 []。
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        if not sep:
+            return None
+        first = first.strip()
+        last = last.strip()
+        try:
+            if first:
+                start = int(first)
+                end = int(last) + 1 if last else max(size, start + 1)
+                if start < 0 or end <= start:
+                    return None
+            else:
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start = max(0, size - suffix)
+                end = size
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        safe = filename.replace('\\', '\\\\').replace('"', '\\"')
+        return f'attachment; filename="{safe}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+class _FileSegments:
+    """按段读取文件的 WSGI 响应体；每段前可带一段前缀字节（multipart 分隔头）"""
+
+    def __init__(self, f, segments, tail=b''):
+        self._f = f
+        self._segments = segments
+        self._tail = tail
+
+    def __iter__(self):
+        fd = self._f.fileno()
+        for prefix, start, end in self._segments:
+            if prefix:
+                yield prefix
+            pos = start
+            while pos < end:
+                chunk = os.pread(fd, min(SEND_BLOCK_SIZE, end - pos), pos)
+                if not chunk:
+                    return
+                pos += len(chunk)
+                yield chunk
+        if self._tail:
+            yield self._tail
+
+    def close(self):
+        self._f.close()
+
+
+def _advise_sequential(f, start, length):
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(f.fileno(), start, length, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def _not_modified(etag, st):
+    if_none_match = request.if_none_match
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and int(st.st_mtime) <= since.timestamp()
+
+
+def _range_applies(etag, st):
+    """If-Range 与当前文件版本一致（或未携带）时才按 Range 返回"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == f'"{etag}"'
+    date = parse_date(if_range)
+    return date is not None and int(st.st_mtime) == int(date.timestamp())
+
+
+def _base_headers(etag, st, as_attachment, download_name, ranged=True):
+    headers = {
+        'Accept-Ranges': 'bytes' if ranged else 'none',
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(datetime.fromtimestamp(int(st.st_mtime), tz=timezone.utc)),
+        'Cache-Control': 'no-cache',
+    }
+    if as_attachment:
+        headers['Content-Disposition'] = content_disposition(download_name)
+    return headers
+
+
+def _multipart_segments(ranges, size, mimetype, headers):
+    """构造 multipart/byteranges 的各段前缀与结尾，并写入 Content-Length"""
+    boundary = uuid.uuid4().hex
+    segments = []
+    length = 0
+    for start, end in ranges:
+        prefix = (
+            f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n'
+            f'Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n'
+        ).encode('latin-1')
+        segments.append((prefix, start, end))
+        length += len(prefix) + end - start
+    tail = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+    headers['Content-Length'] = str(length + len(tail))
+    return segments, tail, f'multipart/byteranges; boundary={boundary}'
+
+
+def send_file_ranged(full_path, mimetype=None, as_attachment=False, download_name=None):
+    """发送本地文件，支持强 ETag / Last-Modified 协商、单段与多段 Range
+
+    整段发送到文件末尾时优先交给服务器的 wsgi.file_wrapper（如 gunicorn 在 Linux 上用
+    sendfile 零拷贝）；其余情况以 1 MiB 块 pread 流式输出。
+    """
+    f = open(full_path, 'rb')
+    try:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        etag = file_etag(st)
+        mimetype = mimetype or 'application/octet-stream'
+        headers = _base_headers(etag, st, as_attachment, download_name or os.path.basename(full_path))
+
+        if request.method in ('GET', 'HEAD') and _not_modified(etag, st):
+            f.close()
+            return current_app.response_class(status=304, headers=headers)
+
+        ranges = None
+        if request.method == 'GET' and _range_applies(etag, st):
+            ranges = parse_ranges(request.headers.get('Range'), size)
+        if ranges == []:
+            f.close()
+            headers['Content-Range'] = f'bytes */{size}'
+            return current_app.response_class(status=416, headers=headers)
+
+        if ranges and len(ranges) > 1:
+            segments, tail, content_type = _multipart_segments(ranges, size, mimetype, headers)
+            return current_app.response_class(
+                _FileSegments(f, segments, tail), status=206, headers=headers,
+                content_type=content_type, direct_passthrough=True,
+            )
+
+        start, end = ranges[0] if ranges else (0, size)
+        status = 206 if ranges else 200
+        if ranges:
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+        headers['Content-Length'] = str(end - start)
+        _advise_sequential(f, start, end - start)
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and end == size:
+            f.seek(start)
+            body = file_wrapper(f, SEND_BLOCK_SIZE)
+        else:
+            body = _FileSegments(f, [(b'', start, end)])
+        return current_app.response_class(
+            body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True,
+        )
+    except BaseException:
+        f.close()
+        raise
+
+
+def send_stream_ranged(read, size, st, etag, mimetype=None, ranged=True, as_attachment=False, download_name=None):
+    """发送由 read(start, end) 生成的数据流（如压缩包内的文件），协商规则与 send_file_ranged 相同
+
+    st 为数据来源文件的 stat，用于 Last-Modified；ranged 为 False 时忽略 Range，总是返回完整内容。
+    """
+    mimetype = mimetype or 'application/octet-stream'
+    headers = _base_headers(etag, st, as_attachment, download_name, ranged=ranged)
+    if request.method in ('GET', 'HEAD') and _not_modified(etag, st):
+        return current_app.response_class(status=304, headers=headers)
+
+    ranges = None
+    if ranged and request.method == 'GET' and _range_applies(etag, st):
+        ranges = parse_ranges(request.headers.get('Range'), size)
+    if ranges == []:
+        headers['Content-Range'] = f'bytes */{size}'
+        return current_app.response_class(status=416, headers=headers)
+
+    if ranges and len(ranges) > 1:
+        segments, tail, content_type = _multipart_segments(ranges, size, mimetype, headers)
+
+        def body():
+            for prefix, start, end in segments:
+                yield prefix
+                yield from read(start, end)
+            yield tail
+
+        return current_app.response_class(
+            body(), status=206, headers=headers, content_type=content_type, direct_passthrough=True,
+        )
+
+    start, end = ranges[0] if ranges else (0, size)
+    if ranges:
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    headers['Content-Length'] = str(end - start)
+    return current_app.response_class(
+        read(start, end), status=206 if ranges else 200, headers=headers,
+        mimetype=mimetype, direct_passthrough=True,
+    )
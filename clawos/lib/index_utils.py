@@ -0,0 +1,391 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from lib import file_utils, inotify_utils, path_utils
+
+
+INDEX_RESCAN_SECONDS = int(os.getenv('CLAWOS_INDEX_RESCAN_SECONDS', '1800'))
+INDEX_MAX_WATCHES = int(os.getenv('CLAWOS_INDEX_MAX_WATCHES', '65536'))
+INDEX_MAX_LIMIT = 500
+INDEX_TOTAL_CAP = 10000
+
+# files.kind: 0 文件，1 目录，2 指向目录的软链接（与 os.walk 一致：列为目录但不进入）
+_KIND_FILE = 0
+_KIND_DIR = 1
+_KIND_DIR_LINK = 2
+
+_WATCH_MASK = (
+    inotify_utils.IN_CREATE | inotify_utils.IN_DELETE | inotify_utils.IN_MOVED_FROM
+    | inotify_utils.IN_MOVED_TO | inotify_utils.IN_DELETE_SELF | inotify_utils.IN_MOVE_SELF
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_parent ON files(parent);
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(name, content='files', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+"""
+
+
+def _child_rel(parent, name):
+    return name if not parent else parent + '/' + name
+
+
+def _subtree_bounds(rel):
+    # '/' 之后紧跟的字符是 '0'，[rel/, rel0) 恰好覆盖 rel 下的所有路径
+    return rel + '/', rel + '0'
+
+
+def _max_watches():
+    try:
+        with open('/proc/sys/fs/inotify/max_user_watches', 'r') as f:
+            system_limit = int(f.read().strip())
+        return max(0, min(INDEX_MAX_WATCHES, system_limit // 2))
+    except Exception:
+        return INDEX_MAX_WATCHES
+
+
+class FileNameIndex:
+    """持久化的文件名索引（SQLite + FTS5 trigram）
+
+    后台线程负责全部写入：启动时按目录 mtime 增量爬取，之后由 inotify 事件增量维护，
+    并按 INDEX_RESCAN_SECONDS 周期重扫以覆盖未能监听的目录。查询在请求线程中只读执行。
+    """
+
+    def __init__(self, root_dir, db_path, rescan_interval=INDEX_RESCAN_SECONDS):
+        self.root_dir = os.path.normpath(root_dir)
+        self.db_path = db_path
+        self.rescan_interval = rescan_interval
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._dirty = set()
+        self._rescan_requested = None
+        self._thread = None
+        self._state = 'idle'
+        self._last_error = ''
+        self._watcher = None
+        self._watch_limit = 0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        try:
+            conn.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        row = conn.execute("SELECT value FROM meta WHERE key='root_dir'").fetchone()
+        if row is not None and row[0] != self.root_dir:
+            self._wipe(conn)
+        conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('root_dir', ?)", (self.root_dir,))
+        conn.commit()
+
+    # ---------- 读取 ----------
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def search(self, keyword, offset=0, limit=100):
+        """按名称子串搜索，返回排好序的一页结果；排序：完全匹配 > 前缀匹配 > 目录 > 短名称"""
+        q = (keyword or '').strip()
+        if not q:
+            return {'results': [], 'total': 0, 'offset': 0, 'limit': limit, 'has_more': False}
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), INDEX_MAX_LIMIT))
+        ql = q.lower()
+        if self.fts and len(q) >= 3:
+            where = 'f.id IN (SELECT rowid FROM names WHERE names MATCH ?)'
+            where_args = ['"' + q.replace('"', '""') + '"']
+        else:
+            where = 'instr(lower(f.name), ?) > 0'
+            where_args = [ql]
+        conn = self._conn()
+        total = conn.execute(
+            f'SELECT count(*) FROM (SELECT 1 FROM files f WHERE {where} LIMIT ?)',
+            where_args + [INDEX_TOTAL_CAP + 1],
+        ).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT f.path, f.name, f.kind FROM files f WHERE {where} '
+            'ORDER BY (lower(f.name) = ?) DESC, (substr(lower(f.name), 1, ?) = ?) DESC, '
+            '(f.kind > 0) DESC, length(f.name), f.path LIMIT ? OFFSET ?',
+            where_args + [ql, len(ql), ql, limit, offset],
+        ).fetchall()
+
+        results = []
+        for rel, name, kind in rows:
+            if kind:
+                results.append({'name': name, 'path': rel, 'is_dir': True, 'size': '-', 'modified': '-', 'icon': '📁'})
+                continue
+            try:
+                st = os.stat(os.path.join(self.root_dir, rel))
+                size = path_utils.format_size(st.st_size)
+                modified = datetime.fromtimestamp(st.st_mtime).strftime('%Y-%m-%d %H:%M')
+            except OSError:
+                size, modified = '-', '-'
+            results.append({
+                'name': name,
+                'path': rel,
+                'is_dir': False,
+                'size': size,
+                'modified': modified,
+                'icon': path_utils.get_file_icon(os.path.splitext(name)[1].lower()),
+            })
+        return {
+            'results': results,
+            'total': min(total, INDEX_TOTAL_CAP),
+            'total_capped': total > INDEX_TOTAL_CAP,
+            'offset': offset,
+            'limit': limit,
+            'has_more': offset + len(results) < total,
+        }
+
+    def status(self, with_counts=True):
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM meta WHERE key='last_full_scan'").fetchone()
+        last_full_scan = int(row[0]) if row else 0
+        if not with_counts:
+            return {'state': self._state, 'ready': last_full_scan > 0}
+        return {
+            'state': self._state,
+            'ready': last_full_scan > 0,
+            'entries': conn.execute('SELECT count(*) FROM files').fetchone()[0],
+            'last_full_scan': last_full_scan,
+            'watched_dirs': self._watcher.count() if self._watcher is not None else 0,
+            'watch_limit': self._watch_limit,
+            'backend': 'fts5-trigram' if self.fts else 'scan',
+            'last_error': self._last_error,
+        }
+
+    # ---------- 后台维护 ----------
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='file-name-index', daemon=True)
+            self._thread.start()
+
+    def request_rescan(self, full=False):
+        """请求重扫；full=True 时忽略目录 mtime 重新读取每个目录"""
+        with self._cond:
+            self._rescan_requested = bool(full or self._rescan_requested)
+            self._cond.notify()
+        self.start()
+
+    def _on_event(self, path, _name, _mask):
+        with self._cond:
+            if path is None:
+                if self._rescan_requested is None:
+                    self._rescan_requested = False
+            else:
+                self._dirty.add(path)
+            self._cond.notify()
+
+    def _run(self):
+        self._watcher = inotify_utils.create_watcher(self._on_event)
+        self._watch_limit = _max_watches() if self._watcher is not None else 0
+        conn = self._conn()
+        next_rescan = 0.0
+        while True:
+            try:
+                with self._cond:
+                    if not self._dirty and self._rescan_requested is None and time.time() < next_rescan:
+                        self._cond.wait(max(0.0, next_rescan - time.time()))
+                    # 合并短时间内的连续事件
+                    if self._dirty and self._rescan_requested is None:
+                        self._cond.wait(0.5)
+                    dirty, self._dirty = self._dirty, set()
+                    full = self._rescan_requested
+                    self._rescan_requested = None
+                if full is not None or time.time() >= next_rescan:
+                    self._full_scan(conn, force=bool(full))
+                    next_rescan = time.time() + self.rescan_interval
+                    continue
+                if dirty:
+                    self._state = 'updating'
+                    for abs_dir in dirty:
+                        self._refresh_dir(conn, abs_dir)
+                    conn.commit()
+                    self._state = 'idle'
+            except Exception as e:
+                self._last_error = str(e)
+                self._state = 'idle'
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                time.sleep(5)
+
+    def _full_scan(self, conn, force):
+        self._state = 'crawling'
+        self._crawl(conn, '', force)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta(key, value) VALUES ('last_full_scan', ?)",
+            (str(int(time.time())),),
+        )
+        conn.commit()
+        self._state = 'idle'
+
+    def _refresh_dir(self, conn, abs_dir):
+        try:
+            rel = os.path.relpath(abs_dir, self.root_dir).replace('\\', '/')
+        except ValueError:
+            return
+        if rel == '.':
+            rel = ''
+        if rel.startswith('..'):
+            return
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            if rel:
+                self._delete_path(conn, rel)
+            return
+        _subdirs, added = self._reconcile(conn, rel, abs_dir, mtime_ns)
+        for sub in added:
+            self._crawl(conn, sub, force=False)
+
+    def _crawl(self, conn, rel, force):
+        stack = [rel]
+        pending = 0
+        while stack:
+            cur = stack.pop()
+            abs_dir = os.path.join(self.root_dir, cur) if cur else self.root_dir
+            try:
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                if cur:
+                    self._delete_path(conn, cur)
+                continue
+            self._watch(abs_dir)
+            row = conn.execute('SELECT mtime_ns FROM dirs WHERE path=?', (cur,)).fetchone()
+            if not force and row is not None and row[0] == mtime_ns:
+                subdirs = [r[0] for r in conn.execute(
+                    'SELECT path FROM files WHERE parent=? AND kind=?', (cur, _KIND_DIR)
+                )]
+            else:
+                subdirs, _added = self._reconcile(conn, cur, abs_dir, mtime_ns)
+            stack.extend(subdirs)
+            pending += 1
+            if pending >= 500:
+                conn.commit()
+                pending = 0
+        conn.commit()
+
+    def _reconcile(self, conn, rel, abs_dir, mtime_ns):
+        """让数据库中 rel 的直接子项与磁盘一致，返回 (需进入的子目录, 新增的子目录)"""
+        current = {}
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    name = entry.name
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if file_utils.is_hidden_dir(name):
+                            continue
+                        try:
+                            is_link = entry.is_symlink()
+                        except OSError:
+                            is_link = False
+                        current[name] = _KIND_DIR_LINK if is_link else _KIND_DIR
+                    elif not file_utils.is_hidden_file(name):
+                        current[name] = _KIND_FILE
+        except FileNotFoundError:
+            if rel:
+                self._delete_path(conn, rel)
+            return [], []
+        except OSError:
+            return [], []
+
+        existing = {name: kind for name, kind in conn.execute(
+            'SELECT name, kind FROM files WHERE parent=?', (rel,)
+        )}
+        added_dirs = []
+        for name, kind in existing.items():
+            new_kind = current.get(name)
+            if new_kind == kind:
+                continue
+            child = _child_rel(rel, name)
+            if kind == _KIND_DIR:
+                self._delete_subtree(conn, child)
+            if new_kind is None:
+                conn.execute('DELETE FROM files WHERE path=?', (child,))
+            else:
+                conn.execute('UPDATE files SET kind=? WHERE path=?', (new_kind, child))
+                if new_kind == _KIND_DIR:
+                    added_dirs.append(child)
+        rows = []
+        for name, kind in current.items():
+            if name in existing:
+                continue
+            child = _child_rel(rel, name)
+            rows.append((child, rel, name, kind))
+            if kind == _KIND_DIR:
+                added_dirs.append(child)
+        if rows:
+            conn.executemany('INSERT OR IGNORE INTO files(path, parent, name, kind) VALUES (?, ?, ?, ?)', rows)
+        conn.execute('INSERT OR REPLACE INTO dirs(path, mtime_ns) VALUES (?, ?)', (rel, mtime_ns))
+        subdirs = [_child_rel(rel, n) for n, k in current.items() if k == _KIND_DIR]
+        return subdirs, added_dirs
+
+    def _delete_subtree(self, conn, rel):
+        lo, hi = _subtree_bounds(rel)
+        conn.execute('DELETE FROM files WHERE path >= ? AND path < ?', (lo, hi))
+        conn.execute('DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)', (rel, lo, hi))
+
+    def _delete_path(self, conn, rel):
+        conn.execute('DELETE FROM files WHERE path=?', (rel,))
+        self._delete_subtree(conn, rel)
+
+    def _watch(self, abs_dir):
+        if self._watcher is None or self._watcher.count() >= self._watch_limit:
+            return
+        self._watcher.add(abs_dir, _WATCH_MASK)
+
+    def _wipe(self, conn):
+        conn.execute('DELETE FROM files')
+        conn.execute('DELETE FROM dirs')
+        conn.execute("DELETE FROM meta WHERE key='last_full_scan'")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(root_dir, db_path):
+    """获取（必要时创建并启动）root_dir 对应的文件名索引"""
+    key = (os.path.normpath(root_dir), db_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FileNameIndex(root_dir, db_path)
+            _indexes[key] = index
+    index.start()
+    return index
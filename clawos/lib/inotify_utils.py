@@ -0,0 +1,154 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import threading
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+DIR_CHANGE_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+SELF_GONE_MASK = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    if not os.name == 'posix' or not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _ = libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except Exception:
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+class DirWatcher:
+    """基于 inotify 的目录监听器，在后台线程中读取事件并回调 on_event(path, name, mask)
+
+    path 为被监听目录，name 为目录内发生变化的条目名（目录自身事件时为空串）。
+    队列溢出时以 on_event(None, '', IN_Q_OVERFLOW) 通知调用方丢弃全部状态。
+    """
+
+    def __init__(self, libc, fd, on_event):
+        self._libc = libc
+        self._fd = fd
+        self._on_event = on_event
+        self._lock = threading.Lock()
+        self._wd_to_path = {}
+        self._path_to_wd = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._read_loop, name='inotify-watcher', daemon=True)
+        self._thread.start()
+
+    def add(self, path, mask=DIR_CHANGE_MASK):
+        """监听目录，成功返回 True；超出 max_user_watches 等失败时返回 False"""
+        with self._lock:
+            if self._closed:
+                return False
+            if path in self._path_to_wd:
+                return True
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask | IN_ONLYDIR)
+            if wd < 0:
+                return False
+            old = self._wd_to_path.get(wd)
+            if old is not None and old != path:
+                # 同一 inode 的不同路径（如软链接）共享 wd，仅保留最新路径
+                self._path_to_wd.pop(old, None)
+            self._wd_to_path[wd] = path
+            self._path_to_wd[path] = wd
+            return True
+
+    def remove(self, path):
+        with self._lock:
+            wd = self._path_to_wd.pop(path, None)
+            if wd is None:
+                return
+            self._wd_to_path.pop(wd, None)
+            if not self._closed:
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def is_watching(self, path):
+        with self._lock:
+            return path in self._path_to_wd
+
+    def count(self):
+        with self._lock:
+            return len(self._path_to_wd)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wd_to_path.clear()
+            self._path_to_wd.clear()
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+    def _read_loop(self):
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                return
+            if not buf:
+                return
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                raw_name = buf[offset:offset + name_len].rstrip(b'\0')
+                offset += name_len
+                self._dispatch(wd, mask, os.fsdecode(raw_name))
+
+    def _dispatch(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            path = None
+        else:
+            with self._lock:
+                path = self._wd_to_path.get(wd)
+                if path is not None and mask & IN_IGNORED:
+                    self._wd_to_path.pop(wd, None)
+                    self._path_to_wd.pop(path, None)
+            if path is None:
+                return
+        try:
+            self._on_event(path, name, mask)
+        except Exception as e:
+            print(f"inotify 回调失败: {e}")
+
+
+def create_watcher(on_event):
+    """创建 inotify 监听器；平台不支持或初始化失败时返回 None"""
+    libc = _load_libc()
+    if libc is None:
+        return None
+    fd = libc.inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        return None
+    return DirWatcher(libc, fd, on_event)
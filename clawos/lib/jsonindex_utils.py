@@ -0,0 +1,378 @@
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+
+
+# 单次返回的最大子节点数量
+JSON_CHILDREN_MAX_LIMIT = 1000
+# 返回节点完整值（供编辑器编辑子树）的大小上限
+JSON_VALUE_MAX_BYTES = 8 * 1024 * 1024
+# 子节点列表中直接附带值的标量大小上限；更长的字符串只给预览
+JSON_INLINE_BYTES = 256
+_PREVIEW_CHARS = 120
+_CACHE_FILES = 8
+_CACHE_CONTAINERS = 256
+_COPY_CHUNK = 4 * 1024 * 1024
+
+# 结构扫描只关心完整字符串与结构字符；数字 / true / false / null 由逗号间的区间确定
+_TOKEN_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{},:]', re.S)
+_WS = b' \t\r\n'
+
+TYPE_OBJECT = 'object'
+TYPE_ARRAY = 'array'
+TYPE_STRING = 'string'
+TYPE_NUMBER = 'number'
+TYPE_BOOLEAN = 'boolean'
+TYPE_NULL = 'null'
+
+_TYPE_CODES = [TYPE_OBJECT, TYPE_ARRAY, TYPE_STRING, TYPE_NUMBER, TYPE_BOOLEAN, TYPE_NULL]
+_FIRST_BYTE_TYPES = {ord('{'): 0, ord('['): 1, ord('"'): 2, ord('t'): 4, ord('f'): 4, ord('n'): 5}
+
+
+class JsonIndexError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_pointer(pointer):
+    """RFC 6901 JSON Pointer -> token 列表；'' 表示整个文档"""
+    if not pointer:
+        return []
+    if not pointer.startswith('/'):
+        raise JsonIndexError(f'非法的 JSON Pointer: {pointer}')
+    return [t.replace('~1', '/').replace('~0', '~') for t in pointer[1:].split('/')]
+
+
+def _escape_token(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def join_pointer(pointer, token):
+    return f'{pointer}/{_escape_token(token)}'
+
+
+class _Children:
+    """一个容器的直接子节点：各字段按下标对齐存放在数组中"""
+
+    __slots__ = ('kind', 'keys', 'starts', 'ends', 'types', 'counts', 'key_index')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.keys = [] if kind == TYPE_OBJECT else None
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.types = array('B')
+        # 子节点为容器时记录其元素数量，标量为 -1
+        self.counts = array('q')
+        self.key_index = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find(self, token):
+        if self.kind == TYPE_ARRAY:
+            if not token.isdigit():
+                return -1
+            i = int(token)
+            return i if i < len(self.starts) else -1
+        if self.key_index is None:
+            # 重复键以最后一个为准，与 json.loads 一致
+            self.key_index = {k: i for i, k in enumerate(self.keys)}
+        return self.key_index.get(token, -1)
+
+
+def _skip_ws(buf, pos, end):
+    while pos < end and buf[pos] in _WS:
+        pos += 1
+    return pos
+
+
+def _rstrip_end(buf, start, end):
+    while end > start and buf[end - 1] in _WS:
+        end -= 1
+    return end
+
+
+class JsonDocument:
+    """单个 JSON 文件的惰性结构索引（mmap）
+
+    只在展开某个容器时扫描它覆盖的字节区间，得到其直接子节点的偏移、类型与元素数量；
+    结果按容器起始偏移缓存，文件 (size, mtime) 变化后整体失效。
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self._containers = OrderedDict()
+        self.lock = threading.Lock()
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size == 0:
+                raise JsonIndexError('文件为空', 422)
+            # mmap 持有自己的文件描述符；被替换或淘汰后由垃圾回收释放，不显式关闭以免影响并发读取
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = 3 if self._buf[:3] == b'\xef\xbb\xbf' else 0
+        start = _skip_ws(self._buf, start, self.size)
+        end = _rstrip_end(self._buf, start, self.size)
+        if start >= end:
+            raise JsonIndexError('文件为空', 422)
+        self.root = (start, end)
+
+    def _type_of(self, start):
+        code = _FIRST_BYTE_TYPES.get(self._buf[start])
+        return 3 if code is None else code
+
+    def _scan(self, start, end):
+        """扫描 [start, end) 处的容器，返回 _Children"""
+        buf = self._buf
+        opener = buf[start]
+        kind = TYPE_OBJECT if opener == ord('{') else TYPE_ARRAY
+        children = _Children(kind)
+        depth = 0
+        # 当前直接子节点的起点；对象中读到 ':' 之后才开始
+        value_start = None if kind == TYPE_OBJECT else _skip_ws(buf, start + 1, end)
+        pending_key = None
+        child_items = 0
+
+        def close_child(stop):
+            value_end = _rstrip_end(buf, value_start, stop)
+            if value_end <= value_start:
+                if kind == TYPE_ARRAY and not children.starts and stop == end - 1:
+                    return
+                raise JsonIndexError(f'JSON 格式错误（偏移 {value_start}）', 422)
+            code = self._type_of(value_start)
+            children.starts.append(value_start)
+            children.ends.append(value_end)
+            children.types.append(code)
+            if code <= 1:
+                # 深度 1 的逗号数 + 1 即元素数量；数字等标量不产生 token，空容器按内容是否为空判断
+                empty = _skip_ws(buf, value_start + 1, value_end - 1) >= value_end - 1
+                children.counts.append(0 if empty else child_items + 1)
+            else:
+                children.counts.append(-1)
+            if kind == TYPE_OBJECT:
+                children.keys.append(pending_key)
+
+        for m in _TOKEN_RE.finditer(buf, start + 1, end):
+            tok = m.group()
+            c = tok[0]
+            if c == 0x22:  # '"'
+                if depth == 0:
+                    if kind == TYPE_OBJECT and value_start is None:
+                        pending_key = json.loads(tok)
+                continue
+            if c in (0x7b, 0x5b):  # '{' '['
+                depth += 1
+                continue
+            if c in (0x7d, 0x5d):  # '}' ']'
+                if depth == 0:
+                    if value_start is not None:
+                        close_child(m.start())
+                    return children
+                depth -= 1
+                continue
+            if depth == 0:
+                if c == 0x3a:  # ':'
+                    value_start = _skip_ws(buf, m.end(), end)
+                    child_items = 0
+                else:  # ','
+                    if value_start is None:
+                        raise JsonIndexError(f'JSON 格式错误（偏移 {m.start()}）', 422)
+                    close_child(m.start())
+                    if kind == TYPE_ARRAY:
+                        value_start = _skip_ws(buf, m.end(), end)
+                    else:
+                        value_start = None
+                        pending_key = None
+                    child_items = 0
+            elif depth == 1 and c == 0x2c:
+                child_items += 1
+        raise JsonIndexError('JSON 格式错误：容器未闭合', 422)
+
+    def children_of(self, start, end):
+        with self.lock:
+            children = self._containers.get(start)
+            if children is not None:
+                self._containers.move_to_end(start)
+                return children
+        children = self._scan(start, end)
+        with self.lock:
+            self._containers[start] = children
+            while len(self._containers) > _CACHE_CONTAINERS:
+                self._containers.popitem(last=False)
+        return children
+
+    def resolve(self, pointer):
+        """返回 pointer 指向节点的 (start, end, type)"""
+        start, end = self.root
+        code = self._type_of(start)
+        for token in parse_pointer(pointer):
+            if code > 1:
+                raise JsonIndexError(f'路径不存在: {pointer}', 404)
+            children = self.children_of(start, end)
+            i = children.find(token)
+            if i < 0:
+                raise JsonIndexError(f'路径不存在: {pointer}', 404)
+            start, end, code = children.starts[i], children.ends[i], children.types[i]
+        return start, end, code
+
+    def _scalar(self, start, end):
+        raw = self._buf[start:end]
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            raise JsonIndexError(f'JSON 格式错误（偏移 {start}）', 422)
+        return value
+
+    def node(self, pointer='', offset=0, limit=200):
+        """节点信息与一页直接子节点"""
+        start, end, code = self.resolve(pointer)
+        out = {
+            'pointer': pointer,
+            'type': _TYPE_CODES[code],
+            'size': end - start,
+            'start': start,
+            'end': end,
+            # 纳秒时间戳超出 JS 安全整数范围，以字符串传给前端，保存时原样带回
+            'mtime_ns': str(self.key[1]),
+            'file_size': self.size,
+        }
+        if code > 1:
+            out['value'] = self._scalar(start, end)
+            return out
+        children = self.children_of(start, end)
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), JSON_CHILDREN_MAX_LIMIT))
+        items = []
+        for i in range(offset, min(offset + limit, len(children))):
+            c_start, c_end, c_code = children.starts[i], children.ends[i], children.types[i]
+            key = children.keys[i] if children.kind == TYPE_OBJECT else i
+            item = {
+                'key': key,
+                'pointer': join_pointer(pointer, key),
+                'type': _TYPE_CODES[c_code],
+                'size': c_end - c_start,
+            }
+            if c_code <= 1:
+                item['count'] = children.counts[i]
+            elif c_end - c_start <= JSON_INLINE_BYTES:
+                item['value'] = self._scalar(c_start, c_end)
+            else:
+                # 长字符串只解码开头部分作为预览
+                head = self._buf[c_start + 1:c_start + 1 + _PREVIEW_CHARS * 4]
+                item['preview'] = head.decode('utf-8', errors='ignore')[:_PREVIEW_CHARS]
+            items.append(item)
+        out.update({
+            'count': len(children),
+            'offset': offset,
+            'children': items,
+            'has_more': offset + len(items) < len(children),
+        })
+        return out
+
+    def value(self, pointer=''):
+        start, end, _code = self.resolve(pointer)
+        if end - start > JSON_VALUE_MAX_BYTES:
+            raise JsonIndexError(f'节点过大（{end - start} 字节），请展开后编辑子节点', 413)
+        return self._scalar(start, end)
+
+    def line_indent(self, start):
+        """节点所在行的行首缩进，用于按原有风格格式化替换内容"""
+        line_start = self._buf.rfind(b'\n', 0, start) + 1
+        indent_end = line_start
+        while indent_end < start and self._buf[indent_end] in b' \t':
+            indent_end += 1
+        return self._buf[line_start:indent_end].decode('ascii', errors='ignore')
+
+
+def _format_value(value, pretty, indent):
+    if not pretty:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    text = json.dumps(value, ensure_ascii=False, indent=2)
+    return text.replace('\n', '\n' + indent)
+
+
+class JsonService:
+    """按 (path, size, mtime) 缓存 JsonDocument，并提供子树替换保存"""
+
+    def __init__(self, max_entries=_CACHE_FILES):
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def get(self, path):
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            doc = self._docs.get(path)
+            if doc is not None and doc.key == key:
+                self._docs.move_to_end(path)
+                return doc
+        doc = JsonDocument(path, key)
+        with self._lock:
+            self._docs[path] = doc
+            self._docs.move_to_end(path)
+            while len(self._docs) > self._max_entries:
+                self._docs.popitem(last=False)
+        return doc
+
+    def patch(self, path, pointer, value, expected_mtime_ns=None):
+        """把 pointer 处的子树替换为 value：原文件其余字节原样拷贝，不重新序列化整个文档
+
+        expected_mtime_ns 与当前不一致时返回 409，避免覆盖其他人的修改。返回新的 mtime_ns。
+        """
+        doc = self.get(path)
+        if expected_mtime_ns is not None and int(expected_mtime_ns) != doc.key[1]:
+            raise JsonIndexError('文件已被修改，请刷新后重试', 409)
+        start, end, _code = doc.resolve(pointer)
+        original = doc._buf[start:end]
+        pretty = b'\n' in original
+        new_bytes = _format_value(value, pretty, doc.line_indent(start) if pretty else '').encode('utf-8')
+
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+                _copy_range(src, dst, 0, start)
+                dst.write(new_bytes)
+                src.seek(end)
+                shutil.copyfileobj(src, dst, _COPY_CHUNK)
+                dst.flush()
+                os.fsync(dst.fileno())
+            shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return os.stat(path).st_mtime_ns
+
+
+def _copy_range(src, dst, start, end):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(_COPY_CHUNK, remaining))
+        if not chunk:
+            break
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_json_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = JsonService()
+    return _service
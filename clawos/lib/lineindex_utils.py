@@ -0,0 +1,259 @@
+import bisect
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+
+# 每隔约 CHECKPOINT_BYTES 记录一个行首偏移；定位任意一行最多向后扫描这么多字节
+CHECKPOINT_BYTES = 64 * 1024
+MAX_WINDOW_LINES = 5000
+MAX_WINDOW_BYTES = 4 * 1024 * 1024
+# 单行超过该长度时截断显示，避免一行数 GB 的文件（如压缩过的 JSON）撑爆响应
+MAX_LINE_BYTES = 64 * 1024
+_SCAN_CHUNK = 4 * 1024 * 1024
+_TAIL_SIG = 64
+_CACHE_ENTRIES = 32
+
+
+class LineIndex:
+    """稀疏的行偏移索引：checkpoint i 表示第 lines[i] 行（从 0 开始）起始于字节 offsets[i]
+
+    文件只增长时（日志追加）从上次的末尾继续建索引，不重新扫描。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lines = array('Q', [0])
+        self.offsets = array('Q', [0])
+        self.size = 0
+        self.newlines = 0
+        self.ino = None
+        self.mtime_ns = None
+        self._tail = b''
+        self._next_checkpoint = CHECKPOINT_BYTES
+        self.lock = threading.Lock()
+
+    @property
+    def total_lines(self):
+        """行数；末尾没有换行符的最后一行也计入"""
+        if self.size == 0:
+            return 0
+        return self.newlines + (0 if self._tail.endswith(b'\n') else 1)
+
+    def refresh(self, st):
+        """根据最新的 stat 结果更新索引，返回 False 表示文件被截断或替换，需要重建"""
+        if st.st_ino != self.ino or st.st_size < self.size:
+            return False
+        if st.st_size == self.size and st.st_mtime_ns == self.mtime_ns:
+            return True
+        with open(self.path, 'rb') as f:
+            if self.size:
+                start = max(0, self.size - len(self._tail))
+                f.seek(start)
+                if f.read(self.size - start) != self._tail:
+                    return False
+            f.seek(self.size)
+            self._scan(f, st.st_size)
+        self.mtime_ns = st.st_mtime_ns
+        return True
+
+    def build(self, st):
+        self.lines = array('Q', [0])
+        self.offsets = array('Q', [0])
+        self.size = 0
+        self.newlines = 0
+        self._tail = b''
+        self._next_checkpoint = CHECKPOINT_BYTES
+        self.ino = st.st_ino
+        with open(self.path, 'rb') as f:
+            self._scan(f, st.st_size)
+        self.mtime_ns = st.st_mtime_ns
+
+    def _scan(self, f, end):
+        pos = self.size
+        while pos < end:
+            chunk = f.read(min(_SCAN_CHUNK, end - pos))
+            if not chunk:
+                break
+            chunk_end = pos + len(chunk)
+            counted = 0
+            # 在块内为每个跨过的 checkpoint 找到其后的第一个行首，换行符只增量计数一次
+            while self._next_checkpoint < chunk_end:
+                nl = chunk.find(b'\n', max(0, self._next_checkpoint - pos))
+                if nl < 0:
+                    break
+                self.newlines += chunk.count(b'\n', counted, nl + 1)
+                counted = nl + 1
+                self.lines.append(self.newlines)
+                self.offsets.append(pos + counted)
+                self._next_checkpoint = pos + counted + CHECKPOINT_BYTES
+            self.newlines += chunk.count(b'\n', counted)
+            pos = chunk_end
+            self._tail = (self._tail + chunk)[-_TAIL_SIG:]
+        self.size = pos
+
+    def checkpoint_for_line(self, line):
+        i = bisect.bisect_right(self.lines, line) - 1
+        return self.lines[i], self.offsets[i]
+
+    def checkpoint_for_offset(self, offset):
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        return self.lines[i], self.offsets[i]
+
+
+def _decode(raw):
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('gbk', errors='replace')
+
+
+def _split_lines(data, limit_lines, complete_only):
+    """把 data 切成行，返回 (行列表, 消耗的字节数, 是否有被截断的长行)"""
+    out = []
+    pos = 0
+    clipped = False
+    n = len(data)
+    while pos < n and len(out) < limit_lines:
+        nl = data.find(b'\n', pos)
+        if nl < 0:
+            if complete_only:
+                break
+            nl = n
+            end = n
+        else:
+            end = nl + 1
+        raw = data[pos:nl]
+        if raw.endswith(b'\r'):
+            raw = raw[:-1]
+        if len(raw) > MAX_LINE_BYTES:
+            raw = raw[:MAX_LINE_BYTES]
+            clipped = True
+        out.append(_decode(raw))
+        pos = end
+    return out, pos, clipped
+
+
+class LineWindowReader:
+    """按行号窗口读取大文本文件（mmap），索引按 (path, inode, mtime, size) 缓存在内存中"""
+
+    def __init__(self, max_entries=_CACHE_ENTRIES):
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def _index(self, path):
+        st = os.stat(path)
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None:
+                index = LineIndex(path)
+                self._indexes[path] = index
+            self._indexes.move_to_end(path)
+            while len(self._indexes) > self._max_entries:
+                self._indexes.popitem(last=False)
+        with index.lock:
+            if index.ino is None or not index.refresh(st):
+                index.build(st)
+        return index
+
+    def _read(self, path, offset, length):
+        if length <= 0:
+            return b''
+        with open(path, 'rb') as f:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return mm[offset:offset + length]
+            except ValueError:
+                # 空文件无法 mmap
+                return b''
+
+    def _seek_line(self, path, index, line):
+        """返回第 line 行的起始字节偏移：从最近的 checkpoint 向后最多扫描 CHECKPOINT_BYTES"""
+        cp_line, cp_offset = index.checkpoint_for_line(line)
+        pos = cp_offset
+        remaining = line - cp_line
+        while remaining > 0 and pos < index.size:
+            data = self._read(path, pos, min(CHECKPOINT_BYTES * 2, index.size - pos))
+            if not data:
+                break
+            i = 0
+            while remaining > 0:
+                nl = data.find(b'\n', i)
+                if nl < 0:
+                    break
+                i = nl + 1
+                remaining -= 1
+            pos += i if remaining == 0 else len(data)
+        return pos
+
+    def window(self, path, start=0, count=500):
+        """读取 [start, start+count) 行；start 为负数时从末尾倒数（-count 即最后一页）"""
+        index = self._index(path)
+        count = max(1, min(int(count), MAX_WINDOW_LINES))
+        total = index.total_lines
+        start = int(start)
+        if start < 0:
+            start = max(0, total + start)
+        start = min(start, max(0, total - 1)) if total else 0
+        begin = self._seek_line(path, index, start)
+        data = self._read(path, begin, min(MAX_WINDOW_BYTES, index.size - begin))
+        lines, used, clipped = _split_lines(data, count, complete_only=False)
+        end_offset = begin + used
+        # 末尾没有换行符的最后一行可能还在写入；跟随模式应从它的行首继续读取
+        partial = bool(lines) and end_offset >= index.size and not data[:used].endswith(b'\n')
+        follow_offset = end_offset
+        if partial:
+            follow_offset = begin + (data.rfind(b'\n', 0, used) + 1)
+        return {
+            'lines': lines,
+            'start': start,
+            'end': start + len(lines),
+            'total_lines': total,
+            'size': index.size,
+            'start_offset': begin,
+            'end_offset': end_offset,
+            'follow_offset': follow_offset,
+            'partial': partial,
+            'clipped': clipped,
+            'eof': end_offset >= index.size,
+        }
+
+    def follow(self, path, after, count=MAX_WINDOW_LINES):
+        """读取字节偏移 after 之后新追加的完整行（tail -f）；文件被截断时返回 reset"""
+        index = self._index(path)
+        after = int(after)
+        if after > index.size:
+            return {'reset': True, 'size': index.size, 'total_lines': index.total_lines}
+        count = max(1, min(int(count), MAX_WINDOW_LINES))
+        cp_line, cp_offset = index.checkpoint_for_offset(after)
+        start = cp_line + self._read(path, cp_offset, after - cp_offset).count(b'\n')
+        data = self._read(path, after, min(MAX_WINDOW_BYTES, index.size - after))
+        lines, used, clipped = _split_lines(data, count, complete_only=True)
+        return {
+            'lines': lines,
+            'start': start,
+            'end': start + len(lines),
+            'total_lines': index.total_lines,
+            'size': index.size,
+            'start_offset': after,
+            'end_offset': after + used,
+            'clipped': clipped,
+            'eof': after + used >= index.size,
+            'reset': False,
+        }
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_line_reader():
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = LineWindowReader()
+    return _reader
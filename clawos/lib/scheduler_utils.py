@@ -0,0 +1,300 @@
+import heapq
+import inspect
+import itertools
+import os
+import threading
+import time
+import uuid
+
+
+# 队列名 -> 最大并发数；磁盘 / 网络密集与 CPU 密集的任务分开排队，安装类任务串行执行
+TASK_QUEUES = {
+    'io': int(os.getenv('CLAWOS_TASK_IO_WORKERS', '0') or 0) or 4,
+    'cpu': int(os.getenv('CLAWOS_TASK_CPU_WORKERS', '0') or 0) or max(1, min(4, os.cpu_count() or 1)),
+    'system': int(os.getenv('CLAWOS_TASK_SYSTEM_WORKERS', '0') or 0) or 1,
+}
+DEFAULT_QUEUE = 'io'
+
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
+# 已结束任务在内存中保留的时长与数量上限
+TASK_TTL_SECONDS = 3600
+TASK_MAX_FINISHED = 200
+# 空闲工作线程等待这么久没有新任务就退出
+WORKER_IDLE_SECONDS = 30
+
+ACTIVE_STATUSES = ('pending', 'running', 'paused')
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """协作式取消令牌：任务函数在循环中检查 cancelled 或调用 raise_if_cancelled"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        """可被取消打断的 sleep，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled('已取消')
+
+
+def _call_run_fn(run_fn, task_id, token):
+    """按 run_fn 的参数个数传入 ()、(task_id) 或 (task_id, token)"""
+    try:
+        n_params = len(inspect.signature(run_fn).parameters)
+    except (TypeError, ValueError):
+        n_params = 0
+    if n_params >= 2:
+        return run_fn(task_id, token)
+    if n_params == 1:
+        return run_fn(task_id)
+    return run_fn()
+
+
+class TaskScheduler:
+    """有界工作线程池：按队列限制并发，队列内按优先级（高者先）、同优先级按提交顺序执行
+
+    工作线程按需启动，数量不超过队列并发上限，空闲一段时间后退出。暂停中的任务仍占着自己的线程，
+    但不计入并发上限，队列会另起线程执行后面的任务。
+    任务记录保存在内存中，结束后超过 TTL 或超出数量上限时淘汰；on_finish 回调用于持久化历史，
+    on_change 在任务记录每次变化后（锁外）收到记录快照，用于推送进度。
+    """
+
+    def __init__(self, queues=None, ttl_seconds=TASK_TTL_SECONDS, max_finished=TASK_MAX_FINISHED,
+                 on_finish=None, on_change=None, idle_seconds=WORKER_IDLE_SECONDS):
+        self.ttl = ttl_seconds
+        self.max_finished = max_finished
+        self.on_finish = on_finish
+        self.on_change = on_change
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._queues = {
+            name: {
+                'limit': max(1, int(limit)), 'heap': [], 'workers': 0, 'idle': 0, 'running': 0, 'paused': 0,
+                'cond': threading.Condition(self._lock),
+            }
+            for name, limit in (queues or TASK_QUEUES).items()
+        }
+        self._tasks = {}
+        # 排队中任务的函数；活动任务（排队或运行中）的取消令牌
+        self._jobs = {}
+        self._tokens = {}
+        self._seq = itertools.count()
+
+    # ---------- 提交与执行 ----------
+
+    def submit(self, run_fn, name='', queue=DEFAULT_QUEUE, priority=PRIORITY_NORMAL):
+        if queue not in self._queues:
+            raise ValueError(f'未知任务队列: {queue}')
+        task_id = uuid.uuid4().hex
+        token = CancelToken()
+        record = {
+            'taskId': task_id,
+            'name': name or '',
+            'queue': queue,
+            'priority': int(priority),
+            'status': 'pending',
+            'message': '',
+            'progress': 0.0,
+            'createdAt': int(time.time() * 1000),
+            'startedAt': None,
+            'finishedAt': None,
+        }
+        with self._lock:
+            self._evict_locked()
+            self._tasks[task_id] = record
+            self._jobs[task_id] = run_fn
+            self._tokens[task_id] = token
+            q = self._queues[queue]
+            heapq.heappush(q['heap'], (-record['priority'], next(self._seq), task_id))
+            self._spawn_locked(queue)
+            q['cond'].notify()
+            snapshot = dict(record)
+        self._changed(snapshot)
+        return task_id
+
+    def _spawn_locked(self, queue):
+        """排队任务多于空闲线程且未达并发上限时启动一个工作线程；暂停任务占用的线程不计入上限"""
+        q = self._queues[queue]
+        if len(q['heap']) > q['idle'] and q['workers'] - q['paused'] < q['limit']:
+            q['workers'] += 1
+            threading.Thread(target=self._worker, args=(queue,), daemon=True, name=f'task-{queue}').start()
+
+    def _next_job(self, queue):
+        """取出队列中下一个未取消的任务；空闲超时返回 None（工作线程随之退出）"""
+        q = self._queues[queue]
+        with self._lock:
+            while True:
+                # 暂停的任务恢复后线程数可能超出上限，多出的线程做完手头任务即退出
+                if q['workers'] - q['paused'] > q['limit']:
+                    q['workers'] -= 1
+                    return None
+                while q['heap']:
+                    _, _, task_id = heapq.heappop(q['heap'])
+                    run_fn = self._jobs.pop(task_id, None)
+                    record = self._tasks.get(task_id)
+                    if run_fn is None or record is None or record['status'] != 'pending':
+                        continue
+                    record['status'] = 'running'
+                    record['startedAt'] = int(time.time() * 1000)
+                    q['running'] += 1
+                    return task_id, run_fn, self._tokens[task_id], dict(record)
+                q['idle'] += 1
+                notified = q['cond'].wait(self.idle_seconds)
+                q['idle'] -= 1
+                if not notified and not q['heap']:
+                    q['workers'] -= 1
+                    return None
+
+    def _worker(self, queue):
+        while True:
+            item = self._next_job(queue)
+            if item is None:
+                return
+            task_id, run_fn, token, snapshot = item
+            self._changed(snapshot)
+            try:
+                _call_run_fn(run_fn, task_id, token)
+                status, message = 'success', None
+            except Exception as e:
+                if token.cancelled or isinstance(e, TaskCancelled):
+                    status, message = 'cancelled', '已取消'
+                else:
+                    status, message = 'failed', str(e)
+            self._finish(task_id, status, message)
+
+    def _finish(self, task_id, status, message=None):
+        with self._lock:
+            self._tokens.pop(task_id, None)
+            record = self._tasks.get(task_id)
+            if record is None:
+                return
+            if record['status'] == 'running':
+                self._queues[record['queue']]['running'] -= 1
+            elif record['status'] == 'paused':
+                self._queues[record['queue']]['paused'] -= 1
+            record['status'] = status
+            if message is not None:
+                record['message'] = message
+            if status == 'success':
+                record['progress'] = 100.0
+            record['finishedAt'] = int(time.time() * 1000)
+            snapshot = dict(record)
+        self._changed(snapshot)
+        if self.on_finish is not None:
+            try:
+                self.on_finish(snapshot)
+            except Exception as e:
+                print(f'任务历史保存失败: {e}')
+
+    # ---------- 状态 ----------
+
+    def update(self, task_id, status=None, message=None, progress=None):
+        with self._lock:
+            record = self._tasks.get(task_id)
+            if record is None:
+                return False
+            # 结束状态由调度器写入，任务函数只能在 running / paused 之间切换
+            if isinstance(status, str) and status and record['status'] in ('running', 'paused'):
+                if status in ('running', 'paused') and status != record['status']:
+                    q = self._queues[record['queue']]
+                    record['status'] = status
+                    if status == 'paused':
+                        # 让出并发名额，排队的任务可以继续执行
+                        q['running'] -= 1
+                        q['paused'] += 1
+                        self._spawn_locked(record['queue'])
+                    else:
+                        q['running'] += 1
+                        q['paused'] -= 1
+            if isinstance(message, str):
+                record['message'] = message
+            if progress is not None:
+                try:
+                    p = float(progress)
+                except Exception:
+                    p = None
+                if p is not None:
+                    record['progress'] = min(100.0, max(0.0, p))
+            snapshot = dict(record)
+        self._changed(snapshot)
+        return True
+
+    def _changed(self, snapshot):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(snapshot)
+        except Exception as e:
+            print(f'任务事件回调失败: {e}')
+
+    def cancel(self, task_id):
+        """请求取消：排队中的任务直接标记为已取消，运行中的任务通过令牌通知"""
+        with self._lock:
+            record = self._tasks.get(task_id)
+            if record is None or record['status'] not in ACTIVE_STATUSES:
+                return False
+            record['cancelRequested'] = True
+            token = self._tokens.get(task_id)
+            pending = record['status'] == 'pending'
+            if pending:
+                self._jobs.pop(task_id, None)
+        if token is not None:
+            token.cancel()
+        if pending:
+            self._finish(task_id, 'cancelled', '已取消')
+        return True
+
+    def is_cancelled(self, task_id):
+        with self._lock:
+            return bool((self._tasks.get(task_id) or {}).get('cancelRequested'))
+
+    def get(self, task_id):
+        with self._lock:
+            return dict(self._tasks.get(task_id) or {})
+
+    def list(self):
+        with self._lock:
+            self._evict_locked()
+            return [dict(r) for r in self._tasks.values()]
+
+    def queue_stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'limit': q['limit'],
+                    'running': q['running'],
+                    'paused': q['paused'],
+                    'pending': sum(1 for _, _, task_id in q['heap'] if task_id in self._jobs),
+                    'workers': q['workers'],
+                }
+                for name, q in self._queues.items()
+            }
+
+    def _evict_locked(self):
+        """淘汰超过 TTL 的已结束任务；仍超出数量上限时从最早结束的开始淘汰"""
+        finished = [r for r in self._tasks.values() if r['finishedAt'] is not None]
+        if not finished:
+            return
+        cutoff = (time.time() - self.ttl) * 1000
+        finished.sort(key=lambda r: r['finishedAt'])
+        excess = len(finished) - self.max_finished
+        for i, record in enumerate(finished):
+            if record['finishedAt'] < cutoff or i < excess:
+                self._tasks.pop(record['taskId'], None)
@@ -0,0 +1,165 @@
+import atexit
+import threading
+import time
+
+from lib import state_utils
+
+
+# 脏数据最多延迟这么久写盘；登录 / 登出会立即写盘
+SESSION_FLUSH_SECONDS = 5
+SESSION_SWEEP_SECONDS = 300
+# last_seen 的更新粒度：同一会话在此间隔内的重复请求不标记脏数据
+SESSION_TOUCH_SECONDS = 60
+
+
+class SessionTable:
+    """登录会话表：内存为准，按批写回状态库
+
+    请求路径上的校验只做一次 dict 查找与几次字段赋值，不加锁、不读写磁盘；
+    last_seen / ip / ua 的变化由后台线程合并后定时写盘，过期会话由同一线程定时清理。
+    状态库中每个会话一行（命名空间 auth_session，键为令牌），写盘只写有变化的会话。
+    """
+
+    def __init__(self, store, ttl_seconds, flush_seconds=SESSION_FLUSH_SECONDS,
+                 sweep_seconds=SESSION_SWEEP_SECONDS, touch_seconds=SESSION_TOUCH_SECONDS):
+        self.store = store
+        self.ttl = ttl_seconds
+        self.flush_seconds = flush_seconds
+        self.sweep_seconds = sweep_seconds
+        self.touch_seconds = touch_seconds
+        self._sessions = {}
+        self._loaded = False
+        # 待写盘的令牌；写盘时内存中已不存在的令牌即删除
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._sessions = self._load()
+            self._loaded = True
+            self._worker = threading.Thread(target=self._run, daemon=True, name='auth-sessions')
+            self._worker.start()
+            atexit.register(self.flush)
+
+    def _load(self):
+        out = {}
+        for token, meta in self.store.items(state_utils.NS_AUTH_SESSION).items():
+            if not isinstance(meta, dict):
+                continue
+            try:
+                meta['last_seen'] = int(meta.get('last_seen'))
+            except (TypeError, ValueError):
+                continue
+            out[token] = meta
+        return out
+
+    def check(self, token, ip='', ua='', now=None):
+        """校验会话并记录访问信息，返回是否有效"""
+        if not token:
+            return False
+        self._ensure_loaded()
+        meta = self._sessions.get(token)
+        if meta is None:
+            return False
+        now = int(now if now is not None else time.time())
+        if now - meta['last_seen'] > self.ttl:
+            self.remove(token, flush=False)
+            return False
+        changed = now - meta['last_seen'] >= self.touch_seconds
+        if ip and meta.get('ip') != ip:
+            meta['ip'] = ip
+            changed = True
+        if ua and meta.get('ua') != ua:
+            meta['ua'] = ua
+            changed = True
+        if changed:
+            meta['last_seen'] = now
+            self._dirty.add(token)
+        return True
+
+    def create(self, token, ip='', ua='', now=None):
+        self._ensure_loaded()
+        now = int(now if now is not None else time.time())
+        with self._lock:
+            self._sessions[token] = {'created_at': now, 'last_seen': now, 'ip': ip, 'ua': ua}
+            self._dirty.add(token)
+        self.flush()
+
+    def remove(self, token, flush=True):
+        self._ensure_loaded()
+        with self._lock:
+            if self._sessions.pop(token, None) is None:
+                return False
+            self._dirty.add(token)
+        if flush:
+            self.flush()
+        return True
+
+    def sweep(self, now=None):
+        """删除过期会话，返回删除数量"""
+        self._ensure_loaded()
+        now = int(now if now is not None else time.time())
+        with self._lock:
+            expired = [t for t, meta in self._sessions.items() if now - meta['last_seen'] > self.ttl]
+            for token in expired:
+                self._sessions.pop(token, None)
+            self._dirty.update(expired)
+        return len(expired)
+
+    def flush(self):
+        """把有变化的会话写回状态库（单个事务，只写变化的行）"""
+        if not self._dirty:
+            return False
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                tokens, self._dirty = list(self._dirty), set()
+                changed = {t: dict(self._sessions[t]) for t in tokens if t in self._sessions}
+                removed = [t for t in tokens if t not in self._sessions]
+            try:
+                with self.store.transaction():
+                    self.store.set_many(state_utils.NS_AUTH_SESSION, changed)
+                    self.store.delete_many(state_utils.NS_AUTH_SESSION, removed)
+            except Exception as e:
+                with self._lock:
+                    self._dirty.update(tokens)
+                print(f'会话写盘失败: {e}')
+                return False
+        return True
+
+    def _run(self):
+        last_sweep = time.time()
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                if time.time() - last_sweep >= self.sweep_seconds:
+                    last_sweep = time.time()
+                    self.sweep()
+                self.flush()
+            except Exception as e:
+                print(f'会话维护失败: {e}')
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._sessions)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_session_table(ttl_seconds):
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = SessionTable(state_utils.get_state_store(), ttl_seconds)
+    return _table
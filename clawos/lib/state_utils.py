@@ -0,0 +1,403 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+
+# 命名空间：kv 表中的 ns 列 / log 表中的 ns 列
+NS_CONVERSATION = 'conversation'
+NS_AUTH_SESSION = 'auth_session'
+NS_PIN = 'pin'
+NS_EMAIL = 'email'
+NS_DB_CONN = 'db_conn'
+NS_AI_SQL_HISTORY = 'ai_sql_history'
+NS_UI = 'ui'
+NS_MODEL_EVAL = 'model_eval'
+NS_TASK_HISTORY = 'task_history'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE TABLE IF NOT EXISTS log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ns TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_ns_id ON log(ns, id);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL
+);
+"""
+
+# 原地更新而不是 REPLACE：保留 rowid，命名空间按 rowid 读出即为插入顺序
+_UPSERT = (
+    'INSERT INTO kv(ns, key, value, updated_at) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT(ns, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at'
+)
+
+
+# 事务内暂存的删除标记
+_DELETED = object()
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class StateStore:
+    """嵌入式状态存储（SQLite WAL）：按命名空间划分的键值表 + 追加日志表
+
+    每次写入都是独立事务，只改动涉及的行；读取走进程内缓存——命名空间首次访问时整体载入，
+    之后由写入方同步更新（本进程是唯一写入方）。缓存保存 JSON 文本，每次读取都解码出新对象，
+    调用方可以随意修改返回值。
+    事务中的改动先暂存在本线程，最外层 COMMIT 之后才写进共享缓存：其他线程读不到未提交的值，
+    回滚时直接丢弃暂存即可。缓存只在 _cache_lock 下读写，读取方拿到的是快照。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        # 每次提交递增；载入命名空间期间若有提交，载入结果可能已过期，不放进缓存
+        self._generation = 0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """写事务；可嵌套，只有最外层提交"""
+        with self._write_lock:
+            conn = self._conn()
+            depth = getattr(self._local, 'depth', 0)
+            if depth == 0:
+                conn.execute('BEGIN IMMEDIATE')
+                self._local.staged = {}
+            self._local.depth = depth + 1
+            try:
+                yield conn
+            except BaseException:
+                self._local.depth = depth
+                if depth == 0:
+                    self._local.staged = {}
+                    conn.execute('ROLLBACK')
+                raise
+            self._local.depth = depth
+            if depth == 0:
+                staged, self._local.staged = self._local.staged, {}
+                try:
+                    conn.execute('COMMIT')
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    raise
+                self._apply_staged(staged)
+
+    def _apply_staged(self, staged):
+        with self._cache_lock:
+            self._generation += 1
+            for ns, changes in staged.items():
+                rows = self._cache.get(ns)
+                if rows is None:
+                    continue
+                for key, text in changes.items():
+                    if text is _DELETED:
+                        rows.pop(key, None)
+                    else:
+                        rows[key] = text
+
+    # ---------- 键值 ----------
+
+    def _staged(self, ns):
+        """本线程当前事务中对 ns 的暂存改动；不在事务中时为 None"""
+        if not getattr(self._local, 'depth', 0):
+            return None
+        return self._local.staged.get(ns)
+
+    def _stage(self, ns, key, text):
+        self._local.staged.setdefault(ns, {})[key] = text
+
+    def _load(self, ns):
+        """确保命名空间已载入缓存，返回 None；读到的行不能放进缓存时（载入期间有别的提交，
+        或本线程事务已改过 ns，读到的含未提交数据）直接返回这份行"""
+        with self._cache_lock:
+            generation = self._generation
+            cached = ns in self._cache
+        if cached:
+            return None
+        rows = dict(self._conn().execute('SELECT key, value FROM kv WHERE ns = ? ORDER BY rowid', (ns,)).fetchall())
+        if self._staged(ns):
+            return rows
+        with self._cache_lock:
+            if ns in self._cache:
+                return None
+            if generation != self._generation:
+                return rows
+            self._cache[ns] = rows
+        return None
+
+    def _namespace(self, ns):
+        """命名空间的快照（JSON 文本），叠加本线程事务中的暂存改动"""
+        rows = self._load(ns)
+        if rows is None:
+            with self._cache_lock:
+                rows = dict(self._cache[ns])
+        staged = self._staged(ns)
+        if staged:
+            for key, text in staged.items():
+                if text is _DELETED:
+                    rows.pop(key, None)
+                else:
+                    rows[key] = text
+        return rows
+
+    def _text(self, ns, key):
+        staged = self._staged(ns)
+        if staged and key in staged:
+            text = staged[key]
+            return None if text is _DELETED else text
+        rows = self._load(ns)
+        if rows is not None:
+            return rows.get(key)
+        with self._cache_lock:
+            return self._cache[ns].get(key)
+
+    def get(self, ns, key, default=None):
+        text = self._text(ns, key)
+        return default if text is None else json.loads(text)
+
+    def items(self, ns):
+        """命名空间下的全部键值，按首次写入顺序"""
+        return {key: json.loads(text) for key, text in self._namespace(ns).items()}
+
+    def set(self, ns, key, value):
+        text = _dumps(value)
+        with self.transaction() as conn:
+            if self._text(ns, key) == text:
+                return
+            conn.execute(_UPSERT, (ns, key, text, time.time()))
+            self._stage(ns, key, text)
+
+    def delete(self, ns, key):
+        with self.transaction() as conn:
+            if self._text(ns, key) is None:
+                return False
+            conn.execute('DELETE FROM kv WHERE ns = ? AND key = ?', (ns, key))
+            self._stage(ns, key, _DELETED)
+        return True
+
+    def update(self, ns, key, fn, default=None):
+        """原子的读-改-写：fn(当前值) 返回新值，返回 None 表示删除"""
+        with self.transaction():
+            value = fn(self.get(ns, key, default))
+            if value is None:
+                self.delete(ns, key)
+            else:
+                self.set(ns, key, value)
+        return value
+
+    def replace(self, ns, mapping):
+        """把命名空间整体替换为 mapping，只写入内容有变化的行与删除消失的行，返回改动行数"""
+        new_rows = {str(k): _dumps(v) for k, v in mapping.items()}
+        changed = 0
+        with self.transaction() as conn:
+            rows = self._namespace(ns)
+            now = time.time()
+            for key in [k for k in rows if k not in new_rows]:
+                conn.execute('DELETE FROM kv WHERE ns = ? AND key = ?', (ns, key))
+                self._stage(ns, key, _DELETED)
+                changed += 1
+            for key, text in new_rows.items():
+                if rows.get(key) != text:
+                    conn.execute(_UPSERT, (ns, key, text, now))
+                    self._stage(ns, key, text)
+                    changed += 1
+        return changed
+
+    def set_many(self, ns, mapping):
+        """批量写入（不删除其他键），返回写入行数"""
+        with self.transaction():
+            for key, value in mapping.items():
+                self.set(ns, str(key), value)
+        return len(mapping)
+
+    def delete_many(self, ns, keys):
+        with self.transaction():
+            return sum(1 for key in keys if self.delete(ns, key))
+
+    # ---------- 追加日志 ----------
+
+    def append(self, ns, value, created_at=None):
+        """追加一条日志，返回自增 id"""
+        with self.transaction() as conn:
+            cur = conn.execute(
+                'INSERT INTO log(ns, value, created_at) VALUES (?, ?, ?)',
+                (ns, _dumps(value), created_at if created_at is not None else time.time()),
+            )
+            return cur.lastrowid
+
+    def log_page(self, ns, before=None, limit=50):
+        """按 id 倒序分页：返回 id < before 的最近 limit 条，结果按时间正序 [(id, value), ...]"""
+        limit = max(1, int(limit))
+        if before is None:
+            rows = self._conn().execute(
+                'SELECT id, value FROM log WHERE ns = ? ORDER BY id DESC LIMIT ?', (ns, limit),
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                'SELECT id, value FROM log WHERE ns = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                (ns, int(before), limit),
+            ).fetchall()
+        return [(row_id, json.loads(text)) for row_id, text in reversed(rows)]
+
+    def log_all(self, ns):
+        return [json.loads(text) for (text,) in self._conn().execute(
+            'SELECT value FROM log WHERE ns = ? ORDER BY id', (ns,),
+        )]
+
+    def log_count(self, ns):
+        return self._conn().execute('SELECT COUNT(*) FROM log WHERE ns = ?', (ns,)).fetchone()[0]
+
+    def log_head(self, ns, limit):
+        """最旧的 limit 条 [(id, value), ...]"""
+        rows = self._conn().execute(
+            'SELECT id, value FROM log WHERE ns = ? ORDER BY id LIMIT ?', (ns, max(1, int(limit))),
+        ).fetchall()
+        return [(row_id, json.loads(text)) for row_id, text in rows]
+
+    def log_delete_upto(self, ns, last_id):
+        """删除 id <= last_id 的日志，返回删除条数"""
+        with self.transaction() as conn:
+            return conn.execute('DELETE FROM log WHERE ns = ? AND id <= ?', (ns, int(last_id))).rowcount
+
+    def log_trim(self, ns, keep):
+        """只保留最近 keep 条，返回删除条数"""
+        with self.transaction() as conn:
+            row = conn.execute(
+                'SELECT id FROM log WHERE ns = ? ORDER BY id DESC LIMIT 1 OFFSET ?', (ns, max(0, int(keep))),
+            ).fetchone()
+            if row is None:
+                return 0
+            return self.log_delete_upto(ns, row[0])
+
+    def log_clear(self, ns):
+        with self.transaction() as conn:
+            return conn.execute('DELETE FROM log WHERE ns = ?', (ns,)).rowcount
+
+    # ---------- 迁移 ----------
+
+    def migrate_json_file(self, name, path, importer):
+        """一次性导入旧的 JSON 文件：importer(store, data) 在事务中执行，成功后原文件改名为 .migrated"""
+        with self.transaction() as conn:
+            if conn.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone():
+                return False
+            imported = False
+            if os.path.isfile(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f'迁移 {path} 失败，保留原文件: {e}')
+                    return False
+                importer(self, data)
+                imported = True
+            conn.execute('INSERT INTO migrations(name, applied_at) VALUES (?, ?)', (name, time.time()))
+        if imported:
+            try:
+                os.replace(path, path + '.migrated')
+            except OSError:
+                pass
+        return imported
+
+
+def _import_conversations(store, data):
+    if not isinstance(data, dict):
+        return
+    for item in data.get('history') or []:
+        if isinstance(item, dict):
+            store.append(NS_CONVERSATION, item)
+    store.set(NS_CONVERSATION, 'sent_count', int(data.get('sent_count') or 0))
+
+
+def _import_auth_sessions(store, data):
+    sessions = data.get('sessions') if isinstance(data, dict) else None
+    if isinstance(sessions, dict):
+        store.set_many(NS_AUTH_SESSION, {t: m for t, m in sessions.items() if isinstance(m, dict)})
+
+
+def _import_value(ns, key):
+    def _import(store, data):
+        store.set(ns, key, data)
+    return _import
+
+
+def _import_mapping(ns):
+    def _import(store, data):
+        if isinstance(data, dict):
+            store.set_many(ns, data)
+    return _import
+
+
+def _import_log(ns):
+    def _import(store, data):
+        for item in data if isinstance(data, list) else []:
+            store.append(ns, item)
+    return _import
+
+
+# (迁移名, DATA_DIR 下的旧文件名, 导入函数)
+LEGACY_JSON_FILES = [
+    ('conversations', 'conversations.json', _import_conversations),
+    ('auth_sessions', 'auth.json', _import_auth_sessions),
+    ('pins', 'pin.json', _import_value(NS_PIN, 'pins')),
+    ('email_history', 'email_history.json', _import_value(NS_EMAIL, 'history')),
+    ('email_config', 'email_config.json', _import_value(NS_EMAIL, 'config')),
+    ('db_connections', 'db_connections.json', _import_mapping(NS_DB_CONN)),
+    ('ai_sql_history', 'ai_sql_history.json', _import_log(NS_AI_SQL_HISTORY)),
+    ('file_open_config', 'file_open_config.json', _import_value(NS_UI, 'file_open_config')),
+    ('model_eval_state', 'model_config_state.json', _import_value(NS_MODEL_EVAL, 'state')),
+]
+
+
+def migrate_legacy_files(store, data_dir):
+    for name, filename, importer in LEGACY_JSON_FILES:
+        store.migrate_json_file(name, os.path.join(data_dir, filename), importer)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """全局状态存储；首次打开时导入旧 JSON 文件"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = StateStore(config.STATE_DB)
+                migrate_legacy_files(store, config.DATA_DIR)
+                _store = store
+    return _store
@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+# 每个任务每秒最多推送的进度事件数；状态变化（开始、结束）不受限制
+TASK_EVENTS_PER_SECOND = 4
+# 发送循环的间隔
+TASK_EVENT_TICK_SECONDS = 0.05
+
+FINAL_STATUSES = ('success', 'failed', 'cancelled')
+
+
+def task_payload(record):
+    """与 /api/task/status 响应相同的结构，前端可共用一套处理逻辑"""
+    return {
+        'success': True,
+        'taskId': record.get('taskId'),
+        'status': record.get('status'),
+        'message': record.get('message', ''),
+        'progress': record.get('progress', 0.0),
+        'queue': record.get('queue'),
+    }
+
+
+class TaskEventCoalescer:
+    """合并任务事件：同一任务在限速窗口内的多次更新只发送最后一次
+
+    publish 可在任意线程调用，只记录最新快照；实际发送由 run() 所在的循环完成，
+    这样 emit 总在 Socket.IO 自己的后台任务里执行，不会从任务线程直接写网络。
+    状态发生变化的事件（pending → running → 结束）不等待限速窗口。
+    """
+
+    def __init__(self, emit, rate=TASK_EVENTS_PER_SECOND, tick=TASK_EVENT_TICK_SECONDS):
+        self.emit = emit
+        self.min_interval = 1.0 / max(0.1, float(rate))
+        self.tick = tick
+        self._pending = {}
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def publish(self, record):
+        task_id = record.get('taskId')
+        if not task_id:
+            return
+        with self._lock:
+            prev = self._pending.get(task_id)
+            urgent = prev is not None and prev[1]
+            last_status = self._last.get(task_id, (0.0, None))[1]
+            self._pending[task_id] = (dict(record), urgent or record.get('status') != last_status)
+
+    def flush(self, now=None):
+        """发送到期的事件，返回发送数量"""
+        now = time.monotonic() if now is None else now
+        due = []
+        with self._lock:
+            for task_id, (record, urgent) in list(self._pending.items()):
+                last_at = self._last.get(task_id, (0.0, None))[0]
+                if urgent or now - last_at >= self.min_interval:
+                    due.append(record)
+                    del self._pending[task_id]
+                    if record.get('status') in FINAL_STATUSES:
+                        self._last.pop(task_id, None)
+                    else:
+                        self._last[task_id] = (now, record.get('status'))
+        for record in due:
+            try:
+                self.emit(record)
+            except Exception as e:
+                print(f'任务事件推送失败: {e}')
+        return len(due)
+
+    def run(self, sleep):
+        while True:
+            self.flush()
+            sleep(self.tick)
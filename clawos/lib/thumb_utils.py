@@ -0,0 +1,236 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+import types
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.context import SpawnContext, SpawnProcess
+
+
+THUMB_SIZES = (64, 128, 256, 512)
+THUMB_DEFAULT_SIZE = 128
+THUMB_CACHE_MAX_BYTES = int(os.getenv('CLAWOS_THUMB_CACHE_MB', '512')) * 1024 * 1024
+THUMB_WORKERS = max(1, min(4, os.cpu_count() or 1))
+THUMB_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff', '.ico'}
+THUMB_FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+
+# 命中时最多每隔这么久刷新一次缓存文件的 mtime，作为 LRU 淘汰依据
+_TOUCH_INTERVAL = 24 * 60 * 60
+
+
+# 启动工作进程时临时替换的 __main__：没有 __file__ / __spec__，子进程就不会重新执行服务入口 app.py
+_BARE_MAIN = types.ModuleType('__main__')
+
+
+class _ThumbProcess(SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = _BARE_MAIN
+        try:
+            return SpawnProcess._Popen(process_obj)
+        finally:
+            sys.modules['__main__'] = main
+
+
+class _ThumbContext(SpawnContext):
+    """spawn 启动的工作进程只导入本模块与 Pillow，不导入 Flask 应用"""
+    Process = _ThumbProcess
+
+
+def _init_worker():
+    from PIL import Image  # noqa: F401
+
+
+def render_thumbnail(src, dst, size, fmt):
+    """在工作进程中生成缩略图，先写临时文件再原子替换"""
+    from PIL import Image, ImageOps
+
+    pil_format = THUMB_FORMATS[fmt][0]
+    with Image.open(src) as img:
+        if img.format == 'JPEG':
+            # 让解码器直接按 1/2、1/4、1/8 缩放解码，大幅降低大图的解码开销
+            img.draft('RGB', (size * 2, size * 2))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.LANCZOS)
+        if pil_format == 'JPEG':
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGBA')
+                bg = Image.new('RGB', img.size, (255, 255, 255))
+                bg.paste(img, mask=img.split()[-1])
+                img = bg
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() or img.mode == 'P' else 'RGB')
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f'{dst}.{uuid.uuid4().hex}.tmp'
+        try:
+            img.save(tmp, pil_format, quality=80, method=4) if pil_format == 'WEBP' else img.save(tmp, pil_format, quality=82, optimize=True)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return os.path.getsize(dst)
+
+
+class ThumbnailCache:
+    """磁盘缩略图缓存，键为 (源路径, 源文件 mtime/大小, 尺寸, 格式)，按总大小 LRU 淘汰"""
+
+    def __init__(self, cache_dir, max_bytes=THUMB_CACHE_MAX_BYTES, workers=THUMB_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pool = None
+        self._total_bytes = None
+        self._evicting = False
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for(self, full_path, st, size, fmt):
+        raw = f'{full_path}\0{st.st_mtime_ns}\0{st.st_size}\0{size}\0{fmt}'
+        return hashlib.sha1(raw.encode('utf-8', errors='surrogateescape')).hexdigest()
+
+    def path_for(self, key, fmt):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.{fmt}')
+
+    def get(self, full_path, st, size, fmt):
+        """返回 (缓存文件路径, key)；缓存缺失时在进程池中生成，同一 key 的并发请求共享一次生成"""
+        key = self.key_for(full_path, st, size, fmt)
+        dst = self.path_for(key, fmt)
+        try:
+            cached = os.stat(dst)
+            if time.time() - cached.st_mtime > _TOUCH_INTERVAL:
+                os.utime(dst)
+            return dst, key
+        except OSError:
+            pass
+
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._submit(full_path, dst, size, fmt)
+                self._pending[key] = future
+        try:
+            try:
+                written = future.result(timeout=60)
+            except BrokenProcessPool:
+                # 工作进程异常退出（如被 OOM 杀掉），下次请求重建进程池，本次在当前线程生成
+                with self._lock:
+                    self._pool = None
+                written = render_thumbnail(full_path, dst, size, fmt)
+        finally:
+            if owner:
+                with self._lock:
+                    self._pending.pop(key, None)
+        if owner:
+            self._account(written)
+        return dst, key
+
+    def _submit(self, full_path, dst, size, fmt):
+        if self._pool is None:
+            try:
+                # spawn 避免在多线程的服务进程中 fork
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=_ThumbContext(),
+                    initializer=_init_worker,
+                )
+            except Exception:
+                self._pool = False
+        if self._pool:
+            try:
+                return self._pool.submit(render_thumbnail, full_path, dst, size, fmt)
+            except Exception:
+                self._pool = False
+        future = Future()
+        try:
+            future.set_result(render_thumbnail(full_path, dst, size, fmt))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _account(self, written):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total()
+            else:
+                self._total_bytes += int(written or 0)
+            if self._total_bytes <= self.max_bytes or self._evicting:
+                return
+            self._evicting = True
+        threading.Thread(target=self._evict, name='thumb-evict', daemon=True).start()
+
+    def _scan_total(self):
+        total = 0
+        for entry in self._iter_cache_files():
+            total += entry[1]
+        return total
+
+    def _iter_cache_files(self):
+        try:
+            with os.scandir(self.cache_dir) as shards:
+                for shard in shards:
+                    if not shard.is_dir(follow_symlinks=False):
+                        continue
+                    try:
+                        with os.scandir(shard.path) as it:
+                            for entry in it:
+                                if entry.name.endswith('.tmp'):
+                                    continue
+                                try:
+                                    st = entry.stat(follow_symlinks=False)
+                                except OSError:
+                                    continue
+                                yield entry.path, st.st_size, st.st_mtime
+                    except OSError:
+                        continue
+        except OSError:
+            return
+
+    def _evict(self):
+        """删除最久未使用的缩略图，直到总大小降到上限的 80%"""
+        try:
+            files = sorted(self._iter_cache_files(), key=lambda x: x[2])
+            total = sum(f[1] for f in files)
+            target = int(self.max_bytes * 0.8)
+            for path, size, _mtime in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    continue
+            with self._lock:
+                self._total_bytes = total
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def stats(self):
+        with self._lock:
+            total = self._total_bytes
+        if total is None:
+            total = self._scan_total()
+            with self._lock:
+                self._total_bytes = total
+        return {'total_bytes': total, 'max_bytes': self.max_bytes, 'workers': self.workers}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache(cache_dir):
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ThumbnailCache(cache_dir)
+    return _cache
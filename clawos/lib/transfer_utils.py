@@ -0,0 +1,349 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+TRANSFER_WORKERS = int(os.getenv('CLAWOS_TRANSFER_WORKERS', '0') or 0) or min(8, (os.cpu_count() or 1) * 2)
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+_CHUNK = 8 * 1024 * 1024
+
+
+class TransferCancelled(Exception):
+    """传输被取消"""
+
+
+class TransferControl:
+    """传输的暂停 / 继续 / 取消开关；工作线程在每个数据块之间调用 checkpoint()"""
+
+    def __init__(self, cancelled=None):
+        self._running = threading.Event()
+        self._running.set()
+        self._cancel = threading.Event()
+        self._cancelled = cancelled
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancel.set()
+        self._running.set()
+
+    def is_cancelled(self):
+        if self._cancel.is_set():
+            return True
+        if self._cancelled is not None and self._cancelled():
+            self._cancel.set()
+            return True
+        return False
+
+    def checkpoint(self):
+        while True:
+            if self.is_cancelled():
+                raise TransferCancelled()
+            # 暂停时定期醒来，以便外部取消能够及时生效
+            if self._running.wait(0.5):
+                break
+        if self.is_cancelled():
+            raise TransferCancelled()
+
+
+def _try_reflink(src_fd, dst_fd):
+    """btrfs / xfs 等支持 reflink 的文件系统上共享数据块，瞬间完成"""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+def _copy_range(src_fd, dst_fd, size, on_bytes, control):
+    """优先用 copy_file_range 在内核中复制（NFS/CIFS 上可由服务端完成），不支持时退回 read/write"""
+    offset = 0
+    use_cfr = hasattr(os, 'copy_file_range')
+    while offset < size:
+        if control is not None:
+            control.checkpoint()
+        n = min(_CHUNK, size - offset)
+        copied = 0
+        if use_cfr:
+            try:
+                copied = os.copy_file_range(src_fd, dst_fd, n, offset, offset)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                    raise
+                use_cfr = False
+                continue
+        else:
+            data = os.pread(src_fd, n, offset)
+            view = memoryview(data)
+            while view:
+                w = os.pwrite(dst_fd, view, offset + copied)
+                view = view[w:]
+                copied += w
+        if copied == 0:
+            # 源文件在复制过程中被截断
+            break
+        offset += copied
+        if on_bytes is not None:
+            on_bytes(copied)
+    return offset
+
+
+def copy_file(src, dst, on_bytes=None, control=None):
+    """复制单个文件及其权限与时间戳，返回 'reflink' 或 'copy'
+
+    中途失败或被取消时删除已写出的部分。
+    """
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        st = os.fstat(src_fd)
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.S_IMODE(st.st_mode) | stat.S_IWUSR)
+        try:
+            try:
+                if st.st_size and _try_reflink(src_fd, dst_fd):
+                    method = 'reflink'
+                    if on_bytes is not None:
+                        on_bytes(st.st_size)
+                else:
+                    method = 'copy'
+                    _copy_range(src_fd, dst_fd, st.st_size, on_bytes, control)
+            finally:
+                os.close(dst_fd)
+            shutil.copystat(src, dst)
+        except BaseException:
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            raise
+    finally:
+        os.close(src_fd)
+    return method
+
+
+def _check_regular(path, st):
+    """FIFO、套接字、设备文件不能按普通文件读取（打开 FIFO 会一直阻塞），直接报错"""
+    if not stat.S_ISREG(st.st_mode):
+        raise OSError(f'不支持复制特殊文件: {path}')
+
+
+def plan_tree(src, dst):
+    """把 src（文件或目录）展开为 (目录列表, [(源文件, 目标文件, 大小)], [(链接目标, 目标路径)])
+
+    符号链接按链接本身复制，不跟随，避免环路与越出根目录。
+    树中含有特殊文件时在复制开始前抛出 OSError。
+    """
+    dirs = []
+    files = []
+    links = []
+    if os.path.islink(src):
+        links.append((os.readlink(src), dst))
+        return dirs, files, links
+    if not os.path.isdir(src):
+        st = os.lstat(src)
+        _check_regular(src, st)
+        files.append((src, dst, st.st_size))
+        return dirs, files, links
+    dirs.append((src, dst))
+    stack = [(src, dst)]
+    while stack:
+        cur_src, cur_dst = stack.pop()
+        with os.scandir(cur_src) as it:
+            for entry in it:
+                target = os.path.join(cur_dst, entry.name)
+                if entry.is_symlink():
+                    links.append((os.readlink(entry.path), target))
+                elif entry.is_dir(follow_symlinks=False):
+                    dirs.append((entry.path, target))
+                    stack.append((entry.path, target))
+                else:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    _check_regular(entry.path, st)
+                    files.append((entry.path, target, st.st_size))
+    return dirs, files, links
+
+
+class TransferJob:
+    """一组 (源, 目标) 的复制或移动，小文件由线程池并行复制，进度以字节计
+
+    移动时先尝试 rename（同一文件系统内瞬间完成）；跨设备（EXDEV）时复制、
+    校验每个文件的大小后再删除源。
+    """
+
+    def __init__(self, op, pairs, control=None, on_bytes=None, workers=TRANSFER_WORKERS):
+        if op not in ('copy', 'move'):
+            raise ValueError(f'不支持的操作: {op}')
+        self.op = op
+        self.pairs = pairs
+        self.control = control or TransferControl()
+        self.on_bytes = on_bytes
+        self.workers = max(1, workers)
+        self.total_bytes = 0
+        self.reflinked = 0
+        self._lock = threading.Lock()
+
+    def measure(self):
+        """统计需要复制的总字节数；能直接 rename 的移动不计入"""
+        total = 0
+        for src, dst in self.pairs:
+            if self.op == 'move' and _same_device(src, os.path.dirname(dst)):
+                continue
+            try:
+                _dirs, files, _links = plan_tree(src, dst)
+            except OSError:
+                # 无法展开的项由 run() 记为失败
+                continue
+            total += sum(size for _s, _d, size in files)
+        self.total_bytes = total
+        return total
+
+    def run(self):
+        """逐项执行，返回 (成功的源路径列表, [(源路径, 错误信息)])"""
+        done = []
+        errors = []
+        for src, dst in self.pairs:
+            self.control.checkpoint()
+            try:
+                if self.op == 'move':
+                    self._move(src, dst)
+                else:
+                    self._copy_tree(src, dst)
+                done.append(src)
+            except TransferCancelled:
+                raise
+            except Exception as e:
+                errors.append((src, str(e)))
+        return done, errors
+
+    def _move(self, src, dst):
+        try:
+            os.rename(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        self._copy_tree(src, dst)
+        try:
+            _verify_tree(src, dst)
+        except BaseException:
+            _remove_partial(dst)
+            raise
+        if os.path.isdir(src) and not os.path.islink(src):
+            shutil.rmtree(src)
+        else:
+            os.remove(src)
+
+    def _on_file_done(self, method):
+        if method == 'reflink':
+            with self._lock:
+                self.reflinked += 1
+
+    def _copy_tree(self, src, dst):
+        if os.path.lexists(dst):
+            # 只清理自己创建的目标，绝不动已存在的文件
+            raise FileExistsError(f'目标已存在: {dst}')
+        try:
+            self._copy_items(*plan_tree(src, dst))
+        except BaseException:
+            # 源保持不动，清掉复制了一半的目标
+            _remove_partial(dst)
+            raise
+
+    def _copy_items(self, dirs, files, links):
+        for _s, d in dirs:
+            os.makedirs(d, exist_ok=True)
+        for target, d in links:
+            os.symlink(target, d)
+        if self.workers <= 1 or len(files) <= 1:
+            for s, d, _size in files:
+                self.control.checkpoint()
+                self._on_file_done(copy_file(s, d, self.on_bytes, self.control))
+        else:
+            self._copy_parallel(files)
+        # 目录的时间戳在其内容写完后再恢复
+        for s, d in reversed(dirs):
+            try:
+                shutil.copystat(s, d)
+            except OSError:
+                pass
+
+    def _copy_parallel(self, files):
+        failed = threading.Event()
+
+        def _run(s, d):
+            if failed.is_set():
+                raise TransferCancelled()
+            self._on_file_done(copy_file(s, d, self.on_bytes, self.control))
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='transfer') as pool:
+            pending = set()
+            try:
+                for s, d, _size in files:
+                    self.control.checkpoint()
+                    if len(pending) >= self.workers * 4:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for f in finished:
+                            f.result()
+                    pending.add(pool.submit(_run, s, d))
+                for f in pending:
+                    f.result()
+            except BaseException:
+                failed.set()
+                for f in pending:
+                    f.cancel()
+                raise
+
+
+def _remove_partial(dst):
+    try:
+        if os.path.isdir(dst) and not os.path.islink(dst):
+            shutil.rmtree(dst, ignore_errors=True)
+        elif os.path.lexists(dst):
+            os.remove(dst)
+    except OSError:
+        pass
+
+
+def _same_device(src, dst_dir):
+    try:
+        return os.lstat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+def _verify_tree(src, dst):
+    """跨设备移动在删除源之前，确认每个文件都已完整写到目标"""
+    _dirs, files, links = plan_tree(src, dst)
+    for s, d, size in files:
+        try:
+            st = os.lstat(d)
+        except OSError:
+            raise OSError(f'校验失败，目标缺少文件: {d}')
+        if not stat.S_ISREG(st.st_mode):
+            raise OSError(f'校验失败，目标不是普通文件: {d}')
+        if st.st_size != size:
+            raise OSError(f'校验失败，大小不一致: {d}')
+    for _target, d in links:
+        if not os.path.islink(d):
+            raise OSError(f'校验失败，目标缺少链接: {d}')
@@ -0,0 +1,379 @@
+import os
+import posixpath
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from lib import path_utils
+
+
+# 保留策略：0 表示不限制；超出时由后台线程按删除时间从旧到新清理
+TRASH_MAX_DAYS = float(os.getenv('CLAWOS_TRASH_MAX_DAYS', '0') or 0)
+TRASH_MAX_MB = int(os.getenv('CLAWOS_TRASH_MAX_MB', '0') or 0)
+TRASH_LIST_MAX_LIMIT = 500
+
+_NAME_TIME_FORMAT = '%Y%m%d%H%M%S'
+_DISPLAY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    name TEXT PRIMARY KEY,
+    original TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    is_dir INTEGER NOT NULL DEFAULT 0,
+    deleted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_deleted_at ON items(deleted_at);
+"""
+
+
+class TrashError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def tree_size(path):
+    """统计文件或目录占用的字节数，不跟随软链接"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return 0
+    if not os.path.isdir(path) or os.path.islink(path):
+        return st.st_size
+    total = 0
+    stack = [path]
+    while stack:
+        cur = stack.pop()
+        try:
+            with os.scandir(cur) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _display_name(name):
+    # 回收站内的名称为 <14 位时间戳>_<原名>[_<序号>]
+    if len(name) > 15 and name[14] == '_':
+        return name[15:]
+    return name
+
+
+def _time_from_name(name):
+    try:
+        return datetime.strptime(name[:14], _NAME_TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+def _remove_path(path):
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.remove(path)
+    else:
+        shutil.rmtree(path)
+
+
+class TrashStore:
+    """回收站清单（SQLite），记录每一项的原始位置、大小与删除时间
+
+    列表、还原与清理都只查询清单，不再逐项 listdir / isdir；
+    没有清单记录的旧条目（升级前删除的）在首次使用时补登，原始位置记为未知。
+    删除目录时先改名移入回收站，目录大小由后台线程随后统计并写回清单。
+    """
+
+    def __init__(self, trash_dir, db_path, max_days=TRASH_MAX_DAYS, max_bytes=TRASH_MAX_MB * 1024 * 1024):
+        self.trash_dir = os.path.normpath(trash_dir)
+        self.db_path = db_path
+        self.max_days = max_days
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._adopted = False
+        self._retention_running = False
+        self._unsized = []
+        self._sizing_running = False
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_ready(self):
+        if self._adopted:
+            return
+        with self._lock:
+            if self._adopted:
+                return
+            os.makedirs(self.trash_dir, exist_ok=True)
+            self._sync_with_disk()
+            self._adopted = True
+
+    def _sync_with_disk(self):
+        """清单与回收站目录对账：补登没有记录的条目，删除文件已不存在的记录"""
+        conn = self._conn()
+        known = {row[0] for row in conn.execute('SELECT name FROM items')}
+        on_disk = set()
+        rows = []
+        with os.scandir(self.trash_dir) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                on_disk.add(entry.name)
+                if entry.name in known:
+                    continue
+                deleted_at = _time_from_name(entry.name)
+                if deleted_at is None:
+                    try:
+                        deleted_at = entry.stat(follow_symlinks=False).st_mtime
+                    except OSError:
+                        deleted_at = time.time()
+                rows.append((
+                    entry.name, None, tree_size(entry.path),
+                    1 if entry.is_dir(follow_symlinks=False) else 0, deleted_at,
+                ))
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO items(name, original, size, is_dir, deleted_at) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            conn.executemany('DELETE FROM items WHERE name = ?', [(n,) for n in known - on_disk])
+
+    def move_to_trash(self, full_path, root_dir):
+        """把 full_path 移入回收站并登记，返回回收站内的名称"""
+        self._ensure_ready()
+        root_dir = os.path.normpath(root_dir)
+        original = os.path.relpath(full_path, root_dir).replace(os.sep, '/')
+        is_dir = os.path.isdir(full_path) and not os.path.islink(full_path)
+        # 目录大小要遍历整棵树，放到改名之后在后台统计
+        size = 0 if is_dir else tree_size(full_path)
+        now = time.time()
+        timestamp = datetime.fromtimestamp(now).strftime(_NAME_TIME_FORMAT)
+        item_name = os.path.basename(full_path)
+        with self._lock:
+            trash_name = f'{timestamp}_{item_name}'
+            counter = 1
+            while os.path.lexists(os.path.join(self.trash_dir, trash_name)):
+                trash_name = f'{timestamp}_{item_name}_{counter}'
+                counter += 1
+            shutil.move(full_path, os.path.join(self.trash_dir, trash_name))
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO items(name, original, size, is_dir, deleted_at) VALUES (?, ?, ?, ?, ?)',
+                (trash_name, original, size, 1 if is_dir else 0, now),
+            )
+        if is_dir:
+            self._schedule_sizing(trash_name)
+        else:
+            self.enforce_retention()
+        return trash_name
+
+    def _schedule_sizing(self, trash_name):
+        """把目录加入待统计列表；同一时刻只有一个统计线程，统计完后再执行保留策略"""
+        with self._lock:
+            self._unsized.append(trash_name)
+            if self._sizing_running:
+                return
+            self._sizing_running = True
+
+        def _run():
+            while True:
+                with self._lock:
+                    if not self._unsized:
+                        self._sizing_running = False
+                        break
+                    name = self._unsized.pop(0)
+                try:
+                    size = tree_size(self._item_path(name))
+                    conn = self._conn()
+                    with conn:
+                        conn.execute('UPDATE items SET size = ? WHERE name = ?', (size, name))
+                except Exception as e:
+                    print(f'回收站目录大小统计失败: {e}')
+            self.enforce_retention()
+
+        threading.Thread(target=_run, daemon=True, name='trash-size').start()
+
+    def list(self, offset=0, limit=100):
+        """按删除时间倒序分页，返回 (items, total, total_size)"""
+        self._ensure_ready()
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), TRASH_LIST_MAX_LIMIT))
+        conn = self._conn()
+        total, total_size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM items').fetchone()
+        rows = conn.execute(
+            'SELECT name, original, size, is_dir, deleted_at FROM items '
+            'ORDER BY deleted_at DESC, name DESC LIMIT ? OFFSET ?',
+            (limit, offset),
+        ).fetchall()
+        return [self._row_to_item(r) for r in rows], total, total_size
+
+    def get(self, name):
+        self._ensure_ready()
+        row = self._conn().execute(
+            'SELECT name, original, size, is_dir, deleted_at FROM items WHERE name = ?', (name,)
+        ).fetchone()
+        return self._row_to_item(row) if row else None
+
+    def _row_to_item(self, row):
+        name, original, size, is_dir, deleted_at = row
+        return {
+            'name': name,
+            'display_name': posixpath.basename(original) if original else _display_name(name),
+            'original_path': original,
+            'size': size,
+            'is_dir': bool(is_dir),
+            'deleted_at': datetime.fromtimestamp(deleted_at).strftime(_DISPLAY_TIME_FORMAT),
+            'deleted_ts': int(deleted_at),
+        }
+
+    def _item_path(self, name):
+        if not name or '/' in name or '\\' in name or name in ('.', '..'):
+            raise TrashError('非法名称', 400)
+        return os.path.join(self.trash_dir, name)
+
+    def restore(self, name, root_dir, target_path=None):
+        """还原到 target_path；未指定时还原到删除前的原始位置。返回还原后的相对路径"""
+        trash_item = self._item_path(name)
+        item = self.get(name)
+        if item is None or not os.path.lexists(trash_item):
+            raise TrashError('文件不存在', 404)
+        target = (target_path or '').strip() or item['original_path']
+        if not target:
+            raise TrashError('原始位置未知，请指定还原路径', 400)
+
+        root_dir = os.path.normpath(root_dir)
+        target_full = os.path.normpath(os.path.join(root_dir, target))
+        if target_full == root_dir or os.path.commonpath([root_dir, target_full]) != root_dir:
+            raise TrashError('非法路径', 403)
+        if os.path.lexists(target_full):
+            raise TrashError('目标已存在', 409)
+
+        os.makedirs(os.path.dirname(target_full), exist_ok=True)
+        shutil.move(trash_item, target_full)
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM items WHERE name = ?', (name,))
+        return os.path.relpath(target_full, root_dir).replace(os.sep, '/')
+
+    def select_expired(self, max_days=None, max_bytes=None):
+        """按保留策略挑出需要清理的条目名称：先按天数，再从最旧的开始删到总大小不超过上限"""
+        self._ensure_ready()
+        conn = self._conn()
+        rows = conn.execute('SELECT name, size, deleted_at FROM items ORDER BY deleted_at ASC, name ASC').fetchall()
+        victims = []
+        remaining = sum(size for _n, size, _t in rows)
+        cutoff = time.time() - max_days * 86400 if max_days else None
+        for name, size, deleted_at in rows:
+            if (cutoff is not None and deleted_at < cutoff) or (max_bytes and remaining > max_bytes):
+                victims.append(name)
+                remaining -= size
+        return victims
+
+    def purge(self, names=None, on_progress=None, cancelled=None):
+        """永久删除指定条目（names 为 None 时清空），返回 (删除数量, 释放字节数)
+
+        on_progress(done_bytes, total_bytes, done_count, total_count) 在每项删除后调用。
+        """
+        self._ensure_ready()
+        conn = self._conn()
+        if names is None:
+            rows = conn.execute('SELECT name, size FROM items ORDER BY deleted_at ASC').fetchall()
+        else:
+            rows = []
+            for name in names:
+                row = conn.execute('SELECT name, size FROM items WHERE name = ?', (name,)).fetchone()
+                if row:
+                    rows.append(row)
+        total_bytes = sum(size for _n, size in rows)
+        done_bytes = 0
+        count = 0
+        for name, size in rows:
+            if cancelled is not None and cancelled():
+                break
+            path = self._item_path(name)
+            try:
+                _remove_path(path)
+            except FileNotFoundError:
+                pass
+            with conn:
+                conn.execute('DELETE FROM items WHERE name = ?', (name,))
+            count += 1
+            done_bytes += size
+            if on_progress is not None:
+                on_progress(done_bytes, total_bytes, count, len(rows))
+        return count, done_bytes
+
+    def enforce_retention(self):
+        """超出保留策略时在后台线程中清理，不阻塞删除请求"""
+        if not self.max_days and not self.max_bytes:
+            return False
+        with self._lock:
+            if self._retention_running:
+                return False
+            self._retention_running = True
+
+        def _run():
+            try:
+                victims = self.select_expired(self.max_days, self.max_bytes)
+                if victims:
+                    self.purge(victims)
+            except Exception as e:
+                print(f'回收站自动清理失败: {e}')
+            finally:
+                with self._lock:
+                    self._retention_running = False
+
+        threading.Thread(target=_run, daemon=True, name='trash-retention').start()
+        return True
+
+
+def purge_job(store, update_task, names=None):
+    """返回永久删除回收站条目的任务函数，交给 create_task 在后台执行；names 为 None 时清空"""
+
+    def _run(task_id, token):
+        update_task(task_id, status='running', progress=0.0, message='清理中…')
+
+        def _report(done_bytes, total_bytes, done, total):
+            update_task(
+                task_id,
+                progress=done * 100.0 / total if total else 100.0,
+                message=f'清理中… {done}/{total}',
+            )
+
+        count, freed = store.purge(names, on_progress=_report, cancelled=lambda: token.cancelled)
+        if token.cancelled:
+            raise TrashError(f'已取消，已清理 {count} 项')
+        update_task(task_id, progress=100.0, message=f'已清理 {count} 项，释放 {path_utils.format_size(freed)}')
+
+    return _run
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_trash_store(trash_dir, db_path):
+    key = (os.path.normpath(trash_dir), db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = TrashStore(trash_dir, db_path)
+            _stores[key] = store
+    return store
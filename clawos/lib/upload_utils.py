@@ -0,0 +1,271 @@
+import errno
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_MAX_CHUNK = 64 * 1024 * 1024
+UPLOAD_EXPIRE_SECONDS = int(os.getenv('CLAWOS_UPLOAD_EXPIRE_HOURS', '24')) * 3600
+UPLOAD_CHECKSUM_ALGOS = ('sha256', 'sha1', 'md5')
+
+_IO_BLOCK = 1024 * 1024
+
+
+class UploadError(Exception):
+    """上传协议错误，status 为对应的 HTTP 状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _merge_range(ranges, start, end):
+    merged = []
+    for s, e in sorted(ranges + [[start, end]]):
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return merged
+
+
+class UploadSession:
+    """一次可续传上传：数据直接写入目标目录下的隐藏 .part 文件，完成后原子地链接到最终文件名
+
+    分片可以乱序、并行到达，已接收区间记录在 received 中；offset 为从 0 开始的连续已接收长度。
+    """
+
+    def __init__(self, upload_id, target_dir, filename, part_path, size, received=None, created=None, updated=None):
+        self.id = upload_id
+        self.target_dir = target_dir
+        self.filename = filename
+        self.part_path = part_path
+        self.size = size
+        self.received = received or []
+        self.created = created or time.time()
+        self.updated = updated or self.created
+        self.lock = threading.Lock()
+
+    @property
+    def offset(self):
+        if self.received and self.received[0][0] == 0:
+            return self.received[0][1]
+        return 0
+
+    @property
+    def complete(self):
+        return self.offset >= self.size
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'target_dir': self.target_dir,
+            'filename': self.filename,
+            'part_path': self.part_path,
+            'size': self.size,
+            'received': self.received,
+            'created': self.created,
+            'updated': self.updated,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['id'], data['target_dir'], data['filename'], data['part_path'], int(data['size']),
+            received=[[int(s), int(e)] for s, e in data.get('received') or []],
+            created=data.get('created'), updated=data.get('updated'),
+        )
+
+
+class UploadStore:
+    """上传会话的登记处；会话清单以 JSON 保存在 state_dir，服务重启后仍可续传"""
+
+    def __init__(self, state_dir, expire_seconds=UPLOAD_EXPIRE_SECONDS):
+        self.state_dir = state_dir
+        self.expire_seconds = expire_seconds
+        self._lock = threading.Lock()
+        self._sessions = {}
+        os.makedirs(state_dir, exist_ok=True)
+
+    def create(self, target_dir, filename, size):
+        self.sweep()
+        upload_id = uuid.uuid4().hex
+        part_path = os.path.join(target_dir, f'.{filename}.{upload_id[:12]}.part')
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            if size and hasattr(os, 'posix_fallocate'):
+                try:
+                    # 预先占用空间，磁盘不足时在开始上传前就失败
+                    os.posix_fallocate(fd, 0, size)
+                except OSError as e:
+                    if e.errno == errno.ENOSPC:
+                        os.close(fd)
+                        fd = None
+                        os.remove(part_path)
+                        raise UploadError('磁盘空间不足', 507)
+                    os.ftruncate(fd, size)
+            elif size:
+                os.ftruncate(fd, size)
+        finally:
+            if fd is not None:
+                os.close(fd)
+        session = UploadSession(upload_id, target_dir, filename, part_path, size)
+        with self._lock:
+            self._sessions[upload_id] = session
+        self._save(session)
+        return session
+
+    def get(self, upload_id):
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            return None
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is not None:
+                return session
+            try:
+                with open(self._manifest_path(upload_id), 'r', encoding='utf-8') as f:
+                    session = UploadSession.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError):
+                return None
+            if not os.path.exists(session.part_path):
+                return None
+            self._sessions[upload_id] = session
+            return session
+
+    def write_chunk(self, session, stream, offset, length, sha256=None):
+        """把请求体流直接 pwrite 到 .part 文件的 offset 处，可选校验分片 sha256，返回会话"""
+        if length is None:
+            raise UploadError('缺少 Content-Length', 411)
+        if length > UPLOAD_MAX_CHUNK:
+            raise UploadError('分片过大', 413)
+        if offset < 0 or offset + length > session.size:
+            raise UploadError('分片超出文件大小', 416)
+        digest = hashlib.sha256() if sha256 else None
+        fd = os.open(session.part_path, os.O_WRONLY)
+        try:
+            pos = offset
+            remaining = length
+            while remaining > 0:
+                chunk = stream.read(min(_IO_BLOCK, remaining))
+                if not chunk:
+                    break
+                if digest is not None:
+                    digest.update(chunk)
+                view = memoryview(chunk)
+                while view:
+                    n = os.pwrite(fd, view, pos)
+                    view = view[n:]
+                    pos += n
+                remaining -= len(chunk)
+        finally:
+            os.close(fd)
+        if remaining > 0:
+            # 连接中断：已写入的字节不登记，客户端按 offset 重传即可
+            raise UploadError('分片数据不完整', 400)
+        if digest is not None and digest.hexdigest() != sha256.lower():
+            raise UploadError('分片校验失败', 460)
+        if length:
+            with session.lock:
+                session.received = _merge_range(session.received, offset, offset + length)
+                session.updated = time.time()
+            self._save(session)
+        return session
+
+    def finalize(self, session, out_full, checksum=None):
+        """校验并把 .part 文件链接为 out_full；目标已存在时抛出 FileExistsError 由调用方换名重试"""
+        with session.lock:
+            if not session.complete:
+                raise UploadError(f'上传未完成: {session.offset}/{session.size}', 409)
+            if checksum:
+                algo, _, expected = checksum.partition(':')
+                algo = algo.strip().lower()
+                if algo not in UPLOAD_CHECKSUM_ALGOS or not expected:
+                    raise UploadError('不支持的校验算法')
+                if _file_digest(session.part_path, algo) != expected.strip().lower():
+                    raise UploadError('文件校验失败', 460)
+            try:
+                # link 不会覆盖已存在的文件，避免与同名文件竞争时静默覆盖
+                os.link(session.part_path, out_full)
+                os.remove(session.part_path)
+            except FileExistsError:
+                raise
+            except OSError:
+                if os.path.exists(out_full):
+                    raise FileExistsError(out_full)
+                os.rename(session.part_path, out_full)
+        self._forget(session.id)
+
+    def abort(self, session):
+        try:
+            os.remove(session.part_path)
+        except OSError:
+            pass
+        self._forget(session.id)
+
+    def sweep(self):
+        """清理超过有效期未更新的上传"""
+        now = time.time()
+        try:
+            names = os.listdir(self.state_dir)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            session = self.get(name[:-5])
+            if session is None:
+                try:
+                    os.remove(os.path.join(self.state_dir, name))
+                except OSError:
+                    pass
+                continue
+            if now - session.updated > self.expire_seconds:
+                self.abort(session)
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        try:
+            os.remove(self._manifest_path(upload_id))
+        except OSError:
+            pass
+
+    def _manifest_path(self, upload_id):
+        return os.path.join(self.state_dir, f'{upload_id}.json')
+
+    def _save(self, session):
+        with session.lock:
+            data = session.to_dict()
+        path = self._manifest_path(session.id)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+
+def _file_digest(path, algo):
+    h = hashlib.new(algo)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_IO_BLOCK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store(state_dir):
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UploadStore(state_dir)
+    return _store
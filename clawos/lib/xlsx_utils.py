@@ -0,0 +1,482 @@
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+from xml.parsers import expat
+
+
+# 单次请求返回的最大行数 / 列数
+XLSX_MAX_ROWS = 500
+XLSX_MAX_COLS = 200
+# 内存中缓存的工作簿数量；每个工作簿只缓存被打开过的工作表
+_MEMORY_WORKBOOKS = 4
+_MAX_ROW_INDEX = 1048576
+_PARSE_CHUNK = 1024 * 1024
+_MAX_COL_INDEX = 16384
+
+# 单元格类型编码：NUM/BOOL/DATE 的值存在 nums 中；SST/TEXT 时 nums 存字符串表下标
+KIND_NUM = 0
+KIND_SST = 1
+KIND_TEXT = 2
+KIND_BOOL = 3
+KIND_DATE = 4
+
+# 内置数字格式中表示日期/时间的编号
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | set(range(27, 37)) | {45, 46, 47} | set(range(50, 59))
+_DATE_CODE_RE = re.compile(r'[dmyhs]', re.I)
+_FORMAT_NOISE_RE = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.|_.|\*.')
+_CELL_REF_RE = re.compile(r'([A-Z]+)(\d+)')
+
+
+class XlsxError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _attr(elem, name):
+    """按本地名取属性，兼容 transitional / strict 两种命名空间"""
+    value = elem.get(name)
+    if value is not None:
+        return value
+    for key, value in elem.attrib.items():
+        if _local(key) == name:
+            return value
+    return None
+
+
+def column_letter(index):
+    name = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(65 + rem) + name
+    return name
+
+
+def _column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def _parse_ref(ref):
+    """'B12' -> (11, 1)，解析失败返回 None"""
+    m = _CELL_REF_RE.match(ref or '')
+    if not m:
+        return None
+    return int(m.group(2)) - 1, _column_index(m.group(1))
+
+
+def _is_date_format(code):
+    return bool(_DATE_CODE_RE.search(_FORMAT_NOISE_RE.sub('', code or '')))
+
+
+class _CountingReader:
+    """包装压缩包成员，统计已解压的字节数用于进度"""
+
+    def __init__(self, f):
+        self._f = f
+        self.done = 0
+
+    def read(self, n=-1):
+        data = self._f.read(n)
+        self.done += len(data)
+        return data
+
+
+class Sheet:
+    """按行压缩存储（CSR）的工作表：row_ptr[r]..row_ptr[r+1] 是第 r 行单元格在各列数组中的范围
+
+    每个单元格只占 列号(4B) + 类型(1B) + 值(8B)；字符串存下标，共享字符串表全表复用。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.row_ptr = array('I', [0])
+        self.cols = array('I')
+        self.kinds = array('B')
+        self.nums = array('d')
+        self.texts = []
+        self.n_cols = 0
+
+    @property
+    def n_rows(self):
+        return len(self.row_ptr) - 1
+
+    @property
+    def n_cells(self):
+        return len(self.cols)
+
+    def _value(self, i, workbook):
+        kind = self.kinds[i]
+        num = self.nums[i]
+        if kind == KIND_NUM:
+            return int(num) if num.is_integer() and abs(num) < 1e15 else num
+        if kind == KIND_SST:
+            idx = int(num)
+            return workbook.strings[idx] if idx < len(workbook.strings) else ''
+        if kind == KIND_TEXT:
+            return self.texts[int(num)]
+        if kind == KIND_BOOL:
+            return bool(num)
+        return workbook.format_date(num)
+
+    def window(self, workbook, row=0, rows=100, col=0, cols=50):
+        row = max(0, int(row))
+        col = max(0, int(col))
+        rows = max(1, min(int(rows), XLSX_MAX_ROWS))
+        cols = max(1, min(int(cols), XLSX_MAX_COLS))
+        row_end = min(row + rows, self.n_rows)
+        col_end = min(col + cols, self.n_cols)
+        out = []
+        width = max(0, col_end - col)
+        for r in range(row, row_end):
+            values = [None] * width
+            lo, hi = self.row_ptr[r], self.row_ptr[r + 1]
+            for i in range(lo, hi):
+                c = self.cols[i]
+                if c >= col_end:
+                    break
+                if c >= col:
+                    values[c - col] = self._value(i, workbook)
+            out.append(values)
+        return {
+            'rows': out,
+            'row': row,
+            'col': col,
+            'row_end': max(row, row_end),
+            'col_end': max(col, col_end),
+            'total_rows': self.n_rows,
+            'total_cols': self.n_cols,
+            'columns': [column_letter(c) for c in range(col, col_end)],
+        }
+
+
+class Workbook:
+    """流式读取 .xlsx：元数据用 iterparse，单元格用 expat 回调；工作表在首次访问时解析并缓存"""
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.sheets = []
+        self.strings = None
+        self.date_styles = set()
+        self.epoch = datetime(1899, 12, 30)
+        self.lock = threading.Lock()
+        self.parsed = {}
+        self.tasks = {}
+        self._read_workbook()
+
+    def _open(self):
+        try:
+            return zipfile.ZipFile(self.path)
+        except zipfile.BadZipFile:
+            raise XlsxError('不是有效的 xlsx 文件', 415)
+
+    def _read_workbook(self):
+        with self._open() as zf:
+            names = set(zf.namelist())
+            if 'xl/workbook.xml' not in names:
+                raise XlsxError('不是有效的 xlsx 文件', 415)
+            targets = {}
+            if 'xl/_rels/workbook.xml.rels' in names:
+                with zf.open('xl/_rels/workbook.xml.rels') as f:
+                    for _event, elem in iterparse(f):
+                        if _local(elem.tag) == 'Relationship':
+                            target = elem.get('Target') or ''
+                            if target.startswith('/'):
+                                target = target.lstrip('/')
+                            else:
+                                target = posixpath.normpath(posixpath.join('xl', target))
+                            targets[elem.get('Id')] = target
+            with zf.open('xl/workbook.xml') as f:
+                for _event, elem in iterparse(f):
+                    tag = _local(elem.tag)
+                    if tag == 'workbookPr' and _attr(elem, 'date1904') in ('1', 'true'):
+                        self.epoch = datetime(1904, 1, 1)
+                    elif tag == 'sheet':
+                        target = targets.get(_attr(elem, 'id'))
+                        if target in names:
+                            self.sheets.append({
+                                'name': elem.get('name') or '',
+                                'part': target,
+                                'state': elem.get('state') or 'visible',
+                            })
+            if 'xl/styles.xml' in names:
+                self._read_styles(zf)
+            for sheet in self.sheets:
+                sheet['dimension'] = self._read_dimension(zf, sheet['part'])
+
+    def _read_styles(self, zf):
+        custom = {}
+        xf_formats = []
+        in_cell_xfs = False
+        with zf.open('xl/styles.xml') as f:
+            for event, elem in iterparse(f, events=('start', 'end')):
+                tag = _local(elem.tag)
+                if tag == 'cellXfs':
+                    in_cell_xfs = event == 'start'
+                elif event == 'end' and tag == 'numFmt':
+                    custom[int(elem.get('numFmtId') or 0)] = elem.get('formatCode') or ''
+                elif event == 'end' and tag == 'xf' and in_cell_xfs:
+                    xf_formats.append(int(elem.get('numFmtId') or 0))
+        for i, fmt in enumerate(xf_formats):
+            if fmt in _BUILTIN_DATE_FORMATS or (fmt in custom and _is_date_format(custom[fmt])):
+                self.date_styles.add(i)
+
+    def _read_dimension(self, zf, part):
+        """只读到 <dimension> 或 <sheetData> 为止，返回 (行数, 列数)；没有声明时返回 None"""
+        with zf.open(part) as f:
+            for _event, elem in iterparse(f, events=('start',)):
+                tag = _local(elem.tag)
+                if tag == 'dimension':
+                    ref = (elem.get('ref') or '').split(':')[-1]
+                    parsed = _parse_ref(ref)
+                    return {'rows': parsed[0] + 1, 'cols': parsed[1] + 1} if parsed else None
+                if tag == 'sheetData':
+                    return None
+        return None
+
+    def format_date(self, serial):
+        try:
+            value = self.epoch + timedelta(days=serial)
+        except OverflowError:
+            return serial
+        # 四舍五入到秒，避免浮点误差显示成 23:59:59
+        value = value.replace(microsecond=0) + timedelta(seconds=round(value.microsecond / 1e6))
+        if value.hour == 0 and value.minute == 0 and value.second == 0:
+            return value.strftime('%Y-%m-%d')
+        if serial < 1:
+            return value.strftime('%H:%M:%S')
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _load_strings(self, zf):
+        strings = []
+        if 'xl/sharedStrings.xml' not in zf.namelist():
+            return strings
+        with zf.open('xl/sharedStrings.xml') as f:
+            for _event, elem in iterparse(f):
+                if _local(elem.tag) != 'si':
+                    continue
+                strings.append(_rich_text(elem))
+                elem.clear()
+        return strings
+
+    def sheet_index(self, sheet):
+        if isinstance(sheet, str) and not sheet.isdigit():
+            for i, s in enumerate(self.sheets):
+                if s['name'] == sheet:
+                    return i
+            raise XlsxError(f'工作表不存在: {sheet}', 404)
+        i = int(sheet or 0)
+        if not 0 <= i < len(self.sheets):
+            raise XlsxError(f'工作表不存在: {sheet}', 404)
+        return i
+
+    def parse_sheet(self, index, on_progress=None, cancelled=None):
+        """解析第 index 个工作表并缓存；on_progress(done_bytes, total_bytes) 按解压后的字节数报告"""
+        info = self.sheets[index]
+        sheet = Sheet(info['name'])
+        with self._open() as zf:
+            if self.strings is None:
+                self.strings = self._load_strings(zf)
+            total = zf.getinfo(info['part']).file_size
+            with zf.open(info['part']) as raw:
+                reader = _CountingReader(raw)
+                self._parse_cells(sheet, reader, total, on_progress, cancelled)
+        with self.lock:
+            self.parsed[index] = sheet
+        return sheet
+
+    def _parse_cells(self, sheet, reader, total, on_progress, cancelled):
+        """用 expat 回调逐个处理单元格：不构建元素树，内存只与结果大小有关"""
+        row_ptr, cols, kinds, nums, texts = sheet.row_ptr, sheet.cols, sheet.kinds, sheet.nums, sheet.texts
+        date_styles = self.date_styles
+        state = {'prefix': None}
+        cur_row = -1
+        next_col = 0
+        max_col = -1
+        cell = None
+        value_parts = None
+        in_phonetic = False
+        tags = {}
+
+        def start(name, attrs):
+            nonlocal cur_row, next_col, cell, value_parts, in_phonetic
+            if state['prefix'] is None:
+                # 根元素确定命名空间前缀（如 x:worksheet），之后直接比较完整标签名
+                prefix = name[:name.index(':') + 1] if ':' in name else ''
+                state['prefix'] = prefix
+                tags.update({t: prefix + t for t in ('row', 'c', 'v', 't', 'is', 'rPh')})
+                return
+            if name == tags['c']:
+                cell = attrs
+                value_parts = None
+            elif name == tags['v'] or (name == tags['t'] and cell is not None and not in_phonetic):
+                value_parts = []
+            elif name == tags['row']:
+                r = attrs.get('r')
+                row = int(r) - 1 if r else cur_row + 1
+                row = min(max(row, cur_row + 1), _MAX_ROW_INDEX - 1)
+                # 跳过的空行在 CSR 中补成长度为 0 的行
+                while len(row_ptr) - 1 < row:
+                    row_ptr.append(len(cols))
+                cur_row = row
+                next_col = 0
+            elif name == tags['rPh']:
+                in_phonetic = True
+
+        def chars(data):
+            if value_parts is not None:
+                value_parts.append(data)
+
+        def end(name):
+            nonlocal next_col, max_col, cell, value_parts, in_phonetic
+            if name == tags['v']:
+                cell['#v'] = ''.join(value_parts)
+                value_parts = None
+            elif name == tags['t']:
+                if value_parts is not None:
+                    cell['#t'] = cell.get('#t', '') + ''.join(value_parts)
+                    value_parts = None
+            elif name == tags['rPh']:
+                in_phonetic = False
+            elif name == tags['c']:
+                attrs, cell = cell, None
+                ref = _parse_ref(attrs.get('r'))
+                col = ref[1] if ref else next_col
+                next_col = col + 1
+                if col >= _MAX_COL_INDEX:
+                    return
+                t = attrs.get('t') or 'n'
+                v = attrs.get('#v')
+                text = None
+                if t == 'inlineStr':
+                    kind, text = KIND_TEXT, attrs.get('#t', v)
+                elif v is None:
+                    return
+                elif t == 's':
+                    kind, num = KIND_SST, float(int(v))
+                elif t == 'b':
+                    kind, num = KIND_BOOL, 1.0 if v.strip() in ('1', 'true') else 0.0
+                elif t in ('str', 'e', 'd'):
+                    kind, text = KIND_TEXT, v
+                else:
+                    try:
+                        num = float(v)
+                    except ValueError:
+                        kind, text = KIND_TEXT, v
+                    else:
+                        s = attrs.get('s')
+                        kind = KIND_DATE if s and int(s) in date_styles else KIND_NUM
+                if kind == KIND_TEXT:
+                    num = float(len(texts))
+                    texts.append(text or '')
+                cols.append(col)
+                kinds.append(kind)
+                nums.append(num)
+                if col > max_col:
+                    max_col = col
+            elif name == tags['row']:
+                row_ptr.append(len(cols))
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = chars
+        try:
+            while True:
+                chunk = reader.read(_PARSE_CHUNK)
+                if not chunk:
+                    break
+                parser.Parse(chunk, False)
+                if cancelled is not None and cancelled():
+                    raise XlsxError('已取消', 409)
+                if on_progress is not None:
+                    on_progress(reader.done, total)
+            parser.Parse(b'', True)
+        except expat.ExpatError as e:
+            raise XlsxError(f'工作表 XML 解析失败: {e}', 422)
+        # 末尾没有数据的空行不计入
+        while len(row_ptr) > 1 and row_ptr[-1] == row_ptr[-2]:
+            row_ptr.pop()
+        sheet.n_cols = max_col + 1
+
+    def describe(self):
+        with self.lock:
+            parsed = dict(self.parsed)
+        out = []
+        for i, info in enumerate(self.sheets):
+            item = {'index': i, 'name': info['name'], 'state': info['state'], 'dimension': info['dimension']}
+            sheet = parsed.get(i)
+            item['parsed'] = sheet is not None
+            if sheet is not None:
+                item['rows'] = sheet.n_rows
+                item['cols'] = sheet.n_cols
+                item['cells'] = sheet.n_cells
+            out.append(item)
+        return out
+
+
+def _rich_text(elem):
+    """<si>/<is> 下的纯文本：拼接 <t> 与 <r><t>，忽略注音 <rPh>"""
+    parts = []
+    for child in elem:
+        tag = _local(child.tag)
+        if tag == 't':
+            parts.append(child.text or '')
+        elif tag == 'r':
+            for sub in child:
+                if _local(sub.tag) == 't':
+                    parts.append(sub.text or '')
+    return ''.join(parts)
+
+
+class WorkbookService:
+    """按 (path, size, mtime) 缓存 Workbook，内存中最多保留 _MEMORY_WORKBOOKS 个"""
+
+    def __init__(self, max_entries=_MEMORY_WORKBOOKS):
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def get(self, path):
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            wb = self._memory.get(path)
+            if wb is not None and wb.key == key:
+                self._memory.move_to_end(path)
+                return wb
+        wb = Workbook(path, key)
+        with self._lock:
+            self._memory[path] = wb
+            self._memory.move_to_end(path)
+            while len(self._memory) > self._max_entries:
+                self._memory.popitem(last=False)
+        return wb
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_workbook_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = WorkbookService()
+    return _service
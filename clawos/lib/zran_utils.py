@@ -0,0 +1,320 @@
+import ctypes
+import ctypes.util
+import struct
+import zlib
+
+
+Z_OK = 0
+Z_STREAM_END = 1
+Z_NEED_DICT = 2
+Z_BUF_ERROR = -5
+Z_NO_FLUSH = 0
+Z_BLOCK = 5
+
+WINDOW_SIZE = 32 * 1024
+DEFAULT_SPAN = 16 * 1024 * 1024
+_IN_CHUNK = 256 * 1024
+_OUT_CHUNK = 256 * 1024
+_INDEX_MAGIC = b'CLZRAN1\n'
+
+
+class _ZStream(ctypes.Structure):
+    _fields_ = [
+        ('next_in', ctypes.c_void_p),
+        ('avail_in', ctypes.c_uint),
+        ('total_in', ctypes.c_ulong),
+        ('next_out', ctypes.c_void_p),
+        ('avail_out', ctypes.c_uint),
+        ('total_out', ctypes.c_ulong),
+        ('msg', ctypes.c_char_p),
+        ('state', ctypes.c_void_p),
+        ('zalloc', ctypes.c_void_p),
+        ('zfree', ctypes.c_void_p),
+        ('opaque', ctypes.c_void_p),
+        ('data_type', ctypes.c_int),
+        ('adler', ctypes.c_ulong),
+        ('reserved', ctypes.c_ulong),
+    ]
+
+
+def _load_libz():
+    try:
+        lib = ctypes.CDLL(ctypes.util.find_library('z') or 'libz.so.1')
+        _ = lib.inflatePrime, lib.inflateSetDictionary, lib.inflateReset2
+    except Exception:
+        return None
+    p = ctypes.POINTER(_ZStream)
+    lib.zlibVersion.restype = ctypes.c_char_p
+    lib.inflateInit2_.argtypes = [p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+    lib.inflate.argtypes = [p, ctypes.c_int]
+    lib.inflateEnd.argtypes = [p]
+    lib.inflateReset2.argtypes = [p, ctypes.c_int]
+    lib.inflatePrime.argtypes = [p, ctypes.c_int, ctypes.c_int]
+    lib.inflateSetDictionary.argtypes = [p, ctypes.c_char_p, ctypes.c_uint]
+    return lib
+
+
+_libz = _load_libz()
+
+
+def available():
+    """系统 zlib 可通过 ctypes 调用（需要 Z_BLOCK 与 inflatePrime）时返回 True"""
+    return _libz is not None
+
+
+class _Inflater:
+    """对 zlib inflate 的最小封装，暴露 Python zlib 模块没有的 Z_BLOCK / inflatePrime"""
+
+    def __init__(self, wbits):
+        self._strm = _ZStream()
+        self._ref = ctypes.byref(self._strm)
+        self._out = ctypes.create_string_buffer(_OUT_CHUNK)
+        self._in = None
+        version = _libz.zlibVersion()
+        ret = _libz.inflateInit2_(self._ref, wbits, version, ctypes.sizeof(_ZStream))
+        if ret != Z_OK:
+            raise OSError(f'inflateInit2 失败: {ret}')
+        self._closed = False
+
+    @property
+    def data_type(self):
+        return self._strm.data_type
+
+    @property
+    def avail_in(self):
+        return self._strm.avail_in
+
+    def set_input(self, data):
+        self._in = ctypes.create_string_buffer(data, len(data))
+        self._strm.next_in = ctypes.addressof(self._in)
+        self._strm.avail_in = len(data)
+
+    def remaining_input(self):
+        if not self._strm.avail_in:
+            return b''
+        return ctypes.string_at(self._strm.next_in, self._strm.avail_in)
+
+    def prime(self, bits, value):
+        _libz.inflatePrime(self._ref, bits, value)
+
+    def set_dictionary(self, window):
+        if window:
+            ret = _libz.inflateSetDictionary(self._ref, window, len(window))
+            if ret != Z_OK:
+                raise OSError(f'inflateSetDictionary 失败: {ret}')
+
+    def reset(self, wbits):
+        _libz.inflateReset2(self._ref, wbits)
+
+    def inflate(self, flush, max_out=_OUT_CHUNK):
+        """返回 (ret, 输出字节)"""
+        self._strm.next_out = ctypes.addressof(self._out)
+        self._strm.avail_out = min(max_out, _OUT_CHUNK)
+        before = self._strm.avail_out
+        ret = _libz.inflate(self._ref, flush)
+        produced = before - self._strm.avail_out
+        if ret not in (Z_OK, Z_STREAM_END, Z_BUF_ERROR):
+            msg = self._strm.msg.decode('utf-8', 'replace') if self._strm.msg else str(ret)
+            raise OSError(f'gzip 数据损坏: {msg}')
+        return ret, self._out.raw[:produced]
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            _libz.inflateEnd(self._ref)
+
+
+class SeekPoint:
+    __slots__ = ('out_offset', 'in_offset', 'bits', 'window')
+
+    def __init__(self, out_offset, in_offset, bits, window):
+        self.out_offset = out_offset
+        self.in_offset = in_offset
+        self.bits = bits
+        self.window = window
+
+
+class IndexingGzipReader:
+    """顺序解压 gzip 文件的只读文件对象，解压过程中按 span 间隔记录 zran 式的随机访问点
+
+    每个访问点保存压缩流中的位置（含未对齐的 bit 数）与之前 32 KB 的解压窗口，
+    之后可从最近的访问点恢复解压，而无需从头开始。
+    """
+
+    def __init__(self, path, span=DEFAULT_SPAN):
+        self._f = open(path, 'rb')
+        self._span = span
+        # 15 + 32：自动识别 gzip/zlib 头
+        self._inf = _Inflater(15 + 32)
+        self._in_base = 0
+        self._in_len = 0
+        self._total_out = 0
+        self._last_point = None
+        self._window = bytearray()
+        self._pending = bytearray()
+        self._eof = False
+        self.points = []
+
+    @property
+    def total_out(self):
+        return self._total_out
+
+    def read(self, n=-1):
+        while not self._eof and (n < 0 or len(self._pending) < n):
+            self._step()
+        if n < 0 or n >= len(self._pending):
+            data = bytes(self._pending)
+            self._pending.clear()
+        else:
+            data = bytes(self._pending[:n])
+            del self._pending[:n]
+        return data
+
+    def drain(self):
+        """读完剩余数据（只为补全访问点），返回解压后的总长度"""
+        while not self._eof:
+            self._step()
+            self._pending.clear()
+        return self._total_out
+
+    def _step(self):
+        if not self._inf.avail_in:
+            chunk = self._f.read(_IN_CHUNK)
+            self._in_base += self._in_len
+            self._in_len = len(chunk)
+            if not chunk:
+                self._eof = True
+                return
+            self._inf.set_input(chunk)
+        ret, out = self._inf.inflate(Z_BLOCK)
+        if out:
+            self._total_out += len(out)
+            self._pending += out
+            self._window += out
+            if len(self._window) > WINDOW_SIZE * 2:
+                del self._window[:-WINDOW_SIZE]
+        if ret == Z_STREAM_END:
+            rest = self._inf.remaining_input()
+            if rest.startswith(b'\x1f\x8b') or (not rest and self._peek_member()):
+                # 多成员 gzip（如 pigz -i 或拼接的文件），继续下一个成员
+                self._inf.reset(15 + 32)
+                return
+            self._eof = True
+            return
+        if ret == Z_BUF_ERROR and not out and not self._inf.avail_in:
+            return
+        dt = self._inf.data_type
+        if dt & 128 and not dt & 64:
+            if self._last_point is None or self._total_out - self._last_point >= self._span:
+                consumed = self._in_base + self._in_len - self._inf.avail_in
+                self.points.append(SeekPoint(
+                    self._total_out, consumed, dt & 7, bytes(self._window[-WINDOW_SIZE:]),
+                ))
+                self._last_point = self._total_out
+
+    def _peek_member(self):
+        pos = self._f.tell()
+        head = self._f.read(2)
+        self._f.seek(pos)
+        return head == b'\x1f\x8b'
+
+    def close(self):
+        self._inf.close()
+        self._f.close()
+
+
+class GzipSeekIndex:
+    """gzip 文件的随机访问索引，可持久化到磁盘"""
+
+    def __init__(self, points, total_out, span=DEFAULT_SPAN):
+        self.points = points
+        self.total_out = total_out
+        self.span = span
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(_INDEX_MAGIC)
+            f.write(struct.pack('<QQI', self.span, self.total_out, len(self.points)))
+            for p in self.points:
+                window = zlib.compress(p.window, 1)
+                f.write(struct.pack('<QQBI', p.out_offset, p.in_offset, p.bits, len(window)))
+                f.write(window)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(_INDEX_MAGIC)) != _INDEX_MAGIC:
+                raise ValueError('索引格式不匹配')
+            span, total_out, count = struct.unpack('<QQI', f.read(20))
+            points = []
+            for _ in range(count):
+                out_offset, in_offset, bits, wlen = struct.unpack('<QQBI', f.read(21))
+                points.append(SeekPoint(out_offset, in_offset, bits, zlib.decompress(f.read(wlen))))
+        return cls(points, total_out, span)
+
+    def iter_range(self, gz_path, offset, length, chunk_size=_OUT_CHUNK):
+        """从最近的访问点恢复解压，产出解压流中 [offset, offset+length) 的数据块"""
+        point = None
+        for p in self.points:
+            if p.out_offset > offset:
+                break
+            point = p
+        with open(gz_path, 'rb') as f:
+            if point is None:
+                inf = _Inflater(15 + 32)
+                pos = 0
+                f.seek(0)
+            else:
+                inf = _Inflater(-15)
+                f.seek(point.in_offset - (1 if point.bits else 0))
+                if point.bits:
+                    inf.prime(point.bits, f.read(1)[0] >> (8 - point.bits))
+                inf.set_dictionary(point.window)
+                pos = point.out_offset
+            raw = point is not None
+            try:
+                end = offset + length
+                while pos < end:
+                    if not inf.avail_in:
+                        chunk = f.read(_IN_CHUNK)
+                        if not chunk:
+                            return
+                        inf.set_input(chunk)
+                    ret, out = inf.inflate(Z_NO_FLUSH, max_out=chunk_size)
+                    if out:
+                        start = pos
+                        pos += len(out)
+                        if pos > offset:
+                            lo = max(0, offset - start)
+                            hi = min(len(out), end - start)
+                            yield out[lo:hi]
+                    if ret == Z_STREAM_END:
+                        rest = inf.remaining_input()
+                        if raw:
+                            # 原始 deflate 流结束后是 8 字节的 gzip 尾部，之后可能还有下一个成员
+                            if len(rest) >= 8:
+                                rest = rest[8:]
+                            else:
+                                f.read(8 - len(rest))
+                                rest = b''
+                        if not rest:
+                            rest = f.read(_IN_CHUNK)
+                        if not rest.startswith(b'\x1f\x8b'):
+                            return
+                        inf.reset(15 + 32)
+                        raw = False
+                        inf.set_input(rest)
+                    elif ret == Z_BUF_ERROR and not out and inf.avail_in:
+                        return
+            finally:
+                inf.close()
+
+
+def build_index(gz_path, span=DEFAULT_SPAN):
+    """完整解压一遍并返回 GzipSeekIndex；通常由 IndexingGzipReader 在列目录时顺带生成"""
+    reader = IndexingGzipReader(gz_path, span=span)
+    try:
+        total = reader.drain()
+        return GzipSeekIndex(reader.points, total, span)
+    finally:
+        reader.close()
@@ -16,6 +16,10 @@ let botUiBound = false;
 let botTokenPromise = null;
 let botSeenEventKeys = new Map();
 let botCompletedRunIds = new Map();
+// 历史按页加载：null 表示没有更早的消息
+let botHistoryBefore = null;
+let botHistoryLoadingOlder = false;
+const BOT_HISTORY_PAGE_SIZE = 50;
 
 // Generate UUID for IDs
 function generateUUID() {
@@ -655,6 +659,7 @@ function ensureBotUiBindings() {
         const atBottom = isNearBottom(box, 60);
         botAutoScrollEnabled = atBottom;
         setJumpLatestVisible(!atBottom);
+        if (box.scrollTop < 40) loadOlderBotHistory();
     });
 
     list.addEventListener('click', function(e) {
@@ -739,35 +744,44 @@ function saveBotMessageToHistory(text) {
     });
 }
 
+function createBotHistoryItem(item) {
+    const li = document.createElement('li');
+    li.className = 'bot-msg bot-msg-' + (item.type || 'bot');
+
+    const avatar = item.type === 'user' ? '👤' : '🤖';
+    const name = item.type === 'user' ? 'You' : 'Claw';
+
+    li.innerHTML = `
+        <div class="bot-avatar">${avatar}</div>
+        <div class="bot-bubble">
+            <div class="bot-name">${name} <span style="font-size:0.8em;opacity:0.6;margin-left:5px">${item.time || ''}</span></div>
+            <div class="bot-text"></div>
+        </div>
+    `;
+    renderBotTextInto(li.querySelector('.bot-text'), item.text);
+    return li;
+}
+
+function fetchBotHistoryPage(before) {
+    const params = new URLSearchParams({ limit: BOT_HISTORY_PAGE_SIZE });
+    if (before !== null && before !== undefined) params.set('before', before);
+    return fetch('/api/history?' + params.toString())
+        .then(r => r.json())
+        .then(data => (data && data.success && data.data ? data.data : { history: [], next_before: null }));
+}
+
+// 只加载最近一页；更早的消息在滚动到顶部时再按游标加载
 function loadBotHistory() {
     ensureBotUiBindings();
-    fetch('/api/history')
-        .then(r => r.json())
-        .then(data => {
+    fetchBotHistoryPage(null)
+        .then(page => {
             const list = document.getElementById('botHistoryList');
             if (!list) return;
             list.innerHTML = '';
-            
-            const history = data && data.success && data.data ? data.data.history : [];
-            history.forEach(item => {
-                const li = document.createElement('li');
-                li.className = 'bot-msg bot-msg-' + (item.type || 'bot');
-                
-                const avatar = item.type === 'user' ? '👤' : '🤖';
-                const name = item.type === 'user' ? 'You' : 'Claw';
-                
-                li.innerHTML = `
-                    <div class="bot-avatar">${avatar}</div>
-                    <div class="bot-bubble">
-                        <div class="bot-name">${name} <span style="font-size:0.8em;opacity:0.6;margin-left:5px">${item.time || ''}</span></div>
-                        <div class="bot-text"></div>
-                    </div>
-                `;
-                list.appendChild(li);
-                const textEl = li.querySelector('.bot-text');
-                renderBotTextInto(textEl, item.text);
-            });
-            
+            botHistoryBefore = page.next_before;
+
+            (page.history || []).forEach(item => list.appendChild(createBotHistoryItem(item)));
+
             const box = document.getElementById('botChatBox');
             if (box && botAutoScrollEnabled) {
                 botScrollToBottom(false);
@@ -777,6 +791,27 @@ function loadBotHistory() {
         });
 }
 
+function loadOlderBotHistory() {
+    if (botHistoryBefore === null || botHistoryLoadingOlder) return;
+    botHistoryLoadingOlder = true;
+    fetchBotHistoryPage(botHistoryBefore)
+        .then(page => {
+            const list = document.getElementById('botHistoryList');
+            const box = document.getElementById('botChatBox');
+            if (!list || !box) return;
+            // 在顶部插入后保持当前可见位置不动
+            const prevHeight = box.scrollHeight;
+            const frag = document.createDocumentFragment();
+            (page.history || []).forEach(item => frag.appendChild(createBotHistoryItem(item)));
+            list.insertBefore(frag, list.firstChild);
+            box.scrollTop += box.scrollHeight - prevHeight;
+            botHistoryBefore = page.next_before;
+        })
+        .finally(() => {
+            botHistoryLoadingOlder = false;
+        });
+}
+
 function botSend() {
     const input = document.getElementById('botInput');
     if (!input) return;
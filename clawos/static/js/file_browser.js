@@ -340,14 +340,48 @@ function formatTimestampYYYYMMDDHHMMSS() {
         + pad(d.getSeconds());
 }
 
-function openArchiveProgressDrawer() {
+function openArchiveProgressDrawer(titleKey, titleFallback) {
     var fill = document.getElementById('archiveProgressFill');
     var text = document.getElementById('archiveProgressText');
+    var title = document.getElementById('archiveProgressTitle');
     if (fill) fill.style.width = '0%';
     if (text) text.textContent = (typeof I18n !== 'undefined' ? I18n.t('archive.preparing') : 'Preparing…');
+    if (title) title.textContent = typeof I18n !== 'undefined' ? I18n.t(titleKey || 'archive.compressing') : (titleFallback || '🗜️ Compressing');
     Drawer.open('archiveProgressDrawer');
 }
 
+function toggleArchiveProgressPause() {
+    var taskId = window.__archiveProgressTaskId;
+    if (!taskId) return;
+    var pausing = !window.__archiveProgressPaused;
+    fetch(pausing ? '/api/batch/transfer/pause' : '/api/batch/transfer/resume', {
+        method: 'POST',
+        headers: Object.assign({ 'Content-Type': 'application/json' }, (typeof authHeaders === 'function' ? authHeaders() : {})),
+        body: JSON.stringify({ taskId: taskId })
+    })
+        .then(function(r) { return r.json(); })
+        .then(function(d) {
+            if (!d || !d.success) return;
+            window.__archiveProgressPaused = !!(d.data && d.data.paused);
+            var btn = document.getElementById('archiveProgressPauseBtn');
+            if (btn) {
+                var key = window.__archiveProgressPaused ? 'archive.resume_task' : 'archive.pause_task';
+                btn.textContent = typeof I18n !== 'undefined' ? I18n.t(key) : (window.__archiveProgressPaused ? 'Resume' : 'Pause');
+            }
+        })
+        .catch(function() {});
+}
+
+function cancelArchiveProgressTask() {
+    var taskId = window.__archiveProgressTaskId;
+    if (!taskId) return;
+    fetch('/api/task/cancel', {
+        method: 'POST',
+        headers: Object.assign({ 'Content-Type': 'application/json' }, (typeof authHeaders === 'function' ? authHeaders() : {})),
+        body: JSON.stringify({ taskId: taskId })
+    }).catch(function() {});
+}
+
 function closeArchiveProgressDrawer() {
     if (window.__archiveProgressPoller && typeof window.__archiveProgressPoller.cancel === 'function') {
         window.__archiveProgressPoller.cancel();
@@ -356,9 +390,33 @@ function closeArchiveProgressDrawer() {
     Drawer.close('archiveProgressDrawer');
 }
 
-function startArchiveProgressPoll(taskId) {
+function transferProgressOptions(action) {
+    var move = action === 'move' || action === 'cut';
+    return {
+        titleKey: move ? 'archive.moving' : 'archive.copying',
+        titleFallback: move ? '🚚 Moving' : '📋 Copying',
+        successKey: move ? 'move.success' : 'copy.success',
+        successFallback: move ? 'Move successful' : 'Copy successful',
+        failedKey: move ? 'move.failed' : 'copy.failed',
+        failedFallback: move ? 'Move failed' : 'Copy failed',
+        pausable: true,
+        useTaskMessage: true
+    };
+}
+
+function startArchiveProgressPoll(taskId, opts) {
     if (!taskId || !window.TaskPoller || typeof window.TaskPoller.start !== 'function') return;
-    openArchiveProgressDrawer();
+    var o = opts || {};
+    var successKey = o.successKey || 'archive.compress_success';
+    var failedKey = o.failedKey || 'archive.compress_failed';
+    openArchiveProgressDrawer(o.titleKey, o.titleFallback);
+    window.__archiveProgressTaskId = taskId;
+    window.__archiveProgressPaused = false;
+    var pauseBtn = document.getElementById('archiveProgressPauseBtn');
+    if (pauseBtn) {
+        pauseBtn.style.display = o.pausable ? '' : 'none';
+        pauseBtn.textContent = typeof I18n !== 'undefined' ? I18n.t('archive.pause_task') : 'Pause';
+    }
     window.__archiveProgressPoller = window.TaskPoller.start(taskId, {
         intervalMs: 600,
         timeoutMs: 30 * 60 * 1000,
@@ -373,15 +431,24 @@ function startArchiveProgressPoll(taskId) {
         }
     });
     window.__archiveProgressPoller.promise.then(function(res) {
+        window.__archiveProgressTaskId = null;
+        if (typeof o.onDone === 'function') o.onDone(res);
         if (res && res.ok) {
-            showToast(typeof I18n !== 'undefined' ? I18n.t('archive.compress_success') : 'Compression completed', 'success');
+            var doneMsg = o.useTaskMessage && res.payload && res.payload.message ? res.payload.message : '';
+            showToast(doneMsg || (typeof I18n !== 'undefined' ? I18n.t(successKey) : (o.successFallback || 'Compression completed')), 'success');
+            closeArchiveProgressDrawer();
+            if (typeof refreshFileList === 'function') doRefreshFileList();
+            return;
+        }
+        if (res && res.status === 'cancelled') {
+            showToast(typeof I18n !== 'undefined' ? I18n.t('archive.task_cancelled') : 'Cancelled', 'warning');
             closeArchiveProgressDrawer();
             if (typeof refreshFileList === 'function') doRefreshFileList();
             return;
         }
         var payload = res && res.payload ? res.payload : null;
         var msg = payload && (payload.message || (payload.error && payload.error.message)) ? (payload.message || (payload.error && payload.error.message)) : '';
-        showToast(msg || (typeof I18n !== 'undefined' ? I18n.t('archive.compress_failed') : 'Compression failed'), 'error');
+        showToast(msg || (typeof I18n !== 'undefined' ? I18n.t(failedKey) : (o.failedFallback || 'Compression failed')), 'error');
         closeArchiveProgressDrawer();
     });
 }
@@ -406,7 +473,8 @@ function openArchiveCreateDialog(paths, outputDir) {
             select: {
                 options: [
                     { value: 'zip', label: 'zip' },
-                    { value: 'tar.gz', label: 'tar.gz' }
+                    { value: 'tar.gz', label: 'tar.gz' },
+                    { value: 'tar.zst', label: 'tar.zst' }
                 ],
                 defaultValue: 'zip'
             },
@@ -414,11 +482,14 @@ function openArchiveCreateDialog(paths, outputDir) {
                 var name = result && typeof result.value === 'string' ? result.value.trim() : '';
                 var fmt = result && typeof result.select === 'string' ? result.select.trim() : 'zip';
                 var archiveName = typeof I18n !== 'undefined' ? I18n.t('archive.default_name') : 'New Archive';
-                if (!name) name = fmt === 'zip' ? archiveName + '.zip' : archiveName + '.tar.gz';
-                if (fmt === 'zip' && !name.toLowerCase().endsWith('.zip')) name = name + '.zip';
-                if (fmt === 'tar.gz' && !name.toLowerCase().endsWith('.tar.gz')) {
-                    if (name.toLowerCase().endsWith('.tar')) name = name + '.gz';
-                    else name = name + '.tar.gz';
+                if (!name) name = archiveName + '.' + fmt;
+                if (fmt === 'zip' && name.toLowerCase().endsWith('.zip') === false) {
+                    name = name.replace(/\.(tar\.gz|tar\.zst)$/i, '') + '.zip';
+                }
+                if (fmt !== 'zip' && !name.toLowerCase().endsWith('.' + fmt)) {
+                    name = name.replace(/\.(zip|tar\.gz|tar\.zst)$/i, '');
+                    if (name.toLowerCase().endsWith('.tar')) name = name + fmt.slice(3);
+                    else name = name + '.' + fmt;
                 }
                 fetch('/api/archive/create', {
                     method: 'POST',
@@ -494,6 +565,76 @@ function batchArchive() {
     openArchiveCreateDialog(paths, getCurrentBrowsePath());
 }
 
+function archiveDownloadUrl(paths, format, compression, name) {
+    var qs = paths.map(function(p) { return 'paths=' + encodeURIComponent(p); });
+    qs.push('format=' + encodeURIComponent(format || 'zip'));
+    qs.push('compression=' + encodeURIComponent(compression || 'deflate'));
+    if (name) qs.push('name=' + encodeURIComponent(name));
+    return '/api/archive/download?' + qs.join('&');
+}
+
+// 边打包边下载：服务端实时生成 zip/tar 流，浏览器直接保存，无需等待压缩任务
+function startArchiveDownload(paths, format, compression, name) {
+    var url = archiveDownloadUrl(paths, format, compression, name);
+    if (url.length <= 6000) {
+        window.location.href = url;
+        return;
+    }
+    // 选择项过多时改用表单 POST，避免 URL 过长
+    var form = document.createElement('form');
+    form.method = 'POST';
+    form.action = '/api/archive/download';
+    form.style.display = 'none';
+    var fields = [['format', format || 'zip'], ['compression', compression || 'deflate']];
+    if (name) fields.push(['name', name]);
+    paths.forEach(function(p) { fields.push(['paths', p]); });
+    fields.forEach(function(kv) {
+        var input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = kv[0];
+        input.value = kv[1];
+        form.appendChild(input);
+    });
+    document.body.appendChild(form);
+    form.submit();
+    form.remove();
+}
+
+function batchDownload() {
+    var paths = [];
+    document.querySelectorAll('.file-checkbox:checked').forEach(function(c) {
+        if (c && c.dataset && c.dataset.path) paths.push(c.dataset.path);
+    });
+    if (paths.length === 0) {
+        showToast(typeof I18n !== 'undefined' ? I18n.t('archive.select_files') : 'Please select files to compress', 'warning');
+        return;
+    }
+    var options = [
+        { value: 'zip:deflate', label: 'zip' },
+        { value: 'zip:stored', label: typeof I18n !== 'undefined' ? I18n.t('archive.zip_stored') : 'zip (no compression)' },
+        { value: 'tar:stored', label: 'tar' },
+        { value: 'tar.gz:stored', label: 'tar.gz' }
+    ];
+    if (typeof window.openDialogDrawer !== 'function') {
+        startArchiveDownload(paths, 'zip', 'deflate', '');
+        return;
+    }
+    window.openDialogDrawer({
+        title: typeof I18n !== 'undefined' ? I18n.t('archive.download_title') : 'Download as Archive',
+        message: typeof I18n !== 'undefined' ? I18n.t('archive.download_message') : 'The archive is generated while downloading',
+        input: true,
+        placeholder: 'download',
+        defaultValue: paths.length === 1 ? (paths[0].split('/').pop() || 'download') : 'download',
+        confirmText: typeof I18n !== 'undefined' ? I18n.t('common.download') : 'Download',
+        select: { options: options, defaultValue: 'zip:deflate' },
+        onConfirm: function(result) {
+            var picked = (result && typeof result.select === 'string' ? result.select : 'zip:deflate').split(':');
+            var name = result && typeof result.value === 'string' ? result.value.trim() : '';
+            startArchiveDownload(paths, picked[0], picked[1], name);
+        }
+    });
+}
+
 function showDragUploadOverlay(show) {
     var overlay = document.getElementById('dragUploadOverlay');
     if (!overlay) return;
@@ -545,6 +686,108 @@ function closeDragUploadDrawer() {
     Drawer.close('dragUploadDrawer');
 }
 
+var RESUMABLE_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+var RESUMABLE_UPLOAD_PARALLEL = 3;
+var RESUMABLE_UPLOAD_RETRIES = 4;
+
+function resumableUploadKey(file, targetDir, filename) {
+    return 'clawos_upload:' + targetDir + '|' + filename + '|' + file.size + '|' + (file.lastModified || 0);
+}
+
+async function resumableUploadJson(resp) {
+    var json = null;
+    try { json = await resp.json(); } catch (e) { json = null; }
+    if (!resp.ok || !json || !json.success) {
+        var msg = json && json.error && json.error.message ? json.error.message : ('HTTP ' + resp.status);
+        var err = new Error(msg);
+        err.status = resp.status;
+        throw err;
+    }
+    return json.data;
+}
+
+async function sha256Hex(blob) {
+    if (!window.crypto || !window.crypto.subtle) return '';
+    var buf = await blob.arrayBuffer();
+    var digest = await window.crypto.subtle.digest('SHA-256', buf);
+    return Array.from(new Uint8Array(digest)).map(function(b) { return b.toString(16).padStart(2, '0'); }).join('');
+}
+
+// 可续传分片上传：分片并行 PUT 到 /api/upload/<id>，断线或刷新页面后从服务端记录的已接收区间继续
+async function uploadFileResumable(file, targetDir, filename, onProgress) {
+    var key = resumableUploadKey(file, targetDir, filename);
+    var status = null;
+    var savedId = null;
+    try { savedId = localStorage.getItem(key); } catch (e) { savedId = null; }
+    if (savedId) {
+        try {
+            status = await resumableUploadJson(await fetch('/api/upload/' + encodeURIComponent(savedId)));
+        } catch (e) {
+            status = null;
+        }
+    }
+    if (!status) {
+        status = await resumableUploadJson(await fetch('/api/upload/create', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ target_dir: targetDir, filename: filename, size: file.size })
+        }));
+        try { localStorage.setItem(key, status.id); } catch (e) {}
+    }
+
+    var chunkSize = status.chunk_size || (8 * 1024 * 1024);
+    var received = status.received || [];
+    var pending = [];
+    var done = 0;
+    for (var start = 0; start < file.size; start += chunkSize) {
+        var end = Math.min(file.size, start + chunkSize);
+        var covered = received.some(function(r) { return r[0] <= start && r[1] >= end; });
+        if (covered) done += end - start;
+        else pending.push([start, end]);
+    }
+    if (typeof onProgress === 'function') onProgress(done, file.size);
+
+    async function putChunk(range) {
+        var blob = file.slice(range[0], range[1]);
+        var digest = await sha256Hex(blob);
+        for (var attempt = 0; ; attempt++) {
+            try {
+                var headers = { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(range[0]) };
+                if (digest) headers['X-Chunk-Sha256'] = digest;
+                await resumableUploadJson(await fetch('/api/upload/' + encodeURIComponent(status.id), {
+                    method: 'PUT', headers: headers, body: blob
+                }));
+                return;
+            } catch (e) {
+                if (attempt >= RESUMABLE_UPLOAD_RETRIES || (e.status && e.status < 500 && e.status !== 460)) throw e;
+                await new Promise(function(resolve) { setTimeout(resolve, 500 * Math.pow(2, attempt)); });
+            }
+        }
+    }
+
+    async function worker() {
+        while (pending.length) {
+            var range = pending.shift();
+            await putChunk(range);
+            done += range[1] - range[0];
+            if (typeof onProgress === 'function') onProgress(done, file.size);
+        }
+    }
+
+    var workers = [];
+    for (var w = 0; w < RESUMABLE_UPLOAD_PARALLEL; w++) workers.push(worker());
+    await Promise.all(workers);
+
+    var result = await resumableUploadJson(await fetch('/api/upload/' + encodeURIComponent(status.id) + '/finalize', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: '{}'
+    }));
+    try { localStorage.removeItem(key); } catch (e) {}
+    return result;
+}
+window.uploadFileResumable = uploadFileResumable;
+
 async function startDragUpload() {
     var state = window.__dragUploadState;
     if (!state || !Array.isArray(state.files) || !state.files.length) return;
@@ -564,6 +807,21 @@ async function startDragUpload() {
         var uploadingText = typeof I18n !== 'undefined' ? I18n.t('upload.uploading') : 'Uploading...';
         if (textEl) textEl.textContent = uploadingText + ' ' + String(i + 1) + '/' + String(total);
 
+        if (f.size >= RESUMABLE_UPLOAD_THRESHOLD) {
+            try {
+                await uploadFileResumable(f, targetDir, desired, function(loaded, size) {
+                    var filePct = size ? loaded / size : 1;
+                    if (fillEl) fillEl.style.width = String(Math.round(((i + filePct) * 1000) / total) / 10) + '%';
+                });
+            } catch (e) {
+                showToast((e && e.message) || (typeof I18n !== 'undefined' ? I18n.t('upload.failed') : 'Upload failed'), 'error');
+                state.uploading = false;
+                return;
+            }
+            if (fillEl) fillEl.style.width = String(Math.round(((i + 1) * 1000) / total) / 10) + '%';
+            continue;
+        }
+
         var fd = new FormData();
         fd.append('file', f, desired);
         fd.append('target_dir', targetDir);
@@ -789,9 +1047,16 @@ function extractArchiveHere(path, name) {
                 });
             })
             .then(function(data) {
-                if (data && data.success) {
-                    showToast(typeof I18n !== 'undefined' ? I18n.t('archive.extract_success') : 'Extraction completed', 'success');
-                    if (typeof refreshFileList === 'function') doRefreshFileList();
+                if (data && data.success && data.data && data.data.taskId) {
+                    // 解压在后台任务中进行，这里只跟踪进度
+                    startArchiveProgressPoll(data.data.taskId, {
+                        titleKey: 'archive.extracting',
+                        titleFallback: '📦 Extracting',
+                        successKey: 'archive.extract_success',
+                        successFallback: 'Extraction completed',
+                        failedKey: 'archive.extract_failed',
+                        failedFallback: 'Extraction failed'
+                    });
                 } else {
                     showToast((data && data.error && data.error.message) || (data && data.message) || (typeof I18n !== 'undefined' ? I18n.t('archive.extract_failed') : 'Extraction failed'), 'error');
                 }
@@ -1073,7 +1338,7 @@ function downloadFile(path, opts) {
         .then(function(data) {
             var info = data && data.success ? data.data : null;
             if (info && info.is_dir) {
-                showToast(typeof I18n !== 'undefined' ? I18n.t('download.no_folder') : 'Cannot download folders', 'warning');
+                startArchiveDownload([p], 'zip', 'deflate', '');
                 return;
             }
 
@@ -1349,10 +1614,106 @@ function openSearchResultMenu(ev, el) {
     return false;
 }
 
+var contentSearchAbort = null;
+
+function cancelContentSearch() {
+    if (contentSearchAbort) {
+        try { contentSearchAbort.abort(); } catch (e) {}
+        contentSearchAbort = null;
+    }
+}
+
+function renderContentMatch(item) {
+    var rawPath = (item && item.path ? String(item.path) : '').replace(/\\/g, '/').replace(/^\/+/, '');
+    var rawName = rawPath.split('/').pop() || rawPath;
+    var encPath = encodeURIComponent(rawPath);
+    var encName = encodeURIComponent(rawName);
+    var safePath = escapeHtml(rawPath);
+    var safeName = escapeHtml(rawName);
+    return (
+        '<div class="file-item search-result-item" data-path="' + safePath + '" data-name="' + safeName + '" data-is-dir="false">' +
+            '<div class="file-col-icon"><span class="file-icon">📄</span></div>' +
+            '<div class="file-col-info">' +
+                '<div class="file-name"><span>' + safeName + ':' + item.line + '</span></div>' +
+                '<div class="file-details-inline"><span style="font-family:monospace;white-space:pre;">' + escapeHtml(item.text || '') + '</span></div>' +
+                '<div class="file-details-inline"><span>' + safePath + '</span></div>' +
+            '</div>' +
+            '<div class="file-col-actions" style="gap:8px;">' +
+                '<div class="menu-btn" data-path="' + encPath + '" data-name="' + encName + '" data-is-dir="false" onclick="return openSearchResultMenu(event, this);">' +
+                    '<span>⋮</span>' +
+                '</div>' +
+            '</div>' +
+        '</div>'
+    );
+}
+
+function doContentSearch(keyword, resultsContainer) {
+    cancelContentSearch();
+    var controller = new AbortController();
+    contentSearchAbort = controller;
+    var dirEl = document.getElementById('currentBrowsePath');
+    var dir = dirEl ? String(dirEl.value || '') : '';
+    var url = '/api/grep?q=' + encodeURIComponent(keyword) + '&path=' + encodeURIComponent(dir);
+    var count = 0;
+    var started = false;
+    fetch(url, { signal: controller.signal, headers: (typeof authHeaders === 'function') ? authHeaders() : {} })
+        .then(function(r) {
+            if (!r.ok || !r.body) { throw new Error('HTTP ' + r.status); }
+            var reader = r.body.getReader();
+            var decoder = new TextDecoder();
+            var buf = '';
+            function handleLine(line) {
+                if (!line) return;
+                var ev = JSON.parse(line);
+                if (ev.type === 'match') {
+                    if (!started) { resultsContainer.innerHTML = ''; started = true; }
+                    resultsContainer.insertAdjacentHTML('beforeend', renderContentMatch(ev));
+                    count += 1;
+                } else if (ev.type === 'done' && count === 0) {
+                    var noResultsText = typeof I18n !== 'undefined' ? I18n.t('fileBrowser.search_no_results') : 'No results found';
+                    resultsContainer.innerHTML = '<div style="text-align:center;padding:40px;color:#666;">' + noResultsText + '</div>';
+                }
+            }
+            function pump() {
+                return reader.read().then(function(res) {
+                    if (res.done) {
+                        handleLine(buf.trim());
+                        return;
+                    }
+                    buf += decoder.decode(res.value, { stream: true });
+                    var lines = buf.split('\n');
+                    buf = lines.pop();
+                    lines.forEach(handleLine);
+                    return pump();
+                });
+            }
+            return pump();
+        })
+        .then(function() {
+            if (contentSearchAbort === controller) contentSearchAbort = null;
+            attachFileItemDefaultHandlers();
+        })
+        .catch(function(err) {
+            if (err && err.name === 'AbortError') return;
+            var searchFailedText = typeof I18n !== 'undefined' ? I18n.t('fileBrowser.search_failed') : 'Search failed';
+            resultsContainer.innerHTML = '<div style="text-align:center;padding:40px;color:#cf222e;">' + searchFailedText + '</div>';
+        });
+}
+
 function doSearch() {
     var input = document.getElementById('searchInput');
     var keyword = input ? String(input.value || '').trim() : '';
     if (!keyword) return;
+    cancelContentSearch();
+    var contentToggle = document.getElementById('searchContentToggle');
+    if (contentToggle && contentToggle.checked) {
+        var container = document.getElementById('searchResults');
+        if (!container) return;
+        var searchingLabel = typeof I18n !== 'undefined' ? I18n.t('fileBrowser.searching') : 'Searching...';
+        container.innerHTML = '<div style="text-align:center;padding:20px;color:#666;">' + searchingLabel + '</div>';
+        doContentSearch(keyword, container);
+        return;
+    }
     var resultsContainer = document.getElementById('searchResults');
     var searchingText = typeof I18n !== 'undefined' ? I18n.t('fileBrowser.searching') : 'Searching...';
     if (resultsContainer) resultsContainer.innerHTML = '<div style="text-align:center;padding:20px;color:#666;">' + searchingText + '</div>';
@@ -1360,9 +1721,15 @@ function doSearch() {
         .then(function(r) { return r.json(); })
         .then(function(data) {
             var results = data && data.success && data.data ? data.data.results : null;
+            var indexing = !!(data && data.success && data.data && data.data.index && !data.data.index.ready);
             if (!resultsContainer) return;
+            var indexingHtml = '';
+            if (indexing) {
+                var indexingText = typeof I18n !== 'undefined' ? I18n.t('fileBrowser.search_indexing') : 'Index is still being built, results may be incomplete';
+                indexingHtml = '<div style="text-align:center;padding:8px;color:#9a6700;">' + indexingText + '</div>';
+            }
             if (results && results.length > 0) {
-                resultsContainer.innerHTML = results.map(function(item) {
+                resultsContainer.innerHTML = indexingHtml + results.map(function(item) {
                     var rawPath = (item && item.path ? String(item.path) : '').replace(/\\/g, '/').replace(/^\/+/, '');
                     var rawName = item && item.name ? String(item.name) : '';
                     var isDir = !!(item && item.is_dir);
@@ -1392,7 +1759,7 @@ function doSearch() {
                 attachFileItemDefaultHandlers();
             } else {
                 var noResultsText = typeof I18n !== 'undefined' ? I18n.t('fileBrowser.search_no_results') : 'No results found';
-                resultsContainer.innerHTML = '<div style="text-align:center;padding:40px;color:#666;">' + noResultsText + '</div>';
+                resultsContainer.innerHTML = indexingHtml + '<div style="text-align:center;padding:40px;color:#666;">' + noResultsText + '</div>';
             }
         })
         .catch(function() {
@@ -1416,94 +1783,149 @@ function closeTrashDrawer(callbacks) {
     }));
 }
 
-function loadTrashList() {
+var TRASH_PAGE_SIZE = 100;
+
+function trashText(key, fallback) {
+    return typeof I18n !== 'undefined' ? I18n.t(key) : fallback;
+}
+
+function renderTrashItem(item) {
+    var esc = function(v) { return (typeof escapeHtml === 'function') ? escapeHtml(v) : v; };
+    var rawName = item.name || '';
+    var displayName = esc(item.display_name || item.name || '');
+    var deletedAt = esc(item.deleted_at || '');
+    var original = item.original_path ? esc(item.original_path) : '';
+    var typeIcon = item.is_dir ? '📁' : '📄';
+    return (
+        '<div style="padding:12px;border:1px solid #eee;border-radius:10px;margin-bottom:10px;background:#fff;display:flex;gap:12px;align-items:flex-start;">' +
+            '<div style="font-size:18px;line-height:1;">' + typeIcon + '</div>' +
+            '<div style="flex:1;min-width:0;">' +
+                '<div style="font-weight:600;word-break:break-word;white-space:pre-wrap;display:flex;align-items:center;gap:10px;flex-wrap:wrap;">' +
+                    '<span>' + displayName + '</span>' +
+                    '<button class="modal-btn modal-btn-confirm" style="padding:4px 8px;border-radius:999px;font-size:12px;" data-trash-name="' + encodeURIComponent(rawName) + '" data-trash-default="' + encodeURIComponent(item.original_path || item.display_name || rawName) + '" onclick="restoreTrashItemFromButton(this)">' + trashText('trash.restore', 'Restore') + '</button>' +
+                '</div>' +
+                (original ? '<div style="margin-top:4px;color:#666;font-size:12px;word-break:break-all;">' + trashText('trash.original_path', 'Original Location') + ': ' + original + '</div>' : '') +
+                '<div style="margin-top:4px;color:#666;font-size:12px;">' + trashText('trash.deleted_at', 'Deleted At') + ': ' + deletedAt +
+                    (typeof item.size === 'number' ? ' · ' + formatSize(item.size) : '') + '</div>' +
+            '</div>' +
+        '</div>'
+    );
+}
+
+function loadTrashList(append) {
     var container = document.getElementById('trashListContainer');
-    var loadingText = typeof I18n !== 'undefined' ? I18n.t('common.loading') : 'Loading...';
-    if (container) container.innerHTML = '<div style="text-align:center;padding:40px;color:#666;">🔄 ' + loadingText + '</div>';
-    fetch('/api/trash/list', { headers: (typeof authHeaders === 'function') ? authHeaders() : {} })
+    if (!container) return;
+    var offset = append ? (window.__trashListOffset || 0) : 0;
+    var moreBtn = document.getElementById('trashLoadMoreBtn');
+    if (moreBtn) moreBtn.remove();
+    if (!append) container.innerHTML = '<div style="text-align:center;padding:40px;color:#666;">🔄 ' + trashText('common.loading', 'Loading...') + '</div>';
+    fetch('/api/trash/list?offset=' + offset + '&limit=' + TRASH_PAGE_SIZE, { headers: (typeof authHeaders === 'function') ? authHeaders() : {} })
         .then(function(r) { return r.json(); })
         .then(function(data) {
-            var items = data && data.success && data.data ? data.data.items : null;
-            if (!container) return;
-            if (!items || items.length === 0) {
-                var emptyTrashText = typeof I18n !== 'undefined' ? I18n.t('trash.empty') : 'Trash is empty';
-                container.innerHTML = '<div style="text-align:center;padding:40px;color:#666;">' + emptyTrashText + '</div>';
+            var page = data && data.success && data.data ? data.data : null;
+            var items = page ? page.items : null;
+            if (!append && (!items || items.length === 0)) {
+                container.innerHTML = '<div style="text-align:center;padding:40px;color:#666;">' + trashText('trash.empty', 'Trash is empty') + '</div>';
                 return;
             }
-            container.innerHTML = items.map(function(item) {
-                var rawName = item.name || '';
-                var rawDisplayName = item.display_name || item.name || '';
-                var displayName = (typeof escapeHtml === 'function') ? escapeHtml(rawDisplayName) : rawDisplayName;
-                var deletedAt = (typeof escapeHtml === 'function') ? escapeHtml(item.deleted_at || '') : (item.deleted_at || '');
-                var typeIcon = item.is_dir ? '📁' : '📄';
-                return (
-                    '<div style="padding:12px;border:1px solid #eee;border-radius:10px;margin-bottom:10px;background:#fff;display:flex;gap:12px;align-items:flex-start;">' +
-                        '<div style="font-size:18px;line-height:1;">' + typeIcon + '</div>' +
-                        '<div style="flex:1;min-width:0;">' +
-                            '<div style="font-weight:600;word-break:break-word;white-space:pre-wrap;display:flex;align-items:center;gap:10px;flex-wrap:wrap;">' +
-                                '<span>' + displayName + '</span>' +
-                                '<button class="modal-btn modal-btn-confirm" style="padding:4px 8px;border-radius:999px;font-size:12px;" data-trash-name="' + encodeURIComponent(rawName) + '" data-trash-default="' + encodeURIComponent(rawDisplayName) + '" onclick="restoreTrashItemFromButton(this)">' + (typeof I18n !== 'undefined' ? I18n.t('trash.restore') : 'Restore') + '</button>' +
-                            '</div>' +
-                            '<div style="margin-top:4px;color:#666;font-size:12px;">' + (typeof I18n !== 'undefined' ? I18n.t('trash.deleted_at') : 'Deleted At') + ': ' + deletedAt + '</div>' +
-                        '</div>' +
-                    '</div>'
-                );
-            }).join('');
+            var html = (items || []).map(renderTrashItem).join('');
+            if (append) {
+                container.insertAdjacentHTML('beforeend', html);
+            } else {
+                var summary = '<div style="margin-bottom:10px;color:#666;font-size:12px;">' +
+                    trashText('trash.item_count', '{{count}} items').replace('{{count}}', String(page.total)) +
+                    ' · ' + formatSize(page.total_size || 0) + '</div>';
+                container.innerHTML = summary + html;
+            }
+            window.__trashListOffset = offset + (items ? items.length : 0);
+            if (page && page.has_more) {
+                container.insertAdjacentHTML('beforeend',
+                    '<button id="trashLoadMoreBtn" class="modal-btn" style="width:100%;" onclick="loadTrashList(true)">' + trashText('trash.load_more', 'Load more') + '</button>');
+            }
         })
         .catch(function() {
-            var loadFailedText = typeof I18n !== 'undefined' ? I18n.t('common.load_failed') : 'Load failed';
-            if (container) container.innerHTML = '<div style="text-align:center;padding:40px;color:#cf222e;">' + loadFailedText + '</div>';
+            container.innerHTML = '<div style="text-align:center;padding:40px;color:#cf222e;">' + trashText('common.load_failed', 'Load failed') + '</div>';
         });
 }
 
+function requestTrashRestore(rawName, targetPath) {
+    return fetch('/api/trash/restore/' + encodeURIComponent(rawName), {
+        method: 'POST',
+        headers: Object.assign({ 'Content-Type': 'application/json' }, (typeof authHeaders === 'function') ? authHeaders() : {}),
+        body: JSON.stringify(targetPath ? { target_path: targetPath } : {})
+    }).then(function(r) {
+        return r.json().then(function(data) { return { status: r.status, data: data }; });
+    });
+}
+
 function restoreTrashItemFromButton(btn) {
     if (!btn || !btn.dataset) return;
     var rawName = decodeURIComponent(btn.dataset.trashName || '');
     var suggested = decodeURIComponent(btn.dataset.trashDefault || '');
-    showPromptDrawer(
-        typeof I18n !== 'undefined' ? I18n.t('trash.restore') : 'Restore',
-        typeof I18n !== 'undefined' ? I18n.t('trash.restore_dialog.path_placeholder') : 'Enter restore path',
-        typeof I18n !== 'undefined' ? I18n.t('trash.restore_example') : 'e.g., docs/a.txt',
-        suggested,
-        typeof I18n !== 'undefined' ? I18n.t('trash.restore') : 'Restore',
-        function(targetPath) {
-            if (!targetPath) return;
-            fetch('/api/trash/restore/' + encodeURIComponent(rawName), {
-                method: 'POST',
-                headers: Object.assign({ 'Content-Type': 'application/json' }, (typeof authHeaders === 'function') ? authHeaders() : {}),
-                body: JSON.stringify({ target_path: targetPath })
-            })
-                .then(function(r) { return r.json(); })
-                .then(function(data) {
-                    if (data && data.success) {
-                        if (typeof showToast === 'function') showToast(typeof I18n !== 'undefined' ? I18n.t('trash.restore_success') : 'Restore successful', 'success');
-                        loadTrashList();
-                    } else {
-                        if (typeof showToast === 'function') showToast((data && data.error && data.error.message) || (typeof I18n !== 'undefined' ? I18n.t('trash.restore_failed') : 'Restore failed'), 'error');
-                    }
-                })
-                .catch(function() { if (typeof showToast === 'function') showToast(typeof I18n !== 'undefined' ? I18n.t('trash.restore_failed') : 'Restore failed', 'error'); });
-        }
-    );
+    var onSuccess = function() {
+        if (typeof showToast === 'function') showToast(trashText('trash.restore_success', 'Restore successful'), 'success');
+        loadTrashList();
+        if (typeof doRefreshFileList === 'function') doRefreshFileList();
+    };
+    var onError = function(data) {
+        if (typeof showToast === 'function') showToast((data && data.error && data.error.message) || trashText('trash.restore_failed', 'Restore failed'), 'error');
+    };
+    var promptTarget = function() {
+        showPromptDrawer(
+            trashText('trash.restore', 'Restore'),
+            trashText('trash.restore_dialog.path_placeholder', 'Enter restore path'),
+            trashText('trash.restore_example', 'e.g., docs/a.txt'),
+            suggested,
+            trashText('trash.restore', 'Restore'),
+            function(targetPath) {
+                if (!targetPath) return;
+                requestTrashRestore(rawName, targetPath)
+                    .then(function(res) { if (res.data && res.data.success) onSuccess(); else onError(res.data); })
+                    .catch(function() { onError(null); });
+            }
+        );
+    };
+    // 先还原到原始位置；原位置已被占用或未知时再让用户指定路径
+    requestTrashRestore(rawName, '')
+        .then(function(res) {
+            if (res.data && res.data.success) {
+                onSuccess();
+            } else if (res.status === 409 || res.status === 400) {
+                onError(res.data);
+                promptTarget();
+            } else {
+                onError(res.data);
+            }
+        })
+        .catch(function() { onError(null); });
 }
 
 function clearTrash() {
     showConfirmDrawer(
-        typeof I18n !== 'undefined' ? I18n.t('trash.clear_dialog.title') : 'Confirm Empty',
-        typeof I18n !== 'undefined' ? I18n.t('trash.clear_dialog.message') : 'Are you sure you want to empty the trash?',
-        typeof I18n !== 'undefined' ? I18n.t('trash.clear') : 'Clear',
+        trashText('trash.clear_dialog.title', 'Confirm Empty'),
+        trashText('trash.clear_dialog.message', 'Are you sure you want to empty the trash?'),
+        trashText('trash.clear', 'Clear'),
         function() {
             fetch('/api/trash/clear', { method: 'POST', headers: (typeof authHeaders === 'function') ? authHeaders() : {} })
                 .then(function(r) { return r.json(); })
                 .then(function(data) {
-                    if (data && data.success) {
-                        if (typeof showToast === 'function') showToast(typeof I18n !== 'undefined' ? I18n.t('trash.clear_success') : 'Trash emptied', 'success');
-                        loadTrashList();
-                    } else {
-                        if (typeof showToast === 'function') showToast((data && data.error && data.error.message) || (typeof I18n !== 'undefined' ? I18n.t('trash.clear_failed') : 'Empty failed'), 'error');
+                    var taskId = data && data.success && data.data ? data.data.taskId : null;
+                    if (!taskId) {
+                        if (typeof showToast === 'function') showToast((data && data.error && data.error.message) || trashText('trash.clear_failed', 'Empty failed'), 'error');
+                        return;
                     }
+                    startArchiveProgressPoll(taskId, {
+                        titleKey: 'trash.clearing',
+                        titleFallback: '🗑️ Emptying Trash',
+                        successKey: 'trash.clear_success',
+                        successFallback: 'Trash emptied',
+                        failedKey: 'trash.clear_failed',
+                        failedFallback: 'Empty failed',
+                        useTaskMessage: true,
+                        onDone: function() { loadTrashList(); }
+                    });
                 })
-                .catch(function() { if (typeof showToast === 'function') showToast(typeof I18n !== 'undefined' ? I18n.t('trash.clear_failed') : 'Empty failed', 'error'); });
+                .catch(function() { if (typeof showToast === 'function') showToast(trashText('trash.clear_failed', 'Empty failed'), 'error'); });
         },
         true
     );
@@ -1756,6 +2178,8 @@ function isArchiveName(name) {
 window.showFileSmallMenu = showFileSmallMenu;
 window.openCurrentFolderMenu = openCurrentFolderMenu;
 window.startDrag = startDrag;
+window.startArchiveProgressPoll = startArchiveProgressPoll;
+window.transferProgressOptions = transferProgressOptions;
 window.handleMenuAction = handleMenuAction;
 window.confirmDelete = confirmDelete;
 window.closeLegacyConfirmModal = closeLegacyConfirmModal;
@@ -1781,6 +2205,7 @@ window.addToChat = addToChat;
 window.openArchiveCreateDialog = openArchiveCreateDialog;
 window.closeArchiveProgressDrawer = closeArchiveProgressDrawer;
 window.batchArchive = batchArchive;
+window.batchDownload = batchDownload;
 window.closeDragUploadDrawer = closeDragUploadDrawer;
 window.startDragUpload = startDragUpload;
 window.closePasteImageDrawer = closePasteImageDrawer;
@@ -1788,6 +2213,7 @@ window.savePasteImage = savePasteImage;
 window.openSearchResultFolder = openSearchResultFolder;
 window.openSearchResultMenu = openSearchResultMenu;
 window.doSearch = doSearch;
+window.cancelContentSearch = cancelContentSearch;
 window.openTrashDrawer = openTrashDrawer;
 window.closeTrashDrawer = closeTrashDrawer;
 window.loadTrashList = loadTrashList;
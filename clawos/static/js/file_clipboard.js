@@ -298,6 +298,11 @@
             if (data.success) {
                 clear();
                 removeDom();
+                if (state.op !== 'link' && data.data && data.data.taskId && typeof window.startArchiveProgressPoll === 'function') {
+                    // 复制 / 移动在后台任务中进行，进度与结果由进度抽屉展示
+                    window.startArchiveProgressPoll(data.data.taskId, window.transferProgressOptions(state.op));
+                    return;
+                }
                 if (window.showToast) {
                     var msg = '';
                     var itemsLabel = typeof I18n !== 'undefined' ? I18n.t('clipboard.items_count_suffix') : 'items';
@@ -637,6 +637,7 @@ window.closeConfirmModal = function() {
 window.closeRenameModal = function() { Drawer.close('renameModal'); };
 window.closeMoveModal = function() { Drawer.close('moveModal'); };
 window.closeSearchModal = function() { 
+    if (typeof window.cancelContentSearch === 'function') window.cancelContentSearch();
     Drawer.close('searchModal', {
         afterClose: function() {
             var results = document.getElementById('searchResults');
@@ -825,6 +826,7 @@ window.openSearchModal = function() {
     if (input) input.focus();
 };
 window.resetSearch = function() {
+    if (typeof window.cancelContentSearch === 'function') window.cancelContentSearch();
     var results = document.getElementById('searchResults');
     var input = document.getElementById('searchInput');
     if (results) results.innerHTML = '';
@@ -1169,8 +1171,13 @@ window.confirmTargetPath = function() {
     .then(function(r) { return r.json(); })
     .then(function(d) {
         if (d && d.success) {
-            showToast(action === 'move' ? (typeof I18n !== 'undefined' ? I18n.t('move.success') : 'Move successful') : (typeof I18n !== 'undefined' ? I18n.t('copy.success') : 'Copy successful'), 'success');
             window.clearSelection();
+            if (d.data && d.data.taskId && typeof startArchiveProgressPoll === 'function') {
+                // 复制 / 移动在后台任务中进行
+                startArchiveProgressPoll(d.data.taskId, transferProgressOptions(action));
+                return;
+            }
+            showToast(action === 'move' ? (typeof I18n !== 'undefined' ? I18n.t('move.success') : 'Move successful') : (typeof I18n !== 'undefined' ? I18n.t('copy.success') : 'Copy successful'), 'success');
             refreshFileList();
         } else {
             showToast(d.error?.message || (action === 'move' ? (typeof I18n !== 'undefined' ? I18n.t('move.failed') : 'Move failed') : (typeof I18n !== 'undefined' ? I18n.t('copy.failed') : 'Copy failed')), 'error');
@@ -1209,6 +1216,38 @@ window.endDrag = function() { window.isDragging = false; document.removeEventLis
 // 其他
 window.handleFileSelect = function(event) {
     var files = event.target.files;
+    var hasLarge = typeof window.uploadFileResumable === 'function'
+        && Array.from(files || []).some(function(f) { return f.size >= window.RESUMABLE_UPLOAD_THRESHOLD; });
+    if (hasLarge) {
+        // 含大文件时逐个走可续传分片上传
+        var list = Array.from(files);
+        var targetDir = document.getElementById('currentBrowsePath') ? document.getElementById('currentBrowsePath').value : '';
+        var box = document.createElement('div');
+        box.className = 'upload-progress';
+        box.innerHTML = '<span>' + (typeof I18n !== 'undefined' ? I18n.t('upload.uploading') : 'Uploading...') + '</span><div class="progress-bar"><div class="progress-fill" id="uploadProgressFill"></div></div>';
+        document.body.appendChild(box);
+        var totalBytes = list.reduce(function(sum, f) { return sum + f.size; }, 0) || 1;
+        (async function() {
+            var base = 0;
+            try {
+                for (var i = 0; i < list.length; i++) {
+                    await window.uploadFileResumable(list[i], targetDir, list[i].name, function(loaded) {
+                        var fill = document.getElementById('uploadProgressFill');
+                        if (fill) fill.style.width = Math.round(((base + loaded) / totalBytes) * 100) + '%';
+                    });
+                    base += list[i].size;
+                }
+                showToast(typeof I18n !== 'undefined' ? I18n.t('common.upload_success') : 'Upload successful', 'success');
+                if (typeof doRefreshFileList === 'function') doRefreshFileList();
+            } catch (e) {
+                showToast((e && e.message) || (typeof I18n !== 'undefined' ? I18n.t('upload.failed') : 'Upload failed'), 'error');
+            } finally {
+                box.remove();
+            }
+        })();
+        event.target.value = '';
+        return;
+    }
     if (files.length > 0) {
         var formData = new FormData();
         for (var i = 0; i < files.length; i++) { formData.append('file', files[i]); }
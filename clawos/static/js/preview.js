@@ -152,9 +152,15 @@ function openPreview(path, name) {
                     var icon = it.is_dir ? '📁' : '📄';
                     var p = escapeHtml(it.path || '');
                     var size = it.is_dir ? '' : ('<span style="color:#999;font-size:12px;margin-left:8px;">' + escapeHtml(it.size_human || '') + '</span>');
+                    var label = '<span style="flex:1;min-width:0;word-break:break-all;">' + p + '</span>';
+                    if (!it.is_dir) {
+                        // 直接从压缩包内流式预览该文件，无需解压
+                        var href = '/view/' + encodePathForUrl(path) + '?member=' + encodeURIComponent(it.path || '');
+                        label = '<a href="' + escapeHtml(href) + '" target="_blank" rel="noopener" style="flex:1;min-width:0;word-break:break-all;color:inherit;">' + p + '</a>';
+                    }
                     return '<div style="padding:10px 2px;border-bottom:1px solid #eee;display:flex;align-items:center;gap:10px;">' +
                         '<span style="width:24px;text-align:center;">' + icon + '</span>' +
-                        '<span style="flex:1;min-width:0;word-break:break-all;">' + p + '</span>' +
+                        label +
                         size +
                     '</div>';
                 }).join('');
@@ -5,6 +5,15 @@
         root.TaskPoller = factory();
     }
 })(typeof window !== 'undefined' ? window : globalThis, function() {
+    // 有 Socket.IO 时订阅 /tasks 命名空间接收推送；连接不可用时所有在等待的任务合并成一次批量查询
+    var TASKS_NAMESPACE = '/tasks';
+    var BATCH_URL = '/api/task/status/batch';
+    var BATCH_LIMIT = 200;
+
+    var watchers = new Map();
+    var socket = null;
+    var pollTimer = null;
+
     function getStatusFromPayload(payload) {
         if (!payload || typeof payload !== 'object') return null;
         if (typeof payload.status === 'string') return payload.status;
@@ -19,63 +28,166 @@
         return null;
     }
 
+    function getSocket() {
+        if (socket) return socket;
+        var ioFn = typeof window !== 'undefined' ? window.io : null;
+        if (typeof ioFn !== 'function') return null;
+        try {
+            socket = ioFn(TASKS_NAMESPACE, { reconnection: true, transports: ['websocket', 'polling'] });
+        } catch (e) {
+            socket = null;
+            return null;
+        }
+        socket.on('connect', function() {
+            // 重连后服务端房间已丢失，重新订阅所有仍在等待的任务
+            var ids = Array.from(watchers.keys());
+            if (ids.length) socket.emit('subscribe', { taskIds: ids });
+        });
+        socket.on('task', function(payload) {
+            var taskId = getTaskIdFromPayload(payload);
+            if (taskId) dispatch(taskId, payload);
+        });
+        return socket;
+    }
+
+    function socketReady() {
+        return !!(socket && socket.connected);
+    }
+
+    function dispatch(taskId, payload) {
+        var list = watchers.get(taskId);
+        if (!list) return;
+        var status = getStatusFromPayload(payload);
+        list.slice().forEach(function(w) {
+            if (w.onUpdate) w.onUpdate({ taskId: taskId, status: status, payload: payload });
+            if (status === 'success') {
+                w.finish({ ok: true, taskId: taskId, status: 'success', payload: payload });
+            } else if (status === 'failed' || status === 'cancelled') {
+                w.finish({ ok: false, taskId: taskId, status: status, payload: payload });
+            }
+        });
+    }
+
+    function removeWatcher(w) {
+        var list = watchers.get(w.taskId);
+        if (!list) return;
+        var i = list.indexOf(w);
+        if (i >= 0) list.splice(i, 1);
+        if (!list.length) {
+            watchers.delete(w.taskId);
+            if (socketReady()) socket.emit('unsubscribe', { taskIds: [w.taskId] });
+        }
+        if (!watchers.size && pollTimer) {
+            clearTimeout(pollTimer);
+            pollTimer = null;
+        }
+    }
+
+    function nextDelay() {
+        var delay = null;
+        watchers.forEach(function(list) {
+            list.forEach(function(w) {
+                if (delay === null || w.intervalMs < delay) delay = w.intervalMs;
+            });
+        });
+        return delay === null ? 1000 : delay;
+    }
+
+    function schedulePoll() {
+        if (pollTimer || !watchers.size) return;
+        pollTimer = setTimeout(function() {
+            pollTimer = null;
+            pollOnce().then(schedulePoll, schedulePoll);
+        }, nextDelay());
+    }
+
+    async function pollOnce() {
+        var now = Date.now();
+        var byFetch = new Map();
+        watchers.forEach(function(list, taskId) {
+            list.slice().forEach(function(w) {
+                if (now - w.startedAt >= w.timeoutMs) {
+                    w.finish({ ok: false, taskId: taskId, status: 'timeout' });
+                    return;
+                }
+                if (socketReady() || !w.fetchFn) return;
+                var ids = byFetch.get(w.fetchFn);
+                if (!ids) {
+                    ids = [];
+                    byFetch.set(w.fetchFn, ids);
+                }
+                if (ids.indexOf(taskId) < 0) ids.push(taskId);
+            });
+        });
+        var jobs = [];
+        byFetch.forEach(function(ids, fetchFn) {
+            for (var i = 0; i < ids.length; i += BATCH_LIMIT) {
+                jobs.push(pollBatch(fetchFn, ids.slice(i, i + BATCH_LIMIT)));
+            }
+        });
+        await Promise.all(jobs);
+    }
+
+    async function pollBatch(fetchFn, ids) {
+        try {
+            var url = BATCH_URL + '?taskIds=' + ids.map(encodeURIComponent).join(',');
+            var resp = await fetchFn(url);
+            var json = null;
+            try { json = await resp.json(); } catch (e) { json = null; }
+            var tasks = json && json.tasks ? json.tasks : {};
+            ids.forEach(function(taskId) {
+                if (tasks[taskId]) dispatch(taskId, tasks[taskId]);
+            });
+        } catch (e) {
+            ids.forEach(function(taskId) {
+                (watchers.get(taskId) || []).forEach(function(w) {
+                    if (w.onUpdate) w.onUpdate({ taskId: taskId, status: null, error: e });
+                });
+            });
+        }
+    }
+
     function start(taskId, opts) {
         var options = opts || {};
-        var intervalMs = typeof options.intervalMs === 'number' ? options.intervalMs : 1000;
-        var timeoutMs = typeof options.timeoutMs === 'number' ? options.timeoutMs : 5000;
         var fetchFn = options.fetchFn;
         if (!fetchFn) {
             if (typeof window !== 'undefined' && window.fetch) fetchFn = window.fetch.bind(window);
         }
-        var onUpdate = typeof options.onUpdate === 'function' ? options.onUpdate : null;
-
-        var elapsedMs = 0;
-        var done = false;
-        var inFlight = false;
-        var intervalId = null;
+        var w = {
+            taskId: taskId,
+            intervalMs: typeof options.intervalMs === 'number' ? options.intervalMs : 1000,
+            timeoutMs: typeof options.timeoutMs === 'number' ? options.timeoutMs : 5000,
+            fetchFn: fetchFn,
+            onUpdate: typeof options.onUpdate === 'function' ? options.onUpdate : null,
+            startedAt: Date.now(),
+            done: false,
+            finish: null
+        };
 
         function cancel() {
-            if (done) return;
-            done = true;
-            if (intervalId) clearInterval(intervalId);
-            intervalId = null;
+            if (w.done) return;
+            w.done = true;
+            removeWatcher(w);
         }
 
         var promise = new Promise(function(resolve) {
-            intervalId = setInterval(async function() {
-                if (done || inFlight) return;
-                elapsedMs += intervalMs;
-                inFlight = true;
-                try {
-                    var url = '/api/task/status?taskId=' + encodeURIComponent(taskId);
-                    var resp = await fetchFn(url);
-                    var json = null;
-                    try { json = await resp.json(); } catch (e) { json = null; }
-                    var status = getStatusFromPayload(json);
-                    if (onUpdate) onUpdate({ taskId: taskId, status: status, payload: json });
-                    if (status === 'success') {
-                        cancel();
-                        resolve({ ok: true, taskId: taskId, status: 'success', payload: json });
-                        return;
-                    }
-                    if (status === 'failed') {
-                        cancel();
-                        resolve({ ok: false, taskId: taskId, status: 'failed', payload: json });
-                        return;
-                    }
-                } catch (e) {
-                    if (onUpdate) onUpdate({ taskId: taskId, status: null, error: e });
-                } finally {
-                    inFlight = false;
-                }
-
-                if (elapsedMs >= timeoutMs) {
-                    cancel();
-                    resolve({ ok: false, taskId: taskId, status: 'timeout' });
-                }
-            }, intervalMs);
+            w.finish = function(result) {
+                if (w.done) return;
+                cancel();
+                resolve(result);
+            };
         });
 
+        var list = watchers.get(taskId);
+        if (!list) {
+            list = [];
+            watchers.set(taskId, list);
+        }
+        list.push(w);
+        var s = getSocket();
+        if (s && s.connected) s.emit('subscribe', { taskIds: [taskId] });
+        schedulePoll();
+
         return { promise: promise, cancel: cancel };
     }
 
@@ -85,4 +197,3 @@
         getTaskIdFromPayload: getTaskIdFromPayload
     };
 });
-